@@ -0,0 +1,202 @@
+# ===========================
+# Pulse Oximeter Acquisition Thread
+# ===========================
+"""
+Background acquisition for the MAX30102 pulse oximeter.
+
+`max30102.MAX30102.read_sequential` blocks the caller until a whole buffer has been
+read. The AcquisitionThread below instead runs in its own thread, sleeps on the sensor
+interrupt (see MAX30102.wait_for_interrupt) and pushes every sample, with the time it
+was read, into a bounded thread-safe queue. Consumers drain that queue without blocking.
+
+When consumers fall behind and the queue is full, the oldest sample is discarded so the
+queue always holds the most recent data; discarded samples are counted in `dropped`.
+
+The thread also has the blocking read_sequential() of the sensor, so it can stand in for
+the device in the readers of pulse_oximeter_reader (see initialize_pulse_oximeter): the
+sensor is then read continuously in the background and a slow consumer only finds more
+samples waiting.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Global Variables
+# ===========================
+QUEUE_SIZE = 512  # ~20 s of samples at 25 Hz
+INTERRUPT_TIMEOUT = 1.0  # seconds to wait for the interrupt before checking for stop
+ERROR_BACKOFF = 0.1  # seconds to wait after an I2C error
+SAMPLE_RATE = 25  # effective samples per second (100 Hz with 4-sample averaging)
+
+Sample = namedtuple("Sample", ["timestamp", "red", "ir"])
+
+# ===========================
+# Acquisition Thread
+# ===========================
+class AcquisitionThread(threading.Thread):
+    """
+    Reads samples from a MAX30102 in the background.
+
+    Parameters:
+    device (max30102.MAX30102): Sensor to read, or any object with the same
+        wait_for_interrupt() / read_fifo() interface.
+    maxsize (int): Capacity of the sample queue.
+    clock (callable): Time source for the sample timestamps.
+    burst (bool): Drain the whole FIFO on each interrupt with read_fifo_burst()
+        instead of reading one sample per interrupt.
+    sample_rate (float): Sensor output rate, used to back-date the samples of a burst.
+    metrics_scope (str, optional): Scope of the thread's gauges (see metrics.scoped).
+    """
+
+    def __init__(self, device, maxsize=QUEUE_SIZE, clock=time.time, burst=False, sample_rate=SAMPLE_RATE,
+                 metrics_scope=None):
+        super().__init__(name="max30102-acquisition", daemon=True)
+        self.device = device
+        self.burst = burst
+        self.sample_rate = sample_rate
+        self.samples = queue.Queue(maxsize=maxsize)
+        self.clock = clock
+        self.dropped = 0
+        self.errors = 0
+        self.read_count = 0
+        self.ended = False  # the device has no more samples (end of a replayed recording)
+        self._partial = []  # samples taken by a get_block() that timed out, oldest first
+        self._stop_event = threading.Event()
+        metrics.gauge(metrics.scoped("queue.acquisition", metrics_scope), self.samples.qsize)
+        metrics.gauge(metrics.scoped("sensor.fifo_overflows", metrics_scope), lambda: self.overflows)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                if not self.device.wait_for_interrupt(INTERRUPT_TIMEOUT):
+                    if getattr(self.device, "exhausted", False):
+                        raise EOFError("End of the PPG recording")
+                    continue
+                if self.burst:
+                    block = self.device.read_fifo_burst()
+                else:
+                    red, ir = self.device.read_fifo()
+            except EOFError:
+                self.ended = True
+                return
+            except OSError as e:
+                # I2C errors are transient (loose wire, bus contention): back off and retry
+                self.errors += 1
+                metrics.counter("sensor.errors").inc()
+                logger.warning("Error reading the pulse oximeter: %s", e)
+                self._stop_event.wait(ERROR_BACKOFF)
+                continue
+
+            now = self.clock()
+            if not self.burst:
+                self.read_count += 1
+                self._put(Sample(now, red, ir))
+                continue
+            # the last sample of the burst is the newest one
+            n = block.shape[0]
+            self.read_count += n
+            for k, (red, ir) in enumerate(block.tolist()):
+                self._put(Sample(now - (n - 1 - k) / self.sample_rate, red, ir))
+
+    @property
+    def overflows(self):
+        """
+        Samples lost in the sensor FIFO (burst mode only).
+        """
+        return getattr(self.device, "overflow_count", 0)
+
+    overflow_count = overflows  # name of the count on the device, see read_sequential()
+
+    def _put(self, sample):
+        while True:
+            try:
+                self.samples.put_nowait(sample)
+                return
+            except queue.Full:
+                try:
+                    self.samples.get_nowait()
+                    self.dropped += 1
+                    metrics.counter("sensor.dropped_samples").inc()
+                except queue.Empty:
+                    pass
+
+    def get_samples(self, max_items=None):
+        """
+        Returns the samples queued so far without blocking.
+
+        Parameters:
+        max_items (int, optional): Maximum number of samples to return.
+
+        Returns:
+        list: Sample(timestamp, red, ir) tuples, oldest first (may be empty).
+        """
+        samples = self._partial[:max_items]
+        del self._partial[:len(samples)]
+        while max_items is None or len(samples) < max_items:
+            try:
+                samples.append(self.samples.get_nowait())
+            except queue.Empty:
+                break
+        return samples
+
+    def get_block(self, amount, timeout=None):
+        """
+        Waits for AMOUNT samples and returns them as (red, ir) lists, like
+        MAX30102.read_sequential(), or None if TIMEOUT expires first. The samples
+        received before the timeout are kept for the next call, so the stream has no gap.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        block, self._partial = self._partial, []
+        while len(block) < amount:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            try:
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                block.append(self.samples.get(timeout=remaining))
+            except queue.Empty:
+                self._partial = block
+                return None
+        block, self._partial = block[:amount], block[amount:]
+        return [s.red for s in block], [s.ir for s in block]
+
+    def read_sequential(self, amount=100, burst=False):
+        """
+        Waits for AMOUNT samples and returns them as (red, ir) lists, like
+        MAX30102.read_sequential(). BURST is ignored: the thread reads the way it was
+        created with.
+
+        Raises:
+        EOFError: The device ended (or the thread stopped) before AMOUNT more samples
+            were queued.
+        """
+        while True:
+            # checked first: the last samples may be queued just before the thread ends
+            finished = self.ended or not self.is_alive()
+            block = self.get_block(amount, timeout=INTERRUPT_TIMEOUT)
+            if block is not None:
+                return block
+            if finished:
+                raise EOFError("End of the PPG recording" if self.ended else "The acquisition thread has stopped")
+
+    def stop(self, timeout=None):
+        """
+        Stops the thread and waits for it to finish.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def shutdown(self):
+        """
+        Stops the thread and shuts the device down, like MAX30102.shutdown().
+        """
+        self.stop(INTERRUPT_TIMEOUT + 1.0)
+        self.device.shutdown()
@@ -1,8 +1,40 @@
-import pygame
+import logging
+import queue
+import threading
 import time
+from collections import namedtuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_mixer = None  # pygame.mixer once initialized
+_audio_checked = False  # Whether init_audio() already ran
+_audio_lock = threading.Lock()
 
 # Initialize the pygame mixer module for audio playback.
-pygame.mixer.init()
+def init_audio():
+    """
+    Imports pygame and initializes its mixer module, once.
+
+    pygame is only imported here, so importing this module stays cheap; the monitoring 
+    system calls this in the background at startup so that the first alarm does not 
+    wait for it. Without pygame or an audio device the alarms are only logged.
+
+    Returns:
+    module: pygame.mixer, or None when no audio output is available.
+    """
+    global _mixer, _audio_checked
+    with _audio_lock:
+        if not _audio_checked:
+            _audio_checked = True
+            try:
+                import pygame
+                pygame.mixer.init()
+                _mixer = pygame.mixer
+            except Exception as e:  # ImportError, or pygame.error without a sound card
+                logger.error("No audio output (%s): alarms will only be logged.", e)
+        return _mixer
 
 # Function to play an alarm sound.
 def alarma(archivo_mp3):
@@ -21,12 +53,16 @@ def alarma(archivo_mp3):
     Example:
     alarma("alarm.wav")
     """
+    mixer = init_audio()
+    if mixer is None:
+        logger.warning("Alarm is sounding (no audio output)...")
+        return
     try:
-        pygame.mixer.music.load(archivo_mp3)  # Load the specified MP3 file.
-        pygame.mixer.music.play(-1)  # Play the sound on an infinite loop.
-        print("Alarm is sounding...")  # Log that the alarm is sounding.
+        mixer.music.load(archivo_mp3)  # Load the specified MP3 file.
+        mixer.music.play(-1)  # Play the sound on an infinite loop.
+        logger.warning("Alarm is sounding...")  # Log that the alarm is sounding.
     except Exception as e:
-        print(f"Error playing the alarm: {e}")  # Log any errors encountered.
+        logger.error("Error playing the alarm: %s", e)  # Log any errors encountered.
 
 # Function to stop the alarm sound.
 def stop_alarma():
@@ -42,11 +78,176 @@ def stop_alarma():
     Example:
     stop_alarma()
     """
+    mixer = init_audio()
+    if mixer is None:
+        return
     try:
-        pygame.mixer.music.stop()  # Stop the currently playing music.
-        print("Alarm has been stopped.")  # Log that the alarm has stopped.
+        mixer.music.stop()  # Stop the currently playing music.
+        logger.info("Alarm has been stopped.")  # Log that the alarm has stopped.
     except Exception as e:
-        print(f"Error stopping the alarm: {e}")  # Log any errors encountered.
+        logger.error("Error stopping the alarm: %s", e)  # Log any errors encountered.
+
+# ===========================
+# Alarm Manager
+# ===========================
+ALARM_FILE = "alarm.wav"  # Replace this with the path to your alarm sound file
+EVENT_QUEUE_SIZE = 64  # Pending alert events
+CLEAR_AFTER = 15  # Seconds without a repeat after which an alert condition is over
+MIN_SOUND_TIME = 10  # Seconds the alarm sounds at least once started
+# (seconds since the condition started, volume): the alarm gets louder the longer it lasts
+ESCALATION_STEPS = ((0, 0.5), (30, 0.8), (60, 1.0))
+
+AlertEvent = namedtuple("AlertEvent", ["timestamp", "key", "message"])
+
+class PygameAlarmBackend:
+    """
+    Alarm backend playing a sound file with pygame (see alarma / stop_alarma).
+    """
+
+    def __init__(self, sound_file=ALARM_FILE):
+        self.sound_file = sound_file
+
+    def play(self):
+        alarma(self.sound_file)
+
+    def stop(self):
+        stop_alarma()
+
+    def set_volume(self, volume):
+        mixer = init_audio()
+        if mixer is None:
+            return
+        try:
+            mixer.music.set_volume(volume)
+        except Exception as e:
+            logger.error("Error setting the alarm volume: %s", e)
+
+class AlarmManager(threading.Thread):
+    """
+    Sounds the alarm from its own thread so that alerts never block the sensing loop.
+
+    Alert events are queued with raise_alert(key, message) and return immediately. 
+    Events with the same key belong to one alert condition: repeats only keep the 
+    condition alive (they are de-duplicated, not announced again). The alarm keeps 
+    sounding while at least one condition is active, escalates its volume following 
+    ESCALATION_STEPS, and stops once every condition has been quiet for CLEAR_AFTER 
+    seconds (and it has sounded for at least MIN_SOUND_TIME seconds) or was cleared.
+
+    Parameters:
+    backend (optional): Object with play(), stop() and set_volume(volume); 
+        PygameAlarmBackend by default, fakes.SilentAlarmBackend in tests.
+    clear_after (float): See CLEAR_AFTER.
+    min_sound_time (float): See MIN_SOUND_TIME.
+    escalation (tuple): See ESCALATION_STEPS.
+    metrics_scope (str, optional): Scope of the manager's gauges (see metrics.scoped).
+    """
+
+    def __init__(self, backend=None, clear_after=CLEAR_AFTER, min_sound_time=MIN_SOUND_TIME,
+                 escalation=ESCALATION_STEPS, clock=time.monotonic, metrics_scope=None):
+        super().__init__(name="alarm-manager", daemon=True)
+        self.backend = PygameAlarmBackend() if backend is None else backend
+        self.clear_after = clear_after
+        self.min_sound_time = min_sound_time
+        self.escalation = escalation
+        self.clock = clock
+        self.events = queue.Queue(EVENT_QUEUE_SIZE)
+        self.active = {}  # key -> [first seen, last seen, message]
+        self.sounding_since = None
+        self.level = -1
+        self.raised = 0  # alert conditions started
+        self.deduplicated = 0  # repeated events folded into an active condition
+        self.escalations = 0
+        self._stop_event = threading.Event()
+        metrics.gauge(metrics.scoped("alarm.active", metrics_scope), lambda: len(self.active))
+        metrics.gauge(metrics.scoped("queue.alarm_events", metrics_scope), self.events.qsize)
+
+    def raise_alert(self, key, message):
+        """
+        Queues an alert event. Never blocks; if the queue is full the oldest event is dropped.
+        """
+        event = AlertEvent(self.clock(), key, message)
+        metrics.counter("alarm.events").inc()
+        while True:
+            try:
+                self.events.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.events.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def clear(self, key):
+        """
+        Ends the alert condition KEY without waiting for CLEAR_AFTER.
+        """
+        self.raise_alert(key, None)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self._handle(self.events.get(timeout=0.5))
+            except queue.Empty:
+                pass
+            self._update(self.clock())
+        self._silence()
+
+    def _handle(self, event):
+        if event.message is None:
+            self.active.pop(event.key, None)
+            return
+        condition = self.active.get(event.key)
+        if condition is None:
+            self.active[event.key] = [event.timestamp, event.timestamp, event.message]
+            self.raised += 1
+            metrics.counter("alarm.raised").inc()
+            logger.warning("ALERT: %s", event.message)
+        else:
+            condition[1] = event.timestamp
+            condition[2] = event.message
+            self.deduplicated += 1
+            metrics.counter("alarm.deduplicated").inc()
+
+    def _update(self, now):
+        for key, (first, last, message) in list(self.active.items()):
+            if now - last > self.clear_after:
+                del self.active[key]
+                logger.info("Alert cleared: %s", message)
+
+        if self.active:
+            if self.sounding_since is None:
+                self.sounding_since = now
+                self.level = -1
+                metrics.counter("alarm.sounded").inc()
+                self.backend.play()
+            # escalate on the age of the oldest active condition
+            age = now - min(first for first, _, _ in self.active.values())
+            level = max(i for i, (after, _) in enumerate(self.escalation) if age >= after)
+            if level != self.level:
+                if self.level >= 0:
+                    self.escalations += 1
+                    metrics.counter("alarm.escalations").inc()
+                    logger.warning("Alarm escalated to level %d after %.0f s", level, age)
+                self.level = level
+                self.backend.set_volume(self.escalation[level][1])
+        elif self.sounding_since is not None and now - self.sounding_since >= self.min_sound_time:
+            self._silence()
+
+    def _silence(self):
+        if self.sounding_since is not None:
+            self.backend.stop()
+            self.sounding_since = None
+            self.level = -1
+
+    def stop(self, timeout=None):
+        """
+        Silences the alarm and stops the manager thread.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+        else:
+            self._silence()
 
 # Example usage (commented out to avoid running in module context):
 '''
@@ -0,0 +1,558 @@
+# ===========================
+# Analytics Module
+# ===========================
+"""
+Per-night summaries of the monitoring logs.
+
+Usage:
+    python analytics.py sleep_monitor_log*.csv sleep_monitor_log/ [--jobs N] [--json nights.json]
+
+Every input (a CSV file of main.log_data, or every chunk file of a binary_log
+directory) is streamed in chunks of CHUNK_ROWS rows as NumPy arrays, never loaded
+whole. Inputs are analyzed in parallel by a process pool, and the result of each input
+is cached in CACHE_DIR under the SHA-256 of its content (and of the analysis options),
+so re-running over months of logs only analyzes the files that are new or changed.
+
+A night runs from NIGHT_SPLIT_HOUR to NIGHT_SPLIT_HOUR the next day, in the local time
+of the log. For each night the summary has:
+
+- the monitored time (readings less than MAX_GAP seconds apart);
+- time in range: share of the time with valid values where SpO2 is within SPO2_RANGE
+  and the heart rate within HR_RANGE;
+- desaturation events: SpO2 below DESATURATION_LEVEL for at least
+  DESATURATION_MIN_DURATION seconds, with their start, duration and lowest value;
+- heart rate variability of the readings: mean, standard deviation and RMSSD of
+  successive valid readings (reading-to-reading, not beat-to-beat);
+- face-not-visible episodes of at least FACE_MIN_DURATION seconds;
+- alarm counts: episodes in which the alert rules of main (value invalid or below
+  its threshold) hold; the logs do not record the alarms themselves.
+
+Results of the inputs are partial summaries that merge: a night split over several
+files (daily rotation, binary chunks) is joined, and an event that crosses the
+boundary is joined as well when the two files are less than MAX_GAP apart.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+from binary_log import BinaryLogReader, CHUNK_PREFIX, CHUNK_SUFFIX, HR_VALID, SPO2_VALID, FACE, INVALID_VALUE
+from pulse_oximeter_reader import SPO2_FIELD, HR_FIELD
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Global Variables
+# ===========================
+CHUNK_ROWS = 50000  # rows parsed at a time
+CACHE_DIR = ".analytics_cache"
+ANALYSIS_VERSION = 2  # part of the cache key: bump when the analysis changes
+NIGHT_SPLIT_HOUR = 12  # local hour at which one night ends and the next begins
+MAX_GAP = 30.0  # seconds between two readings beyond which the monitor was off
+SPO2_RANGE = (90.0, 100.0)  # % SpO2 counted as in range
+HR_RANGE = (80.0, 180.0)  # bpm counted as in range
+DESATURATION_LEVEL = 90.0  # % SpO2 below which the baby is desaturating
+DESATURATION_MIN_DURATION = 10.0  # seconds a desaturation must last to be an event
+FACE_MIN_DURATION = 10.0  # seconds a face-not-visible episode must last
+MAX_EVENTS = 200  # events listed per night and kind (all are counted)
+
+SPO2_COLUMN = SPO2_FIELD  # logged column holding the SpO2
+HR_COLUMN = HR_FIELD  # logged column holding the heart rate
+
+# the alert thresholds of main, applied to the columns of the same name
+AnalysisOptions = namedtuple(
+    "AnalysisOptions", ["oxygen_threshold", "heart_rate_threshold", "version"], defaults=(30.0, 50.0, ANALYSIS_VERSION)
+)
+EVENT_KINDS = ("desaturation", "face_hidden", "alarm_oxygen", "alarm_heart_rate")
+
+# ===========================
+# Log Readers
+# ===========================
+def _parse_column(texts):
+    try:
+        return np.array(texts, dtype=np.float64)
+    except ValueError:
+        return np.array([float(t) if t.strip() else INVALID_VALUE for t in texts])
+
+
+def read_csv_chunks(path, chunk_rows=CHUNK_ROWS):
+    """
+    Streams a main.log_data CSV file.
+
+    Yields:
+    dict: Column arrays of up to CHUNK_ROWS rows: timestamp (local time, seconds),
+    heart_rate, oxygen_level, heart_rate_ok, oxygen_level_ok and face_detected.
+    """
+    with open(path) as f:
+        while True:
+            lines = list(islice(f, chunk_rows))
+            if not lines:
+                return
+            rows = [line.rstrip("\n").split(",") for line in lines]
+            rows = [r for r in rows if len(r) >= 4 and r[0][:1].isdigit()]
+            if not rows:
+                continue
+            stamps, heart_rate, oxygen_level, face = zip(*(r[:4] for r in rows))
+            heart_rate = _parse_column(heart_rate)
+            oxygen_level = _parse_column(oxygen_level)
+            yield {
+                "timestamp": np.array(stamps, dtype="datetime64[s]").astype(np.int64).astype(np.float64),
+                "heart_rate": heart_rate,
+                "oxygen_level": oxygen_level,
+                "heart_rate_ok": heart_rate != INVALID_VALUE,
+                "oxygen_level_ok": oxygen_level != INVALID_VALUE,
+                "face_detected": np.char.strip(np.array(face)) == "True",
+            }
+
+
+def read_binary_chunk(path):
+    """
+    Reads one binary_log chunk file, with the columns of read_csv_chunks (timestamps
+    moved to local time with the UTC offset of the first record).
+
+    Yields:
+    dict: The columns of the chunk (at most binary_log.CHUNK_RECORDS records).
+    """
+    records = BinaryLogReader._map(path)
+    if records is None:
+        return
+    offset = time.localtime(float(records["timestamp"][0])).tm_gmtoff
+    flags = records["flags"]
+    yield {
+        "timestamp": records["timestamp"] + offset,
+        "heart_rate": records["heart_rate"].astype(np.float64),
+        "oxygen_level": records["oxygen_level"].astype(np.float64),
+        "heart_rate_ok": (flags & HR_VALID) != 0,
+        "oxygen_level_ok": (flags & SPO2_VALID) != 0,
+        "face_detected": (flags & FACE) != 0,
+    }
+
+
+def expand_inputs(paths):
+    """
+    CSV files stay as they are, binary log directories become their chunk files.
+    """
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            inputs.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                          if name.startswith(CHUNK_PREFIX) and name.endswith(CHUNK_SUFFIX))
+        else:
+            inputs.append(path)
+    return inputs
+
+
+def content_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# ===========================
+# Accumulators
+# ===========================
+class RunTracker:
+    """
+    Runs of consecutive readings for which a condition holds, streamed chunk by chunk.
+
+    A run ends at the first reading without the condition (its duration reaching that
+    reading) or at a gap of more than MAX_GAP (its duration ending at its last reading).
+    Runs shorter than MIN_DURATION are dropped, except those touching the first or the
+    last reading, which may continue in a neighbouring file.
+
+    Parameters:
+    min_duration (float): Seconds a run must last to be kept.
+    max_gap (float): See MAX_GAP.
+    """
+
+    def __init__(self, min_duration=0.0, max_gap=MAX_GAP):
+        self.min_duration = min_duration
+        self.max_gap = max_gap
+        self.runs = []  # [start, end, lowest value]
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.opens_part = False  # the first run starts at the first reading
+        self._open = None  # run still going at the last reading
+
+    def update(self, timestamps, condition, values=None):
+        n = timestamps.shape[0]
+        if n == 0:
+            return
+        if self.first_timestamp is None:
+            self.first_timestamp = float(timestamps[0])
+            self.opens_part = bool(condition[0])
+        previous = np.empty(n)
+        previous[0] = -np.inf if self.last_timestamp is None else self.last_timestamp
+        previous[1:] = timestamps[:-1]
+        gap = timestamps - previous > self.max_gap
+        before = np.empty(n, dtype=bool)
+        before[0] = self._open is not None
+        before[1:] = condition[:-1]
+        starts = condition & (gap | ~before)
+        ends = before & (gap | ~condition)  # a run ends just before these readings
+
+        start_index = None
+        if self._open is not None and not ends[0]:
+            start_index = 0
+        for i in np.flatnonzero(starts | ends):
+            if ends[i]:
+                end = previous[i] if gap[i] else timestamps[i]
+                self._close(end, values, start_index, i)
+            if starts[i]:
+                self._open = [float(timestamps[i]), None, np.inf]
+                start_index = i
+        if self._open is not None and values is not None:
+            self._open[2] = min(self._open[2], float(values[start_index:].min()))
+        self.last_timestamp = float(timestamps[-1])
+
+    def _close(self, end, values, start_index, stop_index):
+        run = self._open
+        self._open = None
+        if values is not None and start_index is not None and stop_index > start_index:
+            run[2] = min(run[2], float(values[start_index:stop_index].min()))
+        run[1] = float(end)
+        first = self.first_timestamp is not None and run[0] == self.first_timestamp
+        if run[1] - run[0] >= self.min_duration or (first and self.opens_part):
+            self.runs.append(run)
+
+    def to_dict(self):
+        runs = [list(run) for run in self.runs]
+        closes_part = self._open is not None
+        if closes_part:
+            runs.append([self._open[0], self.last_timestamp, self._open[2]])
+        return {"runs": [[r[0], r[1], None if r[2] == np.inf else r[2]] for r in runs],
+                "opens": self.opens_part, "closes": closes_part,
+                "first": self.first_timestamp, "last": self.last_timestamp}
+
+
+class NightAccumulator:
+    """
+    Partial summary of one night in one input.
+
+    Parameters:
+    options (AnalysisOptions): Alert thresholds.
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self.samples = 0
+        self.first = None
+        self.last = None
+        self.monitored = 0.0
+        self.valid_time = 0.0
+        self.in_range_time = 0.0
+        self.hr = [0, 0.0, 0.0]  # count, sum, sum of squares of the valid heart rates
+        self.hr_diffs = [0, 0.0]  # count, sum of squares of successive differences
+        self.first_row = None  # [valid, in range] of the first reading, counted when merging
+        self.first_hr = None  # [timestamp, value] of the first and last valid heart rates
+        self.last_hr = None
+        self.trackers = {
+            "desaturation": RunTracker(DESATURATION_MIN_DURATION),
+            "face_hidden": RunTracker(FACE_MIN_DURATION),
+            "alarm_oxygen": RunTracker(),
+            "alarm_heart_rate": RunTracker(),
+        }
+
+    def update(self, columns):
+        ts = columns["timestamp"]
+        n = ts.shape[0]
+        if n == 0:
+            return
+        spo2, spo2_ok = columns[SPO2_COLUMN], columns[SPO2_COLUMN + "_ok"] & (columns[SPO2_COLUMN] != INVALID_VALUE)
+        hr, hr_ok = columns[HR_COLUMN], columns[HR_COLUMN + "_ok"] & (columns[HR_COLUMN] != INVALID_VALUE)
+
+        # time each reading stands for: since the previous one, unless the monitor was off
+        step = np.diff(ts, prepend=ts[0] if self.last is None else self.last)
+        step[step > MAX_GAP] = 0.0
+        self.monitored += float(step.sum())
+        valid = spo2_ok & hr_ok
+        in_range = (valid & (spo2 >= SPO2_RANGE[0]) & (spo2 <= SPO2_RANGE[1])
+                    & (hr >= HR_RANGE[0]) & (hr <= HR_RANGE[1]))
+        self.valid_time += float(step[valid].sum())
+        self.in_range_time += float(step[in_range].sum())
+
+        if self.first_row is None:
+            self.first_row = [bool(valid[0]), bool(in_range[0])]
+
+        heart_rates, hr_times = hr[hr_ok], ts[hr_ok]
+        if heart_rates.shape[0]:
+            self.hr[0] += heart_rates.shape[0]
+            self.hr[1] += float(heart_rates.sum())
+            self.hr[2] += float(np.square(heart_rates).sum())
+            if self.last_hr is not None:
+                heart_rates = np.concatenate(([self.last_hr[1]], heart_rates))
+                hr_times = np.concatenate(([self.last_hr[0]], hr_times))
+            # successive readings only: not across a gap in which the monitor was off
+            diffs = np.diff(heart_rates)[np.diff(hr_times) <= MAX_GAP]
+            self.hr_diffs[0] += diffs.shape[0]
+            self.hr_diffs[1] += float(np.square(diffs).sum())
+            if self.first_hr is None:
+                self.first_hr = [float(hr_times[0]), float(heart_rates[0])]
+            self.last_hr = [float(hr_times[-1]), float(heart_rates[-1])]
+
+        self.trackers["desaturation"].update(ts, spo2_ok & (spo2 < DESATURATION_LEVEL), spo2)
+        self.trackers["face_hidden"].update(ts, ~columns["face_detected"])
+        # the rules of main.evaluate_state on the raw logged values
+        oxygen, heart_rate = columns["oxygen_level"], columns["heart_rate"]
+        self.trackers["alarm_oxygen"].update(
+            ts, (oxygen == INVALID_VALUE) | (oxygen < self.options.oxygen_threshold))
+        self.trackers["alarm_heart_rate"].update(
+            ts, (heart_rate == INVALID_VALUE) | (heart_rate < self.options.heart_rate_threshold))
+
+        self.samples += n
+        self.first = float(ts[0]) if self.first is None else self.first
+        self.last = float(ts[-1])
+
+    def to_dict(self):
+        return {
+            "samples": self.samples, "first": self.first, "last": self.last, "monitored": self.monitored,
+            "valid_time": self.valid_time, "in_range_time": self.in_range_time,
+            "hr": self.hr, "hr_diffs": self.hr_diffs,
+            "first_row": self.first_row, "first_hr": self.first_hr, "last_hr": self.last_hr,
+            "events": {kind: tracker.to_dict() for kind, tracker in self.trackers.items()},
+        }
+
+
+def night_of(local_seconds):
+    """
+    Date (YYYY-MM-DD) of the night the local times belong to, as an array of day numbers.
+    """
+    return ((local_seconds - NIGHT_SPLIT_HOUR * 3600) // 86400).astype(np.int64)
+
+# ===========================
+# Per-input Analysis
+# ===========================
+def analyze_input(path, options):
+    """
+    Analyzes one CSV file or binary chunk file (run in a pool process).
+
+    Returns:
+    dict: Night (day number) -> partial summary (NightAccumulator.to_dict()).
+    """
+    chunks = read_binary_chunk(path) if path.endswith(CHUNK_SUFFIX) else read_csv_chunks(path)
+    nights = {}
+    for columns in chunks:
+        # rows must be in time order; the logger appends them that way
+        days = night_of(columns["timestamp"])
+        bounds = np.flatnonzero(np.diff(days)) + 1
+        for lo, hi in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [days.shape[0]]))):
+            night = int(days[lo])
+            if night not in nights:
+                nights[night] = NightAccumulator(options)
+            nights[night].update({name: column[lo:hi] for name, column in columns.items()})
+    return {night: accumulator.to_dict() for night, accumulator in nights.items()}
+
+
+def _cache_path(cache_dir, digest, options):
+    key = hashlib.sha256(f"{digest}:{tuple(options)}".encode()).hexdigest()
+    return os.path.join(cache_dir, key[:2], key + ".json")
+
+
+def analyze_inputs(paths, options=AnalysisOptions(), jobs=None, cache_dir=CACHE_DIR):
+    """
+    Analyzes the inputs in parallel, reusing cached results.
+
+    Parameters:
+    paths (list): CSV files and binary log directories.
+    options (AnalysisOptions): Alert thresholds.
+    jobs (int, optional): Worker processes (default: one per CPU).
+    cache_dir (str, optional): Cache directory (None: no cache).
+
+    Returns:
+    tuple: (list of per-input results in input order, number of inputs analyzed).
+    """
+    inputs = expand_inputs(paths)
+    results = [None] * len(inputs)
+    pending = {}
+    for k, path in enumerate(inputs):
+        if cache_dir is not None:
+            cached = _cache_path(cache_dir, content_hash(path), options)
+            if os.path.exists(cached):
+                with open(cached) as f:
+                    results[k] = {int(night): part for night, part in json.load(f).items()}
+                continue
+            pending[k] = cached
+        else:
+            pending[k] = None
+
+    if pending:
+        workers = min(jobs or os.cpu_count() or 1, len(pending))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {k: pool.submit(analyze_input, inputs[k], options) for k in pending}
+            for k, future in futures.items():
+                results[k] = future.result()
+                cached = pending[k]
+                if cached is not None:
+                    os.makedirs(os.path.dirname(cached), exist_ok=True)
+                    tmp = cached + ".tmp"
+                    with open(tmp, "w") as f:
+                        json.dump(results[k], f, separators=(",", ":"))
+                    os.replace(tmp, cached)
+    logger.info("%d inputs, %d analyzed, %d from the cache", len(inputs), len(pending), len(inputs) - len(pending))
+    return results, len(pending)
+
+# ===========================
+# Merging and Summaries
+# ===========================
+def _merge_runs(a, b):
+    """
+    Joins the run lists of two consecutive parts, joining a run that crosses the boundary.
+    """
+    runs = [list(r) for r in a["runs"]]
+    later = [list(r) for r in b["runs"]]
+    if (a["closes"] and b["opens"] and runs and later and a["last"] is not None and b["first"] is not None
+            and 0 <= b["first"] - a["last"] <= MAX_GAP):
+        last, first = runs.pop(), later.pop(0)
+        lows = [v for v in (last[2], first[2]) if v is not None]
+        runs.append([last[0], first[1], min(lows) if lows else None])
+    elif (a["closes"] and not b["opens"] and runs and b["first"] is not None
+            and 0 <= b["first"] - a["last"] <= MAX_GAP):
+        # the run ended at the first reading of the next part
+        runs[-1][1] = b["first"]
+    return {"runs": runs + later, "opens": a["opens"], "closes": b["closes"],
+            "first": a["first"] if a["first"] is not None else b["first"],
+            "last": b["last"] if b["last"] is not None else a["last"]}
+
+
+def merge_parts(parts):
+    """
+    Merges partial summaries of the same night, in time order.
+
+    The first reading of a part stands for the time since the last reading of the
+    previous part, and its first heart rate follows the last one of the previous part,
+    when the two parts are less than MAX_GAP apart: the merge equals a single pass over
+    the joined inputs.
+    """
+    parts = sorted(parts, key=lambda p: p["first"])
+    merged = parts[0]
+    for part in parts[1:]:
+        step = part["first"] - merged["last"]
+        if not 0 <= step <= MAX_GAP:
+            step = 0.0
+        valid, in_range = part["first_row"]
+        hr_diffs = [x + y for x, y in zip(merged["hr_diffs"], part["hr_diffs"])]
+        before, after = merged["last_hr"], part["first_hr"]
+        if before is not None and after is not None and 0 <= after[0] - before[0] <= MAX_GAP:
+            hr_diffs = [hr_diffs[0] + 1, hr_diffs[1] + (after[1] - before[1]) ** 2]
+        merged = {
+            "samples": merged["samples"] + part["samples"],
+            "first": merged["first"], "last": max(merged["last"], part["last"]),
+            "monitored": merged["monitored"] + part["monitored"] + step,
+            "valid_time": merged["valid_time"] + part["valid_time"] + (step if valid else 0.0),
+            "in_range_time": merged["in_range_time"] + part["in_range_time"] + (step if in_range else 0.0),
+            "hr": [x + y for x, y in zip(merged["hr"], part["hr"])],
+            "hr_diffs": hr_diffs,
+            "first_row": merged["first_row"], "first_hr": merged["first_hr"] or part["first_hr"],
+            "last_hr": part["last_hr"] or merged["last_hr"],
+            "events": {kind: _merge_runs(merged["events"][kind], part["events"][kind]) for kind in EVENT_KINDS},
+        }
+    return merged
+
+
+def _local_time(seconds):
+    return str(np.datetime64(int(seconds), "s")).replace("T", " ")
+
+
+def _episodes(runs, min_duration, with_lowest=False):
+    runs = [r for r in runs if r[1] - r[0] >= min_duration]
+    durations = [r[1] - r[0] for r in runs]
+    summary = {"count": len(runs), "total_seconds": round(sum(durations), 1),
+               "longest_seconds": round(max(durations), 1) if durations else 0.0}
+    if with_lowest:
+        summary["events"] = [{"start": _local_time(r[0]), "seconds": round(r[1] - r[0], 1),
+                              "lowest": None if r[2] is None else round(r[2], 1)} for r in runs[:MAX_EVENTS]]
+    return summary
+
+
+def summarize_night(night, part):
+    """
+    Returns:
+    dict: The summary of a night (see the module docstring) from its merged partial summary.
+    """
+    count, total, squares = part["hr"]
+    mean = total / count if count else None
+    sd = float(np.sqrt(max(squares / count - mean * mean, 0.0))) if count else None
+    diffs, diff_squares = part["hr_diffs"]
+    events = part["events"]
+    return {
+        "night": str(np.datetime64(int(night), "D")),
+        "start": _local_time(part["first"]),
+        "end": _local_time(part["last"]),
+        "samples": part["samples"],
+        "monitored_hours": round(part["monitored"] / 3600.0, 2),
+        "time_in_range_percent": (round(100.0 * part["in_range_time"] / part["valid_time"], 1)
+                                  if part["valid_time"] else None),
+        "valid_percent": round(100.0 * part["valid_time"] / part["monitored"], 1) if part["monitored"] else None,
+        "heart_rate": {
+            "mean": None if mean is None else round(mean, 1),
+            "sd": None if sd is None else round(sd, 1),
+            "rmssd": round(float(np.sqrt(diff_squares / diffs)), 1) if diffs else None,
+        },
+        "desaturations": _episodes(events["desaturation"]["runs"], DESATURATION_MIN_DURATION, with_lowest=True),
+        "face_hidden": _episodes(events["face_hidden"]["runs"], FACE_MIN_DURATION),
+        "alarms": {
+            "oxygen": len(events["alarm_oxygen"]["runs"]),
+            "heart_rate": len(events["alarm_heart_rate"]["runs"]),
+        },
+    }
+
+
+def summarize(results):
+    """
+    Merges per-input results and summarizes every night.
+
+    Returns:
+    list: Night summaries in date order.
+    """
+    parts = {}
+    for result in results:
+        for night, part in result.items():
+            parts.setdefault(night, []).append(part)
+    return [summarize_night(night, merge_parts(parts[night])) for night in sorted(parts)]
+
+
+def _format_row(summary):
+    hr = summary["heart_rate"]
+    return (f"{summary['night']}  {summary['start'][11:16]}-{summary['end'][11:16]}  "
+            f"{summary['monitored_hours']:5.1f} h  in range {summary['time_in_range_percent'] or 0:5.1f}%  "
+            f"desat {summary['desaturations']['count']:3d} ({summary['desaturations']['longest_seconds']:.0f} s max)  "
+            f"HR {hr['mean'] or 0:5.1f} sd {hr['sd'] or 0:4.1f} rmssd {hr['rmssd'] or 0:4.1f}  "
+            f"face hidden {summary['face_hidden']['count']:3d}  "
+            f"alarms {summary['alarms']['oxygen']}/{summary['alarms']['heart_rate']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-night summaries of the sleep monitor logs.")
+    parser.add_argument("logs", nargs="+", help="CSV log files or binary log directories")
+    parser.add_argument("--jobs", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--cache", default=CACHE_DIR, help="cache directory of the per-file results")
+    parser.add_argument("--no-cache", action="store_true", help="analyze every file again")
+    parser.add_argument("--json", help="also write the summaries to this JSON file")
+    parser.add_argument("--oxygen-threshold", type=float, default=30, help="main.ALERT_THRESHOLD_OXYGEN")
+    parser.add_argument("--heart-rate-threshold", type=float, default=50, help="main.ALERT_THRESHOLD_HEART_RATE")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    options = AnalysisOptions(args.oxygen_threshold, args.heart_rate_threshold)
+    started = time.perf_counter()
+    results, analyzed = analyze_inputs(args.logs, options, args.jobs, None if args.no_cache else args.cache)
+    nights = summarize(results)
+    for summary in nights:
+        print(_format_row(summary))
+    print(f"{len(nights)} nights, {analyzed} files analyzed in {time.perf_counter() - started:.2f} s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(nights, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
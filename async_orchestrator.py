@@ -0,0 +1,534 @@
+# ===========================
+# Async Orchestrator Module
+# ===========================
+"""
+asyncio entry point of the monitoring system.
+
+The event loop never blocks: every device call (sensor read, frame capture, detection)
+and every sink call (log, alert) runs through a BlockingCall, i.e. in its own daemon
+thread via run_in_executor, with a timeout. A call that times out is abandoned, not
+interrupted (a thread stuck in an I2C read can not be cancelled), and its stage stays
+"busy" until the call returns: later ticks of that stage fail fast instead of queueing
+up behind it, while every other stage keeps running.
+
+Periodic tasks run at independent rates:
+
+- vitals: one oximeter reading (read_vitals() of the devices);
+- vision: one frame capture, then motion/face detection on it;
+- log: fuses the latest readings, decides on alerts, logs the state and raises alerts;
+- health: warns about stale readings and stuck device calls;
+- report: logs the rate, deadline misses and timeouts of every task.
+
+Each task has a deadline every `interval` seconds. A run that ends after the next
+deadline counts as a deadline miss and the missed ticks are skipped rather than run
+back to back. The vitals task has no interval by default: the sensor read blocks until
+a second of samples is in, so it paces itself.
+
+Shutdown (SIGINT/SIGTERM, stop() or the end of `duration`) cancels the tasks, waits
+for them to unwind, closes the devices with a timeout and stops the services.
+
+The device layer is any object with open(), read_vitals(), capture_frame(),
+analyze(image, timestamp) and close() (see MonitorDevices for the real one and
+fakes.FakeMonitorDevices for a scriptable one), so the orchestrator runs without
+hardware.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import queue
+import signal
+import threading
+import time
+
+import metrics
+from pipeline import StageStats, VitalsReading, VisionReading, Alert, fuse, VITALS_MAX_AGE, VISION_MAX_AGE, ERROR_BACKOFF
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Global Variables
+# ===========================
+VITALS_INTERVAL = None  # back to back: each read blocks until a second of samples is in
+VISION_INTERVAL = 1.0  # seconds between two analyzed frames
+LOG_INTERVAL = 1.0  # seconds between two fused (logged) states
+HEALTH_INTERVAL = 5.0  # seconds between two health checks
+REPORT_INTERVAL = 60.0  # seconds between two reports of the task rates
+# seconds a blocking call may take before it is abandoned
+TIMEOUTS = {
+    "devices": 30.0,  # open() and close()
+    "vitals": 5.0,  # one reading takes a second of samples
+    "capture": 2.0,
+    "detection": 5.0,
+    "log": 5.0,
+    "alerts": 2.0,
+}
+
+# ===========================
+# Blocking Calls
+# ===========================
+class DaemonThreadExecutor(concurrent.futures.Executor):
+    """
+    Single daemon thread executor: a call that never returns (e.g. a hung I2C read)
+    does not keep the process alive, unlike with a ThreadPoolExecutor.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._shutdown = False
+        self._lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new calls after shutdown")
+            future = concurrent.futures.Future()
+            self._queue.put((future, fn, args, kwargs))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name=self.name, daemon=True)
+                self._thread.start()
+            return future
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        with self._lock:
+            self._shutdown = True
+            if cancel_futures:
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        item[0].cancel()
+            self._queue.put(None)
+        if wait and self._thread is not None:
+            self._thread.join()
+
+
+class BlockingCall:
+    """
+    Runs blocking functions for one stage in a dedicated thread, one call at a time,
+    with a timeout.
+
+    Parameters:
+    name (str): Stage name.
+    timeout (float, optional): Seconds after which a call is abandoned (None: no limit).
+    metrics_scope (str, optional): Scope of the call's gauges (see metrics.scoped).
+    """
+
+    def __init__(self, name, timeout=None, metrics_scope=None):
+        self.name = name
+        self.timeout = timeout
+        self.executor = DaemonThreadExecutor(f"call-{name}")
+        self.timeouts = 0
+        self._pending = None
+        self._started = None
+        metrics.gauge(metrics.scoped(f"orchestrator.{name}.timeouts", metrics_scope), lambda: self.timeouts)
+
+    @property
+    def busy_for(self):
+        """
+        Seconds the current call has been running (0 when idle).
+        """
+        if self._pending is None or self._pending.done():
+            return 0.0
+        return time.monotonic() - self._started
+
+    async def __call__(self, function, *args):
+        """
+        Runs FUNCTION(*ARGS) in the stage thread and returns its result.
+
+        Raises:
+        TimeoutError: The call took longer than the timeout, or a previous call that
+            timed out is still running.
+        """
+        if self._pending is not None and not self._pending.done():
+            raise TimeoutError(f"{self.name}: previous call still running after {self.busy_for:.1f} s")
+        loop = asyncio.get_running_loop()
+        self._started = time.monotonic()
+        self._pending = loop.run_in_executor(self.executor, function, *args)
+        # an abandoned call may still fail later; retrieve its exception so it is not reported as lost
+        self._pending.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            # shield: a timeout or cancellation abandons the call but keeps tracking it
+            return await asyncio.wait_for(asyncio.shield(self._pending), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise TimeoutError(f"{self.name}: no result after {self.timeout:.1f} s") from None
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+# ===========================
+# Periodic Tasks
+# ===========================
+class PeriodicTask:
+    """
+    Runs a coroutine function every INTERVAL seconds, tracking deadlines.
+
+    Parameters:
+    name (str): Task name.
+    interval (float): Seconds between two deadlines, or None to run the step back to
+        back when its source paces itself (e.g. a blocking sensor read); such a task has
+        no deadlines and waits ERROR_BACKOFF after a failed step.
+    step (callable): Coroutine function run once per interval.
+    first_delay (float): Seconds before the first run.
+    metrics_scope (str, optional): Scope of the task's metrics (see metrics.scoped).
+    """
+
+    def __init__(self, name, interval, step, first_delay=0.0, metrics_scope=None):
+        self.name = name
+        self.interval = interval
+        self.step = step
+        self.first_delay = first_delay
+        self.stats = StageStats(name, metrics_scope)
+        self.deadline_misses = 0
+        self.timeouts = 0
+        self._timeouts_in_row = 0
+        self._stopped = False
+        self._lateness = metrics.histogram(metrics.scoped(f"orchestrator.{name}.lateness", metrics_scope))
+        metrics.gauge(metrics.scoped(f"orchestrator.{name}.deadline_misses", metrics_scope),
+                      lambda: self.deadline_misses)
+
+    async def _run_step(self, loop):
+        """
+        Runs the step once, recording its outcome. Returns False if it failed.
+        """
+        started = loop.time()
+        try:
+            await self.step()
+        except TimeoutError as e:
+            self.timeouts += 1
+            self._timeouts_in_row += 1
+            # a stuck call fails every tick: warn once, the health check keeps reporting it
+            logger.log(logging.WARNING if self._timeouts_in_row == 1 else logging.DEBUG, "%s", e)
+            return False
+        except Exception as e:
+            self.stats.errors += 1
+            logger.error("Error in %s: %s", self.name, e)
+            return False
+        self._timeouts_in_row = 0
+        self.stats.record(loop.time() - started)
+        return True
+
+    def stop(self):
+        """
+        Makes run() return before its next step. Cancelling the task is not enough on
+        Python 3.11, where asyncio.wait_for may swallow a cancellation that arrives just
+        as the awaited call completes.
+        """
+        self._stopped = True
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        next_due = loop.time() + self.first_delay
+        while not self._stopped:
+            delay = next_due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                if self._stopped:
+                    break
+            if self.interval is None:
+                ok = await self._run_step(loop)
+                next_due = loop.time() + (0.0 if ok else ERROR_BACKOFF)
+                continue
+
+            self._lateness.observe((loop.time() - next_due) * 1000.0)
+            await self._run_step(loop)
+            next_due += self.interval
+            finished = loop.time()
+            if finished > next_due:
+                missed = int((finished - next_due) // self.interval) + 1
+                self.deadline_misses += missed
+                next_due += missed * self.interval
+
+    def __str__(self):
+        return f"{self.stats}, deadline misses {self.deadline_misses}, timeouts {self.timeouts}"
+
+# ===========================
+# Device Layer
+# ===========================
+class MonitorDevices:
+    """
+    The real device layer: pulse oximeter with the streaming HR/SpO2 estimator, and the
+    camera with motion and (scheduled) face detection. Every method blocks and is
+    called from an orchestrator stage thread.
+
+    Parameters:
+    ppg_source, ppg_record_to, ppg_speed: See pulse_oximeter_reader.initialize_pulse_oximeter.
+    camera (optional): Camera object to use instead of the Picamera2 (e.g. fakes.FakeCamera).
+    schedule (bool): Gate the face cascade with a vision_scheduler.VisionScheduler.
+    startup (startup.StartupTimer, optional): Timer of the startup steps, reported once
+        the devices are open.
+    sensor_thread, sensor_burst (bool): See the THREADED and BURST options of
+        initialize_pulse_oximeter.
+    """
+
+    def __init__(self, ppg_source=None, ppg_record_to=None, ppg_speed=1.0, camera=None, schedule=True,
+                 startup=None, sensor_thread=False, sensor_burst=False):
+        self.ppg_source = ppg_source
+        self.ppg_record_to = ppg_record_to
+        self.ppg_speed = ppg_speed
+        self.sensor_thread = sensor_thread
+        self.sensor_burst = sensor_burst
+        self.camera = camera
+        self.schedule = schedule
+        self.startup = startup
+        self.scheduler = None
+        self._stream = None
+        self._captured = 0
+
+    def open(self):
+        import night_vision_camera
+        from pulse_oximeter_reader import VitalsReader, initialize_pulse_oximeter, stream_pulse_oximeter_data
+        from startup import StartupTimer
+        from vision_scheduler import VisionScheduler
+
+        timer = StartupTimer() if self.startup is None else self.startup
+        # the camera initializes in the background while the pulse oximeter resets
+        camera = timer.background("camera", night_vision_camera.initialize_camera, self.camera)
+        with timer.step("sensor"):
+            m = initialize_pulse_oximeter(self.ppg_source, self.ppg_record_to, self.ppg_speed, self.sensor_thread,
+                                           self.sensor_burst)
+        # a StopIteration must not reach run_in_executor: the reader returns None instead
+        self._stream = VitalsReader(stream_pulse_oximeter_data(m, with_quality=True, burst=self.sensor_burst))
+        camera.result()
+        self.camera = night_vision_camera.camera
+        if self.schedule:
+            self.scheduler = VisionScheduler(night_vision_camera.face_detection, night_vision_camera.monitor_motion)
+        if self.startup is not None:
+            self.startup.report()
+
+    def read_vitals(self):
+        """
+        Returns:
+        tuple: (oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok, quality), see
+        pulse_oximeter_reader.stream_pulse_oximeter_data, or None once the stream ended
+        (see pulse_oximeter_reader.VitalsReader).
+        """
+        return self._stream()
+
+    def capture_frame(self):
+        """
+        Returns:
+        np.ndarray: A new RGB frame.
+        """
+        with metrics.timer("camera.capture"):
+            return self.camera.capture_array()
+
+    def analyze(self, image, timestamp):
+        """
+        Runs the detectors on IMAGE, captured at TIMESTAMP.
+
+        Returns:
+        pipeline.VisionReading: Face and motion flags (and the SceneState when scheduled).
+        """
+        import night_vision_camera
+        from frame_producer import Frame
+
+        self._captured += 1
+        frame = Frame(image, self._captured, timestamp)
+        if self.scheduler is not None:
+            scene = self.scheduler.update(frame, timestamp)
+            return VisionReading(timestamp, scene.face_detected, scene.motion_detected, frame.seq, scene)
+        motion = night_vision_camera.monitor_motion(frame)
+        return VisionReading(timestamp, night_vision_camera.face_detection(frame), bool(motion), frame.seq)
+
+    def request_check(self, reason="requested"):
+        """
+        Asks the vision scheduler for a face check on the next frame.
+        """
+        if self.scheduler is not None:
+            self.scheduler.request_check(reason)
+
+    def close(self):
+        stop = getattr(self.camera, "stop", None)
+        if stop is not None:
+            stop()
+
+# ===========================
+# Orchestrator
+# ===========================
+class Orchestrator:
+    """
+    Schedules the monitoring tasks on an asyncio event loop.
+
+    Parameters:
+    devices: Device layer (see the module docstring).
+    decide (callable): pipeline.FusedState -> list of Alert (or (key, message) tuples).
+    log (callable): Called with every FusedState.
+    alert (callable): Called with every Alert.
+    vitals_interval, vision_interval, log_interval, health_interval, report_interval
+        (float): Periods of the tasks, in seconds (see PeriodicTask).
+    timeouts (dict, optional): Per-stage timeouts overriding TIMEOUTS.
+    services (list): Objects with start() and stop(timeout), started before and
+        stopped after the tasks.
+    filter_vitals (callable, optional): pipeline.VitalsReading -> VitalsReading applied
+        to every reading (e.g. a vitals_filter.VitalsFilter).
+    on_frame (callable, optional): Called with every captured (image, timestamp), in the
+        capture thread (e.g. clip_recorder.ClipRecorder.add_frame).
+    metrics_scope (str, optional): Scope of the task and call metrics (see metrics.scoped),
+        for an orchestrator that is not the only one of the process.
+    """
+
+    def __init__(self, devices, decide, log, alert, vitals_interval=VITALS_INTERVAL,
+                 vision_interval=VISION_INTERVAL, log_interval=LOG_INTERVAL, health_interval=HEALTH_INTERVAL,
+                 report_interval=REPORT_INTERVAL, timeouts=None, services=(), filter_vitals=None,
+                 on_frame=None, metrics_scope=None):
+        self.devices = devices
+        self.filter_vitals = filter_vitals
+        self.on_frame = on_frame
+        self.decide = decide
+        self.log = log
+        self.alert = alert
+        self.services = list(services)
+        limits = dict(TIMEOUTS, **(timeouts or {}))
+        self.metrics_scope = metrics_scope
+        self.calls = {name: BlockingCall(name, timeout, metrics_scope) for name, timeout in limits.items()}
+        self.tasks = [
+            PeriodicTask("vitals", vitals_interval, self._read_vitals, metrics_scope=metrics_scope),
+            PeriodicTask("vision", vision_interval, self._read_vision, metrics_scope=metrics_scope),
+            PeriodicTask("log", log_interval, self._log, metrics_scope=metrics_scope),
+            PeriodicTask("health", health_interval, self._check_health, first_delay=health_interval,
+                         metrics_scope=metrics_scope),
+            PeriodicTask("report", report_interval, self._report, first_delay=report_interval,
+                         metrics_scope=metrics_scope),
+        ]
+        self.latest_vitals = None
+        self.latest_vision = None
+        self.latest_state = None
+        self.healthy = True
+        self._loop = None
+        self._stop_event = None
+
+    # ---------------------------
+    # Task steps
+    # ---------------------------
+    async def _read_vitals(self):
+        values = await self.calls["vitals"](self.devices.read_vitals)
+        if values is None:
+            return  # no reading: latest_vitals ages and the watchdog reports it
+        if not isinstance(values, VitalsReading):
+            values = VitalsReading(time.time(), *values)
+        if self.filter_vitals is not None:
+            values = self.filter_vitals(values)
+        self.latest_vitals = values
+
+    def _capture(self):
+        image = self.devices.capture_frame()
+        timestamp = time.time()
+        if self.on_frame is not None:
+            self.on_frame(image, timestamp)
+        return image, timestamp
+
+    async def _read_vision(self):
+        image, timestamp = await self.calls["capture"](self._capture)
+        self.latest_vision = await self.calls["detection"](self.devices.analyze, image, timestamp)
+
+    async def _log(self):
+        state = fuse(time.time(), self.latest_vitals, self.latest_vision)
+        self.latest_state = state
+        alerts = [a if isinstance(a, Alert) else Alert(state.timestamp, *a) for a in self.decide(state) or ()]
+        if alerts:
+            await self.calls["alerts"](lambda: [self.alert(a) for a in alerts])
+        await self.calls["log"](self.log, state)
+
+    async def _check_health(self):
+        now = time.time()
+        healthy = True
+        for name, reading, max_age in (("vitals", self.latest_vitals, VITALS_MAX_AGE),
+                                       ("vision", self.latest_vision, VISION_MAX_AGE)):
+            if reading is None or now - reading.timestamp > max_age:
+                healthy = False
+                metrics.counter(metrics.scoped(f"orchestrator.{name}.stale", self.metrics_scope)).inc()
+                age = "never received" if reading is None else f"{now - reading.timestamp:.0f} s old"
+                logger.warning("No fresh %s reading (%s)", name, age)
+        for call in self.calls.values():
+            if call.timeout is not None and call.busy_for > call.timeout:
+                healthy = False
+                logger.error("%s call stuck for %.0f s", call.name, call.busy_for)
+        self.healthy = healthy
+
+    async def _report(self):
+        self.report()
+
+    def report(self):
+        """
+        Logs the rate, deadline misses and timeouts of every task.
+        """
+        for task in self.tasks:
+            logger.info("%s", task)
+
+    def stats(self):
+        return {task.name: dict(task.stats.snapshot(), deadline_misses=task.deadline_misses,
+                                timeouts=task.timeouts) for task in self.tasks}
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+    def stop(self):
+        """
+        Requests a graceful shutdown (thread-safe).
+        """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+
+    async def run(self, duration=None):
+        """
+        Opens the devices, runs the tasks until stop(), SIGINT/SIGTERM or DURATION
+        seconds, then shuts down gracefully.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        handled = []
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self._loop.add_signal_handler(sig, self._stop_event.set)
+                handled.append(sig)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass  # not the main thread, or not supported by the platform
+
+        running = []
+        try:
+            for service in self.services:
+                service.start()
+            await self.calls["devices"](self.devices.open)
+            running = [asyncio.create_task(task.run(), name=task.name) for task in self.tasks]
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), duration)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            logger.info("Stopping the orchestrator...")
+            for task in self.tasks:
+                task.stop()
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            try:
+                await self.calls["devices"](self.devices.close)
+            except Exception as e:
+                logger.warning("Error closing the devices: %s", e)
+            for call in self.calls.values():
+                call.shutdown()
+            for service in reversed(self.services):
+                service.stop(2.0)
+            for sig in handled:
+                self._loop.remove_signal_handler(sig)
@@ -0,0 +1,342 @@
+# ===========================
+# Baseline Module
+# ===========================
+"""
+Personalized alert thresholds learned from the monitoring logs.
+
+main.ALERT_THRESHOLD_OXYGEN and ALERT_THRESHOLD_HEART_RATE are the same for every baby
+and every hour. This offline job reads the history logs of one baby and learns, for
+each hour of the day, the percentiles of the logged oxygen_level and heart_rate values;
+the monitor then checks each reading against the threshold of its hour.
+
+Logs are streamed in chunks (CHUNK_ROWS CSV lines, or one binary_log chunk at a time)
+into fixed-bin histogram sketches: one per hour and value, a few kilobytes each
+whatever the length of the history. Histograms merge by adding their counts, so logs
+are sketched one by one, sketches of several runs can be kept in a state file
+(--sketches) and new nights merged in without re-reading the old ones. Quantiles are
+exact up to the bin width (BIN_WIDTH).
+
+The threshold of an hour is (1 - MARGIN) times the LOW_PERCENTILE of the valid values
+logged in that hour, never below the global default; hours with fewer than
+MIN_SAMPLES valid values keep the default. The table is a small JSON file:
+
+    {"version": 1, "percentiles": [...], "babies": {"<baby>": {
+        "oxygen_level": {"thresholds": [24 values or null], "percentiles": [24 lists or null],
+                         "samples": [24 counts]},
+        "heart_rate": {...}}}}
+
+Usage:
+    python baseline.py --baby lucia sleep_monitor_log.csv old_logs/ [--out thresholds.json]
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from binary_log import BinaryLogReader, INVALID_VALUE, HR_VALID, SPO2_VALID
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Global Variables
+# ===========================
+THRESHOLDS_FILE = "thresholds.json"
+VALUES = ("oxygen_level", "heart_rate")  # logged values, as named in main.log_data
+VALUE_RANGE = (0.0, 320.0)  # range of the histograms (values outside are clipped to it)
+BIN_WIDTH = 0.5  # quantile resolution
+HOURS = 24
+PERCENTILES = (5, 25, 50, 75, 95)  # stored in the table for each hour
+LOW_PERCENTILE = 5  # percentile the threshold is derived from
+MARGIN = 0.15  # fraction below LOW_PERCENTILE at which the threshold is set
+MIN_SAMPLES = 1800  # valid values an hour needs before its threshold is learned (30 min at 1 Hz)
+CHUNK_ROWS = 10000  # CSV lines parsed at a time
+TABLE_VERSION = 1
+
+# ===========================
+# Sketches
+# ===========================
+class HistogramSketch:
+    """
+    Mergeable quantile sketch: counts of values in fixed-width bins.
+
+    Parameters:
+    low, high (float): Range of the bins; values outside are counted in the first or last bin.
+    bin_width (float): Width of the bins, the resolution of the quantiles.
+    """
+
+    def __init__(self, low=VALUE_RANGE[0], high=VALUE_RANGE[1], bin_width=BIN_WIDTH):
+        self.low = low
+        self.bin_width = bin_width
+        self.counts = np.zeros(int(np.ceil((high - low) / bin_width)), dtype=np.int64)
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def add(self, values):
+        """
+        Counts VALUES (array-like).
+        """
+        bins = ((np.asarray(values, dtype=np.float64) - self.low) / self.bin_width).astype(np.int64)
+        np.clip(bins, 0, self.counts.shape[0] - 1, out=bins)
+        self.counts += np.bincount(bins, minlength=self.counts.shape[0])
+
+    def merge(self, other):
+        """
+        Adds the counts of OTHER, a sketch with the same bins.
+        """
+        if other.counts.shape != self.counts.shape or other.low != self.low or other.bin_width != self.bin_width:
+            raise ValueError("cannot merge sketches with different bins")
+        self.counts += other.counts
+        return self
+
+    def quantiles(self, percentiles):
+        """
+        Returns:
+        list: The value at each of PERCENTILES (0 to 100), interpolated within the bins,
+        or None if the sketch is empty.
+        """
+        total = self.count
+        if total == 0:
+            return None
+        cumulative = np.cumsum(self.counts)
+        result = []
+        for p in percentiles:
+            rank = p / 100.0 * total
+            k = int(np.searchsorted(cumulative, rank, side="left"))
+            k = min(k, self.counts.shape[0] - 1)
+            before = cumulative[k] - self.counts[k]
+            inside = (rank - before) / self.counts[k] if self.counts[k] else 0.0
+            result.append(self.low + (k + min(max(inside, 0.0), 1.0)) * self.bin_width)
+        return result
+
+
+class BaselineSketches:
+    """
+    One HistogramSketch per value and hour of the day.
+    """
+
+    def __init__(self):
+        self.sketches = {name: [HistogramSketch() for _ in range(HOURS)] for name in VALUES}
+
+    def add(self, hours, values):
+        """
+        Adds the valid entries of VALUES (dict of name -> array) at HOURS (array of 0-23).
+        """
+        hours = np.asarray(hours)
+        for name in VALUES:
+            column = np.asarray(values[name], dtype=np.float64)
+            valid = (column != INVALID_VALUE) & np.isfinite(column) & (column > 0)
+            for hour in np.unique(hours[valid]):
+                self.sketches[name][hour].add(column[valid & (hours == hour)])
+
+    def merge(self, other):
+        for name in VALUES:
+            for mine, theirs in zip(self.sketches[name], other.sketches[name]):
+                mine.merge(theirs)
+        return self
+
+    def save(self, path):
+        np.savez_compressed(path, **{name: np.stack([s.counts for s in self.sketches[name]]) for name in VALUES})
+
+    @classmethod
+    def load(cls, path):
+        sketches = cls()
+        with np.load(path) as data:
+            for name in VALUES:
+                for sketch, counts in zip(sketches.sketches[name], data[name]):
+                    sketch.counts += counts
+        return sketches
+
+# ===========================
+# Log Readers
+# ===========================
+def _csv_value(text):
+    return float(text) if text.strip() else float(INVALID_VALUE)
+
+
+def read_csv_chunks(path, chunk_rows=CHUNK_ROWS):
+    """
+    Streams a main.log_data CSV file.
+
+    Yields:
+    tuple: (hours, values) for up to CHUNK_ROWS rows, hours being the local hour of the
+    rows (taken from the timestamp text) and values a dict of name -> np.ndarray.
+    """
+    hours, heart_rate, oxygen_level = [], [], []
+    with open(path) as f:
+        for line in f:
+            fields = line.rstrip("\n").split(",")
+            if len(fields) < 4 or len(fields[0]) < 13:
+                continue
+            try:
+                row = int(fields[0][11:13]), _csv_value(fields[1]), _csv_value(fields[2])
+            except ValueError:
+                continue  # header or truncated line
+            hours.append(row[0])
+            heart_rate.append(row[1])
+            oxygen_level.append(row[2])
+            if len(hours) >= chunk_rows:
+                yield np.array(hours), {"heart_rate": np.array(heart_rate), "oxygen_level": np.array(oxygen_level)}
+                hours, heart_rate, oxygen_level = [], [], []
+    if hours:
+        yield np.array(hours), {"heart_rate": np.array(heart_rate), "oxygen_level": np.array(oxygen_level)}
+
+
+def read_binary_chunks(directory):
+    """
+    Streams a binary_log directory, one chunk file at a time.
+
+    Yields:
+    tuple: (hours, values) as read_csv_chunks. The UTC offset of the first record is
+    used for the whole chunk (an hour of records by default).
+    """
+    for records in BinaryLogReader(directory).chunks():
+        timestamps = records["timestamp"]
+        offset = time.localtime(float(timestamps[0])).tm_gmtoff
+        hours = ((timestamps + offset) // 3600 % HOURS).astype(np.int64)
+        flags = records["flags"]
+        yield hours, {
+            "oxygen_level": np.where(flags & SPO2_VALID, records["oxygen_level"], INVALID_VALUE),
+            "heart_rate": np.where(flags & HR_VALID, records["heart_rate"], INVALID_VALUE),
+        }
+
+
+def sketch_logs(paths, sketches=None):
+    """
+    Adds the logs at PATHS (CSV files or binary log directories) to SKETCHES.
+
+    Returns:
+    BaselineSketches: The updated sketches (new ones if SKETCHES is None).
+    """
+    sketches = BaselineSketches() if sketches is None else sketches
+    for path in paths:
+        chunks = read_binary_chunks(path) if os.path.isdir(path) else read_csv_chunks(path)
+        rows = 0
+        for hours, values in chunks:
+            sketches.add(hours, values)
+            rows += hours.shape[0]
+        logger.info("%s: %d rows", path, rows)
+    return sketches
+
+# ===========================
+# Threshold Table
+# ===========================
+def thresholds_from_sketches(sketches, defaults):
+    """
+    Parameters:
+    sketches (BaselineSketches): Sketches of one baby.
+    defaults (dict): Value name -> global threshold.
+
+    Returns:
+    dict: The baby's entry of the threshold table (see the module docstring).
+    """
+    entry = {}
+    for name in VALUES:
+        thresholds, percentiles, samples = [], [], []
+        for sketch in sketches.sketches[name]:
+            count = sketch.count
+            samples.append(count)
+            if count < MIN_SAMPLES:
+                thresholds.append(None)
+                percentiles.append(None)
+                continue
+            values = sketch.quantiles(PERCENTILES + (LOW_PERCENTILE,))
+            percentiles.append([round(v, 2) for v in values[:-1]])
+            thresholds.append(round(max(defaults[name], (1.0 - MARGIN) * values[-1]), 2))
+        entry[name] = {"thresholds": thresholds, "percentiles": percentiles, "samples": samples}
+    return entry
+
+
+def write_table(path, baby, entry):
+    """
+    Stores ENTRY as the thresholds of BABY in the table at PATH, keeping the other babies.
+    """
+    table = {"version": TABLE_VERSION, "percentiles": list(PERCENTILES), "babies": {}}
+    if os.path.exists(path):
+        with open(path) as f:
+            table["babies"] = json.load(f).get("babies", {})
+    table["babies"][baby] = entry
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(table, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+class ThresholdTable:
+    """
+    Per-hour alert thresholds of one baby, looked up in O(1).
+
+    Parameters:
+    defaults (dict): Value name -> threshold used for hours without a learned one.
+    learned (dict, optional): Value name -> list of 24 thresholds (None: default).
+    """
+
+    def __init__(self, defaults, learned=None):
+        self.defaults = dict(defaults)
+        self.learned = bool(learned)
+        self._table = {}
+        for name in VALUES:
+            hours = (learned or {}).get(name) or [None] * HOURS
+            self._table[name] = [self.defaults[name] if t is None else t for t in hours]
+
+    @classmethod
+    def load(cls, path, baby, defaults):
+        """
+        Loads BABY's thresholds from the table at PATH. A missing file or baby gives a
+        table of DEFAULTS.
+        """
+        try:
+            with open(path) as f:
+                table = json.load(f)
+        except FileNotFoundError:
+            return cls(defaults)
+        entry = table.get("babies", {}).get(baby)
+        if entry is None:
+            logger.warning("No thresholds for %r in %s, using the defaults.", baby, path)
+            return cls(defaults)
+        return cls(defaults, {name: entry[name]["thresholds"] for name in VALUES if name in entry})
+
+    def lookup(self, name, timestamp):
+        """
+        Returns:
+        float: Threshold of value NAME for the local hour of TIMESTAMP.
+        """
+        return self._table[name][time.localtime(timestamp).tm_hour]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Learn per-hour alert thresholds from the monitoring logs.")
+    parser.add_argument("logs", nargs="+", help="CSV log files or binary log directories")
+    parser.add_argument("--baby", default="default", help="name the thresholds are stored under")
+    parser.add_argument("--out", default=THRESHOLDS_FILE, help="threshold table to update")
+    parser.add_argument("--sketches", help="state file: sketches of earlier runs are merged in and saved back")
+    parser.add_argument("--oxygen-default", type=float, default=30,
+                        help="threshold of hours without a baseline (main.ALERT_THRESHOLD_OXYGEN)")
+    parser.add_argument("--heart-rate-default", type=float, default=50,
+                        help="threshold of hours without a baseline (main.ALERT_THRESHOLD_HEART_RATE)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    sketches = None
+    if args.sketches and os.path.exists(args.sketches):
+        sketches = BaselineSketches.load(args.sketches)
+    sketches = sketch_logs(args.logs, sketches)
+    if args.sketches:
+        sketches.save(args.sketches)
+
+    defaults = {"oxygen_level": args.oxygen_default, "heart_rate": args.heart_rate_default}
+    entry = thresholds_from_sketches(sketches, defaults)
+    write_table(args.out, args.baby, entry)
+    for name in VALUES:
+        learned = sum(t is not None for t in entry[name]["thresholds"])
+        print(f"{name}: thresholds learned for {learned}/{HOURS} hours")
+    print(f"Thresholds of {args.baby!r} written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# ===========================
+# Face Detection Benchmark
+# ===========================
+"""
+Measures the per-frame latency of face detection before and after the FaceDetector
+rewrite, on the sample image `baby_face_detection_proof.png` resized to the camera
+resolution (640x360).
+
+- before: what face_detection() used to do on every call, i.e. build a
+  cv2.CascadeClassifier and run detectMultiScale(scaleFactor=1.1, minNeighbors=4) on
+  the full grayscale frame.
+- after (full scan): cached FaceDetector with default settings, no ROI tracking.
+- after (tracking): cached FaceDetector with ROI tracking, as used by
+  night_vision_camera.face_detection().
+- after (0.9x) / (0.875x): the tracking detector forced to detect on a downscaled
+  frame, at the smallest scale that still finds the 53 px sample face and just below
+  it, to show how far the frame can be shrunk before faces of this size are lost.
+
+Usage:
+    python bench_face_detection.py [--frames 200] [--image path.png]
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from face_detector import CASCADE_PATH, FaceDetector
+
+# ===========================
+# Global Variables
+# ===========================
+SAMPLE_IMAGE = "baby_face_detection_proof.png"
+FRAME_SIZE = (640, 360)  # camera resolution set in initialize_camera()
+
+
+def load_frame(path, size=FRAME_SIZE):
+    """
+    Loads PATH and resizes it to the camera resolution, as an RGB frame.
+    """
+    image = cv2.imread(path)
+    if image is None:
+        raise FileNotFoundError(path)
+    return cv2.cvtColor(cv2.resize(image, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+
+
+def legacy_face_detection(frame):
+    """
+    The face_detection() implementation prior to FaceDetector.
+    """
+    face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
+    gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+    faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=4)
+    return len(faces) > 0
+
+
+def measure(detect, frame, n_frames):
+    """
+    Runs DETECT on FRAME N_FRAMES times.
+
+    Returns:
+    tuple: (latencies in milliseconds as np.array, fraction of frames with a face)
+    """
+    latencies = np.empty(n_frames)
+    hits = 0
+    for k in range(n_frames):
+        started = time.perf_counter()
+        hits += bool(detect(frame))
+        latencies[k] = (time.perf_counter() - started) * 1000.0
+    return latencies, hits / n_frames
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Face detection latency, before and after FaceDetector.")
+    parser.add_argument("--image", default=SAMPLE_IMAGE)
+    parser.add_argument("--frames", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    frame = load_frame(args.image)
+    cases = [
+        ("before (new cascade, full frame)", legacy_face_detection),
+        ("after (cached, full scan)", FaceDetector(rescan_interval=0)),
+        ("after (cached, ROI tracking)", FaceDetector()),
+        ("after (ROI tracking, 0.9x)", FaceDetector(scale=0.9)),
+        ("after (ROI tracking, 0.875x)", FaceDetector(scale=0.875)),
+    ]
+
+    print(f"{args.frames} frames of {FRAME_SIZE[0]}x{FRAME_SIZE[1]} from {args.image}")
+    print(f"{'case':36s} {'mean ms':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'face':>6s}")
+    baseline = None
+    for name, detect in cases:
+        latencies, hit_rate = measure(detect, frame, args.frames)
+        mean = latencies.mean()
+        baseline = baseline or mean
+        print(f"{name:36s} {mean:8.2f} {np.percentile(latencies, 50):8.2f} "
+              f"{np.percentile(latencies, 95):8.2f} {hit_rate:6.0%}  x{baseline / mean:.1f}")
+
+
+if __name__ == "__main__":
+    main()
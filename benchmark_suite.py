@@ -0,0 +1,270 @@
+# ===========================
+# Benchmark Suite
+# ===========================
+"""
+Micro-benchmarks of the signal and vision hot paths, runnable without any sensor.
+
+Inputs are fixtures generated or loaded once before timing:
+- PPG windows of hrcalc.BUFFER_SIZE samples from ppg_recording.synthetic_ppg() at
+  several heart rates and noise levels,
+- camera frames at the camera resolution: `baby_face_detection_proof.png`, the same
+  image shifted (motion), darkened (night) and an empty noisy frame.
+
+Every case is called on its inputs in turn. For each case the suite reports latency
+percentiles, throughput and the peak memory allocated by one call (measured in a
+separate tracemalloc pass, so that tracing does not distort the timings).
+
+Results are saved as JSON. Given a baseline JSON file, a case whose median latency is
+more than THRESHOLD slower than in the baseline is reported as a regression and the
+exit status is 1.
+
+Usage:
+    python benchmark_suite.py                                  # run every case
+    python benchmark_suite.py --only hrcalc --iterations 2000
+    python benchmark_suite.py --output bench.json
+    python benchmark_suite.py --baseline bench.json --threshold 0.2
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+import hrcalc
+import hrcalc_stream
+import signal_quality
+import night_vision_camera
+from face_detector import FaceDetector
+from motion_detector import MotionDetector
+from fakes import FakeCamera
+from ppg_recording import synthetic_ppg
+
+# ===========================
+# Global Variables
+# ===========================
+SAMPLE_IMAGE = "baby_face_detection_proof.png"
+FRAME_SIZE = (640, 360)  # camera resolution set in initialize_camera()
+HEART_RATES = (60, 120, 180)  # bpm of the synthetic PPG fixtures
+NOISE_LEVELS = (20, 300)  # noise standard deviation of the fixtures, in sensor counts
+ITERATIONS = 500
+WARMUP = 20
+MIN_TIME = 0.5  # seconds spent at least on every case
+THRESHOLD = 0.10  # allowed median slowdown against the baseline
+PERCENTILES = (50, 90, 95, 99)
+
+# ===========================
+# Fixtures
+# ===========================
+def ppg_windows():
+    """
+    (ir, red) windows of hrcalc.BUFFER_SIZE samples, as lists like read_sequential()
+    returns, for every heart rate and noise level.
+    """
+    seconds = hrcalc.BUFFER_SIZE / hrcalc.SAMPLE_FREQ
+    windows = []
+    for seed, (heart_rate, noise) in enumerate((hr, n) for hr in HEART_RATES for n in NOISE_LEVELS):
+        red, ir = synthetic_ppg(seconds, heart_rate=heart_rate, noise=noise, seed=seed)
+        windows.append((ir.tolist(), red.tolist()))
+    return windows
+
+
+def ppg_stream(seconds=60):
+    """
+    One minute of (red, ir) samples per heart rate, as lists.
+    """
+    return [tuple(a.tolist() for a in synthetic_ppg(seconds, heart_rate=hr, seed=k))
+            for k, hr in enumerate(HEART_RATES)]
+
+
+def image_frames(path=SAMPLE_IMAGE, size=FRAME_SIZE):
+    """
+    RGB frames at the camera resolution: the sample image, shifted, darkened, and a
+    noisy empty frame.
+    """
+    image = cv2.imread(path)
+    if image is None:
+        raise FileNotFoundError(path)
+    frame = cv2.cvtColor(cv2.resize(image, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+    shifted = np.roll(frame, 40, axis=1)
+    dark = (frame * 0.25).astype(np.uint8)
+    noise = np.random.default_rng(0).integers(0, 40, frame.shape, dtype=np.uint8)
+    return [frame, shifted, dark, noise]
+
+# ===========================
+# Cases
+# ===========================
+def build_cases(image_path=SAMPLE_IMAGE):
+    """
+    Returns:
+    list: (name, function, inputs) tuples; FUNCTION is called with each input as its
+    positional arguments.
+    """
+    windows = ppg_windows()
+    frames = image_frames(image_path)
+
+    # find_peaks inputs as prepared by calc_hr_and_spo2
+    peak_inputs = []
+    for ir, _ in windows:
+        x = hrcalc.moving_average_vectorized(ir)
+        peak_inputs.append((x, hrcalc.BUFFER_SIZE, min(max(int(np.mean(x)), 30), 60), 4, 15))
+
+    estimator = hrcalc_stream.StreamingHrSpo2Estimator()
+    blocks = [(red[k:k + estimator.report_every], ir[k:k + estimator.report_every])
+              for red, ir in ppg_stream() for k in range(0, len(red), estimator.report_every)]
+
+    # monitor_motion and face_detection use the camera module globals
+    night_vision_camera.initialize_camera(FakeCamera(frames=frames))
+    full_scan = FaceDetector(rescan_interval=0)
+    reference_motion = MotionDetector("reference")
+
+    return [
+        ("hrcalc.calc_hr_and_spo2", hrcalc.calc_hr_and_spo2, windows),
+        ("hrcalc.calc_hr_and_spo2_vectorized", hrcalc.calc_hr_and_spo2_vectorized, windows),
+        ("hrcalc.find_peaks", hrcalc.find_peaks, peak_inputs),
+        ("hrcalc.find_peaks_vectorized", hrcalc.find_peaks_vectorized, peak_inputs),
+        ("hrcalc_stream.extend (1 s)", lambda red, ir: list(estimator.extend(red, ir)), blocks),
+        ("signal_quality.assess", signal_quality.assess, windows),
+        ("night_vision_camera.monitor_motion", night_vision_camera.monitor_motion, [(f,) for f in frames]),
+        ("MotionDetector.detect (reference)", reference_motion.detect, [(f,) for f in frames]),
+        ("night_vision_camera.face_detection", night_vision_camera.face_detection, [(f,) for f in frames]),
+        ("FaceDetector.detect (full scan)", full_scan.detect, [(f,) for f in frames]),
+    ]
+
+# ===========================
+# Measurement
+# ===========================
+def measure(function, inputs, iterations=ITERATIONS, warmup=WARMUP, min_time=MIN_TIME):
+    """
+    Times FUNCTION over its inputs.
+
+    Returns:
+    dict: Latency statistics in milliseconds, throughput in calls per second and peak
+    memory of one call in KiB.
+    """
+    n_inputs = len(inputs)
+    for k in range(warmup):
+        function(*inputs[k % n_inputs])
+
+    latencies = []
+    started = time.perf_counter()
+    k = 0
+    while k < iterations or time.perf_counter() - started < min_time:
+        args = inputs[k % n_inputs]
+        t0 = time.perf_counter()
+        function(*args)
+        latencies.append(time.perf_counter() - t0)
+        k += 1
+    elapsed = time.perf_counter() - started
+    latencies = np.array(latencies) * 1000.0
+
+    peak = 0
+    tracemalloc.start()
+    try:
+        for args in inputs:
+            tracemalloc.reset_peak()
+            function(*args)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+
+    result = {
+        "calls": int(latencies.shape[0]),
+        "mean_ms": float(latencies.mean()),
+        "min_ms": float(latencies.min()),
+        "max_ms": float(latencies.max()),
+        "throughput": latencies.shape[0] / elapsed,
+        "peak_kib": peak / 1024.0,
+    }
+    for p in PERCENTILES:
+        result[f"p{p}_ms"] = float(np.percentile(latencies, p))
+    return result
+
+
+def environment():
+    return {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+    }
+
+
+def run(only=None, iterations=ITERATIONS, image_path=SAMPLE_IMAGE):
+    """
+    Runs every case whose name contains ONLY (all cases when None).
+
+    Returns:
+    dict: {"environment": ..., "results": {case name: measure() result}}
+    """
+    results = {}
+    for name, function, inputs in build_cases(image_path):
+        if only and only not in name:
+            continue
+        results[name] = measure(function, inputs, iterations)
+        r = results[name]
+        print(f"{name:38s} {r['p50_ms']:9.3f} {r['p95_ms']:9.3f} {r['p99_ms']:9.3f} "
+              f"{r['throughput']:10.1f} {r['peak_kib']:9.1f}")
+    return {"environment": environment(), "results": results}
+
+
+def compare(current, baseline, threshold=THRESHOLD):
+    """
+    Compares the median latency of every case present in both runs.
+
+    Returns:
+    list: Names of the cases slower than the baseline by more than THRESHOLD.
+    """
+    regressions = []
+    print(f"\n{'case':38s} {'base p50':>9s} {'now p50':>9s} {'change':>8s}")
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["p50_ms"]
+        after = result["p50_ms"]
+        change = after / before - 1.0 if before else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:38s} {before:9.3f} {after:9.3f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the signal and vision hot paths.")
+    parser.add_argument("--only", help="run only the cases whose name contains this text")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS, help="minimum calls per case")
+    parser.add_argument("--image", default=SAMPLE_IMAGE, help="image fixture")
+    parser.add_argument("--output", help="JSON file to save the results to")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="allowed median slowdown against the baseline (0.1 = 10%%)")
+    args = parser.parse_args(argv)
+
+    print(f"{'case':38s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'calls/s':>10s} {'peak KiB':>9s}")
+    current = run(args.only, args.iterations, args.image)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+# ===========================
+# Binary Log Module
+# ===========================
+"""
+Compact binary log format for the monitoring data, with a fast replay reader.
+
+The CSV log stores timestamps as text and values as free-form floats, so reading a night
+back means parsing every line. This backend writes fixed-width records instead:
+
+    timestamp     float64  seconds since the epoch
+    heart_rate    float32
+    oxygen_level  float32
+    flags         uint8    HR_VALID | SPO2_VALID | FACE | MOTION (| MOTION_KNOWN)
+
+(17 bytes per record, against ~36 bytes per CSV line.) Records are appended to chunk
+files `chunk-<first epoch second>.smlog` in a log directory; each chunk starts with a
+16-byte header and holds at most CHUNK_RECORDS records (one hour at one record per
+second by default).
+
+BinaryLogReader maps the chunks with np.memmap, so a night is exposed as NumPy arrays
+without parsing or copying, and builds an index of the first/last timestamp of every
+chunk so that a time range only touches the chunks that overlap it. Records must be
+appended in time order, which the monitor does.
+
+csv_to_binary() and binary_to_csv() convert from and to the CSV format of main.log_data.
+
+Usage:
+    python binary_log.py to-binary sleep_monitor_log.csv logs/
+    python binary_log.py to-csv logs/ night.csv [--start EPOCH] [--end EPOCH]
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+import metrics
+
+# ===========================
+# Global Variables
+# ===========================
+MAGIC = b"SMLOG\x00\x01\x00"  # format name and version
+HEADER_SIZE = 16  # MAGIC + 8 reserved bytes
+CHUNK_RECORDS = 3600
+FLUSH_INTERVAL = 30.0  # seconds a record may stay in the file buffer, as data_logger.FLUSH_INTERVAL
+CHUNK_PREFIX = "chunk-"
+CHUNK_SUFFIX = ".smlog"
+CSV_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("heart_rate", "<f4"),
+    ("oxygen_level", "<f4"),
+    ("flags", "u1"),
+])
+
+# flag bits
+HR_VALID = 0x01
+SPO2_VALID = 0x02
+FACE = 0x04
+MOTION = 0x08
+MOTION_KNOWN = 0x10  # the motion flag was measured (the CSV format has no motion column)
+
+INVALID_VALUE = -999  # value used by hrcalc when a measurement failed
+
+
+def make_flags(heart_rate, oxygen_level, face_detected, heart_rate_ok=None, oxygen_level_ok=None,
+               motion_detected=None):
+    """
+    Packs the validity, face and motion flags of one reading. When the validity is not
+    given, a value is valid unless it is INVALID_VALUE.
+    """
+    if heart_rate_ok is None:
+        heart_rate_ok = heart_rate != INVALID_VALUE
+    if oxygen_level_ok is None:
+        oxygen_level_ok = oxygen_level != INVALID_VALUE
+    flags = HR_VALID if heart_rate_ok else 0
+    flags |= SPO2_VALID if oxygen_level_ok else 0
+    flags |= FACE if face_detected else 0
+    if motion_detected is not None:
+        flags |= MOTION_KNOWN | (MOTION if motion_detected else 0)
+    return flags
+
+# ===========================
+# Writer
+# ===========================
+class BinaryLogWriter:
+    """
+    Appends fixed-width records to chunk files in DIRECTORY.
+
+    It has the same log() interface and start()/stop() lifecycle as
+    data_logger.BufferedCsvLogger, so either can be used as the monitor's log backend.
+    Records reach the disk (and BinaryLogReader) at the latest with the first write
+    FLUSH_INTERVAL seconds after the last flush, at a chunk rollover and on stop().
+
+    Parameters:
+    directory (str): Log directory, created if needed.
+    chunk_records (int): Records per chunk file.
+    flush_interval (float): See FLUSH_INTERVAL.
+    """
+
+    def __init__(self, directory, chunk_records=CHUNK_RECORDS, flush_interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.chunk_records = chunk_records
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.flushes = 0
+        self._file = None
+        self._last_flush = time.monotonic()
+        self._chunk_count = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        pass
+
+    def log(self, timestamp, heart_rate, oxygen_level, face_detected, heart_rate_ok=None,
+            oxygen_level_ok=None, motion_detected=None):
+        """
+        Appends one record.
+        """
+        record = np.array(
+            [(timestamp, heart_rate, oxygen_level,
+              make_flags(heart_rate, oxygen_level, face_detected, heart_rate_ok, oxygen_level_ok, motion_detected))],
+            dtype=RECORD_DTYPE,
+        )
+        self.write_records(record)
+        return True
+
+    def write_records(self, records):
+        """
+        Appends an array of RECORD_DTYPE records, starting new chunks as needed.
+        """
+        records = np.asarray(records, dtype=RECORD_DTYPE)
+        start = 0
+        while start < records.shape[0]:
+            if self._file is None or self._chunk_count >= self.chunk_records:
+                self._new_chunk(records["timestamp"][start])
+            count = min(self.chunk_records - self._chunk_count, records.shape[0] - start)
+            self._file.write(records[start:start + count].tobytes())
+            self._chunk_count += count
+            self.written += count
+            metrics.counter("log.rows_written").inc(count)
+            start += count
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _new_chunk(self, first_timestamp):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+        name = f"{CHUNK_PREFIX}{int(first_timestamp):010d}{CHUNK_SUFFIX}"
+        path = os.path.join(self.directory, name)
+        existing = os.path.getsize(path) if os.path.exists(path) else 0
+        self._file = open(path, "ab")
+        if existing == 0:
+            # a reader may open the chunk before the first flush of its records
+            self._file.write(MAGIC + bytes(HEADER_SIZE - len(MAGIC)))
+            self._file.flush()
+        self._chunk_count = max(0, existing - HEADER_SIZE) // RECORD_DTYPE.itemsize
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+            self.flushes += 1
+        self._last_flush = time.monotonic()
+
+    def stop(self, timeout=None):
+        """
+        Flushes and closes the current chunk.
+        """
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+# ===========================
+# Reader
+# ===========================
+class BinaryLogReader:
+    """
+    Memory-mapped, read-only view of a binary log directory.
+
+    Attributes:
+    paths (list): Chunk files, in time order.
+    first (np.ndarray): First timestamp of every chunk.
+    last (np.ndarray): Last timestamp of every chunk.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.refresh()
+
+    def refresh(self):
+        """
+        Re-scans the directory, e.g. after the writer started a new chunk.
+        """
+        names = sorted(n for n in os.listdir(self.directory)
+                       if n.startswith(CHUNK_PREFIX) and n.endswith(CHUNK_SUFFIX))
+        self.paths = []
+        self._maps = []
+        first, last = [], []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            records = self._map(path)
+            if records is None:
+                continue
+            self.paths.append(path)
+            self._maps.append(records)
+            first.append(records["timestamp"][0])
+            last.append(records["timestamp"][-1])
+        self.first = np.array(first, dtype=np.float64)
+        self.last = np.array(last, dtype=np.float64)
+
+    @staticmethod
+    def _map(path):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a binary sleep monitor log")
+        # ignore a record that is still being written
+        count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        if count <= 0:
+            return None
+        return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+    def __len__(self):
+        return sum(m.shape[0] for m in self._maps)
+
+    def chunks(self, start=None, end=None):
+        """
+        Yields zero-copy record views of the chunks overlapping [START, END).
+        """
+        lo = 0 if start is None else int(np.searchsorted(self.last, start, side="left"))
+        hi = len(self._maps) if end is None else int(np.searchsorted(self.first, end, side="left"))
+        for k in range(lo, hi):
+            records = self._maps[k]
+            i = 0 if start is None else int(np.searchsorted(records["timestamp"], start, side="left"))
+            j = records.shape[0] if end is None else int(np.searchsorted(records["timestamp"], end, side="left"))
+            if i < j:
+                yield records[i:j]
+
+    def read(self, start=None, end=None):
+        """
+        Records in [START, END) as one structured array. This is a view of the mapped
+        file when the range lies in a single chunk, and a concatenated copy otherwise.
+        """
+        parts = list(self.chunks(start, end))
+        if not parts:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts)
+
+    def columns(self, start=None, end=None):
+        """
+        Records in [START, END) as a dict of column arrays, with the flags unpacked.
+        """
+        records = self.read(start, end)
+        flags = records["flags"]
+        return {
+            "timestamp": records["timestamp"],
+            "heart_rate": records["heart_rate"],
+            "oxygen_level": records["oxygen_level"],
+            "heart_rate_ok": (flags & HR_VALID) != 0,
+            "oxygen_level_ok": (flags & SPO2_VALID) != 0,
+            "face_detected": (flags & FACE) != 0,
+            "motion_detected": (flags & MOTION) != 0,
+            "motion_known": (flags & MOTION_KNOWN) != 0,
+        }
+
+# ===========================
+# CSV Conversion
+# ===========================
+def _parse_csv_value(text):
+    return float(text) if text.strip() else float(INVALID_VALUE)
+
+
+def csv_to_binary(csv_path, directory, chunk_records=CHUNK_RECORDS, batch_rows=10000):
+    """
+    Appends the rows of a main.log_data CSV file to a binary log directory.
+
+    Returns:
+    int: Number of records written.
+    """
+    writer = BinaryLogWriter(directory, chunk_records)
+    batch = []
+    try:
+        with open(csv_path) as f:
+            for line in f:
+                fields = line.rstrip("\n").split(",")
+                if len(fields) < 4:
+                    continue
+                timestamp = time.mktime(time.strptime(fields[0], CSV_TIMESTAMP_FORMAT))
+                heart_rate = _parse_csv_value(fields[1])
+                oxygen_level = _parse_csv_value(fields[2])
+                face = fields[3].strip() == "True"
+                batch.append((timestamp, heart_rate, oxygen_level, make_flags(heart_rate, oxygen_level, face)))
+                if len(batch) >= batch_rows:
+                    writer.write_records(np.array(batch, dtype=RECORD_DTYPE))
+                    batch = []
+        if batch:
+            writer.write_records(np.array(batch, dtype=RECORD_DTYPE))
+    finally:
+        writer.stop()
+    return writer.written
+
+
+def _format_value(value):
+    return np.format_float_positional(np.float32(value), trim="-")
+
+
+def binary_to_csv(directory, csv_path, start=None, end=None):
+    """
+    Writes the records of a binary log directory in [START, END) as main.log_data CSV rows.
+
+    Returns:
+    int: Number of rows written.
+    """
+    rows = 0
+    with open(csv_path, "w") as f:
+        for records in BinaryLogReader(directory).chunks(start, end):
+            lines = [
+                f"{time.strftime(CSV_TIMESTAMP_FORMAT, time.localtime(ts))},"
+                f"{_format_value(hr)},{_format_value(spo2)},{bool(flags & FACE)}\n"
+                for ts, hr, spo2, flags in records.tolist()
+            ]
+            f.writelines(lines)
+            rows += len(lines)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert between the CSV and the binary sleep monitor logs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    to_binary = sub.add_parser("to-binary", help="append a CSV log to a binary log directory")
+    to_binary.add_argument("csv")
+    to_binary.add_argument("directory")
+    to_csv = sub.add_parser("to-csv", help="export a binary log directory to CSV")
+    to_csv.add_argument("directory")
+    to_csv.add_argument("csv")
+    to_csv.add_argument("--start", type=float, help="first epoch second to export")
+    to_csv.add_argument("--end", type=float, help="epoch second to stop at (exclusive)")
+    args = parser.parse_args(argv)
+
+    if args.command == "to-binary":
+        print(f"{csv_to_binary(args.csv, args.directory)} records written to {args.directory}")
+    else:
+        print(f"{binary_to_csv(args.directory, args.csv, args.start, args.end)} rows written to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+# ===========================
+# Clip Recorder Module
+# ===========================
+"""
+Video clips of what the camera saw around an alarm.
+
+Recording the camera all night would fill the SD card, so ClipRecorder only keeps the
+last PRE_EVENT seconds of frames in memory and saves a clip when an alert fires:
+
+- add_frame() is called with every captured frame. At most CLIP_FPS frames per second
+  are kept, downscaled to CLIP_WIDTH (and converted to grayscale with CLIP_GRAYSCALE)
+  straight into a ring of slots allocated once, so memory use is fixed
+  (`ring_bytes`) and a kept frame costs one resize, not an allocation;
+- trigger() only records the event. The recorder's own thread writes the frames from
+  PRE_EVENT seconds before the event to POST_EVENT seconds after it to an MJPEG file in
+  CLIP_DIR, taking them from the ring as they arrive, so capture and detection never
+  wait for the encoder. Alerts during a clip extend it (up to MAX_CLIP_SECONDS); a
+  repeat of the same alert within EVENT_COOLDOWN seconds of its last clip does not
+  start a new one;
+- after every clip the oldest clips are deleted until CLIP_DIR holds at most
+  MAX_DISK_BYTES.
+
+The ring keeps RING_MARGIN seconds more than PRE_EVENT, so the encoder may fall that
+far behind before frames are lost (counted in clips.dropped_frames).
+"""
+
+import glob
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+import cv2
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Global Variables
+# ===========================
+CLIP_DIR = "clips"  # Directory of the saved clips
+CLIP_PREFIX = "clip-"
+CLIP_SUFFIX = ".avi"
+CLIP_CODEC = "MJPG"  # fourcc of the clips (MJPEG in AVI is available in every OpenCV build)
+CLIP_FPS = 5.0  # frames per second kept in the ring and written to the clips
+CLIP_WIDTH = 320  # pixels, width of the kept frames (the height follows the camera's aspect ratio)
+CLIP_GRAYSCALE = False  # keep grayscale frames (a third of the memory and disk)
+PRE_EVENT = 10.0  # seconds of video before the event
+POST_EVENT = 10.0  # seconds of video after the event
+MAX_CLIP_SECONDS = 60.0  # longest clip, however many alerts extend it
+RING_MARGIN = 5.0  # seconds the encoder may lag behind the camera
+EVENT_COOLDOWN = 300.0  # seconds after a clip during which the same alert key starts no new clip
+MAX_PENDING = 4  # events waiting for the encoder
+MAX_DISK_BYTES = 500 * 1024 * 1024  # total size of the clips kept in CLIP_DIR
+END_GRACE = 2.0  # seconds a clip waits for frames after its end before it is closed
+
+ClipEvent = namedtuple("ClipEvent", ["timestamp", "key", "message"])
+
+# ===========================
+# Frame Ring
+# ===========================
+class FrameRing:
+    """
+    Fixed number of preallocated frame slots, addressed by an increasing sequence number.
+
+    Parameters:
+    capacity (int): Number of slots.
+    shape (tuple): Shape of one frame.
+    """
+
+    def __init__(self, capacity, shape, dtype=np.uint8):
+        self.frames = np.zeros((capacity,) + tuple(shape), dtype)
+        self.timestamps = np.zeros(capacity)
+        self.capacity = capacity
+        self.next_seq = 0  # sequence number of the next frame written
+
+    @property
+    def nbytes(self):
+        return self.frames.nbytes + self.timestamps.nbytes
+
+    @property
+    def oldest_seq(self):
+        return max(0, self.next_seq - self.capacity)
+
+    def slot(self):
+        """
+        Returns the slot array the next frame is written into (see commit).
+        """
+        return self.frames[self.next_seq % self.capacity]
+
+    def commit(self, timestamp):
+        """
+        Publishes the frame written into slot() as taken at TIMESTAMP.
+        """
+        self.timestamps[self.next_seq % self.capacity] = timestamp
+        self.next_seq += 1
+
+    def first_since(self, timestamp):
+        """
+        Sequence number of the oldest kept frame taken at or after TIMESTAMP (next_seq if none).
+        """
+        for seq in range(self.oldest_seq, self.next_seq):
+            if self.timestamps[seq % self.capacity] >= timestamp:
+                return seq
+        return self.next_seq
+
+    def read(self, seq):
+        """
+        Returns (timestamp, copy of the frame) of SEQ, which must still be kept.
+        """
+        index = seq % self.capacity
+        return self.timestamps[index], self.frames[index].copy()
+
+# ===========================
+# Clip Recorder
+# ===========================
+class ClipRecorder(threading.Thread):
+    """
+    Keeps the recent frames and writes clips around alert events from its own thread.
+    Has the start()/stop() lifecycle of the pipeline services.
+
+    Parameters:
+    directory (str): See CLIP_DIR.
+    fps, width, grayscale: See CLIP_FPS, CLIP_WIDTH, CLIP_GRAYSCALE.
+    pre_event, post_event, max_clip_seconds: See PRE_EVENT, POST_EVENT, MAX_CLIP_SECONDS.
+    cooldown (float): See EVENT_COOLDOWN.
+    max_disk_bytes (int): See MAX_DISK_BYTES.
+    frame_shape (tuple, optional): Shape of the camera frames; the ring is allocated
+        from it right away instead of on the first frame.
+    metrics_scope (str, optional): Scope of the recorder's gauges (see metrics.scoped).
+    """
+
+    def __init__(self, directory=CLIP_DIR, fps=CLIP_FPS, width=CLIP_WIDTH, grayscale=CLIP_GRAYSCALE,
+                 pre_event=PRE_EVENT, post_event=POST_EVENT, max_clip_seconds=MAX_CLIP_SECONDS,
+                 cooldown=EVENT_COOLDOWN, max_disk_bytes=MAX_DISK_BYTES, frame_shape=None,
+                 metrics_scope=None):
+        super().__init__(name="clip-recorder", daemon=True)
+        self.directory = directory
+        self.fps = fps
+        self.width = width
+        self.grayscale = grayscale
+        self.pre_event = pre_event
+        self.post_event = post_event
+        self.max_clip_seconds = max_clip_seconds
+        self.cooldown = cooldown
+        self.max_disk_bytes = max_disk_bytes
+        self.capacity = math.ceil((pre_event + RING_MARGIN) * fps)
+
+        self.ring = None
+        self._size = None  # (width, height) of the kept frames
+        self._scratch = None  # resized color frame before the grayscale conversion
+        self._last_added = None
+        self._events = deque()
+        self._current = None  # [start, end, event] of the clip being written
+        self._last_clip = {}  # alert key -> event time of its last clip
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+
+        self.clips = 0
+        self.skipped_events = 0  # events folded into a clip or within the cooldown
+        self.dropped_frames = 0  # frames overwritten before the encoder got to them
+        self.deleted_clips = 0
+        if frame_shape is not None:
+            self._allocate(frame_shape)
+        metrics.gauge(metrics.scoped("clips.ring_bytes", metrics_scope), lambda: self.ring_bytes)
+
+    @property
+    def ring_bytes(self):
+        return 0 if self.ring is None else self.ring.nbytes
+
+    def _allocate(self, frame_shape):
+        height, width = frame_shape[:2]
+        scale = min(1.0, self.width / width)  # frames are never upscaled
+        self._size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        shape = (self._size[1], self._size[0]) if self.grayscale else (self._size[1], self._size[0], 3)
+        self.ring = FrameRing(self.capacity, shape)
+        if self.grayscale:
+            self._scratch = np.zeros((self._size[1], self._size[0], 3), np.uint8)
+        logger.info("Clip ring: %d frames of %s, %.1f MB", self.capacity, shape, self.ring.nbytes / 1e6)
+
+    # ---------------------------
+    # Producer side
+    # ---------------------------
+    def wants_frame(self, timestamp):
+        """
+        Whether a frame taken at TIMESTAMP would be kept (to skip fetching the others).
+        """
+        return self._last_added is None or timestamp - self._last_added >= 0.8 / self.fps
+
+    def add_frame(self, frame, timestamp=None):
+        """
+        Keeps FRAME if the last kept frame is at least 1 / fps old. Never blocks on the
+        encoder.
+
+        Parameters:
+        frame (frame_producer.Frame or np.ndarray): RGB frame.
+        timestamp (float, optional): Capture time (default: the Frame's, or now).
+        """
+        image = getattr(frame, "image", frame)
+        if timestamp is None:
+            timestamp = getattr(frame, "timestamp", None) or time.time()
+        if not self.wants_frame(timestamp):
+            return
+        self._last_added = timestamp
+        with self._cond:
+            if self.ring is None:
+                self._allocate(image.shape)
+            slot = self.ring.slot()
+            if self.grayscale:
+                cv2.resize(image, self._size, dst=self._scratch, interpolation=cv2.INTER_AREA)
+                cv2.cvtColor(self._scratch, cv2.COLOR_RGB2GRAY, dst=slot)
+            else:
+                cv2.resize(image, self._size, dst=slot, interpolation=cv2.INTER_AREA)
+            self.ring.commit(timestamp)
+            self._cond.notify_all()
+
+    def trigger(self, key, message="", timestamp=None):
+        """
+        Asks for a clip around an alert event. Never blocks.
+
+        Returns:
+        bool: False if the event starts no new clip (it extended the current one, its
+        key is within the cooldown, or too many clips are pending).
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._cond:
+            current = self._current
+            if current is not None and timestamp <= current[1]:
+                current[1] = max(current[1], min(timestamp + self.post_event, current[0] + self.max_clip_seconds))
+                self.skipped_events += 1
+                return False
+            last = self._last_clip.get(key)
+            if (last is not None and timestamp - last < self.cooldown) or len(self._events) >= MAX_PENDING:
+                self.skipped_events += 1
+                metrics.counter("clips.skipped_events").inc()
+                return False
+            self._last_clip[key] = timestamp
+            self._events.append(ClipEvent(timestamp, key, message))
+            self._cond.notify_all()
+            return True
+
+    # ---------------------------
+    # Encoder thread
+    # ---------------------------
+    def run(self):
+        while not self._stop_event.is_set():
+            with self._cond:
+                self._cond.wait_for(lambda: self._events or self._stop_event.is_set(), timeout=1.0)
+                if not self._events:
+                    continue
+                event = self._events.popleft()
+                self._current = [event.timestamp - self.pre_event, event.timestamp + self.post_event, event]
+            try:
+                self._record(event)
+            except Exception:
+                logger.exception("Error writing the clip of %s", event.key)
+            finally:
+                with self._cond:
+                    self._current = None
+            self._enforce_budget()
+
+    def _next_frame(self, seq):
+        """
+        Waits for the frame SEQ (or a later one if it was overwritten) until the end of
+        the current clip.
+
+        Returns:
+        tuple: (seq, timestamp, frame), or None once the clip is over.
+        """
+        with self._cond:
+            while True:
+                start, end, _ = self._current
+                if self.ring is not None and seq < self.ring.next_seq:
+                    if seq < self.ring.oldest_seq:
+                        self.dropped_frames += self.ring.oldest_seq - seq
+                        metrics.counter("clips.dropped_frames").inc(self.ring.oldest_seq - seq)
+                        seq = self.ring.oldest_seq
+                    timestamp, frame = self.ring.read(seq)
+                    return (seq, timestamp, frame) if timestamp <= end else None
+                if self._stop_event.is_set() or time.time() > end + END_GRACE:
+                    return None
+                self._cond.wait(0.5)
+
+    def _record(self, event):
+        with self._cond:
+            seq = self.ring.first_since(self._current[0]) if self.ring is not None else 0
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(event.timestamp))
+        path = os.path.join(self.directory, f"{CLIP_PREFIX}{stamp}-{event.key}{CLIP_SUFFIX}")
+        writer = None
+        written = 0
+        first = last = None
+        try:
+            while True:
+                item = self._next_frame(seq)
+                if item is None:
+                    break
+                seq, timestamp, frame = item
+                seq += 1
+                if writer is None:
+                    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*CLIP_CODEC), self.fps,
+                                             self._size, not self.grayscale)
+                    if not writer.isOpened():
+                        raise RuntimeError(f"Cannot write {path} with the {CLIP_CODEC} codec")
+                    first = timestamp
+                if not self.grayscale:
+                    frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+                # repeat frames over gaps in the capture so the clip plays in real time
+                repeats = 1 if last is None else min(max(1, round((timestamp - last) * self.fps)), 2 * int(self.fps))
+                with metrics.timer("clips.write_frame"):
+                    for _ in range(repeats):
+                        writer.write(frame)
+                written += repeats
+                last = timestamp
+        finally:
+            if writer is not None:
+                writer.release()
+        if writer is None:
+            logger.warning("No frames for the clip of %s (%s)", event.key, event.message)
+            return
+        self.clips += 1
+        metrics.counter("clips.recorded").inc()
+        logger.info("Saved clip %s: %.0f s around %s (%s)", path, last - first, event.key, event.message)
+
+    def _enforce_budget(self):
+        """
+        Deletes the oldest clips until CLIP_DIR holds at most max_disk_bytes.
+        """
+        paths = sorted(glob.glob(os.path.join(self.directory, f"{CLIP_PREFIX}*{CLIP_SUFFIX}")),
+                       key=os.path.getmtime)
+        sizes = [os.path.getsize(path) for path in paths]
+        total = sum(sizes)
+        for path, size in zip(paths[:-1], sizes):  # the newest clip is always kept
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            total -= size
+            self.deleted_clips += 1
+            logger.info("Deleted clip %s (clip budget of %.0f MB)", path, self.max_disk_bytes / 1e6)
+
+    def stop(self, timeout=None):
+        """
+        Finishes the clip being written with the frames already kept, and stops.
+        """
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self.is_alive():
+            self.join(timeout)
@@ -0,0 +1,299 @@
+# ===========================
+# Data Logger Module
+# ===========================
+"""
+Buffered CSV logger for the monitoring data.
+
+Opening, appending one line to and closing `sleep_monitor_log.csv` on every cycle costs
+an open/close per sample and wears the Pi's SD card. BufferedCsvLogger keeps the file
+open, buffers rows in memory and writes them in batches from a background thread:
+
+- log() only puts the row in a queue and never blocks the monitoring loop (if the writer
+  falls far behind, new rows are dropped and counted instead);
+- buffered rows are flushed once FLUSH_ROWS rows are pending or FLUSH_INTERVAL seconds
+  after the oldest pending row, and always on stop();
+- fsync is controlled by a policy: "never" (leave it to the OS), "flush" (after every
+  flush) or "interval" (at most every FSYNC_INTERVAL seconds);
+- the file can be rotated when it exceeds a size and/or when the day changes; rotated
+  files keep the base name with the date (and a counter) appended;
+- a failed write (full or removed SD card...) is logged and counted and the rows stay
+  buffered and are retried every WRITE_RETRY_INTERVAL seconds; `healthy` tells whether
+  the writer is running and its last write succeeded.
+
+Rows have the same format as main.log_data: timestamp,heart_rate,oxygen_level,face_detected
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Global Variables
+# ===========================
+LOG_FILE = "sleep_monitor_log.csv"
+FLUSH_ROWS = 60  # rows buffered before a flush
+FLUSH_INTERVAL = 30.0  # seconds a row may stay buffered
+FSYNC_POLICIES = ("never", "flush", "interval")
+FSYNC_POLICY = "interval"
+FSYNC_INTERVAL = 300.0  # seconds between two fsyncs with the "interval" policy
+QUEUE_SIZE = 10000  # rows waiting for the writer thread
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+WRITE_RETRY_INTERVAL = 5.0  # seconds between two attempts after a failed write
+
+# ===========================
+# Buffered CSV Logger
+# ===========================
+class BufferedCsvLogger(threading.Thread):
+    """
+    Background CSV writer with batching, fsync policy and rotation.
+
+    Parameters:
+    path (str): CSV file, appended to.
+    flush_rows (int): See FLUSH_ROWS.
+    flush_interval (float): See FLUSH_INTERVAL.
+    fsync (str): One of FSYNC_POLICIES.
+    fsync_interval (float): See FSYNC_INTERVAL.
+    max_bytes (int, optional): Rotate the file once it would grow beyond this size.
+    rotate_daily (bool): Rotate the file when the date of the logged rows changes.
+    metrics_scope (str, optional): Scope of the logger's gauges (see metrics.scoped).
+    """
+
+    def __init__(self, path=LOG_FILE, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL,
+                 fsync=FSYNC_POLICY, fsync_interval=FSYNC_INTERVAL, max_bytes=None,
+                 rotate_daily=False, queue_size=QUEUE_SIZE, metrics_scope=None):
+        super().__init__(name="data-logger", daemon=True)
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, not {fsync!r}")
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.rows = queue.Queue(queue_size)
+
+        self.written = 0  # rows written to disk
+        self.dropped = 0  # rows lost because the queue was full
+        self.flushes = 0
+        self.rotations = 0
+        self.errors = 0  # failed writes
+        self.last_error = None
+        self.last_flush_duration = 0.0
+
+        self._file = None
+        self._file_day = None
+        self._buffer = []
+        self._oldest_pending = None
+        self._retry_at = None  # set while the last write failed
+        self._last_fsync = time.monotonic()
+        self._stop_event = threading.Event()
+        metrics.gauge(metrics.scoped("queue.log_rows", metrics_scope), self.rows.qsize)
+
+    # ---------------------------
+    # Producer side
+    # ---------------------------
+    def log(self, timestamp, heart_rate, oxygen_level, face_detected, heart_rate_ok=None,
+            oxygen_level_ok=None, motion_detected=None):
+        """
+        Queues one row. Never blocks.
+
+        The validity and motion flags are accepted for compatibility with
+        binary_log.BinaryLogWriter; the CSV format has no column for them.
+
+        Parameters:
+        - timestamp (float): Time of the reading (seconds since the epoch).
+        - heart_rate (int): Measured heart rate in bpm.
+        - oxygen_level (int): Measured blood oxygen saturation (SpO2) in percentage.
+        - face_detected (bool): Indicates if a face was detected.
+
+        Returns:
+        - bool: False if the row was dropped because the writer is too far behind.
+        """
+        try:
+            self.rows.put_nowait((timestamp, heart_rate, oxygen_level, face_detected))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            metrics.counter("log.dropped_rows").inc()
+            return False
+
+    # ---------------------------
+    # Writer thread
+    # ---------------------------
+    def run(self):
+        while not self._stop_event.is_set():
+            timeout = 0.5
+            if self._oldest_pending is not None and self._retry_at is None:
+                timeout = max(0.0, min(timeout, self._oldest_pending + self.flush_interval - time.monotonic()))
+            try:
+                self._add(self.rows.get(timeout=timeout))
+            except queue.Empty:
+                pass
+            if self._flush_due():
+                self._try_flush()
+
+        # drain what is left and write it before exiting
+        while True:
+            try:
+                self._add(self.rows.get_nowait())
+            except queue.Empty:
+                break
+        self._try_flush()
+        try:
+            self._close()
+        except OSError as e:
+            logger.error("Error closing %s: %s", self.path, e)
+
+    @property
+    def healthy(self):
+        """
+        True while the writer thread runs and its last write succeeded.
+        """
+        return self.is_alive() and self._retry_at is None
+
+    def _try_flush(self):
+        """
+        Flushes, keeping the rows buffered for a later retry if the write fails.
+
+        Returns:
+        - bool: True if the buffer was written.
+        """
+        try:
+            self.flush()
+        except OSError as e:
+            self.errors += 1
+            self.last_error = e
+            metrics.counter("log.write_errors").inc()
+            if self._retry_at is None:
+                logger.error("Error writing %s: %s (retrying every %.0f s)", self.path, e, WRITE_RETRY_INTERVAL)
+            self._retry_at = time.monotonic() + WRITE_RETRY_INTERVAL
+            # reopen the file on the next attempt, it may be gone with its card
+            file, self._file = self._file, None
+            if file is not None:
+                try:
+                    file.close()
+                except OSError:
+                    pass
+            # the buffer cannot grow without bound while the disk is failing
+            excess = len(self._buffer) - self.rows.maxsize
+            if self.rows.maxsize > 0 and excess > 0:
+                del self._buffer[:excess]
+                self.dropped += excess
+                metrics.counter("log.dropped_rows").inc(excess)
+            return False
+        if self._retry_at is not None:
+            logger.info("Writing %s again", self.path)
+            self._retry_at = None
+        return True
+
+    def _flush_due(self):
+        if not self._buffer:
+            return False
+        if self._retry_at is not None:
+            return time.monotonic() >= self._retry_at
+        return (len(self._buffer) >= self.flush_rows
+                or time.monotonic() - self._oldest_pending >= self.flush_interval)
+
+    def _add(self, row):
+        timestamp, heart_rate, oxygen_level, face_detected = row
+        local = time.localtime(timestamp)
+        if (self.rotate_daily and self._file_day is not None and local[:3] != self._file_day
+                and self._retry_at is None):
+            # write the previous day's rows to the previous day's file first
+            # (while writes fail, the days stay in one file)
+            if self._try_flush():
+                try:
+                    self._rotate()
+                except OSError as e:
+                    self.errors += 1
+                    metrics.counter("log.write_errors").inc()
+                    logger.error("Error rotating %s: %s", self.path, e)
+                    self._file = None
+                    self._file_day = None
+        if self._file_day is None:
+            self._file_day = local[:3]
+        self._buffer.append(
+            f"{time.strftime(TIMESTAMP_FORMAT, local)},{heart_rate},{oxygen_level},{face_detected}\n"
+        )
+        if self._oldest_pending is None:
+            self._oldest_pending = time.monotonic()
+
+    def flush(self):
+        """
+        Writes the buffered rows (called by the writer thread).
+        """
+        if not self._buffer:
+            return
+        started = time.perf_counter()
+        data = "".join(self._buffer)
+        if self._file is None:
+            self._open()
+        if self.max_bytes and self._file.tell() and self._file.tell() + len(data) > self.max_bytes:
+            day = self._file_day
+            self._rotate()
+            self._file_day = day
+            self._open()
+        self._file.write(data)
+        self._file.flush()
+
+        now = time.monotonic()
+        if self.fsync == "flush" or (self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval):
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+
+        self.written += len(self._buffer)
+        self.flushes += 1
+        metrics.counter("log.rows_written").inc(len(self._buffer))
+        self._buffer = []
+        self._oldest_pending = None
+        self.last_flush_duration = time.perf_counter() - started
+        metrics.histogram("log.flush").observe(self.last_flush_duration * 1000.0)
+
+    # ---------------------------
+    # Files
+    # ---------------------------
+    def _open(self):
+        self._file = open(self.path, "a")
+
+    def _close(self):
+        if self._file is not None:
+            if self.fsync != "never":
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def _rotated_path(self):
+        root, ext = os.path.splitext(self.path)
+        day = self._file_day or time.localtime()[:3]
+        base = f"{root}.{day[0]:04d}-{day[1]:02d}-{day[2]:02d}"
+        candidate = base + ext
+        counter = 1
+        while os.path.exists(candidate):
+            candidate = f"{base}.{counter}{ext}"
+            counter += 1
+        return candidate
+
+    def _rotate(self):
+        self._close()
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            os.replace(self.path, self._rotated_path())
+            self.rotations += 1
+        self._file_day = None
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+    def stop(self, timeout=None):
+        """
+        Flushes every queued row, closes the file and stops the writer thread.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
@@ -0,0 +1,319 @@
+# ===========================
+# Fake Hardware Backends
+# ===========================
+"""
+Stand-ins for the hardware libraries used by the baby monitoring system, so that the
+sensor and camera code paths can run on a workstation or in tests without a Raspberry Pi.
+
+- FakeSMBus: in-memory MAX30102 register map and 32-sample FIFO fed from a list (or any
+  iterable) of (red, ir) samples, optionally paced at a fixed sample rate.
+- FakeGPIO: the subset of RPi.GPIO used by max30102, with the interrupt pin driven by a
+  FakeSMBus (low while the FIFO holds data).
+- FakeCamera: Picamera2 stand-in returning frames from arrays or image files.
+- SilentAlarmBackend: alarm.AlarmManager backend that records calls instead of playing.
+- FakeMonitorDevices: device layer of async_orchestrator.Orchestrator with scripted
+  readings and calls that can be made to hang.
+
+Example:
+    bus = FakeSMBus(samples, sample_rate=25)
+    sensor = max30102.MAX30102(bus=bus, gpio=FakeGPIO(bus))
+"""
+
+import threading
+import time
+from collections import deque
+
+import max30102
+
+# ===========================
+# MAX30102 / I2C
+# ===========================
+class FakeSMBus:
+    """
+    Fake smbus.SMBus exposing one MAX30102 with a FIFO fed from SAMPLES.
+
+    Parameters:
+    samples (iterable): (red, ir) pairs, 18-bit values.
+    sample_rate (float, optional): Samples per second entering the FIFO. When None, a
+        new sample is available as soon as the previous one has been read.
+    """
+
+    def __init__(self, samples=(), sample_rate=None):
+        self.registers = bytearray(256)
+        self.registers[max30102.REG_PART_ID] = 0x15
+        self.samples = iter(samples)
+        self.sample_rate = sample_rate
+        self.fifo = deque()
+        self.exhausted = False
+        self.writes = []  # (register, values) written by the driver
+        self.reads = 0  # number of read transactions
+        self._started = time.monotonic()
+        self._produced = 0
+        self._lock = threading.Lock()
+
+    # ---------------------------
+    # FIFO simulation
+    # ---------------------------
+    def _refill(self):
+        if self.sample_rate is None:
+            due = self._produced + (0 if self.fifo else 1)
+        else:
+            due = int((time.monotonic() - self._started) * self.sample_rate)
+        while self._produced < due and not self.exhausted:
+            try:
+                red, ir = next(self.samples)
+            except StopIteration:
+                self.exhausted = True
+                break
+            self._produced += 1
+            if len(self.fifo) == max30102.FIFO_DEPTH:
+                # FIFO rollover is disabled: new samples are lost and counted
+                ovf = self.registers[max30102.REG_OVF_COUNTER]
+                self.registers[max30102.REG_OVF_COUNTER] = min(ovf + 1, 0x1F)
+                continue
+            self.fifo.append((int(red) & 0x3FFFF, int(ir) & 0x3FFFF))
+            wr_ptr = self.registers[max30102.REG_FIFO_WR_PTR]
+            self.registers[max30102.REG_FIFO_WR_PTR] = (wr_ptr + 1) & 0x1F
+
+    def pending(self):
+        """
+        Number of samples currently waiting in the FIFO.
+        """
+        with self._lock:
+            self._refill()
+            return len(self.fifo)
+
+    def _pop_sample_bytes(self):
+        red, ir = self.fifo.popleft() if self.fifo else (0, 0)
+        rd_ptr = self.registers[max30102.REG_FIFO_RD_PTR]
+        self.registers[max30102.REG_FIFO_RD_PTR] = (rd_ptr + 1) & 0x1F
+        self.registers[max30102.REG_OVF_COUNTER] = 0
+        return [(red >> 16) & 0xFF, (red >> 8) & 0xFF, red & 0xFF,
+                (ir >> 16) & 0xFF, (ir >> 8) & 0xFF, ir & 0xFF]
+
+    # ---------------------------
+    # smbus.SMBus interface
+    # ---------------------------
+    def write_i2c_block_data(self, address, register, values):
+        with self._lock:
+            self.writes.append((register, list(values)))
+            for offset, value in enumerate(values):
+                self.registers[register + offset] = value
+            if register in (max30102.REG_FIFO_WR_PTR, max30102.REG_FIFO_RD_PTR):
+                # resetting the pointers flushes the FIFO
+                self.fifo.clear()
+            if register == max30102.REG_MODE_CONFIG and values and values[0] & 0x40:
+                # reset: the bit clears itself once the reset is done
+                self.registers[max30102.REG_MODE_CONFIG] = values[0] & ~0x40
+                self.fifo.clear()
+
+    def read_i2c_block_data(self, address, register, length):
+        with self._lock:
+            self.reads += 1
+            self._refill()
+            if register == max30102.REG_FIFO_DATA:
+                # the FIFO data register does not auto-increment, it pops samples
+                data = []
+                while len(data) < length:
+                    data.extend(self._pop_sample_bytes())
+                return data[:length]
+            return list(self.registers[register:register + length])
+
+    def read_byte_data(self, address, register):
+        return self.read_i2c_block_data(address, register, 1)[0]
+
+    def close(self):
+        pass
+
+
+class FakeGPIO:
+    """
+    Fake RPi.GPIO module for the MAX30102 interrupt pin.
+
+    The pin reads 0 (active) while BUS has samples in its FIFO and 1 otherwise, like
+    the open-drain INT output of the sensor.
+
+    Parameters:
+    bus (FakeSMBus): Bus whose FIFO drives the interrupt pin.
+    edge_support (bool): When False, wait_for_edge raises RuntimeError, which makes
+        the driver fall back to polling.
+    """
+    BOARD = 10
+    BCM = 11
+    IN = 1
+    OUT = 0
+    FALLING = 32
+    RISING = 31
+    BOTH = 33
+
+    def __init__(self, bus, edge_support=True):
+        self.bus = bus
+        self.edge_support = edge_support
+        self.mode = None
+        self.pins = {}
+        self.input_calls = 0
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setup(self, pin, direction, **kwargs):
+        self.pins[pin] = direction
+
+    def input(self, pin):
+        self.input_calls += 1
+        return 0 if self.bus.pending() else 1
+
+    def wait_for_edge(self, pin, edge, timeout=None):
+        if not self.edge_support:
+            raise RuntimeError("edge detection not supported by this fake")
+        deadline = None if timeout is None else time.monotonic() + timeout / 1000.0
+        while not self.bus.pending():
+            if self.bus.exhausted or (deadline is not None and time.monotonic() >= deadline):
+                return None
+            time.sleep(0.001)
+        return pin
+
+    def cleanup(self, *args):
+        self.pins.clear()
+
+# ===========================
+# Camera
+# ===========================
+class FakeCamera:
+    """
+    Fake Picamera2 returning frames from arrays or image files.
+
+    Parameters:
+    frames (list, optional): RGB np.ndarray frames, returned in a loop.
+    paths (list, optional): Image files loaded with OpenCV (converted to RGB) and
+        appended to FRAMES.
+    fps (float, optional): Frame rate to simulate; capture_array() sleeps to keep it.
+    """
+
+    def __init__(self, frames=None, paths=None, fps=None):
+        self.frames = list(frames or [])
+        for path in paths or []:
+            import cv2
+            image = cv2.imread(path)
+            if image is None:
+                raise FileNotFoundError(path)
+            self.frames.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        if not self.frames:
+            raise ValueError("FakeCamera needs at least one frame")
+        self.fps = fps
+        self.captured = 0
+        self.started = False
+        self._next_time = time.monotonic()
+
+    def configure(self, *args, **kwargs):
+        pass
+
+    def start(self):
+        self.started = True
+
+    def stop(self):
+        self.started = False
+
+    def capture_array(self, *args):
+        if self.fps:
+            delay = self._next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_time = max(self._next_time, time.monotonic()) + 1.0 / self.fps
+        frame = self.frames[self.captured % len(self.frames)]
+        self.captured += 1
+        # a real camera returns a new buffer for every capture
+        return frame.copy()
+
+# ===========================
+# Alarm
+# ===========================
+class SilentAlarmBackend:
+    """
+    Alarm backend for alarm.AlarmManager that records calls instead of playing sound.
+
+    Attributes:
+    calls (list): ("play",), ("stop",) and ("volume", v) tuples, in call order.
+    playing (bool): Whether the alarm is currently sounding.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.playing = False
+        self.volume = None
+
+    def play(self):
+        self.calls.append(("play",))
+        self.playing = True
+
+    def stop(self):
+        self.calls.append(("stop",))
+        self.playing = False
+
+    def set_volume(self, volume):
+        self.calls.append(("volume", volume))
+        self.volume = volume
+
+# ===========================
+# Orchestrator Devices
+# ===========================
+class FakeMonitorDevices:
+    """
+    Device layer for async_orchestrator.Orchestrator returning scripted results.
+
+    Parameters:
+    vitals (list): (oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok) tuples,
+        returned in a loop.
+    face_detected (bool): Face flag of every vision reading.
+    shape (tuple): Shape of the captured frames.
+    read_delay (float): Seconds every read_vitals() takes, like the sensor.
+
+    Attributes:
+    hung (set): Names of the calls ("vitals", "capture", "detection", "close") that
+        block, like a hung I2C bus or camera, until removed from the set.
+    calls (dict): Number of calls of each method.
+    """
+
+    def __init__(self, vitals=((97.0, True, 120.0, True),), face_detected=True, shape=(360, 640, 3),
+                 read_delay=0.0):
+        self.vitals = list(vitals)
+        self.face_detected = face_detected
+        self.shape = shape
+        self.read_delay = read_delay
+        self.hung = set()
+        self.calls = {"open": 0, "vitals": 0, "capture": 0, "detection": 0, "close": 0}
+        self.opened = False
+
+    def _call(self, name):
+        self.calls[name] += 1
+        while name in self.hung:
+            time.sleep(0.01)
+
+    def open(self):
+        self.calls["open"] += 1
+        self.opened = True
+
+    def read_vitals(self):
+        if self.read_delay:
+            time.sleep(self.read_delay)
+        self._call("vitals")
+        return self.vitals[(self.calls["vitals"] - 1) % len(self.vitals)]
+
+    def capture_frame(self):
+        import numpy as np
+
+        self._call("capture")
+        return np.zeros(self.shape, np.uint8)
+
+    def analyze(self, image, timestamp):
+        from pipeline import VisionReading
+
+        self._call("detection")
+        return VisionReading(timestamp, self.face_detected, False, self.calls["detection"])
+
+    def request_check(self, reason="requested"):
+        pass
+
+    def close(self):
+        self._call("close")
+        self.opened = False
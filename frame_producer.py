@@ -0,0 +1,193 @@
+# ===========================
+# Frame Producer Module
+# ===========================
+"""
+Single owner of the night vision camera.
+
+A FrameProducer thread captures frames continuously and keeps the latest few in a small
+ring, each tagged with a sequence number and a timestamp. Consumers (motion detection,
+face detection, ...) ask for the latest frame instead of calling `capture_array()`
+themselves, so one capture serves every detector of a monitoring cycle and the capture
+never blocks the thread doing the vitals work.
+
+Frames are handed out as read-only views of the captured array (no copy). Derived images
+(grayscale, equalized) are computed at most once per frame and cached on the Frame, so
+every detector shares one conversion.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+import cv2
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Global Variables
+# ===========================
+RING_SIZE = 4  # number of recent frames kept
+CAPTURE_ERROR_BACKOFF = 0.5  # seconds to wait after a failed capture
+
+# ===========================
+# Frame
+# ===========================
+class Frame:
+    """
+    One captured frame with lazily computed, cached derived images.
+
+    Attributes:
+    image (np.ndarray): Read-only RGB frame as returned by the camera.
+    seq (int): Sequence number, increasing by one per captured frame.
+    timestamp (float): Capture time (seconds since the epoch).
+    """
+
+    def __init__(self, image, seq, timestamp):
+        image.flags.writeable = False
+        self.image = image
+        self.seq = seq
+        self.timestamp = timestamp
+        self._derived = {}
+        self._lock = threading.RLock()
+
+    def derived(self, name, compute):
+        """
+        Returns the derived image NAME, computing it with COMPUTE(frame) on first use.
+        The result is cached on the frame and made read-only.
+        """
+        with self._lock:
+            if name not in self._derived:
+                result = compute(self)
+                if hasattr(result, "flags"):
+                    result.flags.writeable = False
+                self._derived[name] = result
+            return self._derived[name]
+
+    @property
+    def gray(self):
+        """
+        Grayscale version of the frame.
+        """
+        return self.derived("gray", lambda f: cv2.cvtColor(f.image, cv2.COLOR_RGB2GRAY))
+
+    @property
+    def equalized(self):
+        """
+        Histogram-equalized grayscale version of the frame.
+        """
+        return self.derived("equalized", lambda f: cv2.equalizeHist(f.gray))
+
+    @property
+    def age(self):
+        """
+        Seconds since the frame was captured.
+        """
+        return time.time() - self.timestamp
+
+# ===========================
+# Frame Producer Thread
+# ===========================
+class FrameProducer(threading.Thread):
+    """
+    Background thread that owns the camera and publishes the latest frames.
+
+    Parameters:
+    camera (optional): Object with a `capture_array()` method (Picamera2 or
+        fakes.FakeCamera). When omitted, the camera set up by
+        night_vision_camera.initialize_camera() is used (and initialized if needed).
+    ring_size (int): Number of recent frames kept.
+    interval (float): Minimum seconds between two captures (0 captures as fast as the
+        camera delivers frames).
+    on_frame (callable, optional): Called with every published Frame from the capture 
+        thread (e.g. clip_recorder.ClipRecorder.add_frame); it must not block.
+    """
+
+    def __init__(self, camera=None, ring_size=RING_SIZE, interval=0.0, on_frame=None):
+        super().__init__(name="frame-producer", daemon=True)
+        if camera is None:
+            import night_vision_camera
+            if night_vision_camera.camera is None:
+                night_vision_camera.initialize_camera()
+            camera = night_vision_camera.camera
+        self.camera = camera
+        self.interval = interval
+        self.on_frame = on_frame
+        self.errors = 0
+        self._ring = deque(maxlen=ring_size)
+        self._seq = 0
+        self._new_frame = threading.Condition()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            try:
+                with metrics.timer("camera.capture"):
+                    image = self.camera.capture_array()
+            except Exception as e:
+                self.errors += 1
+                metrics.counter("camera.errors").inc()
+                logger.warning("Error capturing a frame: %s", e)
+                self._stop_event.wait(CAPTURE_ERROR_BACKOFF)
+                continue
+            frame = self.publish(image)
+            if self.on_frame is not None:
+                try:
+                    self.on_frame(frame)
+                except Exception:
+                    logger.exception("Error in the frame listener")
+
+            if self.interval:
+                self._stop_event.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def publish(self, image, timestamp=None):
+        """
+        Adds a captured image to the ring and wakes up waiting consumers.
+
+        Returns:
+        Frame: The published frame.
+        """
+        with self._new_frame:
+            self._seq += 1
+            frame = Frame(image, self._seq, time.time() if timestamp is None else timestamp)
+            self._ring.append(frame)
+            self._new_frame.notify_all()
+        return frame
+
+    def latest(self):
+        """
+        Returns the most recent Frame, or None if nothing was captured yet.
+        """
+        with self._new_frame:
+            return self._ring[-1] if self._ring else None
+
+    def frames(self):
+        """
+        Returns the frames in the ring, oldest first.
+        """
+        with self._new_frame:
+            return list(self._ring)
+
+    def wait_for_frame(self, after_seq=0, timeout=None):
+        """
+        Blocks until a frame newer than AFTER_SEQ is available.
+
+        Returns:
+        Frame or None: The latest frame, or None if TIMEOUT expired.
+        """
+        with self._new_frame:
+            ready = self._new_frame.wait_for(
+                lambda: self._ring and self._ring[-1].seq > after_seq, timeout
+            )
+            return self._ring[-1] if ready else None
+
+    def stop(self, timeout=None):
+        """
+        Stops capturing and waits for the thread to finish.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
@@ -193,3 +193,234 @@ def remove_close_peaks(n_peaks, ir_valley_locs, x, min_dist):
     sorted_indices[:n_peaks] = sorted(sorted_indices[:n_peaks])
 
     return sorted_indices, n_peaks
+
+
+# ===========================
+# Vectorized engine
+# ===========================
+# The functions below reproduce calc_hr_and_spo2 (including the integer
+# truncation and the quirks inherited from algorithm.h) with NumPy array
+# operations instead of per-sample Python loops. They are selectable through
+# ENGINES / get_engine() and must return exactly what the legacy path returns
+# for the same buffer (see hrcalc_parity.py).
+
+def moving_average_vectorized(ir_data):
+    """
+    DC removal, inversion and 4 point moving average of the IR signal.
+
+    Matches the in-place loop of calc_hr_and_spo2: the first len - MA_SIZE
+    samples are replaced by the truncated mean of the next MA_SIZE samples,
+    the last MA_SIZE samples are left untouched.
+    """
+    ir = np.asarray(ir_data, dtype=np.int64)
+    x = -1 * (ir - int(np.mean(ir)))
+    n = x.shape[0] - MA_SIZE
+    if n > 0:
+        window_sums = np.convolve(x, np.ones(MA_SIZE, dtype=np.int64), mode="valid")[:n]
+        x[:n] = np.trunc(window_sums / MA_SIZE).astype(np.int64)
+    return x
+
+
+def find_peaks_vectorized(x, size, min_height, min_dist, max_num):
+    """
+    Array based equivalent of find_peaks.
+
+    Returns the peak locations (sorted, already trimmed to the number of
+    peaks) as an np.array and the number of peaks.
+    """
+    locs = find_peaks_above_min_height_vectorized(x, size, min_height, max_num)
+    locs = remove_close_peaks_vectorized(locs, x, min_dist)
+    n_peaks = min(locs.shape[0], max_num)
+    return locs[:n_peaks], n_peaks
+
+
+def find_peaks_above_min_height_vectorized(x, size, min_height, max_num):
+    """
+    Array based equivalent of find_peaks_above_min_height.
+
+    A left edge is a sample above MIN_HEIGHT and above its predecessor
+    (x[-1] for index 0, as in the legacy loop). It is a peak when the first
+    sample after its flat top is lower.
+    """
+    x = np.asarray(x)
+    head = x[:size]
+    previous = np.roll(x, 1)[:size]
+    candidates = np.flatnonzero((head > min_height) & (head > previous))
+    candidates = candidates[candidates < size - 1]
+    if candidates.shape[0] == 0:
+        return candidates
+
+    # index of the first sample that differs from the flat top, capped at size - 1
+    changes = np.flatnonzero(head[1:] != head[:-1]) + 1
+    pos = np.searchsorted(changes, candidates, side="right")
+    right = np.full(candidates.shape, size - 1)
+    has_change = pos < changes.shape[0]
+    right[has_change] = np.minimum(changes[pos[has_change]], size - 1)
+
+    peaks = candidates[head[candidates] > head[right]]
+    return peaks[:max_num]
+
+
+def remove_close_peaks_vectorized(locs, x, min_dist):
+    """
+    Array based equivalent of remove_close_peaks.
+
+    Peaks are visited from the highest to the lowest (ties: later peak first,
+    like the reversed stable sort of the legacy code) and every peak within
+    MIN_DISTANCE of a kept one is suppressed.
+    """
+    locs = np.asarray(locs, dtype=np.int64)
+    # the legacy loop compares against a lag-zero peak at index -1 first
+    locs = locs[locs + 1 > min_dist]
+    if locs.shape[0] == 0:
+        return locs
+
+    heights = np.asarray(x)[locs]
+    order = np.lexsort((np.arange(locs.shape[0]), heights))[::-1]
+    ordered = locs[order]
+    close = np.abs(ordered[:, None] - ordered[None, :]) <= min_dist
+
+    keep = np.ones(ordered.shape[0], dtype=bool)
+    for i in range(ordered.shape[0]):
+        if keep[i]:
+            keep[i + 1:] &= ~close[i, i + 1:]
+
+    return np.sort(ordered[keep])
+
+
+def beat_ratios_vectorized(ir_data, red_data, locs, max_ratios=5):
+    """
+    Batched AC/DC ratio computation for every pair of consecutive valleys.
+
+    Returns the (at most MAX_RATIOS) ratios in beat order, before sorting.
+    """
+    ir = np.asarray(ir_data, dtype=np.int64)
+    red = np.asarray(red_data, dtype=np.int64)
+    locs = np.asarray(locs, dtype=np.int64)
+    if locs.shape[0] < 2:
+        return np.zeros(0, dtype=np.int64)
+
+    starts = locs[:-1]
+    ends = locs[1:]
+    wide = (ends - starts) > 3
+    nume, denom = beat_ratio_terms(ir, red, starts[wide], ends[wide])
+    return ratios_from_terms(nume, denom, max_ratios)
+
+
+def beat_ratio_terms(ir, red, starts, ends):
+    """
+    Numerator (red AC * IR DC) and denominator (IR AC * red DC) of the SpO2
+    ratio for the beats between STARTS[k] and ENDS[k].
+
+    IR and RED are int64 arrays, the beat bounds are indices into them.
+    """
+    if starts.shape[0] == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # index of the first maximum inside [start, end) for every beat
+    seg = np.arange(ir.shape[0])
+    inside = (seg[None, :] >= starts[:, None]) & (seg[None, :] < ends[:, None])
+    ir_dc_max_index = np.argmax(np.where(inside, ir[None, :], -16777216), axis=1)
+    red_dc_max_index = np.argmax(np.where(inside, red[None, :], -16777216), axis=1)
+    ir_dc_max = ir[ir_dc_max_index]
+    red_dc_max = red[red_dc_max_index]
+    width = ends - starts
+
+    red_ac = (red[ends] - red[starts]) * (red_dc_max_index - starts)
+    red_ac = red[starts] + np.trunc(red_ac / width).astype(np.int64)
+    red_ac = red_dc_max - red_ac
+
+    ir_ac = (ir[ends] - ir[starts]) * (ir_dc_max_index - starts)
+    ir_ac = ir[starts] + np.trunc(ir_ac / width).astype(np.int64)
+    ir_ac = ir_dc_max - ir_ac
+
+    return red_ac * ir_dc_max, ir_ac * red_dc_max
+
+
+def ratios_from_terms(nume, denom, max_ratios=5):
+    """
+    Ratios of the first MAX_RATIOS usable beats, given their ratio terms.
+    """
+    valid = (denom > 0) & (nume != 0)
+    nume = nume[valid][:max_ratios]
+    denom = denom[valid][:max_ratios]
+    # same 32-bit wrap as the legacy implementation
+    return np.trunc(((nume * 100) & 0xffffffff) / denom).astype(np.int64)
+
+
+def spo2_from_ratios(ratios):
+    """
+    Median of the beat ratios mapped to SpO2, as in calc_hr_and_spo2.
+
+    Returns a (spo2, spo2_valid) tuple.
+    """
+    ratio = sorted(int(r) for r in ratios)
+    mid_index = int(len(ratio) / 2)
+
+    ratio_ave = 0
+    if mid_index > 1:
+        ratio_ave = int((ratio[mid_index-1] + ratio[mid_index])/2)
+    else:
+        if len(ratio) != 0:
+            ratio_ave = ratio[mid_index]
+
+    if ratio_ave > 2 and ratio_ave < 184:
+        spo2 = -45.060 * (ratio_ave**2) / 10000.0 + 30.054 * ratio_ave / 100.0 + 94.845
+        return spo2, True
+    return -999, False
+
+
+def hr_from_valleys(locs):
+    """
+    Heart rate from the mean valley interval, as in calc_hr_and_spo2.
+
+    Returns a (hr, hr_valid) tuple.
+    """
+    n_peaks = len(locs)
+    if n_peaks >= 2:
+        peak_interval_sum = int((int(locs[-1]) - int(locs[0])) / (n_peaks - 1))
+        return int(SAMPLE_FREQ * 60 / peak_interval_sum), True
+    return -999, False
+
+
+def calc_hr_and_spo2_vectorized(ir_data, red_data):
+    """
+    Vectorized drop-in replacement for calc_hr_and_spo2.
+
+    Same inputs and same (hr, hr_valid, spo2, spo2_valid) output.
+    """
+    x = moving_average_vectorized(ir_data)
+
+    n_th = int(np.mean(x))
+    n_th = 30 if n_th < 30 else n_th  # min allowed
+    n_th = 60 if n_th > 60 else n_th  # max allowed
+
+    ir_valley_locs, n_peaks = find_peaks_vectorized(x, BUFFER_SIZE, n_th, 4, 15)
+    hr, hr_valid = hr_from_valleys(ir_valley_locs)
+
+    if n_peaks and ir_valley_locs.max() > BUFFER_SIZE:
+        return hr, hr_valid, -999, False
+
+    ratios = beat_ratios_vectorized(ir_data, red_data, ir_valley_locs)
+    spo2, spo2_valid = spo2_from_ratios(ratios)
+
+    return hr, hr_valid, spo2, spo2_valid
+
+
+# engines selectable by name, "legacy" stays the default
+ENGINES = {
+    "legacy": calc_hr_and_spo2,
+    "vectorized": calc_hr_and_spo2_vectorized,
+}
+DEFAULT_ENGINE = "legacy"
+
+
+def get_engine(name=None):
+    """
+    Return the calc_hr_and_spo2 implementation registered under NAME.
+    """
+    name = DEFAULT_ENGINE if name is None else name
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError("unknown hrcalc engine: {0} (expected one of {1})".format(name, sorted(ENGINES)))
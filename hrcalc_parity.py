@@ -0,0 +1,121 @@
+# ===========================
+# hrcalc Engine Parity Check
+# ===========================
+"""
+Runs the legacy and the vectorized hrcalc engines on the same red/IR buffers and
+reports every buffer where their (hr, hr_valid, spo2, spo2_valid) outputs differ.
+
+Buffers come either from a recording (a .npz file with `ir` and `red` arrays of
+shape (n_windows, 100), or flat arrays that are cut into 100-sample windows) or
+from synthetic PPG-like windows generated with a fixed seed, so the check runs
+without a sensor.
+
+Usage:
+    python hrcalc_parity.py                      # synthetic windows
+    python hrcalc_parity.py --windows 20000      # more synthetic windows
+    python hrcalc_parity.py --recording night.npz
+
+tests/test_hrcalc.py runs the same check on a few hundred seeded synthetic windows.
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+import hrcalc
+
+# ===========================
+# Buffer Sources
+# ===========================
+def synthetic_windows(count, seed=0):
+    """
+    Yields (ir, red) windows of hrcalc.BUFFER_SIZE samples.
+
+    Most windows are noisy PPG-like waveforms over a wide HR range; every fifth
+    window is uniform noise and every seventh a nearly flat signal, to cover the
+    invalid paths of the algorithm as well.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(hrcalc.BUFFER_SIZE) / hrcalc.SAMPLE_FREQ
+    for k in range(count):
+        if k % 5 == 0:
+            ir = rng.integers(0, 0x3FFFF, hrcalc.BUFFER_SIZE)
+            red = rng.integers(0, 0x3FFFF, hrcalc.BUFFER_SIZE)
+        elif k % 7 == 0:
+            ir = rng.integers(1000, 1010, hrcalc.BUFFER_SIZE)
+            red = rng.integers(1000, 1010, hrcalc.BUFFER_SIZE)
+        else:
+            phase = 2 * np.pi * rng.uniform(40, 200) / 60 * t + rng.uniform(0, 2 * np.pi)
+            wave = np.sin(phase) + 0.4 * np.sin(2 * phase + 1)
+            dc_ir = rng.uniform(20000, 200000)
+            amp = rng.uniform(50, 3000)
+            ir = dc_ir + amp * wave + rng.normal(0, rng.uniform(0, 400), t.shape)
+            red = dc_ir * rng.uniform(0.5, 1.2) + amp * rng.uniform(0.3, 1.5) * wave \
+                + rng.normal(0, rng.uniform(0, 400), t.shape)
+        yield (np.clip(ir, 0, 0x3FFFF).astype(np.int64).tolist(),
+               np.clip(red, 0, 0x3FFFF).astype(np.int64).tolist())
+
+
+def recorded_windows(path):
+    """
+    Yields (ir, red) windows stored in a .npz recording.
+    """
+    data = np.load(path)
+    ir = np.asarray(data["ir"], dtype=np.int64).reshape(-1)
+    red = np.asarray(data["red"], dtype=np.int64).reshape(-1)
+    n_windows = min(ir.shape[0], red.shape[0]) // hrcalc.BUFFER_SIZE
+    for k in range(n_windows):
+        window = slice(k * hrcalc.BUFFER_SIZE, (k + 1) * hrcalc.BUFFER_SIZE)
+        yield ir[window].tolist(), red[window].tolist()
+
+# ===========================
+# Parity Check
+# ===========================
+def check_parity(windows, reference="legacy", candidate="vectorized"):
+    """
+    Compares two engines on every window.
+
+    Parameters:
+    windows (iterable): (ir, red) buffers.
+    reference (str): Name of the reference engine in hrcalc.ENGINES.
+    candidate (str): Name of the engine under test.
+
+    Returns:
+    tuple: (number of windows checked, list of (index, reference result, candidate result) mismatches)
+    """
+    ref = hrcalc.get_engine(reference)
+    cand = hrcalc.get_engine(candidate)
+    checked = 0
+    mismatches = []
+    for index, (ir, red) in enumerate(windows):
+        expected = ref(ir, red)
+        actual = cand(ir, red)
+        if expected != actual:
+            mismatches.append((index, expected, actual))
+        checked += 1
+    return checked, mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that hrcalc engines agree on the same buffers.")
+    parser.add_argument("--recording", help=".npz file with `ir` and `red` arrays")
+    parser.add_argument("--windows", type=int, default=5000, help="number of synthetic windows")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--candidate", default="vectorized", choices=sorted(hrcalc.ENGINES))
+    args = parser.parse_args(argv)
+
+    if args.recording:
+        windows = recorded_windows(args.recording)
+    else:
+        windows = synthetic_windows(args.windows, args.seed)
+
+    checked, mismatches = check_parity(windows, candidate=args.candidate)
+    for index, expected, actual in mismatches[:20]:
+        print(f"window {index}: legacy={expected} {args.candidate}={actual}")
+    print(f"{checked} windows checked, {len(mismatches)} mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+# ===========================
+# Streaming HR/SpO2 Estimator
+# ===========================
+"""
+Sliding-window version of hrcalc.calc_hr_and_spo2.
+
+Instead of waiting for a fresh 100-sample buffer and recomputing it from scratch, the
+estimator keeps the last hrcalc.BUFFER_SIZE red/IR samples in a ring buffer and reports
+a new HR/SpO2 estimate every `report_every` samples (once per second by default) over the
+most recent window. The work done per sample is O(1):
+
+- the DC sum and the 4-sample sums of the moving average are updated incrementally,
+- the AC/DC ratio terms of a beat only depend on the raw samples between its two
+  valleys, so they are cached by absolute valley position and reused while the beat
+  stays in the window; only beats that entered the window since the last report are
+  computed.
+
+The valley search itself runs once per report on the vectorized hrcalc helpers. Every
+estimate is identical to hrcalc.calc_hr_and_spo2 on the same 100 samples.
+
+Each reported window is also graded by signal_quality.assess (`last_quality`). With
+`quality_gate`, windows that fail the check are reported as invalid (-999) without
+running the valley search.
+"""
+
+import numpy as np
+
+import hrcalc
+import signal_quality
+
+# ===========================
+# Estimator
+# ===========================
+class StreamingHrSpo2Estimator:
+    """
+    Incremental HR/SpO2 estimator over the last hrcalc.BUFFER_SIZE samples.
+
+    Parameters:
+    report_every (int): Number of new samples between two estimates. Defaults to
+        hrcalc.SAMPLE_FREQ, i.e. one estimate per second.
+    quality_gate (bool): Report windows rejected by signal_quality.assess as invalid
+        without estimating them.
+    """
+
+    def __init__(self, report_every=hrcalc.SAMPLE_FREQ, quality_gate=False):
+        if report_every < 1:
+            raise ValueError("report_every must be at least 1")
+        self.size = hrcalc.BUFFER_SIZE
+        self.report_every = report_every
+        self.quality_gate = quality_gate
+
+        # samples are written twice (at pos and pos + size) so that the current window
+        # is always the contiguous slice [pos, pos + size)
+        self._ir = np.zeros(2 * self.size, dtype=np.int64)
+        self._red = np.zeros(2 * self.size, dtype=np.int64)
+        # raw sums of MA_SIZE consecutive IR samples, indexed like the samples they start at
+        self._ir_sum4 = np.zeros(2 * self.size, dtype=np.int64)
+        self._pos = 0
+        self._ir_sum = 0
+        self._last_sum4 = 0
+        self._count = 0  # total number of samples pushed
+        self._since_report = 0
+
+        # (absolute start, absolute end) of a beat -> (nume, denom) ratio terms
+        self._beat_cache = {}
+        self.last_estimate = None
+        self.last_quality = None  # signal_quality.SignalQuality of the last reported window
+
+    @property
+    def ready(self):
+        """
+        True once a full window of samples has been received.
+        """
+        return self._count >= self.size
+
+    def reset(self):
+        """
+        Drop all buffered samples, e.g. after the finger was removed.
+        """
+        self.__init__(self.report_every, self.quality_gate)
+
+    def push(self, red, ir):
+        """
+        Adds one red/IR sample.
+
+        Returns:
+        tuple or None: (hr, hr_valid, spo2, spo2_valid) when an estimate is due, None otherwise.
+        """
+        red = int(red)
+        ir = int(ir)
+        size = self.size
+        pos = self._pos
+
+        if self._count >= size:
+            self._ir_sum -= int(self._ir[pos])
+        self._ir_sum += ir
+        self._ir[pos] = self._ir[pos + size] = ir
+        self._red[pos] = self._red[pos + size] = red
+
+        # the MA_SIZE-sample sum that ends with this sample is now complete
+        self._last_sum4 += ir
+        if self._count >= hrcalc.MA_SIZE:
+            self._last_sum4 -= int(self._ir[(pos - hrcalc.MA_SIZE) % size])
+        if self._count >= hrcalc.MA_SIZE - 1:
+            start = (pos - (hrcalc.MA_SIZE - 1)) % size
+            self._ir_sum4[start] = self._ir_sum4[start + size] = self._last_sum4
+
+        self._pos = (pos + 1) % size
+        self._count += 1
+        self._since_report += 1
+
+        if self.ready and self._since_report >= self.report_every:
+            self._since_report = 0
+            self.last_estimate = self.estimate()
+            return self.last_estimate
+        return None
+
+    def extend(self, red_samples, ir_samples):
+        """
+        Adds a block of samples, e.g. the output of MAX30102.read_sequential().
+
+        Returns:
+        list: The estimates produced while consuming the block, oldest first.
+        """
+        estimates = []
+        for red, ir in zip(red_samples, ir_samples):
+            estimate = self.push(red, ir)
+            if estimate is not None:
+                estimates.append(estimate)
+        return estimates
+
+    def window(self):
+        """
+        Returns read-only views (ir, red) of the current window, oldest sample first.
+        """
+        ir = self._ir[self._pos:self._pos + self.size]
+        red = self._red[self._pos:self._pos + self.size]
+        ir.flags.writeable = False
+        red.flags.writeable = False
+        return ir, red
+
+    def estimate(self):
+        """
+        Computes HR/SpO2 over the current window.
+
+        Returns:
+        tuple: (hr, hr_valid, spo2, spo2_valid), as hrcalc.calc_hr_and_spo2.
+        """
+        if not self.ready:
+            return -999, False, -999, False
+
+        size = self.size
+        ir, red = self.window()
+        self.last_quality = signal_quality.assess(ir, red)
+        if self.quality_gate and not self.last_quality.ok:
+            return -999, False, -999, False
+        first = self._count - size  # absolute index of ir[0]
+
+        # moving average from the cached raw sums: x[i] = trunc((4 * mean - sum4[i]) / 4)
+        ir_mean = int(self._ir_sum / size)
+        x = -1 * (ir - ir_mean)
+        n = size - hrcalc.MA_SIZE
+        sum4 = self._ir_sum4[self._pos:self._pos + n]
+        x[:n] = np.trunc((hrcalc.MA_SIZE * ir_mean - sum4) / hrcalc.MA_SIZE).astype(np.int64)
+
+        n_th = int(np.mean(x))
+        n_th = 30 if n_th < 30 else n_th  # min allowed
+        n_th = 60 if n_th > 60 else n_th  # max allowed
+
+        locs, n_peaks = hrcalc.find_peaks_vectorized(x, size, n_th, 4, 15)
+        hr, hr_valid = hrcalc.hr_from_valleys(locs)
+
+        spo2, spo2_valid = hrcalc.spo2_from_ratios(self._ratios(ir, red, locs, first))
+        return hr, hr_valid, spo2, spo2_valid
+
+    def _ratios(self, ir, red, locs, first):
+        """
+        Beat ratios for the valleys LOCS of the current window, reusing cached beats.
+        """
+        # forget beats that started before the window
+        self._beat_cache = {k: v for k, v in self._beat_cache.items() if k[0] >= first}
+        if locs.shape[0] < 2:
+            return np.zeros(0, dtype=np.int64)
+
+        starts = locs[:-1]
+        ends = locs[1:]
+        keep = (ends - starts) > 3
+        starts = starts[keep]
+        ends = ends[keep]
+        keys = [(int(s) + first, int(e) + first) for s, e in zip(starts, ends)]
+
+        missing = [k for k, key in enumerate(keys) if key not in self._beat_cache]
+        if missing:
+            nume, denom = hrcalc.beat_ratio_terms(ir, red, starts[missing], ends[missing])
+            for k, a, b in zip(missing, nume, denom):
+                self._beat_cache[keys[k]] = (int(a), int(b))
+
+        terms = np.array([self._beat_cache[key] for key in keys], dtype=np.int64).reshape(-1, 2)
+        return hrcalc.ratios_from_terms(terms[:, 0], terms[:, 1])
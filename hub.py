@@ -0,0 +1,593 @@
+# ===========================
+# Multi-Crib Hub Module
+# ===========================
+"""
+Hub mode: one process monitoring several cribs, each with its own pulse oximeter and
+camera.
+
+Every crib is a configured device set (I2C channel, address and interrupt GPIO pin of
+its MAX30102, or a PPG recording to replay; camera index, stream URL or "picamera:N")
+and keeps its own decision state, log file and alarm. The work is shared between
+the cribs instead of starting one pipeline per crib:
+
+- a SensorScheduler with SENSOR_WORKERS threads polls the oximeters by due time. Each
+  poll drains the sensor FIFO without blocking (read_fifo_burst) and feeds the crib's
+  streaming HR/SpO2 estimator, so a few threads serve any number of sensors, and a
+  hung I2C bus only holds one of them;
+- every MOTION_INTERVAL the frames of all idle cribs are captured and analyzed as one
+  batch on a pool of VISION_WORKERS threads (OpenCV releases the GIL during motion
+  and face detection). Each crib keeps its own motion detector, face detector and
+  vision scheduler, so the cascade still only runs when its scene may have changed;
+- a fusion thread fuses, evaluates and logs the latest readings of every crib once
+  per DATA_LOG_INTERVAL, and raises alerts on the crib's own AlarmManager.
+
+The cribs come from a JSON file:
+
+    {"cribs": [
+        {"name": "left", "i2c_channel": 1, "camera": "picamera:0"},
+        {"name": "right", "i2c_channel": 3, "gpio_pin": 11, "camera": "picamera:1",
+         "baby_id": "lucia"}
+    ]}
+
+Usage:
+    python hub.py --config hub.json
+    python hub.py --bench 1 2 4 8 --seconds 30
+
+--bench runs N simulated cribs (synthetic PPG nights with different seeds, fake cameras,
+silent alarms, logs in a temporary directory) and reports the throughput of the hub
+and its CPU time, per CPU-second and per core.
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+import main
+import metrics
+import night_vision_camera
+import ppg_recording
+from alarm import AlarmManager
+from data_logger import BufferedCsvLogger
+from face_detector import FaceDetector
+from frame_producer import Frame
+from hrcalc_stream import StreamingHrSpo2Estimator
+from metrics import MetricsServer
+from motion_detector import MotionDetector
+from pipeline import VisionReading, VitalsReading, fuse
+from pulse_oximeter_reader import QUALITY_GATE
+from vision_scheduler import VisionScheduler
+from vitals_filter import VitalsFilter
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Global Variables
+# ===========================
+HUB_CONFIG = "hub.json"  # Crib configuration file
+SENSOR_WORKERS = 2  # Threads polling the oximeters of all cribs
+SENSOR_POLL_INTERVAL = 0.5  # Seconds between two FIFO reads of a sensor (the FIFO holds 1.28 s at 25 Hz)
+VISION_WORKERS = os.cpu_count() or 1  # Threads analyzing the frames of all cribs
+ERROR_BACKOFF = 1.0  # Seconds before a device is read again after an error
+CAMERA_SIZE = (640, 360)  # Resolution of the cameras opened by the hub
+BENCH_CRIBS = (1, 2, 4, 8)  # Crib counts of the scaling benchmark
+BENCH_SECONDS = 20.0  # Duration of one benchmark run
+
+CribConfig = namedtuple(
+    "CribConfig",
+    ["name", "i2c_channel", "i2c_address", "gpio_pin", "camera", "ppg_source", "ppg_speed", "log_file", "baby_id"],
+    defaults=(1, 0x57, 7, None, None, 1.0, None, None)
+)
+
+# ===========================
+# Configuration
+# ===========================
+def load_config(path=HUB_CONFIG):
+    """
+    Reads the crib configuration file.
+
+    Parameters:
+    path (str): JSON file with a "cribs" list of CribConfig fields ("i2c_address"
+        may be a string such as "0x57").
+
+    Returns:
+    list: CribConfig of every crib.
+    """
+    with open(path) as f:
+        entries = json.load(f)["cribs"]
+    configs = []
+    for entry in entries:
+        entry = dict(entry)
+        if isinstance(entry.get("i2c_address"), str):
+            entry["i2c_address"] = int(entry["i2c_address"], 0)
+        configs.append(CribConfig(**entry))
+    names = [config.name for config in configs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Crib names must be unique: {names}")
+    return configs
+
+# ===========================
+# Devices
+# ===========================
+class VideoCaptureCamera:
+    """
+    Camera read with OpenCV (USB camera index or stream URL), with the capture_array()
+    interface of the Picamera2.
+
+    Parameters:
+    source (int or str): cv2.VideoCapture source.
+    size (tuple): Requested (width, height).
+    """
+
+    def __init__(self, source, size=CAMERA_SIZE):
+        self.source = source
+        self.capture = cv2.VideoCapture(source)
+        if not self.capture.isOpened():
+            raise RuntimeError(f"Cannot open camera {source!r}")
+        self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+        self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+
+    def capture_array(self):
+        ok, image = self.capture.read()
+        if not ok:
+            raise RuntimeError(f"No frame from camera {self.source!r}")
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    def stop(self):
+        self.capture.release()
+
+
+def open_camera(source):
+    """
+    Opens the camera of a crib.
+
+    Parameters:
+    source: None (no camera), "picamera:N" for the Picamera2 number N, a
+        cv2.VideoCapture index or URL, or an already opened camera object
+        (e.g. fakes.FakeCamera).
+
+    Returns:
+    Object with capture_array(), or None.
+    """
+    if source is None:
+        return None
+    if isinstance(source, str) and source.startswith("picamera:"):
+        if night_vision_camera.Picamera2 is None:
+            raise RuntimeError("picamera2 is not installed")
+        camera = night_vision_camera.Picamera2(int(source.split(":", 1)[1]))
+        camera.preview_configuration.main.size = CAMERA_SIZE
+        camera.preview_configuration.main.format = "RGB888"
+        camera.preview_configuration.align()
+        camera.configure("preview")
+        camera.start()
+        return camera
+    if isinstance(source, (int, str)):
+        return VideoCaptureCamera(source)
+    return source
+
+
+def open_oximeter(config):
+    """
+    Opens the pulse oximeter of a crib: its MAX30102, or a replay of CONFIG.ppg_source
+    (a recording, ppg_recording.SYNTHETIC, or (red, ir) sample arrays).
+    """
+    source = config.ppg_source
+    if source is None:
+        import max30102
+
+        return max30102.MAX30102(config.i2c_channel, config.i2c_address, config.gpio_pin)
+    if isinstance(source, str) and source == ppg_recording.SYNTHETIC:
+        source = ppg_recording.synthetic_ppg(8 * 3600)
+    return ppg_recording.ReplayMAX30102(source, speed=config.ppg_speed, loop=True)
+
+# ===========================
+# Crib
+# ===========================
+class Crib:
+    """
+    Devices, decision state, log and alarm of one monitored crib.
+
+    Parameters:
+    config (CribConfig): Devices and files of the crib.
+    alarm_backend (optional): Backend of the crib's AlarmManager (see alarm.py).
+    metrics_scope (str, optional): Scope of the hub the crib belongs to (see metrics.scoped).
+    """
+
+    def __init__(self, config, alarm_backend=None, metrics_scope=None):
+        self.config = config
+        self.name = config.name
+        self.device = open_oximeter(config)
+        self.camera = open_camera(config.camera)
+        self.estimator = StreamingHrSpo2Estimator(quality_gate=QUALITY_GATE)
+        self.filter_vitals = VitalsFilter() if main.FILTER_VITALS else None
+        self.motion_detector = MotionDetector(night_vision_camera.MOTION_MODE)
+        self.face_detector = FaceDetector()
+        scope = metrics.scoped(f"hub.{self.name}", metrics_scope)  # every crib has its own gauges
+        self.scheduler = VisionScheduler(self.face_detector, self.motion_detector.detect, metrics_scope=scope)
+        self.evaluator = main.StateEvaluator(config.baby_id, vision_scheduler=self.scheduler, name=self.name)
+        self.alarm = AlarmManager(alarm_backend, metrics_scope=scope)
+        self.alarm.name = f"alarm-{self.name}"
+        self.csv_logger = BufferedCsvLogger(config.log_file or f"sleep_monitor_log-{self.name}.csv",
+                                            metrics_scope=scope)
+        self.csv_logger.name = f"data-logger-{self.name}"
+
+        self.latest_vitals = None
+        self.latest_vision = None
+        self.readings = 0
+        self.frames = 0
+        self.sensor_errors = 0
+        self.vision_errors = 0
+        self.vision_busy = False  # a frame of the crib is being analyzed
+        self._readings_counter = metrics.counter(metrics.scoped("readings", scope))
+        self._frames_counter = metrics.counter(metrics.scoped("frames", scope))
+
+    def start(self):
+        self.alarm.start()
+        self.csv_logger.start()
+        self.device.read_fifo_burst()  # drop the samples queued while the other cribs were set up
+        self.device.overflow_count = 0
+
+    def stop(self, timeout=2.0):
+        for service in (self.alarm, self.csv_logger):
+            if service.is_alive():
+                service.stop(timeout)
+        if self.camera is not None and hasattr(self.camera, "stop"):
+            self.camera.stop()
+        self.device.shutdown()
+
+    def poll_sensor(self):
+        """
+        Drains the oximeter FIFO into the estimator and publishes the new readings.
+
+        Returns:
+        int: Number of samples read.
+        """
+        with metrics.timer("sensor.read"):
+            samples = self.device.read_fifo_burst()
+        if self.device.last_overflow:
+            logger.warning("[%s] Sensor FIFO overflow, %d samples lost", self.name, self.device.last_overflow)
+        with metrics.timer("hrcalc"):
+            for red, ir in samples:
+                estimate = self.estimator.push(red, ir)
+                if estimate is None:
+                    continue
+                quality = self.estimator.last_quality
+                reading = VitalsReading(time.time(), *estimate, quality.score if quality is not None else None)
+                if self.filter_vitals is not None:
+                    reading = self.filter_vitals(reading)
+                self.latest_vitals = reading
+                self.readings += 1
+                self._readings_counter.inc()
+        return len(samples)
+
+    def analyze_frame(self):
+        """
+        Captures a frame and runs it through the crib's vision scheduler.
+        """
+        try:
+            with metrics.timer("camera.capture"):
+                image = self.camera.capture_array()
+            timestamp = time.time()
+            self.frames += 1
+            self._frames_counter.inc()
+            scene = self.scheduler.update(Frame(image, self.frames, timestamp), timestamp)
+            self.latest_vision = VisionReading(timestamp, scene.face_detected, scene.motion_detected,
+                                               self.frames, scene)
+        except Exception:
+            self.vision_errors += 1
+            logger.exception("[%s] Frame analysis failed", self.name)
+        finally:
+            self.vision_busy = False
+
+    def tick(self, now):
+        """
+        Fuses the latest readings, raises the alerts they call for and logs the state.
+        """
+        state = fuse(now, self.latest_vitals, self.latest_vision)
+        for key, message in self.evaluator(state):
+            self.alarm.raise_alert(key, message)
+        main.log_state(state, self.csv_logger)
+
+    def stats(self):
+        return {"readings": self.readings, "frames": self.frames, "cascades": self.scheduler.cascades,
+                "sensor_errors": self.sensor_errors, "vision_errors": self.vision_errors,
+                "overflow": self.device.overflow_count, "alarms_raised": self.alarm.raised}
+
+# ===========================
+# Sensor Scheduler
+# ===========================
+class SensorScheduler:
+    """
+    Polls the oximeters of many cribs with a few shared threads.
+
+    The cribs wait in a heap ordered by the time their next poll is due; each worker
+    takes the earliest due crib, sleeps until it is due and polls it. A crib whose
+    poll fails is retried after ERROR_BACKOFF seconds.
+
+    Parameters:
+    cribs (list): Crib objects.
+    workers (int): See SENSOR_WORKERS.
+    interval (float): See SENSOR_POLL_INTERVAL.
+    metrics_scope (str, optional): Scope of the scheduler's gauges (see metrics.scoped).
+    """
+
+    def __init__(self, cribs, workers=SENSOR_WORKERS, interval=SENSOR_POLL_INTERVAL, metrics_scope=None):
+        self.cribs = list(cribs)
+        self.interval = interval
+        self.polls = 0
+        self.late = 0  # polls started more than one interval after they were due
+        self._cond = threading.Condition()
+        self._stopped = False
+        now = time.monotonic()
+        # staggered so that the polls spread over the interval
+        self._heap = [(now + i * interval / len(self.cribs), i) for i in range(len(self.cribs))]
+        self._threads = [threading.Thread(target=self._run, name=f"sensor-{k}", daemon=True)
+                         for k in range(min(workers, len(self.cribs)))]
+        metrics.gauge(metrics.scoped("hub.sensor_late", metrics_scope), lambda: self.late)
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=2.0):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _next(self):
+        """
+        Waits for the earliest due crib; returns (due time, index), or None once stopped.
+        """
+        with self._cond:
+            while not self._stopped:
+                if self._heap:
+                    delay = self._heap[0][0] - time.monotonic()
+                    if delay <= 0:
+                        return heapq.heappop(self._heap)
+                    self._cond.wait(delay)
+                else:
+                    self._cond.wait(self.interval)
+            return None
+
+    def _run(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            due, index = item
+            crib = self.cribs[index]
+            now = time.monotonic()
+            if now - due > self.interval:
+                self.late += 1
+            try:
+                crib.poll_sensor()
+                next_due = max(due + self.interval, now)
+            except Exception:
+                crib.sensor_errors += 1
+                logger.exception("[%s] Sensor read failed", crib.name)
+                next_due = time.monotonic() + ERROR_BACKOFF
+            self.polls += 1
+            with self._cond:
+                heapq.heappush(self._heap, (next_due, index))
+                self._cond.notify()
+
+# ===========================
+# Hub
+# ===========================
+class Hub:
+    """
+    Runs the sensor scheduler, the batched vision and the fusion of all cribs.
+
+    Parameters:
+    cribs (list): Crib objects.
+    sensor_workers (int): See SENSOR_WORKERS.
+    vision_workers (int): See VISION_WORKERS.
+    poll_interval (float): See SENSOR_POLL_INTERVAL.
+    vision_interval (float): Seconds between two vision batches (main.MOTION_INTERVAL).
+    fusion_interval (float): Seconds between two fused states (main.DATA_LOG_INTERVAL).
+    services (list): Objects with start() and stop(timeout) (e.g. a MetricsServer).
+    metrics_scope (str, optional): Scope of the hub's gauges (see metrics.scoped), for a hub
+        that is not the only one of the process; its cribs take the same scope.
+    """
+
+    def __init__(self, cribs, sensor_workers=SENSOR_WORKERS, vision_workers=VISION_WORKERS,
+                 poll_interval=SENSOR_POLL_INTERVAL, vision_interval=main.MOTION_INTERVAL,
+                 fusion_interval=main.DATA_LOG_INTERVAL, services=(), metrics_scope=None):
+        self.cribs = list(cribs)
+        self.vision_interval = vision_interval
+        self.fusion_interval = fusion_interval
+        self.services = list(services)
+        self.stop_event = threading.Event()
+        self.sensors = SensorScheduler(self.cribs, sensor_workers, poll_interval, metrics_scope)
+        self.vision_pool = ThreadPoolExecutor(vision_workers, thread_name_prefix="vision")
+        self.batches = 0
+        self.skipped_frames = 0  # frames not taken because the crib's previous one was still analyzed
+        self._threads = [threading.Thread(target=self._vision_loop, name="vision-batches", daemon=True),
+                         threading.Thread(target=self._fusion_loop, name="fusion", daemon=True)]
+
+    def start(self):
+        for service in self.services:
+            service.start()
+        for crib in self.cribs:
+            crib.start()
+        self.sensors.start()
+        for thread in self._threads:
+            thread.start()
+        logger.info("Hub monitoring %d cribs: %s", len(self.cribs), ", ".join(c.name for c in self.cribs))
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self.sensors.stop(timeout)
+        self.vision_pool.shutdown(wait=True, cancel_futures=True)
+        for crib in self.cribs:
+            crib.stop(timeout)
+        for service in reversed(self.services):
+            service.stop(timeout)
+
+    def _vision_loop(self):
+        cameras = [crib for crib in self.cribs if crib.camera is not None]
+        next_time = time.monotonic()
+        while cameras and not self.stop_event.wait(max(0.0, next_time - time.monotonic())):
+            next_time = max(next_time + self.vision_interval, time.monotonic())
+            self.batches += 1
+            for crib in cameras:
+                if crib.vision_busy:
+                    self.skipped_frames += 1
+                    continue
+                crib.vision_busy = True
+                self.vision_pool.submit(crib.analyze_frame)
+
+    def _fusion_loop(self):
+        while not self.stop_event.wait(self.fusion_interval):
+            now = time.time()
+            for crib in self.cribs:
+                try:
+                    crib.tick(now)
+                except Exception:
+                    logger.exception("[%s] Fusion failed", crib.name)
+
+    def stats(self):
+        report = {crib.name: crib.stats() for crib in self.cribs}
+        report["hub"] = {"sensor_polls": self.sensors.polls, "late_polls": self.sensors.late,
+                         "vision_batches": self.batches, "skipped_frames": self.skipped_frames}
+        return report
+
+    def report(self):
+        for name, stats in self.stats().items():
+            logger.info("%s: %s", name, ", ".join(f"{k}={v}" for k, v in stats.items()))
+
+    def wait(self, report_interval=60.0):
+        """
+        Blocks until the hub is stopped, logging its stats every REPORT_INTERVAL seconds.
+        """
+        while not self.stop_event.wait(report_interval):
+            self.report()
+
+
+def run_hub(config_path=HUB_CONFIG):
+    """
+    Monitors the cribs of CONFIG_PATH until interrupted.
+    """
+    cribs = [Crib(config) for config in load_config(config_path)]
+    services = [MetricsServer(port=main.METRICS_PORT)] if main.METRICS_PORT is not None else []
+    hub = Hub(cribs, services=services)
+    hub.start()
+    try:
+        hub.wait(report_interval=main.STATS_INTERVAL)
+    finally:
+        hub.stop()
+        hub.report()
+
+# ===========================
+# Scaling Benchmark
+# ===========================
+def _bench_cameras(n_cribs, n_frames=60):
+    """
+    Fake cameras showing the baby picture, still for 30 frames then moving for 30.
+    """
+    import fakes
+    from multiprocess_mode import _comparison_camera
+
+    baby = _comparison_camera().frames
+    scene = [baby[(k // 8) % len(baby)] if (k // 30) % 2 else baby[0] for k in range(n_frames)]
+    # every crib starts at another frame, so the cribs do not all move at the same time
+    return [fakes.FakeCamera(frames=scene[7 * k % n_frames:] + scene[:7 * k % n_frames]) for k in range(n_cribs)]
+
+
+def bench(n_cribs, seconds=BENCH_SECONDS, speed=1.0, directory=None, metrics_scope=None):
+    """
+    Runs N_CRIBS simulated cribs for SECONDS.
+
+    Parameters:
+    n_cribs (int): Number of cribs.
+    seconds (float): Duration of the run.
+    speed (float): Replay speed of the synthetic PPG nights (more readings per crib).
+    directory (str): Directory of the crib logs.
+    metrics_scope (str, optional): Scope of the run's gauges (see metrics.scoped); each
+        run in the same process needs its own.
+
+    Returns:
+    dict: Rates (per second), CPU time and throughput per CPU-second of the run.
+    """
+    import fakes
+
+    cameras = _bench_cameras(n_cribs)
+    cribs = []
+    for k in range(n_cribs):
+        config = CribConfig(f"crib{k}", camera=cameras[k], ppg_speed=speed,
+                            ppg_source=ppg_recording.synthetic_ppg(600, heart_rate=110 + 5 * k, seed=k),
+                            log_file=os.path.join(directory, f"crib{k}.csv"))
+        crib = Crib(config, alarm_backend=fakes.SilentAlarmBackend(), metrics_scope=metrics_scope)
+        crib.evaluator.thresholds_file = os.path.join(directory, "thresholds.json")  # none: default thresholds
+        cribs.append(crib)
+    hub = Hub(cribs, poll_interval=min(SENSOR_POLL_INTERVAL, 0.5 / speed), metrics_scope=metrics_scope)
+
+    wall, cpu = time.monotonic(), time.process_time()
+    hub.start()
+    hub.stop_event.wait(seconds)
+    stats = hub.stats()
+    wall, cpu = time.monotonic() - wall, time.process_time() - cpu
+    hub.stop()
+
+    readings = sum(stats[c.name]["readings"] for c in cribs)
+    frames = sum(stats[c.name]["frames"] for c in cribs)
+    cascades = sum(stats[c.name]["cascades"] for c in cribs)
+    return {
+        "cribs": n_cribs,
+        "readings_per_s": readings / wall,
+        "frames_per_s": frames / wall,
+        "cascades_per_s": cascades / wall,
+        "cpu_s": cpu,
+        "cores_used": cpu / wall,
+        "frames_per_cpu_s": frames / cpu if cpu else float("nan"),
+        "readings_per_cpu_s": readings / cpu if cpu else float("nan"),
+        "cribs_per_core": n_cribs * wall / cpu if cpu else float("nan"),
+        "late_polls": stats["hub"]["late_polls"],
+        "skipped_frames": stats["hub"]["skipped_frames"],
+    }
+
+
+def print_bench(results):
+    print(f"{'cribs':>5} {'readings/s':>10} {'frames/s':>9} {'cascades/s':>10} {'cores':>6} "
+          f"{'frames/cpu-s':>12} {'cribs/core':>10} {'late':>5} {'skipped':>7}")
+    for r in results:
+        print(f"{r['cribs']:>5} {r['readings_per_s']:>10.1f} {r['frames_per_s']:>9.1f} {r['cascades_per_s']:>10.2f} "
+              f"{r['cores_used']:>6.2f} {r['frames_per_cpu_s']:>12.1f} {r['cribs_per_core']:>10.1f} "
+              f"{r['late_polls']:>5} {r['skipped_frames']:>7}")
+    print(f"({os.cpu_count()} CPUs; frames/cpu-s is the per-core throughput, cribs/core the number of "
+          f"cribs one fully used core could serve at this load)")
+
+# ===========================
+# Main Execution
+# ===========================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monitor several cribs from one process.")
+    parser.add_argument("--config", default=HUB_CONFIG, help="crib configuration file (JSON)")
+    parser.add_argument("--bench", type=int, nargs="*", metavar="N",
+                        help=f"run the scaling benchmark with N simulated cribs (default {list(BENCH_CRIBS)})")
+    parser.add_argument("--seconds", type=float, default=BENCH_SECONDS, help="duration of one benchmark run")
+    parser.add_argument("--speed", type=float, default=1.0, help="PPG replay speed of the benchmark cribs")
+    args = parser.parse_args()
+    logging.basicConfig(level=main.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.bench is not None:
+        logging.getLogger("main").setLevel(logging.ERROR)  # the simulated cribs raise warnings all the time
+        with tempfile.TemporaryDirectory() as directory:
+            print_bench([bench(n, args.seconds, args.speed, directory, metrics_scope=f"bench{k}")
+                         for k, n in enumerate(args.bench or BENCH_CRIBS)])
+    else:
+        try:
+            run_hub(args.config)
+        except KeyboardInterrupt:
+            logger.info("Shutting down the hub...")
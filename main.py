@@ -1,16 +1,57 @@
+import argparse
+import logging
 import time
-import threading
 
-from pulse_oximeter_reader import initialize_pulse_oximeter, get_pulse_oximeter_data  # Replace with actual imports
-from night_vision_camera import initialize_camera, monitor_motion, face_detection  # Replace with actual imports
-from alarm import alarma, stop_alarma
+_started = time.monotonic()  # Start of the startup timing (see startup.py)
+
+# OpenCV and picamera2 (night_vision_camera, frame_producer), asyncio, the binary log and 
+# the process backend are imported by the functions that use them, so importing this 
+# module is cheap and works on machines without the camera libraries
+from pulse_oximeter_reader import initialize_pulse_oximeter, get_pulse_oximeter_data, stream_pulse_oximeter_data, VitalsReader  # Replace with actual imports
+from alarm import alarma, stop_alarma, init_audio, AlarmManager
+from data_logger import BufferedCsvLogger
+from pipeline import Pipeline, VitalsReading
+from signal_quality import QUALITY_THRESHOLD
+from vision_scheduler import VisionScheduler
+from vitals_filter import VitalsFilter
+from baseline import ThresholdTable
+from metrics import MetricsServer
+from startup import StartupTimer
+import metrics
+
+logger = logging.getLogger("main")
+startup = StartupTimer(_started)  # Durations of the startup steps, reported once the system runs
+startup.mark("imports")
 
 # ===========================
 # Global Variables and Config
 # ===========================
 DATA_LOG_INTERVAL = 1  # Seconds between data logs
+LOG_FILE = "sleep_monitor_log.csv"  # File where the monitoring data is logged
+LOG_BACKEND = "csv"  # "csv" (LOG_FILE) or "binary" (chunk files in BINARY_LOG_DIR)
+BINARY_LOG_DIR = "sleep_monitor_log"  # Directory of the binary log
 ALERT_THRESHOLD_OXYGEN = 30  # % SpO2 threshold for alert
 ALERT_THRESHOLD_HEART_RATE = 50  # bpm threshold for alert (too low)
+THRESHOLDS_FILE = "thresholds.json"  # Per-hour personalized thresholds learned by baseline.py (used if it exists)
+BABY_ID = "default"  # Baby whose thresholds are loaded from THRESHOLDS_FILE
+POOR_SIGNAL_ALERT_AFTER = 60  # Seconds of poor signal after which an alert asks to check the sensor
+NO_VITALS_ALERT_AFTER = 30  # Seconds without a fresh vitals reading after which an alert asks to check the sensor
+FILTER_VITALS = True  # Check the alert thresholds on outlier-filtered, smoothed vitals (see vitals_filter.py)
+LOG_FILTERED_VITALS = False  # Log the filtered vitals instead of the raw readings
+VISION_INTERVAL = 1  # Seconds between two analyzed camera frames
+VISION_SCHEDULER = True  # Gate face detection on motion (see vision_scheduler.py)
+MOTION_INTERVAL = 0.2  # Seconds between two frames checked for motion with the scheduler
+SCENE_MIN_CONFIDENCE = 0.3  # Scene confidence below which a missing face is not reported
+CLIP_RECORDING = True  # Save a video clip of the seconds around every alarm (see clip_recorder.py)
+STATS_INTERVAL = 60  # Seconds between two reports of the pipeline stage rates
+PPG_SOURCE = None  # None for the MAX30102, a ppg_recording file or "synthetic" to replay a night
+PPG_RECORD_TO = None  # ppg_recording file to which the raw sensor samples are appended
+PPG_REPLAY_SPEED = 1.0  # Replay speed of PPG_SOURCE relative to real time (None: as fast as possible)
+SENSOR_THREAD = True  # Read the pulse oximeter in a background acquisition thread (see acquisition.py)
+SENSOR_BURST = True  # Drain the sensor FIFO with block reads instead of three I2C transactions per sample
+LOG_LEVEL = logging.INFO  # logging.DEBUG also shows every reading and detection
+METRICS_PORT = 8765  # Local port of the JSON metrics endpoint (None to disable it)
+STATUS_PORT = 8766  # Local port of the live status page for the parents (None to disable it)
 
 # ===========================
 # Alert System
@@ -19,9 +60,11 @@ def trigger_alert(message):
     """
     Triggers an alert based on the input message.
 
-    This function activates the alarm system and logs the alert message.
+    This function activates the alarm system and logs the alert message. It blocks 
+    for the 10 seconds the alarm sounds and is only used by the serial 
+    monitoring_loop; the pipeline raises alerts through a non-blocking AlarmManager.
     """
-    print(f"ALERT: {message}")
+    logger.warning("ALERT: %s", message)
     archivo_mp3 = "alarm.wav"  # Replace this with the path to your alarm sound file
     alarma(archivo_mp3)  # Sound the alarm
     time.sleep(10)  # Allow the alarm to sound for 10 seconds
@@ -41,9 +84,10 @@ def log_data(heart_rate, oxygen_level, face_detected):
     - face_detected (bool): Indicates if a face was detected.
     """
     timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    with open("sleep_monitor_log.csv", "a") as log_file:
-        log_file.write(f"{timestamp},{heart_rate},{oxygen_level},{face_detected}\n")
-    print(f"Logged data: HR={heart_rate}, SpO2={oxygen_level}, Face={face_detected}")
+    with metrics.timer("log.flush"):
+        with open(LOG_FILE, "a") as log_file:
+            log_file.write(f"{timestamp},{heart_rate},{oxygen_level},{face_detected}\n")
+    logger.debug("Logged data: HR=%s, SpO2=%s, Face=%s", heart_rate, oxygen_level, face_detected)
 
 # ===========================
 # Main Monitoring Loop
@@ -55,53 +99,592 @@ def monitoring_loop():
     This function integrates data from the pulse oximeter and the camera to detect potential
     risks and triggers alerts when thresholds are crossed.
     """
-    print("Starting sleep monitoring...")
-    # Initialize devices
-    m = initialize_pulse_oximeter()  # Initialize the pulse oximeter
-    initialize_camera()  # Initialize the camera
+    from night_vision_camera import initialize_camera, face_detection
+
+    logger.info("Starting sleep monitoring...")
+    # Initialize devices: the camera and the audio output in the background, while the pulse oximeter resets
+    camera = startup.background("camera", initialize_camera)
+    startup.background("audio", init_audio)
+    with startup.step("sensor"):
+        m = initialize_pulse_oximeter(PPG_SOURCE, PPG_RECORD_TO, PPG_REPLAY_SPEED, SENSOR_THREAD, SENSOR_BURST)  # Initialize the pulse oximeter
+    camera.result()  # Wait for the camera
+    startup.report()
+    vitals_filter = VitalsFilter() if FILTER_VITALS else None  # Keeps single spikes from raising alerts
 
     while True:
         # Get pulse oximeter data
-        oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok = get_pulse_oximeter_data(m)
+        reading = VitalsReading(time.time(), *get_pulse_oximeter_data(m, with_quality=True, burst=SENSOR_BURST))
+        if vitals_filter is not None:
+            reading = vitals_filter.apply(reading)
+        oxygen_level, heart_rate = checked_vitals(reading)
+        oxygen_threshold, heart_rate_threshold = alert_thresholds(reading.timestamp)
 
-        # Check for abnormal values
-        if oxygen_level == -999 or oxygen_level < ALERT_THRESHOLD_OXYGEN:
-            trigger_alert(f"Low Oxygen Level: {oxygen_level}%")
-        if heart_rate == -999 or heart_rate < ALERT_THRESHOLD_HEART_RATE:
-            trigger_alert(f"Low Heart Rate: {heart_rate} bpm")
-        else:
-            print("Baby's vital signs are within normal limits.")
+        # Check for abnormal values, unless the signal is too poor to tell
+        usable, signal_alert = check_signal_quality(reading.quality, reading.timestamp)
+        if signal_alert:
+            trigger_alert(signal_alert)
+        if usable:
+            if oxygen_level == -999 or oxygen_level < oxygen_threshold:
+                trigger_alert(f"Low Oxygen Level: {oxygen_level:.0f}%")
+            if heart_rate == -999 or heart_rate < heart_rate_threshold:
+                trigger_alert(f"Low Heart Rate: {heart_rate:.0f} bpm")
+            else:
+                logger.debug("Baby's vital signs are within normal limits.")
 
         # Monitor motion from camera
         face_detected = face_detection()
         if face_detected:
-            print("Face detected. No risk of asphyxia.")
+            logger.debug("Face detected. No risk of asphyxia.")
         else:
-            print("Warning! Risk of asphyxia detected.")
+            logger.warning("Warning! Risk of asphyxia detected.")
 
         # Log data at intervals
-        log_data(heart_rate, oxygen_level, face_detected)
+        if LOG_FILTERED_VITALS:
+            log_data(heart_rate, oxygen_level, face_detected)
+        else:
+            log_data(reading.heart_rate, reading.oxygen_level, face_detected)
         time.sleep(DATA_LOG_INTERVAL)  # Wait before the next monitoring cycle
 
+# ===========================
+# Decision Logic
+# ===========================
+def checked_vitals(vitals):
+    """
+    Values of a vitals reading to check against the alert thresholds: the filtered 
+    values when the reading went through a vitals_filter.VitalsFilter, the raw ones 
+    otherwise.
+
+    Parameters:
+    - vitals (pipeline.VitalsReading): Reading to check.
+
+    Returns:
+    - tuple: (oxygen_level, heart_rate)
+    """
+    oxygen_level = vitals.oxygen_level if vitals.filtered_oxygen_level is None else vitals.filtered_oxygen_level
+    heart_rate = vitals.heart_rate if vitals.filtered_heart_rate is None else vitals.filtered_heart_rate
+    return oxygen_level, heart_rate
+
+class StateEvaluator:
+    """
+    Alert decisions for one monitored baby, with the state they depend on (last 
+    checked reading, poor signal duration, thresholds, vision scheduler).
+
+    The module functions alert_thresholds, check_signal_quality and evaluate_state 
+    use the `evaluator` instance of the single-crib run modes; hub.py creates one 
+    per crib.
+
+    Parameters:
+    - baby_id (str, optional): Baby whose thresholds are loaded (default: BABY_ID).
+    - thresholds_file (str, optional): Threshold table (default: THRESHOLDS_FILE).
+    - vision_scheduler (optional): Object with request_check(reason), asked for a face 
+      check when the vitals look abnormal.
+    - name (str, optional): Prefix of the log messages (e.g. the crib name).
+    """
+
+    def __init__(self, baby_id=None, thresholds_file=None, vision_scheduler=None, name=None):
+        self.baby_id = baby_id
+        self.thresholds_file = thresholds_file
+        self.vision_scheduler = vision_scheduler
+        self.prefix = f"[{name}] " if name else ""
+        self.threshold_table = None  # baseline.ThresholdTable, loaded on first use
+        self._last_evaluated_vitals = None  # Vitals reading already checked by evaluate()
+        self._poor_signal_since = None  # Time of the first of the consecutive readings with a poor signal
+        self._no_vitals_since = None  # Time of the first evaluated state without vitals, before any reading
+
+    def alert_thresholds(self, timestamp):
+        """
+        Alert thresholds for a reading: the personalized ones of the baby for the hour 
+        of the reading when the thresholds file has them, ALERT_THRESHOLD_OXYGEN and 
+        ALERT_THRESHOLD_HEART_RATE otherwise.
+
+        Parameters:
+        - timestamp (float): Time of the reading.
+
+        Returns:
+        - tuple: (oxygen_threshold, heart_rate_threshold)
+        """
+        if self.threshold_table is None:
+            baby_id = BABY_ID if self.baby_id is None else self.baby_id
+            path = THRESHOLDS_FILE if self.thresholds_file is None else self.thresholds_file
+            defaults = {"oxygen_level": ALERT_THRESHOLD_OXYGEN, "heart_rate": ALERT_THRESHOLD_HEART_RATE}
+            self.threshold_table = ThresholdTable.load(path, baby_id, defaults)
+            if self.threshold_table.learned:
+                logger.info("%sUsing the personalized alert thresholds of %r from %s.", self.prefix, baby_id, path)
+        return (self.threshold_table.lookup("oxygen_level", timestamp),
+                self.threshold_table.lookup("heart_rate", timestamp))
+
+    def check_signal_quality(self, quality, timestamp):
+        """
+        Decides whether a reading is reliable enough to be checked against the alert 
+        thresholds, and tracks how long the signal has been poor.
+
+        Without skin contact or while the baby moves the pulse oximeter reports -999 or 
+        implausible values; those readings must not raise low oxygen or heart rate 
+        alarms, but a signal that stays poor means the sensor needs attention.
+
+        Readings of windows scoring below signal_quality.QUALITY_THRESHOLD, the level at 
+        which the estimator rejects a window, are not usable.
+
+        Parameters:
+        - quality (float): Signal quality score of the reading (None when unknown).
+        - timestamp (float): Time of the reading.
+
+        Returns:
+        - tuple: (usable, message), message being an alert text once the signal has been 
+          poor for POOR_SIGNAL_ALERT_AFTER seconds, None otherwise.
+        """
+        if quality is None or quality >= QUALITY_THRESHOLD:
+            self._poor_signal_since = None
+            return True, None
+        if self._poor_signal_since is None:
+            self._poor_signal_since = timestamp
+        poor_for = timestamp - self._poor_signal_since
+        logger.debug("%sPoor pulse oximeter signal (quality %.2f) for %.0f s, vitals not checked.", self.prefix,
+                     quality, poor_for)
+        if poor_for >= POOR_SIGNAL_ALERT_AFTER:
+            return False, f"{self.prefix}Poor pulse oximeter signal for {poor_for:.0f} s, check the sensor"
+        return False, None
+
+    def check_vitals_fresh(self, state):
+        """
+        Tracks how long the monitor has gone without a fresh vitals reading.
+
+        A sensor that stops producing readings (unplugged, hung I2C bus, ended stream) 
+        must not go unnoticed: stale readings are never checked against the thresholds, 
+        so without this check a dead sensor would never raise an alarm.
+
+        Parameters:
+        - state (pipeline.FusedState): Latest vitals and vision readings with their age.
+
+        Returns:
+        - str or None: An alert text once no fresh reading arrived for 
+          NO_VITALS_ALERT_AFTER seconds, None otherwise.
+        """
+        if state.vitals_fresh:
+            self._no_vitals_since = None
+            return None
+        if state.vitals is not None:
+            missing_for = state.vitals_age
+        else:
+            # no reading yet: count from the first state evaluated without one
+            if self._no_vitals_since is None:
+                self._no_vitals_since = state.timestamp
+            missing_for = state.timestamp - self._no_vitals_since
+        if missing_for >= NO_VITALS_ALERT_AFTER:
+            return f"{self.prefix}No pulse oximeter reading for {missing_for:.0f} s, check the sensor"
+        return None
+
+    def evaluate(self, state):
+        """
+        Decides which alerts to raise for a fused pipeline state.
+
+        Each vitals reading is checked once, and only while it is fresh, so a stalled 
+        sensor does not re-trigger alerts on an old value; a sensor without fresh readings 
+        for too long raises its own alert (see check_vitals_fresh). Readings with a poor signal 
+        quality are not checked (see check_signal_quality), and filtered values are 
+        checked when available (see checked_vitals) against the thresholds of their hour 
+        (see alert_thresholds). Abnormal vitals ask the vision scheduler for an 
+        immediate face check, and a missing face is only reported while the scene state 
+        is confident enough.
+
+        Parameters:
+        - state (pipeline.FusedState): Latest vitals and vision readings with their age.
+
+        Returns:
+        - list: (key, message) tuples of the alerts to raise.
+        """
+        alerts = []
+
+        vitals_alert = self.check_vitals_fresh(state)
+        if vitals_alert:
+            alerts.append(("vitals", vitals_alert))
+
+        vitals = state.vitals
+        if state.vitals_fresh and vitals is not self._last_evaluated_vitals:
+            self._last_evaluated_vitals = vitals
+            oxygen_level, heart_rate = checked_vitals(vitals)
+            oxygen_threshold, heart_rate_threshold = self.alert_thresholds(vitals.timestamp)
+            usable, signal_alert = self.check_signal_quality(vitals.quality, vitals.timestamp)
+            if signal_alert:
+                alerts.append(("signal", signal_alert))
+            if usable:
+                if oxygen_level == -999 or oxygen_level < oxygen_threshold:
+                    alerts.append(("oxygen", f"{self.prefix}Low Oxygen Level: {oxygen_level:.0f}%"))
+                if heart_rate == -999 or heart_rate < heart_rate_threshold:
+                    alerts.append(("heart_rate", f"{self.prefix}Low Heart Rate: {heart_rate:.0f} bpm"))
+                else:
+                    logger.debug("%sBaby's vital signs are within normal limits.", self.prefix)
+            if alerts and self.vision_scheduler is not None:
+                self.vision_scheduler.request_check("vitals")
+
+        scene = state.vision.scene if state.vision_fresh else None
+        if scene is not None and scene.confidence < SCENE_MIN_CONFIDENCE:
+            logger.debug("%sFace status uncertain (last checked %.0f s ago).", self.prefix, scene.face_age)
+        elif state.vision_fresh:
+            if state.vision.face_detected:
+                logger.debug("%sFace detected. No risk of asphyxia.", self.prefix)
+            else:
+                logger.warning("%sWarning! Risk of asphyxia detected.", self.prefix)
+
+        return alerts
+
+    __call__ = evaluate
+
+evaluator = StateEvaluator()  # Decision state of the single-crib run modes
+
+def alert_thresholds(timestamp):
+    """
+    Alert thresholds for a reading (see StateEvaluator.alert_thresholds).
+    """
+    return evaluator.alert_thresholds(timestamp)
+
+def check_signal_quality(quality, timestamp):
+    """
+    Whether a reading is reliable enough to be checked (see StateEvaluator.check_signal_quality).
+    """
+    return evaluator.check_signal_quality(quality, timestamp)
+
+def evaluate_state(state):
+    """
+    Alerts to raise for a fused pipeline state (see StateEvaluator.evaluate).
+    """
+    return evaluator.evaluate(state)
+
+def log_state(state, csv_logger=None):
+    """
+    Logs a fused pipeline state, once vitals are available. The raw readings are 
+    logged, or the filtered ones with LOG_FILTERED_VITALS.
+
+    Parameters:
+    - state (pipeline.FusedState): State to log.
+    - csv_logger (data_logger.BufferedCsvLogger or binary_log.BinaryLogWriter, optional): 
+      Logger to pass the row to. Without it the row is written immediately with log_data.
+    """
+    if state.vitals is None:
+        return
+    face_detected = state.vision.face_detected if state.vision_fresh else False
+    if LOG_FILTERED_VITALS:
+        oxygen_level, heart_rate = checked_vitals(state.vitals)
+    else:
+        oxygen_level, heart_rate = state.vitals.oxygen_level, state.vitals.heart_rate
+    if csv_logger is None:
+        log_data(heart_rate, oxygen_level, face_detected)
+    else:
+        motion_detected = state.vision.motion_detected if state.vision_fresh else None
+        csv_logger.log(state.timestamp, heart_rate, oxygen_level, face_detected,
+                       heart_rate_ok=state.vitals.heart_rate_ok, oxygen_level_ok=state.vitals.oxygen_level_ok,
+                       motion_detected=motion_detected)
+
 # ===========================
 # Multi-threading Setup
 # ===========================
-def run_multithreaded():
+def build_services():
+    """
+    Creates the alarm manager, the data logger and the metrics server of the pipeline.
+
+    Returns:
+    - tuple: (alarm_manager, csv_logger, services), services being every object to 
+      start and stop with the pipeline.
+    """
+    alarm_manager = AlarmManager()  # Sounds, de-duplicates and escalates alerts in its own thread
+    if LOG_BACKEND == "binary":
+        from binary_log import BinaryLogWriter
+
+        csv_logger = BinaryLogWriter(BINARY_LOG_DIR)  # Fixed-width records, read back with binary_log.BinaryLogReader
+    else:
+        csv_logger = BufferedCsvLogger(LOG_FILE)  # Batches rows and writes them in the background
+    services = [alarm_manager, csv_logger]
+    if METRICS_PORT is not None:
+        services.append(MetricsServer(port=METRICS_PORT))  # Serves a JSON snapshot of every metric
+    return alarm_manager, csv_logger, services
+
+def build_clip_recorder(services):
+    """
+    Creates the clip recorder when CLIP_RECORDING is set and adds it to SERVICES.
+
+    Returns:
+    - clip_recorder.ClipRecorder or None: Keeps the last seconds of frames and saves a 
+      clip around every alarm.
+    """
+    if not CLIP_RECORDING:
+        return None
+    from clip_recorder import ClipRecorder
+
+    clip_recorder = ClipRecorder()
+    services.append(clip_recorder)
+    return clip_recorder
+
+def build_status_server(services, alarm_manager):
+    """
+    Creates the live status server when STATUS_PORT is set and adds it to SERVICES.
+
+    Returns:
+    - status_server.StatusServer or None: Pushes every fused state, the alarm status of
+      ALARM_MANAGER and camera snapshots to the browsers on http://localhost:STATUS_PORT/.
+    """
+    if STATUS_PORT is None:
+        return None
+    from status_server import StatusServer
+
+    status_server = StatusServer(port=STATUS_PORT, alarm_manager=alarm_manager)
+    services.append(status_server)
+    return status_server
+
+def frame_listener(*listeners):
+    """
+    Combines the frame listeners (clip recorder, status server) that are not None.
+
+    Returns:
+    - callable or None: on_frame(frame, timestamp=None) calling the add_frame of every 
+      listener, or None without listeners.
+    """
+    listeners = [listener for listener in listeners if listener is not None]
+    if not listeners:
+        return None
+
+    def on_frame(frame, timestamp=None):
+        for listener in listeners:
+            listener.add_frame(frame, timestamp)
+    return on_frame
+
+def record_state(state, csv_logger, status_server=None):
+    """
+    Logs a fused pipeline state (see log_state) and pushes it to the live status clients.
+    """
+    log_state(state, csv_logger)
+    if status_server is not None:
+        status_server.publish(state)
+
+def raise_alert(alert, alarm_manager, clip_recorder=None):
+    """
+    Sounds the alarm for a pipeline alert and saves the video around it.
+
+    Parameters:
+    - alert (pipeline.Alert): Alert to raise.
+    - alarm_manager (alarm.AlarmManager): Alarm to sound.
+    - clip_recorder (clip_recorder.ClipRecorder, optional): Recorder of the clip.
+    """
+    alarm_manager.raise_alert(alert.key, alert.message)
+    if clip_recorder is not None:
+        clip_recorder.trigger(alert.key, alert.message, alert.timestamp)
+
+def build_pipeline():
+    """
+    Initializes the devices and connects them into a concurrent monitoring pipeline.
+
+    Returns:
+    - pipeline.Pipeline: The pipeline, not started yet.
+    """
+    from night_vision_camera import initialize_camera, monitor_motion, face_detection
+    from frame_producer import FrameProducer
+
+    # the camera and the audio output initialize in the background, while the pulse oximeter resets
+    camera = startup.background("camera", initialize_camera)
+    startup.background("audio", init_audio)
+    with startup.step("sensor"):
+        m = initialize_pulse_oximeter(PPG_SOURCE, PPG_RECORD_TO, PPG_REPLAY_SPEED, SENSOR_THREAD, SENSOR_BURST)  # Initialize the pulse oximeter
+    camera.result()  # The frame producer needs the camera
+
+    vitals_stream = stream_pulse_oximeter_data(m, with_quality=True, burst=SENSOR_BURST)  # A new graded reading every second
+    vision_interval = VISION_INTERVAL
+    vision_scheduler = None
+    if VISION_SCHEDULER:
+        # motion on every checked frame, the face cascade only when the scene may have changed
+        vision_scheduler = VisionScheduler(face_detection, monitor_motion)
+        vision_interval = MOTION_INTERVAL
+    evaluator.vision_scheduler = vision_scheduler  # abnormal vitals ask for a face check
+    alarm_manager, csv_logger, services = build_services()
+    clip_recorder = build_clip_recorder(services)
+    status_server = build_status_server(services, alarm_manager)
+    return Pipeline(
+        read_vitals=VitalsReader(vitals_stream),
+        producer=FrameProducer(on_frame=frame_listener(clip_recorder, status_server)),
+        detect_face=face_detection,
+        decide=evaluate_state,
+        log=lambda state: record_state(state, csv_logger, status_server),
+        alert=lambda alert: raise_alert(alert, alarm_manager, clip_recorder),
+        vision_interval=vision_interval,
+        fusion_interval=DATA_LOG_INTERVAL,
+        services=services,
+        vision_scheduler=vision_scheduler,
+        filter_vitals=VitalsFilter() if FILTER_VITALS else None,
+    )
+
+def build_multiprocess_pipeline():
+    """
+    Connects the monitoring pipeline to a vitals process (oximeter and HR/SpO2 
+    estimation) and a vision process (camera and detection) instead of device threads.
+
+    Returns:
+    - pipeline.Pipeline: The pipeline, not started yet. The worker processes start 
+      and stop with it.
+    """
+    from multiprocess_mode import ProcessBackend
+
+    startup.background("audio", init_audio)  # the devices initialize in the worker processes
+    alarm_manager, csv_logger, services = build_services()
+    backend = ProcessBackend(
+        PPG_SOURCE, PPG_RECORD_TO, PPG_REPLAY_SPEED,
+        sensor_thread=SENSOR_THREAD,
+        sensor_burst=SENSOR_BURST,
+        motion_interval=MOTION_INTERVAL if VISION_SCHEDULER else VISION_INTERVAL,
+        schedule=VISION_SCHEDULER,
+        log_level=LOG_LEVEL,
+        alert=alarm_manager.raise_alert,  # a worker process that keeps failing or ended
+    )
+    # face checks requested by evaluate_state are forwarded to the vision process
+    evaluator.vision_scheduler = backend if VISION_SCHEDULER else None
+    clip_recorder = build_clip_recorder(services)
+    status_server = build_status_server(services, alarm_manager)
+
+    listeners = [listener for listener in (clip_recorder, status_server) if listener is not None]
+
+    def read_vision():
+        reading = backend.read_vision()
+        # the frames stay in shared memory; only the ones a listener keeps are copied out
+        if reading is not None:
+            wanting = [listener for listener in listeners if listener.wants_frame(reading.timestamp)]
+            frame = backend.latest_frame() if wanting else None
+            if frame is not None:
+                for listener in wanting:
+                    listener.add_frame(frame)
+        return reading
+
+    return Pipeline(
+        read_vitals=backend.read_vitals,
+        producer=None,
+        detect_face=None,
+        decide=evaluate_state,
+        log=lambda state: record_state(state, csv_logger, status_server),
+        alert=lambda alert: raise_alert(alert, alarm_manager, clip_recorder),
+        fusion_interval=DATA_LOG_INTERVAL,
+        services=[backend] + services,
+        read_vision=read_vision,
+        filter_vitals=VitalsFilter() if FILTER_VITALS else None,
+    )
+
+def run_multithreaded(pipeline=None):
     """
     Runs the monitoring system using multiple threads for performance.
 
-    This ensures efficient operation of the monitoring loop and allows for
-    simultaneous processing of different tasks.
+    The oximeter and the camera are read by independent workers, a fusion stage 
+    combines their latest readings and decides on alerts, and logging and alerts 
+    run in their own consumers, so a slow stage never delays the others. The rate 
+    of every stage is logged periodically, and all metrics are served on 
+    METRICS_PORT. The pipeline is stopped cleanly on 
+    KeyboardInterrupt. How long the startup steps took is logged once it runs.
+
+    Parameters:
+    - pipeline (pipeline.Pipeline, optional): Pipeline to run instead of build_pipeline().
+    """
+    if pipeline is None:
+        pipeline = build_pipeline()
+    pipeline.start()
+    startup.report()
+    try:
+        pipeline.wait(report_interval=STATS_INTERVAL)
+    finally:
+        pipeline.stop()
+        pipeline.report()
+
+def run_multiprocess():
+    """
+    Runs the monitoring system with the oximeter and the camera in their own 
+    processes (see multiprocess_mode.py), so signal processing and vision use 
+    separate cores and interpreters. Crashed or hung worker processes are restarted.
+    """
+    run_multithreaded(build_multiprocess_pipeline())
+
+# ===========================
+# asyncio Setup
+# ===========================
+def build_orchestrator(devices=None):
+    """
+    Builds the asyncio orchestrator of the monitoring system.
+
+    Parameters:
+    - devices (optional): Device layer to use instead of the oximeter and camera 
+      (e.g. fakes.FakeMonitorDevices).
+
+    Returns:
+    - async_orchestrator.Orchestrator: The orchestrator, not started yet.
+    """
+    from async_orchestrator import Orchestrator, MonitorDevices
+
+    startup.background("audio", init_audio)
+    if devices is None:
+        # opened by the orchestrator, which reports the startup once they are ready
+        devices = MonitorDevices(PPG_SOURCE, PPG_RECORD_TO, PPG_REPLAY_SPEED, schedule=VISION_SCHEDULER,
+                                 startup=startup, sensor_thread=SENSOR_THREAD,
+                                 sensor_burst=SENSOR_BURST)
+    # face checks requested by evaluate_state are forwarded to the devices' scheduler
+    evaluator.vision_scheduler = devices if VISION_SCHEDULER else None
+    alarm_manager, csv_logger, services = build_services()
+    clip_recorder = build_clip_recorder(services)
+    status_server = build_status_server(services, alarm_manager)
+    return Orchestrator(
+        devices,
+        decide=evaluate_state,
+        log=lambda state: record_state(state, csv_logger, status_server),
+        alert=lambda alert: raise_alert(alert, alarm_manager, clip_recorder),
+        vision_interval=MOTION_INTERVAL if VISION_SCHEDULER else VISION_INTERVAL,
+        log_interval=DATA_LOG_INTERVAL,
+        report_interval=STATS_INTERVAL,
+        services=services,
+        filter_vitals=VitalsFilter() if FILTER_VITALS else None,
+        on_frame=frame_listener(clip_recorder, status_server),
+    )
+
+def run_async():
+    """
+    Runs the monitoring system on an asyncio event loop.
+
+    Sensor reads, frame capture and detection run in their own threads with 
+    per-stage timeouts, so a hung I2C bus or camera only stalls its own task. 
+    SIGINT and SIGTERM stop the tasks and close the devices gracefully.
     """
-    monitor_thread = threading.Thread(target=monitoring_loop)
-    monitor_thread.start()
-    monitor_thread.join()
+    import asyncio
+
+    orchestrator = build_orchestrator()
+    asyncio.run(orchestrator.run())
+    orchestrator.report()
+
+# ===========================
+# Multi-Crib Hub
+# ===========================
+def run_hub():
+    """
+    Monitors several cribs, configured in hub.HUB_CONFIG, from this process (see 
+    hub.py): the oximeters share a few polling threads, the frames of all cribs are 
+    analyzed in batches on a worker pool, and every crib keeps its own decision state, 
+    log file and alarm.
+    """
+    import hub  # hub.py builds on this module
+
+    hub.run_hub()
 
 # ===========================
 # Main Execution
 # ===========================
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Baby sleep monitoring system.")
+    parser.add_argument("--mode", choices=("threads", "processes", "async", "serial", "hub"), default="threads",
+                        help="threads: one process (default); processes: oximeter and camera in their own "
+                             "processes; async: asyncio orchestrator; serial: the original single loop; hub: several cribs "
+                             "configured in hub.json")
+    args = parser.parse_args()
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     try:
-        run_multithreaded()  # Start the monitoring system
+        # Start the monitoring system
+        if args.mode == "processes":
+            run_multiprocess()
+        elif args.mode == "async":
+            run_async()
+        elif args.mode == "serial":
+            monitoring_loop()
+        elif args.mode == "hub":
+            run_hub()
+        else:
+            run_multithreaded()
     except KeyboardInterrupt:
-        print("Shutting down the monitoring system...")
+        logger.info("Shutting down the monitoring system...")
@@ -2,10 +2,20 @@
 
 # this code is currently for python 2.7
 from __future__ import print_function
-from time import sleep
+from time import sleep, time
 
-import RPi.GPIO as GPIO
-import smbus
+import numpy as np
+
+# the hardware libraries only exist on the Pi; without them a bus and a gpio
+# backend have to be passed to MAX30102 (see fakes.py)
+try:
+    import RPi.GPIO as GPIO
+except ImportError:
+    GPIO = None
+try:
+    import smbus
+except ImportError:
+    smbus = None
 
 # i2c address-es
 # not required?
@@ -44,24 +54,61 @@ REG_PART_ID = 0xFF
 # currently not used
 MAX_BRIGHTNESS = 255
 
+# FIFO geometry
+FIFO_DEPTH = 32  # samples
+SAMPLE_BYTES = 6  # 3 bytes red + 3 bytes ir in SpO2 mode
+# most smbus drivers limit a block read to 32 bytes, i.e. 5 whole samples
+I2C_BLOCK_MAX = 32
+
+# RESET bit of the mode configuration register, cleared by the device once the reset is done
+MODE_RESET = 0x40
+# longest wait for the reset to complete (the fixed wait used before) and polling step (seconds)
+RESET_TIMEOUT = 1.0
+RESET_POLL_INTERVAL = 0.002
+
+# bounded back-off used while polling the interrupt pin (seconds)
+POLL_MIN_DELAY = 0.0005
+POLL_MAX_DELAY = 0.005
+
+
+def decode_samples(data):
+    """
+    Decode raw FIFO bytes into an (n, 2) array of [red, ir] samples.
+    Each value is 3 bytes, MSB first, masked to 18 bits.
+    """
+    raw = np.asarray(data, dtype=np.uint32).reshape(-1, 3)
+    values = (raw[:, 0] << 16 | raw[:, 1] << 8 | raw[:, 2]) & 0x03FFFF
+    return values.reshape(-1, 2)
+
 
 class MAX30102():
     # by default, this assumes that physical pin 7 (GPIO 4) is used as interrupt
     # by default, this assumes that the device is at 0x57 on channel 1
-    def __init__(self, channel=1, address=0x57, gpio_pin=7):
+    # bus and gpio can be injected (e.g. fakes.FakeSMBus / fakes.FakeGPIO) to run without hardware
+    def __init__(self, channel=1, address=0x57, gpio_pin=7, bus=None, gpio=None):
         print("Channel: {0}, address: 0x{1:x}".format(channel, address))
         self.address = address
         self.channel = channel
-        self.bus = smbus.SMBus(self.channel)
+        if (bus is None and smbus is None) or (gpio is None and GPIO is None):
+            raise RuntimeError("smbus and RPi.GPIO are required unless bus and gpio are given")
+        self.bus = smbus.SMBus(self.channel) if bus is None else bus
+        self.gpio = GPIO if gpio is None else gpio
         self.interrupt = gpio_pin
+        # samples lost because the FIFO overflowed, accumulated over read_fifo_burst() calls
+        self.overflow_count = 0
+        self.last_overflow = 0
+        # samples drained by a burst read but not yet returned by read_sequential()
+        self._burst_pending = np.zeros((0, 2), dtype=np.uint32)
 
         # set gpio mode
-        GPIO.setmode(GPIO.BOARD)
-        GPIO.setup(self.interrupt, GPIO.IN)
+        self.gpio.setmode(self.gpio.BOARD)
+        self.gpio.setup(self.interrupt, self.gpio.IN)
 
         self.reset()
 
-        sleep(1)  # wait 1 sec
+        # poll for the end of the reset instead of always waiting 1 sec
+        if not self.wait_reset():
+            print("[SETUP] reset not confirmed after {0} s".format(RESET_TIMEOUT))
 
         # read & clear interrupt register (read 1 byte)
         reg_data = self.bus.read_i2c_block_data(self.address, REG_INTR_STATUS_1, 1)
@@ -80,7 +127,21 @@ class MAX30102():
         Reset the device, this will clear all settings,
         so after running this, run setup() again.
         """
-        self.bus.write_i2c_block_data(self.address, REG_MODE_CONFIG, [0x40])
+        self.bus.write_i2c_block_data(self.address, REG_MODE_CONFIG, [MODE_RESET])
+
+    def wait_reset(self, timeout=RESET_TIMEOUT):
+        """
+        Wait until the device clears the RESET bit of the mode register.
+        Returns True once the reset is done, False after TIMEOUT seconds.
+        """
+        deadline = time() + timeout
+        while True:
+            mode = self.bus.read_i2c_block_data(self.address, REG_MODE_CONFIG, 1)[0]
+            if not mode & MODE_RESET:
+                return True
+            if time() >= deadline:
+                return False
+            sleep(RESET_POLL_INTERVAL)
 
     def setup(self, led_mode=0x03):
         """
@@ -141,17 +202,85 @@ class MAX30102():
 
         return red_led, ir_led
 
-    def read_sequential(self, amount=100):
+    def read_fifo_pointers(self):
+        """
+        Read FIFO_WR_PTR, OVF_COUNTER and FIFO_RD_PTR in a single transaction
+        (the three registers are contiguous).
+        """
+        wr_ptr, ovf, rd_ptr = self.bus.read_i2c_block_data(self.address, REG_FIFO_WR_PTR, 3)
+        return wr_ptr & 0x1F, ovf & 0x1F, rd_ptr & 0x1F
+
+    def read_fifo_burst(self):
+        """
+        Drain every sample queued in the FIFO.
+        The number of samples is computed from the write/read pointers and they are
+        read with as few block reads as the bus allows, then decoded in one step.
+        Returns an (n, 2) np.array of [red, ir] samples (n may be 0).
+        """
+        # read & clear both interrupt status registers at once
+        self.bus.read_i2c_block_data(self.address, REG_INTR_STATUS_1, 2)
+
+        wr_ptr, ovf, rd_ptr = self.read_fifo_pointers()
+        self.last_overflow = ovf
+        self.overflow_count += ovf
+        if ovf:
+            # samples were lost, so the FIFO is full (wr_ptr == rd_ptr)
+            n_samples = FIFO_DEPTH
+        else:
+            n_samples = (wr_ptr - rd_ptr) % FIFO_DEPTH
+
+        per_read = I2C_BLOCK_MAX // SAMPLE_BYTES
+        data = []
+        for start in range(0, n_samples, per_read):
+            count = min(per_read, n_samples - start)
+            data.extend(self.bus.read_i2c_block_data(self.address, REG_FIFO_DATA, count * SAMPLE_BYTES))
+
+        return decode_samples(data)
+
+    def wait_for_interrupt(self, timeout=1.0):
+        """
+        Wait until the interrupt pin is pulled low (data available) without spinning.
+        This sleeps on the falling edge when the GPIO backend supports it and
+        otherwise polls the pin with a bounded back-off.
+        Returns True when data is available, False on timeout.
+        """
+        if self.gpio.input(self.interrupt) == 0:
+            return True
+
+        deadline = time() + timeout
+        try:
+            channel = self.gpio.wait_for_edge(self.interrupt, self.gpio.FALLING,
+                                              timeout=max(1, int(timeout * 1000)))
+            # the pin may have gone low between the first check and the edge wait
+            return channel is not None or self.gpio.input(self.interrupt) == 0
+        except (AttributeError, RuntimeError):
+            # no edge support, or edge detection already used for this pin
+            pass
+
+        delay = POLL_MIN_DELAY
+        while self.gpio.input(self.interrupt) == 1:
+            remaining = deadline - time()
+            if remaining <= 0:
+                return False
+            sleep(min(delay, remaining))
+            delay = min(delay * 2, POLL_MAX_DELAY)
+        return True
+
+    def read_sequential(self, amount=100, burst=False):
         """
         This function will read the red-led and ir-led `amount` times.
         This works as blocking function.
+        With burst=True the FIFO is drained with read_fifo_burst() on each
+        interrupt; samples beyond `amount` are kept for the next call.
         """
+        if burst:
+            return self._read_sequential_burst(amount)
+
         red_buf = []
         ir_buf = []
         for i in range(amount):
-            while(GPIO.input(self.interrupt) == 1):
+            while not self.wait_for_interrupt():
                 # wait for interrupt signal, which means the data is available
-                # do nothing here
                 pass
 
             red, ir = self.read_fifo()
@@ -160,3 +289,18 @@ class MAX30102():
             ir_buf.append(ir)
 
         return red_buf, ir_buf
+
+    def _read_sequential_burst(self, amount):
+        blocks = [self._burst_pending]
+        available = self._burst_pending.shape[0]
+        while available < amount:
+            while not self.wait_for_interrupt():
+                pass
+            block = self.read_fifo_burst()
+            blocks.append(block)
+            available += block.shape[0]
+
+        samples = np.concatenate(blocks)
+        self._burst_pending = samples[amount:]
+        samples = samples[:amount]
+        return samples[:, 0].tolist(), samples[:, 1].tolist()
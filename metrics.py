@@ -0,0 +1,343 @@
+# ===========================
+# Metrics Module
+# ===========================
+"""
+Lightweight metrics for the monitoring system: counters, gauges and timing histograms,
+plus a local HTTP endpoint that serves a JSON snapshot of them.
+
+Metrics are created on first use in a process-wide registry and looked up by name:
+
+    metrics.counter("alarm.raised").inc()
+    metrics.gauge("queue.vitals", lambda: q.qsize())    # sampled when read
+    with metrics.timer("sensor.read"):                   # histogram, milliseconds
+        red, ir = m.read_sequential()
+
+A gauge stays bound to the first function given for its name, so components that can
+exist more than once in a process (e.g. per crib in hub.py) put a scope in their
+metric names with scoped().
+
+Recording a value costs one lock acquisition and a bisect into fixed buckets, a few
+microseconds, so the instrumentation can stay on all night. Histograms keep counts per
+bucket (plus count, sum, min and max) rather than samples, so their memory does not
+grow with the run time; percentiles are estimated from the buckets.
+
+    curl http://127.0.0.1:8765/metrics
+"""
+
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Global Variables
+# ===========================
+HOST = "127.0.0.1"  # only reachable from the Pi itself
+PORT = 8765
+# upper bounds (milliseconds) of the histogram buckets, roughly x2 apart
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+PERCENTILES = (50, 95, 99)
+
+# ===========================
+# Metric Types
+# ===========================
+class Counter:
+    """
+    Monotonically increasing count of events.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    """
+    Current value of something. With FUNCTION, the value is read from it when the
+    gauge is sampled (e.g. a queue depth), otherwise it is the last set() value.
+    """
+
+    def __init__(self, function=None):
+        self.function = function
+        self.value = None
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        if self.function is None:
+            return self.value
+        try:
+            return self.function()
+        except Exception:
+            return None
+
+
+class Histogram:
+    """
+    Distribution of observed values over fixed buckets.
+
+    Parameters:
+    buckets (tuple): Increasing bucket upper bounds; larger values go to an overflow
+        bucket.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def percentile(self, q):
+        """
+        Estimated Q-th percentile: the upper bound of the bucket holding it (the
+        maximum for the overflow bucket).
+        """
+        if not self.count:
+            return None
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        with self._lock:
+            result = {
+                "count": self.count,
+                "mean": self.sum / self.count if self.count else None,
+                "min": self.min,
+                "max": self.max,
+                "buckets": {str(b): c for b, c in zip(self.buckets + ("inf",), self.counts)},
+            }
+        for q in PERCENTILES:
+            result[f"p{q}"] = self.percentile(q)
+        return result
+
+# ===========================
+# Registry
+# ===========================
+class MetricsRegistry:
+    """
+    Named counters, gauges and histograms.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name, kind, *args):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(name, kind(*args))
+        if not isinstance(metric, kind):
+            raise TypeError(f"Metric {name} is a {type(metric).__name__}, not a {kind.__name__}")
+        return metric
+
+    def counter(self, name):
+        return self._get(name, Counter)
+
+    def gauge(self, name, function=None):
+        """
+        Returns gauge NAME, bound to FUNCTION if it is not bound yet. Binding an already
+        bound gauge to another function is refused (with a warning): the second
+        instance of a component would otherwise take over the gauge of the first one.
+        """
+        gauge = self._get(name, Gauge)
+        if function is not None:
+            with self._lock:
+                if gauge.function is None:
+                    gauge.function = function
+                elif gauge.function is not function:
+                    logger.warning("Gauge %s is already bound, give the new instance its own scope", name)
+        return gauge
+
+    def histogram(self, name, buckets=BUCKETS):
+        return self._get(name, Histogram, buckets)
+
+    @contextmanager
+    def timer(self, name):
+        """
+        Records the duration of the block, in milliseconds, in histogram NAME.
+        """
+        histogram = self.histogram(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.observe((time.perf_counter() - started) * 1000.0)
+
+    def timed(self, name):
+        """
+        Decorator recording the duration of every call in histogram NAME.
+        """
+        def decorator(function):
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return function(*args, **kwargs)
+            wrapper.__name__ = function.__name__
+            wrapper.__doc__ = function.__doc__
+            wrapper.__wrapped__ = function
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """
+        Returns:
+        dict: {"uptime": seconds, "counters": {...}, "gauges": {...}, "histograms": {...}}
+        """
+        result = {"timestamp": time.time(), "uptime": time.time() - self.started,
+                  "counters": {}, "gauges": {}, "histograms": {}}
+        with self._lock:
+            items = sorted(self._metrics.items())
+        for name, metric in items:
+            if isinstance(metric, Counter):
+                result["counters"][name] = metric.snapshot()
+            elif isinstance(metric, Gauge):
+                result["gauges"][name] = metric.snapshot()
+            else:
+                result["histograms"][name] = metric.snapshot()
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+        self.started = time.time()
+
+
+registry = MetricsRegistry()  # process-wide registry used by the functions below
+
+
+def scoped(name, scope=None):
+    """
+    Metric NAME within SCOPE (e.g. "hub.crib1"), or NAME itself without a scope.
+    """
+    return f"{scope}.{name}" if scope else name
+
+
+def counter(name):
+    return registry.counter(name)
+
+
+def gauge(name, function=None):
+    return registry.gauge(name, function)
+
+
+def histogram(name, buckets=BUCKETS):
+    return registry.histogram(name, buckets)
+
+
+def timer(name):
+    return registry.timer(name)
+
+
+def timed(name):
+    return registry.timed(name)
+
+
+def snapshot():
+    return registry.snapshot()
+
+# ===========================
+# HTTP Endpoint
+# ===========================
+def _handler_class():
+    """
+    Request handler of the endpoint. http.server is only imported once a server starts,
+    so importing this module stays cheap.
+    """
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = json.dumps(self.server.registry.snapshot(), default=str).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("metrics endpoint: " + format, *args)
+
+    return MetricsHandler
+
+
+class MetricsServer:
+    """
+    Serves the registry snapshot as JSON on http://HOST:PORT/metrics from a background
+    thread. Has the start()/stop() lifecycle of the pipeline services.
+
+    Parameters:
+    registry (MetricsRegistry): Registry to serve.
+    host (str): Interface to bind; the default only accepts local connections.
+    port (int): TCP port (0 picks a free one, see `address`).
+    """
+
+    def __init__(self, registry=registry, host=HOST, port=PORT):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address if self._server else None
+
+    def start(self):
+        """
+        Starts serving. If the port cannot be bound (e.g. it is in use), the error is
+        logged and the monitor runs without the endpoint.
+        """
+        from http.server import ThreadingHTTPServer
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), _handler_class())
+        except OSError as e:
+            logger.error("Metrics endpoint unavailable on %s:%d: %s", self.host, self.port, e)
+            return
+        self._server.daemon_threads = True
+        self._server.registry = self.registry
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        logger.info("Metrics available on http://%s:%d/metrics", *self.address[:2])
+
+    def stop(self, timeout=None):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join(timeout)
+            self._server = None
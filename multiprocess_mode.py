@@ -0,0 +1,665 @@
+# ===========================
+# Multi-process Mode Module
+# ===========================
+"""
+Runs the signal and vision paths in separate processes so they do not share one
+interpreter lock.
+
+- the vitals process owns the pulse oximeter: it reads sample blocks, feeds the
+  streaming HR/SpO2 estimator and publishes the blocks and the readings;
+- the vision process owns the camera: it captures frames, runs the motion detector and
+  the (scheduled) face cascade and publishes the frames and the vision results;
+- the main process keeps the rest of the pipeline (fusion, decisions, logging, alarm)
+  and reads the results through ProcessBackend.read_vitals / read_vision, which plug
+  into pipeline.Pipeline in place of the device workers.
+
+Everything crosses the process boundary through shared_ring.SharedRing buffers in
+shared memory, never through pickling: sample blocks, readings, frames and vision
+results. The stop and face-check requests are SharedFlag bytes, which unlike a
+multiprocessing.Event have no lock that a killed worker could leave held.
+
+A Supervisor thread in the main process restarts a worker process that died, or that
+stopped refreshing the heartbeat of its output ring (e.g. stuck in an I2C read), with
+an exponential back-off, and raises an alert once a worker failed RESTART_ALERT_AFTER
+times in a row. A worker that exits by itself has run out of input (the end of a PPG
+recording) and is not restarted, which is also alerted. Worker processes are started with the "spawn" method, so a
+restart never forks the threads of the main process.
+
+Each worker process has its own metrics registry; the main process publishes the
+restart count, ring counts and heartbeat age of every worker ("mp.<worker>.*").
+
+    python multiprocess_mode.py --compare --seconds 30    # threads vs processes
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import secrets
+import signal
+import threading
+import time
+
+import numpy as np
+
+import hrcalc
+import metrics
+from pipeline import VitalsReading, VisionReading
+from shared_ring import SharedRing
+from vision_scheduler import SceneState
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Global Variables
+# ===========================
+FRAME_SHAPE = (360, 640, 3)  # camera frames (rows, columns, RGB), see night_vision_camera
+FRAME_SLOTS = 4  # frames kept in shared memory
+SAMPLE_BLOCK = hrcalc.SAMPLE_FREQ  # samples per published block (one second)
+SAMPLE_SLOTS = 64  # sample blocks kept (about a minute)
+READING_SLOTS = 64  # vitals and vision results kept
+MOTION_INTERVAL = 0.2  # seconds between two frames analyzed by the vision process
+READ_TIMEOUT = 1.0  # seconds read_vitals/read_vision wait before returning None
+SUPERVISE_INTERVAL = 1.0  # seconds between two checks of the workers
+HEARTBEAT_TIMEOUT = 10.0  # seconds without a heartbeat after which a worker is restarted
+STARTUP_GRACE = 30.0  # seconds a new worker may take to import and open its device
+RESTART_BACKOFF = 1.0  # seconds before the first restart, doubled after every crash
+MAX_RESTART_BACKOFF = 60.0
+STABLE_AFTER = 60.0  # seconds of uptime after which a worker's back-off is reset
+RESTART_ALERT_AFTER = 3  # consecutive failures of a worker after which an alert is raised
+
+# columns of the rings of results
+VITALS_FIELDS = ("oxygen_level", "oxygen_level_ok", "heart_rate", "heart_rate_ok", "quality")
+VISION_FIELDS = ("face_detected", "motion_detected", "motion_magnitude", "confidence", "face_age",
+                 "frame_seq", "cascade_ran")
+
+# ===========================
+# Shared Flag
+# ===========================
+class SharedFlag:
+    """
+    Lock-free flag shared with the worker processes, with the is_set/set/clear/wait
+    interface of threading.Event. wait() polls.
+
+    Parameters:
+    context (multiprocessing context): Used to allocate the shared byte.
+    """
+
+    def __init__(self, context):
+        self._value = context.RawValue("b", 0)
+
+    def is_set(self):
+        return bool(self._value.value)
+
+    def set(self):
+        self._value.value = 1
+
+    def clear(self):
+        self._value.value = 0
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while not self.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(remaining, 0.05))
+        return True
+
+# ===========================
+# Worker Processes
+# ===========================
+def _init_worker(log_level):
+    logging.basicConfig(level=log_level, format="%(asctime)s %(levelname)s %(processName)s %(name)s: %(message)s")
+    # Ctrl+C reaches the whole process group: the main process stops the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def vitals_worker(rings, source, record_to, speed, stop_event, log_level=logging.INFO, threaded=False,
+                  burst=False):
+    """
+    Entry point of the vitals process: sensor acquisition and HR/SpO2 estimation.
+
+    Parameters:
+    rings (dict): SharedRing.spec() of the "samples" and "vitals" rings.
+    source, record_to, speed, threaded, burst: See pulse_oximeter_reader.initialize_pulse_oximeter.
+    stop_event (SharedFlag): Set by the main process to stop.
+    log_level (int): Logging level of the process.
+    """
+    import hrcalc_stream
+    from pulse_oximeter_reader import initialize_pulse_oximeter, read_samples, _record_reading, QUALITY_GATE
+
+    _init_worker(log_level)
+    samples = SharedRing(*rings["samples"])
+    readings = SharedRing(*rings["vitals"])
+    try:
+        m = initialize_pulse_oximeter(source, record_to, speed, threaded, burst)
+        estimator = hrcalc_stream.StreamingHrSpo2Estimator(SAMPLE_BLOCK, quality_gate=QUALITY_GATE)
+        block = np.empty((SAMPLE_BLOCK, 2), np.uint32)
+        while not stop_event.is_set():
+            readings.beat()
+            samples_read = read_samples(m, SAMPLE_BLOCK, burst)
+            if samples_read is None:
+                estimator.reset()  # the samples around an I2C error are not contiguous
+                continue
+            red, ir = samples_read
+            block[:, 0] = red
+            block[:, 1] = ir
+            samples.write(block)
+            with metrics.timer("hrcalc"):
+                results = list(estimator.extend(red, ir))
+            for oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok in results:
+                quality = estimator.last_quality
+                _record_reading(oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok, quality)
+                readings.write((oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok, quality.score))
+    except EOFError:
+        logger.info("End of the PPG recording")
+    finally:
+        samples.close()
+        readings.close()
+
+
+def vision_worker(rings, camera, interval, schedule, check_event, stop_event, log_level=logging.INFO):
+    """
+    Entry point of the vision process: frame capture, motion and face detection.
+
+    Parameters:
+    rings (dict): SharedRing.spec() of the "frames" and "vision" rings.
+    camera (optional): Picklable camera object (e.g. fakes.FakeCamera); None opens the
+        Picamera2 through night_vision_camera.initialize_camera.
+    interval (float): Minimum seconds between two analyzed frames.
+    schedule (bool): Gate the face cascade with a vision_scheduler.VisionScheduler
+        (otherwise it runs on every frame).
+    check_event (SharedFlag): Set by the main process to request a face check.
+    stop_event (SharedFlag): Set by the main process to stop.
+    log_level (int): Logging level of the process.
+    """
+    import night_vision_camera
+    from frame_producer import Frame
+    from vision_scheduler import VisionScheduler
+
+    _init_worker(log_level)
+    frames = SharedRing(*rings["frames"])
+    readings = SharedRing(*rings["vision"])
+    try:
+        night_vision_camera.initialize_camera(camera)
+        camera = night_vision_camera.camera
+        scheduler = VisionScheduler(night_vision_camera.face_detection, night_vision_camera.monitor_motion)
+        captured = 0
+        shape_warned = False
+        next_time = time.monotonic()
+        while not stop_event.is_set():
+            readings.beat()
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                stop_event.wait(delay)
+                continue
+            next_time = time.monotonic() + interval
+
+            with metrics.timer("camera.capture"):
+                image = camera.capture_array()
+            timestamp = time.time()
+            captured += 1
+            if image.shape == frames.shape:
+                frame_seq = frames.write(image, timestamp)
+            else:
+                frame_seq = -1
+                if not shape_warned:
+                    logger.warning("Frames of shape %s are not shared (expected %s)", image.shape, frames.shape)
+                    shape_warned = True
+            frame = Frame(image, captured, timestamp)
+
+            if schedule:
+                if check_event.is_set():
+                    check_event.clear()
+                    scheduler.request_check("vitals")
+                scene = scheduler.update(frame, timestamp)
+                row = (scene.face_detected, scene.motion_detected, scene.motion_magnitude or 0.0,
+                       scene.confidence, scene.face_age, frame_seq, scene.cascade_ran)
+            else:
+                motion = night_vision_camera.monitor_motion(frame)
+                face = night_vision_camera.face_detection(frame)
+                row = (face, bool(motion), getattr(motion, "magnitude", 0.0), 1.0, 0.0, frame_seq, True)
+            readings.write(row, timestamp)
+    finally:
+        frames.close()
+        readings.close()
+
+# ===========================
+# Supervisor
+# ===========================
+class WorkerProcess:
+    """
+    One supervised worker: how to start it and the ring that carries its heartbeat.
+
+    Parameters:
+    name (str): Worker name (also the process name).
+    target (callable): Module-level entry point (picklable for the spawn method).
+    args (tuple): Arguments of TARGET.
+    heartbeat (shared_ring.SharedRing): Ring whose heartbeat the worker refreshes.
+    """
+
+    def __init__(self, name, target, args, heartbeat):
+        self.name = name
+        self.target = target
+        self.args = args
+        self.heartbeat = heartbeat
+        self.process = None
+        self.launched = None  # time.time() of the last start
+        self.restarts = 0
+        self.failures = 0  # crashes since the worker was last stable
+        self.next_start = 0.0  # time.monotonic() before which it is not restarted
+        self.ended = False  # exited by itself, not restarted
+
+
+class Supervisor:
+    """
+    Starts the worker processes and restarts the ones that die or hang. Has the
+    start()/stop() lifecycle of the pipeline services.
+
+    Parameters:
+    workers (list): WorkerProcess objects.
+    stop_event (SharedFlag): Flag the workers watch; set on stop().
+    context (multiprocessing context): Used to create the processes.
+    interval (float): See SUPERVISE_INTERVAL.
+    heartbeat_timeout (float): See HEARTBEAT_TIMEOUT.
+    startup_grace (float): See STARTUP_GRACE.
+    alert (callable, optional): alert(key, message), e.g. AlarmManager.raise_alert;
+        without it the failures are only logged.
+    """
+
+    def __init__(self, workers, stop_event, context, interval=SUPERVISE_INTERVAL,
+                 heartbeat_timeout=HEARTBEAT_TIMEOUT, startup_grace=STARTUP_GRACE, alert=None):
+        self.workers = list(workers)
+        self.stop_event = stop_event
+        self.context = context
+        self.interval = interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.startup_grace = startup_grace
+        self.alert = alert
+        self._stopping = threading.Event()
+        self._thread = None
+        for worker in self.workers:
+            metrics.gauge(f"mp.{worker.name}.restarts", lambda w=worker: w.restarts)
+            metrics.gauge(f"mp.{worker.name}.heartbeat_age",
+                          lambda w=worker: time.time() - w.heartbeat.heartbeat if w.heartbeat.heartbeat else None)
+
+    def _launch(self, worker):
+        worker.process = self.context.Process(target=worker.target, args=worker.args, name=worker.name, daemon=True)
+        worker.process.start()
+        worker.launched = time.time()
+        logger.info("Started %s process (pid %d)", worker.name, worker.process.pid)
+
+    @staticmethod
+    def _terminate(process):
+        process.terminate()
+        process.join(1.0)
+        if process.is_alive():
+            process.kill()  # e.g. stuck in uninterruptible I/O or stopped
+            process.join(1.0)
+
+    def _alert(self, worker, message):
+        metrics.counter(f"mp.{worker.name}.alerts").inc()
+        if self.alert is not None:
+            self.alert(f"process-{worker.name}", message)
+
+    def _hung(self, worker):
+        last_sign = max(worker.heartbeat.heartbeat, worker.launched + self.startup_grace)
+        return time.time() - last_sign > self.heartbeat_timeout
+
+    def check(self, worker):
+        """
+        Restarts WORKER if it is due; called periodically by the supervisor thread.
+        """
+        if worker.ended:
+            return
+        process = worker.process
+        if process is None:
+            if time.monotonic() >= worker.next_start:
+                worker.restarts += 1
+                metrics.counter(f"mp.{worker.name}.restart").inc()
+                self._launch(worker)
+            return
+        if process.is_alive():
+            if not self._hung(worker):
+                if time.time() - worker.launched > STABLE_AFTER:
+                    worker.failures = 0
+                return
+            logger.error("%s process stopped responding, terminating it", worker.name)
+            self._terminate(process)
+        elif process.exitcode == 0:
+            # its input ended (e.g. a PPG recording): restarting it would replay it
+            logger.error("%s process ended, not restarting it", worker.name)
+            worker.process = None
+            worker.ended = True
+            self._alert(worker, f"The {worker.name} process ended")
+            return
+        else:
+            logger.error("%s process exited with code %s", worker.name, process.exitcode)
+        delay = min(MAX_RESTART_BACKOFF, RESTART_BACKOFF * 2 ** worker.failures)
+        worker.failures += 1
+        worker.process = None
+        worker.next_start = time.monotonic() + delay
+        logger.info("Restarting %s process in %.0f s", worker.name, delay)
+        if worker.failures >= RESTART_ALERT_AFTER:
+            self._alert(worker, f"The {worker.name} process failed {worker.failures} times in a row, "
+                                f"restarting it in {delay:.0f} s")
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            for worker in self.workers:
+                try:
+                    self.check(worker)
+                except Exception as e:
+                    logger.error("Error supervising %s: %s", worker.name, e)
+
+    def start(self):
+        for worker in self.workers:
+            self._launch(worker)
+        self._thread = threading.Thread(target=self._run, name="supervisor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Asks the workers to stop and waits for them, terminating the ones that do not exit.
+        """
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.stop_event.set()
+        for worker in self.workers:
+            process = worker.process
+            if process is None:
+                continue
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning("%s process did not stop, terminating it", worker.name)
+                self._terminate(process)
+
+# ===========================
+# Main-process Side
+# ===========================
+class ProcessBackend:
+    """
+    Creates the shared rings and the supervised worker processes, and turns their
+    output back into pipeline readings. Has the start()/stop() lifecycle of the
+    pipeline services; stop() also frees the shared memory.
+
+    Parameters:
+    ppg_source, ppg_record_to, ppg_speed: See pulse_oximeter_reader.initialize_pulse_oximeter.
+    camera (optional): See vision_worker.
+    motion_interval (float): See MOTION_INTERVAL.
+    schedule (bool): See vision_worker.
+    frame_shape (tuple): Shape of the shared frames.
+    log_level (int): Logging level of the worker processes.
+    read_timeout (float): See READ_TIMEOUT.
+    alert (callable, optional): See Supervisor.
+    sensor_thread, sensor_burst (bool): See the THREADED and BURST options of
+        initialize_pulse_oximeter.
+    """
+
+    def __init__(self, ppg_source=None, ppg_record_to=None, ppg_speed=1.0, camera=None,
+                 motion_interval=MOTION_INTERVAL, schedule=True, frame_shape=FRAME_SHAPE,
+                 log_level=logging.INFO, read_timeout=READ_TIMEOUT, alert=None, sensor_thread=False,
+                 sensor_burst=False):
+        self.schedule = schedule
+        self.read_timeout = read_timeout
+        prefix = f"sm{os.getpid()}{secrets.token_hex(3)}"
+        self.rings = {
+            "samples": SharedRing(f"{prefix}_samples", SAMPLE_SLOTS, (SAMPLE_BLOCK, 2), np.uint32, create=True),
+            "vitals": SharedRing(f"{prefix}_vitals", READING_SLOTS, (len(VITALS_FIELDS),), np.float64, create=True),
+            "frames": SharedRing(f"{prefix}_frames", FRAME_SLOTS, frame_shape, np.uint8, create=True),
+            "vision": SharedRing(f"{prefix}_vision", READING_SLOTS, (len(VISION_FIELDS),), np.float64, create=True),
+        }
+        specs = {name: ring.spec() for name, ring in self.rings.items()}
+        context = multiprocessing.get_context("spawn")
+        self.stop_event = SharedFlag(context)
+        self.check_event = SharedFlag(context)
+        self.supervisor = Supervisor([
+            WorkerProcess("vitals", vitals_worker,
+                          ({"samples": specs["samples"], "vitals": specs["vitals"]}, ppg_source, ppg_record_to,
+                           ppg_speed, self.stop_event, log_level, sensor_thread, sensor_burst),
+                          self.rings["vitals"]),
+            WorkerProcess("vision", vision_worker,
+                          ({"frames": specs["frames"], "vision": specs["vision"]}, camera, motion_interval, schedule,
+                           self.check_event, self.stop_event, log_level),
+                          self.rings["vision"]),
+        ], self.stop_event, context, alert=alert)
+        self._last = {"vitals": -1, "vision": -1}
+        for name, ring in self.rings.items():
+            metrics.gauge(f"mp.ring.{name}", lambda r=ring: r.count)
+
+    def start(self):
+        self.supervisor.start()
+
+    def stop(self, timeout=2.0):
+        self.supervisor.stop(timeout)
+        for ring in self.rings.values():
+            ring.close()
+
+    def _next(self, name):
+        """
+        Waits for a new result in ring NAME and returns the newest one, or None.
+        """
+        ring = self.rings[name]
+        if not ring.wait(self._last[name], self.read_timeout):
+            return None
+        latest = ring.latest()
+        skipped = latest[0] - self._last[name] - 1
+        if skipped > 0 and self._last[name] >= 0:
+            metrics.counter(f"mp.{name}.skipped").inc(skipped)
+        self._last[name] = latest[0]
+        return latest
+
+    def read_vitals(self):
+        """
+        Returns:
+        pipeline.VitalsReading: The newest reading of the vitals process, or None if none
+        arrived within READ_TIMEOUT.
+        """
+        latest = self._next("vitals")
+        if latest is None:
+            return None
+        _, timestamp, row = latest
+        oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok, quality = row.tolist()
+        return VitalsReading(timestamp, oxygen_level, bool(oxygen_level_ok), heart_rate, bool(heart_rate_ok), quality)
+
+    def read_vision(self):
+        """
+        Returns:
+        pipeline.VisionReading: The newest result of the vision process (with a
+        SceneState when it schedules the cascade), or None if none arrived within
+        READ_TIMEOUT.
+        """
+        latest = self._next("vision")
+        if latest is None:
+            return None
+        _, timestamp, row = latest
+        face, motion, magnitude, confidence, face_age, frame_seq, cascade_ran = row.tolist()
+        scene = None
+        if self.schedule:
+            scene = SceneState(timestamp, bool(face), confidence, face_age, bool(motion), bool(cascade_ran), None,
+                               magnitude)
+        return VisionReading(timestamp, bool(face), bool(motion), int(frame_seq), scene)
+
+    def request_check(self, reason="requested"):
+        """
+        Asks the vision process for a face check on its next frame, like
+        VisionScheduler.request_check.
+        """
+        self.check_event.set()
+
+    def latest_frame(self):
+        """
+        Returns:
+        frame_producer.Frame: Copy of the newest shared frame, or None.
+        """
+        from frame_producer import Frame
+
+        latest = self.rings["frames"].latest()
+        if latest is None:
+            return None
+        seq, timestamp, image = latest
+        return Frame(image, seq, timestamp)
+
+    def sample_blocks(self, after_seq=-1):
+        """
+        Raw sensor blocks published after AFTER_SEQ.
+
+        Returns:
+        tuple: (list of (seq, timestamp, (SAMPLE_BLOCK, 2) red/IR array), number of
+        blocks already overwritten)
+        """
+        return self.rings["samples"].read_since(after_seq)
+
+# ===========================
+# Mode Comparison
+# ===========================
+def _percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None}
+    return {"p50": round(float(np.percentile(values, 50)), 3), "p95": round(float(np.percentile(values, 95)), 3)}
+
+
+def _comparison_camera(frame_shape=FRAME_SHAPE):
+    import cv2
+    import fakes
+
+    image = cv2.imread(os.path.join(os.path.dirname(os.path.abspath(__file__)), "baby_face_detection_proof.png"))
+    image = cv2.cvtColor(cv2.resize(image, (frame_shape[1], frame_shape[0])), cv2.COLOR_BGR2RGB)
+    # a few shifted copies so that the motion detector sees movement
+    frames = [image] + [np.roll(image, 8 * k, axis=1) for k in range(1, 4)]
+    return fakes.FakeCamera(frames=frames, fps=30)
+
+
+def run_mode(mode, seconds, ppg_speed=4.0, motion_interval=0.0):
+    """
+    Runs the pipeline with a synthetic night and a fake camera for SECONDS.
+
+    Parameters:
+    mode (str): "threads" (pipeline.Pipeline in one process) or "processes".
+    seconds (float): Duration of the run.
+    ppg_speed (float): Replay speed of the synthetic PPG (4 gives four readings per second).
+    motion_interval (float): Seconds between two analyzed frames (0: as fast as possible).
+
+    Returns:
+    dict: Reading rates (per second) and lag (seconds) of the delivered readings and of
+    the readings used by the fusion stage.
+    """
+    import night_vision_camera
+    import ppg_recording
+    from frame_producer import FrameProducer
+    from pipeline import Pipeline
+    from pulse_oximeter_reader import initialize_pulse_oximeter, stream_pulse_oximeter_data, VitalsReader
+    from vision_scheduler import VisionScheduler
+
+    delivery = {"vitals": [], "vision": []}
+    decision = {"vitals": [], "vision": []}
+
+    def timed(name, read):
+        def wrapper():
+            reading = read()
+            if reading is not None:
+                delivery[name].append(time.time() - reading.timestamp)
+            return reading
+        return wrapper
+
+    def decide(state):
+        if state.vitals_age is not None:
+            decision["vitals"].append(state.vitals_age)
+        if state.vision_age is not None:
+            decision["vision"].append(state.vision_age)
+        return []
+
+    camera = _comparison_camera()
+    if mode == "threads":
+        m = initialize_pulse_oximeter(ppg_recording.SYNTHETIC, speed=ppg_speed)
+        stream = stream_pulse_oximeter_data(m)
+        night_vision_camera.initialize_camera(camera)
+        # the vitals worker stamps its readings itself, so only the vision lag is measured
+        pipeline = Pipeline(
+            read_vitals=VitalsReader(stream),
+            producer=FrameProducer(camera),
+            detect_face=night_vision_camera.face_detection,
+            decide=decide, log=lambda state: None, alert=lambda alert: None,
+            vision_interval=motion_interval,
+            vision_scheduler=VisionScheduler(night_vision_camera.face_detection, night_vision_camera.monitor_motion,
+                                             metrics_scope=mode),
+            metrics_scope=mode,
+        )
+        vision_worker = next(stage for stage in pipeline.stages if stage.name == "vision")
+        vision_worker.output = _TimedQueue(vision_worker.output, delivery["vision"])
+    else:
+        backend = ProcessBackend(ppg_recording.SYNTHETIC, ppg_speed=ppg_speed, camera=camera,
+                                 motion_interval=motion_interval, log_level=logging.WARNING)
+        pipeline = Pipeline(
+            read_vitals=timed("vitals", backend.read_vitals), producer=None, detect_face=None,
+            decide=decide, log=lambda state: None, alert=lambda alert: None,
+            services=[backend], read_vision=timed("vision", backend.read_vision),
+            metrics_scope=mode,
+        )
+
+    pipeline.start()
+    started = time.monotonic()
+    time.sleep(seconds)
+    stats = pipeline.stats()
+    elapsed = time.monotonic() - started
+    pipeline.stop()
+
+    report = {"mode": mode, "seconds": round(elapsed, 1)}
+    for name in ("vitals", "vision"):
+        report[f"{name}_rate"] = round(stats[name]["count"] / elapsed, 2)
+        report[f"{name}_delivery_lag"] = _percentiles(delivery[name])
+        report[f"{name}_decision_age"] = _percentiles(decision[name])
+    return report
+
+
+class _TimedQueue:
+    """
+    Queue wrapper recording the age of every reading put into it.
+    """
+
+    def __init__(self, q, lags):
+        self._q = q
+        self._lags = lags
+
+    def __getattr__(self, name):
+        return getattr(self._q, name)
+
+    def put_nowait(self, item):
+        self._q.put_nowait(item)
+        self._lags.append(time.time() - item.timestamp)
+
+
+def compare(seconds, ppg_speed=4.0, motion_interval=0.0):
+    """
+    Runs both modes one after the other on the same synthetic input.
+
+    Returns:
+    list: The run_mode() reports.
+    """
+    return [run_mode(mode, seconds, ppg_speed, motion_interval) for mode in ("threads", "processes")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the threaded and the multi-process monitoring modes.")
+    parser.add_argument("--compare", action="store_true", help="run both modes and report rates and lag")
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--ppg-speed", type=float, default=4.0)
+    parser.add_argument("--motion-interval", type=float, default=0.0)
+    args = parser.parse_args(argv)
+    if not args.compare:
+        parser.error("nothing to do (use --compare, or main.py --mode processes to monitor)")
+
+    logging.basicConfig(level=logging.WARNING)
+    print(f"{os.cpu_count()} CPU(s)")
+    for report in compare(args.seconds, args.ppg_speed, args.motion_interval):
+        print(f"{report['mode']}: {report['seconds']} s")
+        for name in ("vitals", "vision"):
+            delivery, age = report[f"{name}_delivery_lag"], report[f"{name}_decision_age"]
+            print(f"  {name:6s} {report[f'{name}_rate']:6.2f}/s, delivery lag p50 {delivery['p50']} s "
+                  f"p95 {delivery['p95']} s, age at decision p50 {age['p50']} s p95 {age['p95']} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,19 @@
+import logging
+
 import cv2
-from picamera2 import Picamera2
-import numpy as np
+
+import metrics
+from face_detector import FaceDetector
+from motion_detector import MotionDetector
+
+# Picamera2 only exists on the Pi; elsewhere frames have to come from another
+# camera object (e.g. fakes.FakeCamera through frame_producer.FrameProducer)
+try:
+    from picamera2 import Picamera2
+except ImportError:
+    Picamera2 = None
+
+logger = logging.getLogger(__name__)
 
 # ===========================
 # Night Vision Camera Module
@@ -16,104 +29,97 @@ pulse oximeter and alarm components to provide a comprehensive monitoring soluti
 # Global Variables
 # ===========================
 camera = None  # Camera object for capturing frames
-back_sub = None  # Background subtractor for motion detection
-kernel_open = np.ones((5, 5), np.uint8)  # Kernel for morphological opening
-kernel_dilate = np.ones((10, 10), np.uint8)  # Kernel for dilation
+MOTION_MODE = "fast"  # "fast" or "reference" motion detection (see motion_detector.py)
+motion_detector = None  # MotionDetector, created with the camera
+back_sub = None  # Background subtractor for motion detection (the motion detector's)
+face_detector = None  # FaceDetector, loaded on first use and reused afterwards
 
 # ===========================
 # Night Vision Camera Functions
 # ===========================
-def initialize_camera():
+def initialize_camera(source=None):
     """
     Initializes the night vision camera and configures it for real-time monitoring.
     
     This function sets up the camera resolution, format, and background subtractor 
     for motion detection.
+
+    Parameters:
+    source (optional): Already configured camera object to use instead of the 
+        Picamera2 (e.g. fakes.FakeCamera).
     """
-    global camera, back_sub
-    print("Initializing night vision camera...")
-
-    # Initialize the Picamera2 object
-    camera = Picamera2()
-    camera.preview_configuration.main.size = (640, 360)  # Set resolution
-    camera.preview_configuration.main.format = "RGB888"  # Set color format
-    camera.preview_configuration.align()
-    camera.configure("preview")  # Configure the camera for preview mode
-    camera.start()
-
-    # Create a background subtractor for motion detection
-    back_sub = cv2.createBackgroundSubtractorMOG2(
-        history=100, varThreshold=15, detectShadows=False
-    )
-
-def monitor_motion():
+    global camera, back_sub, motion_detector
+    logger.info("Initializing night vision camera...")
+
+    if source is not None:
+        camera = source
+    else:
+        if Picamera2 is None:
+            raise RuntimeError("picamera2 is not installed; pass a camera source instead")
+        # Initialize the Picamera2 object
+        camera = Picamera2()
+        camera.preview_configuration.main.size = (640, 360)  # Set resolution
+        camera.preview_configuration.main.format = "RGB888"  # Set color format
+        camera.preview_configuration.align()
+        camera.configure("preview")  # Configure the camera for preview mode
+        camera.start()
+
+    # Create the motion detector and its background subtractor
+    motion_detector = MotionDetector(MOTION_MODE)
+    back_sub = motion_detector.back_sub
+
+@metrics.timed("vision.motion")
+def monitor_motion(frame=None):
     """
     Detects motion using the night vision camera feed.
 
-    This function applies background subtraction and contour analysis to determine 
-    if motion is present in the frame. The size of detected contours is used to 
-    filter noise.
+    This function applies background subtraction to determine if motion is present 
+    in the frame. The size of the moving regions is used to filter noise. In the 
+    default "fast" MOTION_MODE the frame is downscaled first and the contour analysis 
+    is skipped when too few pixels changed; the "reference" mode runs the original 
+    full-resolution pipeline (see motion_detector.py).
+
+    Parameters:
+    frame (frame_producer.Frame or np.ndarray, optional): Frame to analyze. If omitted, 
+        a new frame is captured from the camera.
 
     Returns:
-    bool: True if motion is detected, False otherwise.
+    motion_detector.MotionResult: Truthy if motion is detected, with the motion 
+    magnitude and the bounding box of the moving regions.
     """
-    global camera, back_sub, kernel_open, kernel_dilate
-
-    motion_detected = False
+    global camera, motion_detector
 
     # Capture a frame from the camera
-    frame = camera.capture_array()
+    if frame is None:
+        frame = camera.capture_array()
 
-    # Convert the frame to grayscale and enhance contrast
-    gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
-    equilized = cv2.equalizeHist(gray)
+    return motion_detector.detect(frame)
 
-    # Apply background subtraction
-    fgmask = back_sub.apply(equilized)
-
-    # Perform morphological operations to clean up the mask
-    fgmask = cv2.morphologyEx(fgmask, cv2.MORPH_OPEN, kernel_open)
-    fgmask = cv2.morphologyEx(fgmask, cv2.MORPH_DILATE, kernel_dilate)
-
-    # Threshold the mask to extract binary regions
-    _, thresh = cv2.threshold(fgmask, 100, 255, cv2.THRESH_BINARY)
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    # Analyze contours to detect significant motion
-    for contour in contours:
-        if cv2.contourArea(contour) > 5000:  # Adjust threshold as needed
-            motion_detected = True
-
-    return motion_detected
-
-def face_detection():
+@metrics.timed("vision.face_detection")
+def face_detection(frame=None):
     """
     Detects faces in the camera feed using Haar cascades.
 
     This function analyzes the camera frames for the presence of faces, which helps 
     confirm the baby's presence in the monitored area and assess asphyxia risk.
 
+    Parameters:
+    frame (frame_producer.Frame or np.ndarray, optional): Frame to analyze. If omitted, 
+        a new frame is captured from the camera.
+
     Returns:
     bool: True if a face is detected, False otherwise.
     """
-    global camera
-    face_cascade = cv2.CascadeClassifier(
-        '/home/pi/Documents/finalproject/iot_final_project/haarcascade_frontalface_default (1).xml'
-    )
-
-    face_detected = False
+    global camera, face_detector
+    if face_detector is None:
+        face_detector = FaceDetector()  # Load the Haar cascade only once
 
     # Capture a frame from the camera
-    frame = camera.capture_array()
-    gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)  # Convert to grayscale
-
-    # Detect faces in the frame
-    faces = face_cascade.detectMultiScale(
-        gray, scaleFactor=1.1, minNeighbors=4
-    )
+    if frame is None:
+        frame = camera.capture_array()
 
-    if len(faces) > 0:
-        face_detected = True
+    # Detect faces on a downscaled frame, searching around the last face first
+    face_detected = face_detector(frame)
 
     return face_detected
 
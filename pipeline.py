@@ -0,0 +1,499 @@
+# ===========================
+# Monitoring Pipeline Module
+# ===========================
+"""
+Concurrent monitoring pipeline.
+
+The serial monitoring loop reads the oximeter, then runs face detection, then writes the
+log, then sleeps, so one slow stage delays all the others. Here every stage runs in its
+own thread and the stages are connected by small bounded queues:
+
+    VitalsWorker  --vitals-->  \\
+                                FusionStage --states--> Consumer("logger")
+    VisionWorker  --vision-->  /            --alerts--> Consumer("alerts")
+
+- VitalsWorker and VisionWorker produce readings as fast as their source allows.
+- FusionStage keeps the latest reading of each producer together with its age, builds a
+  FusedState at a fixed interval, asks a decision function for alerts and forwards the
+  state to the logger and the alerts to the alert consumer.
+- the two consumers run the (possibly slow) log and alert sinks off the decision path.
+- with `read_vision`, a VisionSourceWorker replaces the VisionWorker and only forwards
+  readings produced elsewhere (see multiprocess_mode.py, where the devices live in
+  their own processes).
+
+Queues never block a producer: when a queue is full its oldest item is dropped (and
+counted), because only the freshest data matters for the decision. Every stage keeps a
+StageStats with its rate and busy time so it is visible where the time goes; step
+durations, queue depths and drop counts are also published in the metrics registry.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Global Variables
+# ===========================
+QUEUE_SIZE = 8  # capacity of the queues between stages
+FUSION_INTERVAL = 1.0  # seconds between two fused states
+VITALS_MAX_AGE = 10.0  # seconds after which a vitals reading is considered stale
+VISION_MAX_AGE = 5.0  # seconds after which a vision reading is considered stale
+ERROR_BACKOFF = 1.0  # seconds a stage waits after an unexpected error
+RATE_WINDOW = 60.0  # seconds over which stage rates are computed
+
+# quality: signal_quality score (0 to 1) of the window, when the source provides it
+# filtered_*: values after vitals_filter.VitalsFilter, when the pipeline filters the readings
+VitalsReading = namedtuple(
+    "VitalsReading",
+    ["timestamp", "oxygen_level", "oxygen_level_ok", "heart_rate", "heart_rate_ok", "quality",
+     "filtered_oxygen_level", "filtered_heart_rate"],
+    defaults=(None, None, None)
+)
+# scene: vision_scheduler.SceneState when the vision worker runs a scheduler
+VisionReading = namedtuple(
+    "VisionReading", ["timestamp", "face_detected", "motion_detected", "frame_seq", "scene"], defaults=(None,)
+)
+FusedState = namedtuple(
+    "FusedState", ["timestamp", "vitals", "vision", "vitals_age", "vision_age", "vitals_fresh", "vision_fresh"]
+)
+Alert = namedtuple("Alert", ["timestamp", "key", "message"])
+
+# ===========================
+# Helpers
+# ===========================
+def put_latest(q, item):
+    """
+    Puts ITEM in the bounded queue Q without blocking, dropping the oldest item if Q is full.
+
+    Returns:
+    int: Number of items dropped (0 or 1).
+    """
+    dropped = 0
+    while True:
+        try:
+            q.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                q.get_nowait()
+                dropped += 1
+            except queue.Empty:
+                pass
+
+
+def fuse(now, vitals, vision):
+    """
+    Builds the FusedState at time NOW of the latest VITALS and VISION readings (either
+    may be None).
+    """
+    vitals_age = None if vitals is None else now - vitals.timestamp
+    vision_age = None if vision is None else now - vision.timestamp
+    return FusedState(
+        now, vitals, vision, vitals_age, vision_age,
+        vitals_age is not None and vitals_age <= VITALS_MAX_AGE,
+        vision_age is not None and vision_age <= VISION_MAX_AGE,
+    )
+
+
+def drain(q):
+    """
+    Returns every item currently in Q, oldest first, without blocking.
+    """
+    items = []
+    while True:
+        try:
+            items.append(q.get_nowait())
+        except queue.Empty:
+            return items
+
+
+class StageStats:
+    """
+    Throughput and timing of one pipeline stage.
+
+    Attributes:
+    count (int): Items processed since start.
+    errors (int): Unexpected errors caught.
+    dropped (int): Items dropped from the stage's output queue(s).
+    busy_time (float): Seconds spent processing items.
+    last_duration (float): Seconds spent on the last item.
+
+    Parameters:
+    name (str): Stage name.
+    metrics_scope (str, optional): Scope of the stage's metrics (see metrics.scoped).
+    """
+
+    def __init__(self, name, metrics_scope=None):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.dropped = 0
+        self.busy_time = 0.0
+        self.last_duration = 0.0
+        self.started = time.monotonic()
+        self._recent = deque(maxlen=1000)  # completion times of recent items
+        self._histogram = metrics.histogram(metrics.scoped(f"stage.{name}", metrics_scope))
+        metrics.gauge(metrics.scoped(f"stage.{name}.dropped", metrics_scope), lambda: self.dropped)
+        metrics.gauge(metrics.scoped(f"stage.{name}.errors", metrics_scope), lambda: self.errors)
+
+    def record(self, duration):
+        now = time.monotonic()
+        self.count += 1
+        self.busy_time += duration
+        self.last_duration = duration
+        self._recent.append(now)
+        self._histogram.observe(duration * 1000.0)
+
+    def rate(self, window=RATE_WINDOW):
+        """
+        Items per second over the last WINDOW seconds.
+        """
+        now = time.monotonic()
+        span = min(window, now - self.started)
+        if span <= 0:
+            return 0.0
+        recent = sum(1 for t in self._recent if now - t <= window)
+        return recent / span
+
+    def snapshot(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "count": self.count,
+            "rate": round(self.rate(), 3),
+            "busy": round(self.busy_time / elapsed, 3),
+            "last_ms": round(self.last_duration * 1000.0, 1),
+            "errors": self.errors,
+            "dropped": self.dropped,
+        }
+
+    def __str__(self):
+        s = self.snapshot()
+        return (f"{self.name}: {s['rate']:.2f}/s, last {s['last_ms']:.1f} ms, busy {s['busy']:.0%}, "
+                f"errors {s['errors']}, dropped {s['dropped']}")
+
+# ===========================
+# Stages
+# ===========================
+class Stage(threading.Thread):
+    """
+    Base class of a pipeline stage: calls step() until the shared stop event is set.
+
+    step() returns True when it processed an item (timed in the stage stats) and False
+    when it had nothing to do. A step that first waits for its input calls mark() once
+    the input is there, so that the waiting time is not counted as busy time.
+    """
+
+    def __init__(self, name, stop_event, metrics_scope=None):
+        super().__init__(name=name, daemon=True)
+        self.stop_event = stop_event
+        self.stats = StageStats(name, metrics_scope)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.mark()
+            try:
+                processed = self.step()
+            except Exception as e:
+                self.stats.errors += 1
+                logger.error("Error in %s: %s", self.name, e)
+                self.stop_event.wait(ERROR_BACKOFF)
+                continue
+            if processed:
+                self.stats.record(time.perf_counter() - self._work_started)
+
+    def mark(self):
+        """
+        Starts timing the work of the current step.
+        """
+        self._work_started = time.perf_counter()
+
+    def step(self):
+        raise NotImplementedError
+
+
+class VitalsWorker(Stage):
+    """
+    Reads the pulse oximeter and publishes VitalsReading items.
+
+    Parameters:
+    read (callable): Returns (oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok[, quality]),
+        e.g. a bound get_pulse_oximeter_data or the next() of stream_pulse_oximeter_data, 
+        or a complete VitalsReading (which keeps its own timestamp), or None when no 
+        reading arrived.
+    output (queue.Queue): Destination queue.
+    filter_vitals (callable, optional): VitalsReading -> VitalsReading applied to every 
+        reading before it is published (e.g. a vitals_filter.VitalsFilter).
+    """
+
+    def __init__(self, read, output, stop_event, filter_vitals=None, metrics_scope=None):
+        super().__init__("vitals", stop_event, metrics_scope)
+        self.read = read
+        self.output = output
+        self.filter_vitals = filter_vitals
+
+    def step(self):
+        reading = self.read()
+        if reading is None:
+            return False
+        if isinstance(reading, VitalsReading):
+            self.mark()  # produced elsewhere: waiting for it is not work of this stage
+        else:
+            reading = VitalsReading(time.time(), *reading)
+        if self.filter_vitals is not None:
+            reading = self.filter_vitals(reading)
+        self.stats.dropped += put_latest(self.output, reading)
+        return True
+
+
+class VisionSourceWorker(Stage):
+    """
+    Publishes VisionReading items produced elsewhere (e.g. by another process).
+
+    Parameters:
+    read (callable): Returns the next VisionReading, or None when none arrived
+        (it should wait a little rather than return None immediately).
+    output (queue.Queue): Destination queue.
+    """
+
+    def __init__(self, read, output, stop_event, metrics_scope=None):
+        super().__init__("vision", stop_event, metrics_scope)
+        self.read = read
+        self.output = output
+
+    def step(self):
+        reading = self.read()
+        if reading is None:
+            return False
+        self.mark()
+        self.stats.dropped += put_latest(self.output, reading)
+        return True
+
+
+class VisionWorker(Stage):
+    """
+    Runs the detectors on every new frame of a frame producer and publishes VisionReading items.
+
+    Parameters:
+    producer (frame_producer.FrameProducer): Frame source.
+    detect_face (callable): frame -> bool.
+    output (queue.Queue): Destination queue.
+    detect_motion (callable, optional): frame -> bool.
+    interval (float): Minimum seconds between two analyzed frames.
+    scheduler (vision_scheduler.VisionScheduler, optional): Decides per frame whether
+        the face detector runs; replaces DETECT_FACE and DETECT_MOTION when given.
+    """
+
+    def __init__(self, producer, detect_face, output, stop_event, detect_motion=None, interval=1.0,
+                 scheduler=None, metrics_scope=None):
+        super().__init__("vision", stop_event, metrics_scope)
+        self.producer = producer
+        self.detect_face = detect_face
+        self.detect_motion = detect_motion
+        self.scheduler = scheduler
+        self.output = output
+        self.interval = interval
+        self._last_seq = 0
+        self._next_time = 0.0
+
+    def step(self):
+        delay = self._next_time - time.monotonic()
+        if delay > 0:
+            self.stop_event.wait(delay)
+            return False
+        frame = self.producer.wait_for_frame(self._last_seq, timeout=1.0)
+        if frame is None:
+            return False
+        self.mark()
+        self._last_seq = frame.seq
+        self._next_time = time.monotonic() + self.interval
+
+        if self.scheduler is not None:
+            scene = self.scheduler.update(frame, frame.timestamp)
+            reading = VisionReading(frame.timestamp, scene.face_detected, scene.motion_detected, frame.seq, scene)
+        else:
+            motion = self.detect_motion(frame) if self.detect_motion else None
+            reading = VisionReading(frame.timestamp, self.detect_face(frame), motion, frame.seq)
+        self.stats.dropped += put_latest(self.output, reading)
+        return True
+
+
+class FusionStage(Stage):
+    """
+    Combines the latest vitals and vision readings and decides on alerts.
+
+    Parameters:
+    vitals (queue.Queue): VitalsReading input.
+    vision (queue.Queue): VisionReading input.
+    decide (callable): FusedState -> list of Alert (or (key, message) tuples).
+    states (queue.Queue): FusedState output, for the logger.
+    alerts (queue.Queue): Alert output.
+    interval (float): Seconds between two fused states.
+    """
+
+    def __init__(self, vitals, vision, decide, states, alerts, stop_event, interval=FUSION_INTERVAL,
+                 metrics_scope=None):
+        super().__init__("fusion", stop_event, metrics_scope)
+        self.vitals = vitals
+        self.vision = vision
+        self.decide = decide
+        self.states = states
+        self.alerts = alerts
+        self.interval = interval
+        self.latest_vitals = None
+        self.latest_vision = None
+        self.latest_state = None
+        self._next_time = time.monotonic()
+
+    def step(self):
+        delay = self._next_time - time.monotonic()
+        if delay > 0:
+            self.stop_event.wait(delay)
+            return False
+        self._next_time += self.interval
+
+        for reading in drain(self.vitals):
+            self.latest_vitals = reading
+        for reading in drain(self.vision):
+            self.latest_vision = reading
+
+        state = self.fuse(time.time())
+        self.latest_state = state
+        for alert in self.decide(state) or ():
+            if not isinstance(alert, Alert):
+                alert = Alert(state.timestamp, *alert)
+            self.stats.dropped += put_latest(self.alerts, alert)
+        self.stats.dropped += put_latest(self.states, state)
+        return True
+
+    def fuse(self, now):
+        return fuse(now, self.latest_vitals, self.latest_vision)
+
+
+class Consumer(Stage):
+    """
+    Passes every item of a queue to a handler, e.g. the data logger or the alarm.
+    """
+
+    def __init__(self, name, source, handle, stop_event, metrics_scope=None):
+        super().__init__(name, stop_event, metrics_scope)
+        self.source = source
+        self.handle = handle
+
+    def step(self):
+        try:
+            item = self.source.get(timeout=0.5)
+        except queue.Empty:
+            return False
+        self.mark()
+        self.handle(item)
+        return True
+
+# ===========================
+# Pipeline
+# ===========================
+class Pipeline:
+    """
+    Wires the stages together.
+
+    Parameters:
+    read_vitals (callable): See VitalsWorker.
+    producer (frame_producer.FrameProducer): Frame source; started and stopped with the pipeline.
+    detect_face (callable): See VisionWorker.
+    decide (callable): See FusionStage.
+    log (callable): Called with every FusedState.
+    alert (callable): Called with every Alert.
+    detect_motion (callable, optional): See VisionWorker.
+    vision_interval (float): See VisionWorker.
+    fusion_interval (float): See FusionStage.
+    services (list): Objects with start() and stop(timeout) (e.g. the alarm manager)
+        started before and stopped after the stages.
+    vision_scheduler (vision_scheduler.VisionScheduler, optional): See VisionWorker.
+    read_vision (callable, optional): See VisionSourceWorker. Replaces the vision worker 
+        (PRODUCER, DETECT_FACE and DETECT_MOTION are then unused and may be None).
+    filter_vitals (callable, optional): See VitalsWorker.
+    metrics_scope (str, optional): Scope of the stage and queue metrics (see metrics.scoped),
+        for a pipeline that is not the only one of the process.
+    """
+
+    def __init__(self, read_vitals, producer, detect_face, decide, log, alert,
+                 detect_motion=None, vision_interval=1.0, fusion_interval=FUSION_INTERVAL,
+                 queue_size=QUEUE_SIZE, services=(), vision_scheduler=None, read_vision=None,
+                 filter_vitals=None, metrics_scope=None):
+        self.stop_event = threading.Event()
+        self.producer = producer
+        self.services = list(services)
+        vitals_q = queue.Queue(queue_size)
+        vision_q = queue.Queue(queue_size)
+        states_q = queue.Queue(queue_size)
+        alerts_q = queue.Queue(queue_size)
+        self.queues = {"vitals": vitals_q, "vision": vision_q, "states": states_q, "alerts": alerts_q}
+        for name, q in self.queues.items():
+            metrics.gauge(metrics.scoped(f"queue.{name}", metrics_scope), q.qsize)
+
+        self.fusion = FusionStage(vitals_q, vision_q, decide, states_q, alerts_q, self.stop_event,
+                                  interval=fusion_interval, metrics_scope=metrics_scope)
+        if read_vision is not None:
+            vision_worker = VisionSourceWorker(read_vision, vision_q, self.stop_event, metrics_scope=metrics_scope)
+        else:
+            vision_worker = VisionWorker(producer, detect_face, vision_q, self.stop_event, detect_motion=detect_motion,
+                                         interval=vision_interval, scheduler=vision_scheduler,
+                                         metrics_scope=metrics_scope)
+        self.stages = [
+            VitalsWorker(read_vitals, vitals_q, self.stop_event, filter_vitals=filter_vitals,
+                         metrics_scope=metrics_scope),
+            vision_worker,
+            self.fusion,
+            Consumer("logger", states_q, log, self.stop_event, metrics_scope=metrics_scope),
+            Consumer("alerts", alerts_q, alert, self.stop_event, metrics_scope=metrics_scope),
+        ]
+
+    def start(self):
+        for service in self.services:
+            service.start()
+        if self.producer is not None and not self.producer.is_alive():
+            self.producer.start()
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self, timeout=2.0):
+        """
+        Signals every stage to stop and waits up to TIMEOUT seconds for each of them.
+        Stages blocked in a device read are daemon threads and do not keep the process alive.
+        """
+        self.stop_event.set()
+        if self.producer is not None:
+            self.producer.stop(timeout)
+        for stage in self.stages:
+            if stage.is_alive():
+                stage.join(timeout)
+        for service in reversed(self.services):
+            service.stop(timeout)
+
+    def stats(self):
+        """
+        Returns the stats of every stage and the current queue depths.
+        """
+        report = {stage.name: stage.stats.snapshot() for stage in self.stages}
+        report["queues"] = {name: q.qsize() for name, q in self.queues.items()}
+        return report
+
+    def report(self):
+        """
+        Logs the rate of every stage.
+        """
+        for stage in self.stages:
+            logger.info("%s", stage.stats)
+        logger.info("Queue depths: " + ", ".join(f"{n}={q.qsize()}" for n, q in self.queues.items()))
+
+    def wait(self, report_interval=60.0):
+        """
+        Blocks until the pipeline is stopped, logging the stage rates every REPORT_INTERVAL seconds.
+        """
+        while not self.stop_event.wait(report_interval):
+            self.report()
@@ -0,0 +1,384 @@
+# ===========================
+# PPG Recording and Replay Module
+# ===========================
+"""
+Records raw red/IR samples from the MAX30102 and replays them without hardware.
+
+- RecordingMAX30102 wraps a sensor and appends every sample returned by
+  read_sequential() (or read_fifo()/read_fifo_burst()) to a PpgRecorder.
+- ReplayMAX30102 has the same interface as max30102.MAX30102 and streams a recording
+  (or any red/IR arrays) in real time, at N times real time or as fast as possible.
+- synthetic_ppg() generates a PPG-like night with a slowly drifting heart rate, so the
+  signal path can be exercised without any recording at all.
+
+Recording format (little endian):
+
+    header   8 bytes MAGIC, float64 sample rate
+    records  float64 timestamp (seconds since the epoch), uint32 red, uint32 ir
+
+read_sequential() returns a whole buffer at once, so the samples of a buffer are
+timestamped backwards from the time the buffer was returned, one sample period apart.
+
+Usage:
+    python ppg_recording.py record night.ppg --seconds 3600
+    python ppg_recording.py synthesize night.ppg --seconds 3600 [--heart-rate 130]
+    python ppg_recording.py info night.ppg
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+import hrcalc
+import max30102
+
+# ===========================
+# Global Variables
+# ===========================
+MAGIC = b"PPGREC\x00\x01"  # format name and version
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("sample_rate", "<f8")])
+RECORD_DTYPE = np.dtype([("timestamp", "<f8"), ("red", "<u4"), ("ir", "<u4")])
+SAMPLE_RATE = hrcalc.SAMPLE_FREQ  # samples per second delivered by the sensor
+SYNTHETIC = "synthetic"  # initialize_pulse_oximeter source name for a generated night
+
+# ===========================
+# Recording
+# ===========================
+class PpgRecorder:
+    """
+    Appends timestamped red/IR samples to a recording file.
+
+    Parameters:
+    path (str): Recording file. A new file gets a header; an existing one is appended to.
+    sample_rate (float): Samples per second, stored in the header.
+    """
+
+    def __init__(self, path, sample_rate=SAMPLE_RATE):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.samples = 0
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "ab")
+        if new:
+            self._file.write(np.array([(MAGIC, sample_rate)], dtype=HEADER_DTYPE).tobytes())
+
+    def write(self, red, ir, timestamps=None):
+        """
+        Appends a buffer of samples.
+
+        Parameters:
+        red (sequence): Red LED samples.
+        ir (sequence): IR LED samples.
+        timestamps (sequence, optional): Time of every sample. By default the last
+            sample is stamped now and the others one sample period apart before it.
+        """
+        n = len(red)
+        if n == 0:
+            return
+        records = np.empty(n, dtype=RECORD_DTYPE)
+        if timestamps is None:
+            timestamps = time.time() - np.arange(n - 1, -1, -1) / self.sample_rate
+        records["timestamp"] = timestamps
+        records["red"] = red
+        records["ir"] = ir
+        self._file.write(records.tobytes())
+        self.samples += n
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_recording(path):
+    """
+    Maps a recording file without reading it.
+
+    Returns:
+    tuple: (sample rate, np.memmap of RECORD_DTYPE records)
+    """
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if header.shape[0] == 0 or header["magic"][0] != MAGIC:
+        raise ValueError(f"{path} is not a PPG recording")
+    count = (os.path.getsize(path) - HEADER_DTYPE.itemsize) // RECORD_DTYPE.itemsize
+    if count <= 0:
+        return float(header["sample_rate"][0]), np.zeros(0, dtype=RECORD_DTYPE)
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_DTYPE.itemsize, shape=(count,))
+    return float(header["sample_rate"][0]), records
+
+
+class RecordingMAX30102:
+    """
+    Wraps a MAX30102 (or a ReplayMAX30102) and records every sample read through it.
+    Any other attribute is forwarded to the wrapped device.
+
+    Parameters:
+    device: Sensor to read from.
+    recorder (PpgRecorder or str): Recorder, or the path of a recording to create.
+    """
+
+    def __init__(self, device, recorder):
+        self.device = device
+        self.recorder = recorder if isinstance(recorder, PpgRecorder) else PpgRecorder(recorder)
+
+    def __getattr__(self, name):
+        return getattr(self.device, name)
+
+    def read_fifo(self):
+        red, ir = self.device.read_fifo()
+        self.recorder.write([red], [ir])
+        return red, ir
+
+    def read_fifo_burst(self):
+        samples = self.device.read_fifo_burst()
+        self.recorder.write(samples[:, 0], samples[:, 1])
+        return samples
+
+    def read_sequential(self, amount=100, burst=False):
+        red, ir = self.device.read_sequential(amount, burst=burst)
+        self.recorder.write(red, ir)
+        return red, ir
+
+    def shutdown(self):
+        self.recorder.close()
+        self.device.shutdown()
+
+# ===========================
+# Replay
+# ===========================
+class ReplayMAX30102:
+    """
+    Drop-in replacement for max30102.MAX30102 that replays recorded samples.
+
+    Samples become available at the pace of their recorded timestamps divided by
+    SPEED, starting when the device is created (or reset). Reads block like on the
+    real sensor. Once the recording is exhausted, wait_for_interrupt() returns False
+    and reads raise EOFError, unless LOOP is set.
+
+    Parameters:
+    source (str or tuple): Recording path, or (red, ir) sample arrays.
+    speed (float, optional): Replay speed relative to real time; None replays as fast
+        as possible.
+    loop (bool): Restart from the beginning at the end of the recording.
+    sample_rate (float, optional): Sample rate of (red, ir) arrays (recordings carry
+        theirs in the header).
+    clock (callable): Monotonic time source.
+    sleep (callable): Sleep function, replaceable together with CLOCK.
+    """
+
+    def __init__(self, source, speed=1.0, loop=False, sample_rate=None, clock=time.monotonic, sleep=time.sleep):
+        if isinstance(source, (str, os.PathLike)):
+            rate, records = load_recording(source)
+            self.red = records["red"]
+            self.ir = records["ir"]
+            offsets = records["timestamp"] - records["timestamp"][0] if records.shape[0] else np.zeros(0)
+        else:
+            rate = sample_rate or SAMPLE_RATE
+            self.red = np.asarray(source[0], dtype=np.uint32)
+            self.ir = np.asarray(source[1], dtype=np.uint32)
+            offsets = np.arange(self.red.shape[0]) / rate
+        if self.red.shape[0] == 0:
+            raise ValueError("Nothing to replay")
+        self.sample_rate = rate
+        self.speed = speed
+        self.loop = loop
+        self.clock = clock
+        self.sleep = sleep
+        self.offsets = np.asarray(offsets, dtype=np.float64)
+        self.span = self.offsets[-1] + 1.0 / rate  # duration of one pass
+
+        self.overflow_count = 0
+        self.last_overflow = 0
+        self.interrupt = None
+        self.reset()
+
+    # ---------------------------
+    # Sensor interface
+    # ---------------------------
+    def reset(self):
+        self.position = 0  # index of the next sample to return
+        self.started = self.clock()
+
+    def setup(self, led_mode=0x03):
+        pass
+
+    def set_config(self, reg, value):
+        pass
+
+    def shutdown(self):
+        pass
+
+    def wait_for_interrupt(self, timeout=1.0):
+        """
+        Sleeps until the next sample is due, at most TIMEOUT seconds.
+        Returns True when a sample is available.
+        """
+        if self.exhausted:
+            self.sleep(timeout)
+            return False
+        wait = self._due(self.position) - self.clock()
+        if wait > 0:
+            self.sleep(min(wait, timeout))
+        return self._due(self.position) <= self.clock()
+
+    def read_fifo(self):
+        red, ir = self.read_sequential(1)
+        return red[0], ir[0]
+
+    def read_fifo_burst(self):
+        """
+        Returns every sample that is due, as an (n, 2) array. Like the real FIFO, only
+        the last FIFO_DEPTH samples are kept; older ones are counted as overflow.
+        """
+        due = self._due_count()
+        self.last_overflow = max(0, due - self.position - max30102.FIFO_DEPTH)
+        self.overflow_count += self.last_overflow
+        self.position += self.last_overflow
+        indexes = self._indexes(self.position, due)
+        self.position = due
+        return np.column_stack((self.red[indexes], self.ir[indexes]))
+
+    def read_sequential(self, amount=100, burst=False):
+        """
+        Returns the next AMOUNT (red, ir) samples as lists, once the last one is due.
+        """
+        end = self.position + amount
+        if not self.loop and end > self.red.shape[0]:
+            raise EOFError("End of the PPG recording")
+        wait = self._due(end - 1) - self.clock()
+        if wait > 0:
+            self.sleep(wait)
+        indexes = self._indexes(self.position, end)
+        self.position = end
+        return self.red[indexes].tolist(), self.ir[indexes].tolist()
+
+    # ---------------------------
+    # Timing
+    # ---------------------------
+    @property
+    def exhausted(self):
+        return not self.loop and self.position >= self.red.shape[0]
+
+    def _indexes(self, start, end):
+        indexes = np.arange(start, end)
+        return indexes % self.red.shape[0] if self.loop else indexes
+
+    def _due(self, index):
+        """
+        Clock time at which sample INDEX (counted across loops) becomes available.
+        """
+        if self.speed is None:
+            return self.started
+        n = self.red.shape[0]
+        return self.started + ((index // n) * self.span + self.offsets[index % n]) / self.speed
+
+    def _due_count(self):
+        """
+        Number of samples (counted across loops) available now.
+        """
+        n = self.red.shape[0]
+        if self.speed is None:
+            return self.position + max30102.FIFO_DEPTH if self.loop else n
+        elapsed = (self.clock() - self.started) * self.speed
+        passes, offset = divmod(elapsed, self.span)
+        count = int(passes) * n + int(np.searchsorted(self.offsets, offset, side="right"))
+        return count if self.loop else min(count, n)
+
+# ===========================
+# Synthetic Signal
+# ===========================
+def synthetic_ppg(duration, sample_rate=SAMPLE_RATE, heart_rate=120.0, ratio=0.5, noise=60.0, seed=0):
+    """
+    Generates a PPG-like red/IR signal.
+
+    The heart rate drifts slowly around HEART_RATE, the baseline wanders with breathing
+    and a little noise is added.
+
+    Parameters:
+    duration (float): Seconds of signal.
+    sample_rate (float): Samples per second.
+    heart_rate (float): Mean heart rate in bpm.
+    ratio (float): Red/IR pulsatile ratio (lower means a higher SpO2).
+    noise (float): Standard deviation of the added noise, in sensor counts (the
+        pulsatile amplitude is 1500 counts on IR).
+    seed (int): Random seed, for reproducible nights.
+
+    Returns:
+    tuple: (red, ir) np.uint32 arrays.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sample_rate)
+    t = np.arange(n) / sample_rate
+    drift = np.cumsum(rng.normal(0, 0.05, n))
+    drift -= np.linspace(0, drift[-1], n) if n else 0  # keep the mean rate at heart_rate
+    bpm = np.clip(heart_rate + drift, 40, 220)
+    phase = 2 * np.pi * np.cumsum(bpm / 60.0) / sample_rate
+    pulse = np.sin(phase) + 0.4 * np.sin(2 * phase + 1)
+    breathing = np.sin(2 * np.pi * 0.5 * t)
+    ir = 100000 + 400 * breathing + 1500 * pulse + rng.normal(0, noise, n)
+    red = 60000 + 250 * breathing + 1500 * ratio * pulse + rng.normal(0, noise, n)
+    return (np.clip(red, 0, 0x3FFFF).astype(np.uint32),
+            np.clip(ir, 0, 0x3FFFF).astype(np.uint32))
+
+
+def write_synthetic_recording(path, duration, start=None, **kwargs):
+    """
+    Writes a synthetic_ppg() night to a recording file.
+
+    Returns:
+    int: Number of samples written.
+    """
+    sample_rate = kwargs.get("sample_rate", SAMPLE_RATE)
+    red, ir = synthetic_ppg(duration, **kwargs)
+    start = time.time() if start is None else start
+    with PpgRecorder(path, sample_rate) as recorder:
+        recorder.write(red, ir, start + np.arange(red.shape[0]) / sample_rate)
+        return recorder.samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record, generate and inspect raw PPG recordings.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    record = sub.add_parser("record", help="record the MAX30102")
+    record.add_argument("path")
+    record.add_argument("--seconds", type=float, default=60)
+    synthesize = sub.add_parser("synthesize", help="write a synthetic night")
+    synthesize.add_argument("path")
+    synthesize.add_argument("--seconds", type=float, default=3600)
+    synthesize.add_argument("--heart-rate", type=float, default=120)
+    synthesize.add_argument("--seed", type=int, default=0)
+    info = sub.add_parser("info", help="describe a recording")
+    info.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        device = RecordingMAX30102(max30102.MAX30102(), args.path)
+        try:
+            for _ in range(int(np.ceil(args.seconds * SAMPLE_RATE / hrcalc.BUFFER_SIZE))):
+                device.read_sequential(hrcalc.BUFFER_SIZE)
+        finally:
+            device.shutdown()
+        print(f"{device.recorder.samples} samples written to {args.path}")
+    elif args.command == "synthesize":
+        samples = write_synthetic_recording(args.path, args.seconds, heart_rate=args.heart_rate, seed=args.seed)
+        print(f"{samples} samples written to {args.path}")
+    else:
+        rate, records = load_recording(args.path)
+        duration = records["timestamp"][-1] - records["timestamp"][0] if records.shape[0] else 0.0
+        print(f"{records.shape[0]} samples at {rate:g} Hz, {duration:.1f} s, "
+              f"starting {time.ctime(records['timestamp'][0]) if records.shape[0] else '-'}")
+
+
+if __name__ == "__main__":
+    main()
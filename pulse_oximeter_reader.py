@@ -15,32 +15,87 @@ Libraries Used:
   data retrieval from its red and infrared (IR) light sensors.
 - hrcalc: Processes raw sensor data to calculate heart rate (HR) and blood oxygen saturation 
   (SpO2) using signal processing algorithms.
+- signal_quality: Grades every window first (skin contact, perfusion, clipping, motion), 
+  so that windows without a usable pulse are not processed nor reported as vital signs.
 """
 
 # ===========================
 # Import Libraries
 # ===========================
+import logging
+import time
+
 import max30102  # Interface for the MAX30102 sensor to read red and IR light data
+from acquisition import AcquisitionThread, SAMPLE_RATE  # Background reads of the sensor
 import hrcalc  # Provides functions to calculate HR and SpO2 from sensor data
+import hrcalc_stream  # Sliding-window HR and SpO2 estimator
+import ppg_recording  # Recording and replay of raw sensor samples
+import metrics  # Timing histograms and counters of the hot paths
+import signal_quality  # Contact, perfusion, clipping and motion check of a window
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Global Variables
+# ===========================
+QUALITY_GATE = True  # Skip HR/SpO2 estimation on windows rejected by signal_quality.assess
+READ_ERROR_BACKOFF = 1.0  # Seconds to wait before reading the sensor again after an error
+# hrcalc returns (hr, hr_valid, spo2, spo2_valid), which the readers below name 
+# (oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok): the heart_rate field of the 
+# readings (and the heart_rate column of the logs) holds the SpO2, and oxygen_level the 
+# heart rate. Code that needs the actual quantity uses these names.
+SPO2_FIELD = "heart_rate"  # Field holding the SpO2 (%)
+HR_FIELD = "oxygen_level"  # Field holding the heart rate (bpm)
 
 # ===========================
 # Functions
 # ===========================
 
-def initialize_pulse_oximeter():
+def initialize_pulse_oximeter(source=None, record_to=None, speed=1.0, threaded=False, burst=False):
     """
     Initializes the MAX30102 pulse oximeter sensor.
 
     This function creates an instance of the MAX30102 sensor, enabling communication 
-    and data retrieval.
+    and data retrieval. Instead of the sensor, a recorded or synthetic night can be 
+    replayed through a device with the same interface, so the rest of the system runs 
+    without hardware.
+    With THREADED, the device is read by a started acquisition.AcquisitionThread, which 
+    is returned in its place: reads then take the samples queued in the background 
+    instead of reading the sensor on the caller's thread.
+    The samples lost in the sensor FIFO are published in the sensor.fifo_overflows gauge.
+
+    Parameters:
+    source (str, optional): None for the sensor, the path of a recording made with 
+        ppg_recording, or ppg_recording.SYNTHETIC for a generated night.
+    record_to (str, optional): Recording file to which every sample read is appended.
+    speed (float, optional): Replay speed relative to real time (None: as fast as 
+        possible). Only used with a SOURCE.
+    threaded (bool, optional): Read the device in a background acquisition thread.
+    burst (bool, optional): Make the acquisition thread drain the whole FIFO on every 
+        interrupt (see max30102.MAX30102.read_fifo_burst). Without THREADED, pass BURST 
+        to the readers below instead.
 
     Returns:
-    max30102.MAX30102: An instance of the MAX30102 pulse oximeter sensor.
+    max30102.MAX30102: An instance of the MAX30102 pulse oximeter sensor (or of a 
+    replay/recording device, or acquisition thread, with the same interface).
     """
-    m = max30102.MAX30102()
+    if source is None:
+        m = max30102.MAX30102()
+    elif source == ppg_recording.SYNTHETIC:
+        m = ppg_recording.ReplayMAX30102(ppg_recording.synthetic_ppg(8 * 3600), speed=speed, loop=True)
+    else:
+        m = ppg_recording.ReplayMAX30102(source, speed=speed)
+    if record_to is not None:
+        m = ppg_recording.RecordingMAX30102(m, record_to)
+    if threaded:
+        # the thread publishes the FIFO overflows of the device itself
+        m = AcquisitionThread(m, burst=burst, sample_rate=getattr(m, "sample_rate", SAMPLE_RATE))
+        m.start()
+    else:
+        metrics.gauge("sensor.fifo_overflows", lambda: getattr(m, "overflow_count", 0))
     return m
 
-def get_pulse_oximeter_data(m):
+def get_pulse_oximeter_data(m, engine=None, with_quality=False, burst=False):
     """
     Reads data from the pulse oximeter and calculates heart rate (HR) and SpO2.
 
@@ -49,6 +104,10 @@ def get_pulse_oximeter_data(m):
 
     Parameters:
     m (max30102.MAX30102): An initialized instance of the MAX30102 pulse oximeter sensor.
+    engine (str, optional): Name of the hrcalc engine ("legacy" or "vectorized"). 
+        Defaults to hrcalc.DEFAULT_ENGINE.
+    with_quality (bool, optional): Append the signal quality score of the window.
+    burst (bool, optional): Drain the sensor FIFO with block reads (see read_samples).
 
     Returns:
     tuple: A tuple containing the following:
@@ -56,18 +115,159 @@ def get_pulse_oximeter_data(m):
         - oxygen_level_ok (bool): Whether the SpO2 calculation is reliable.
         - heart_rate (float): The calculated heart rate in beats per minute (BPM).
         - heart_rate_ok (bool): Whether the heart rate calculation is reliable.
+        - quality (float): Only with WITH_QUALITY, the signal_quality score (0 to 1) 
+          of the window. Rejected windows score below signal_quality.QUALITY_THRESHOLD 
+          and, with QUALITY_GATE, are reported as -999 without running hrcalc.
     """
     # Read red and IR sensor data sequentially
-    red, ir = m.read_sequential()
+    with metrics.timer("sensor.read"):
+        red, ir = m.read_sequential(burst=burst)
 
-    # Process the data to calculate HR and SpO2
-    oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok = hrcalc.calc_hr_and_spo2(ir, red)
+    # Check the window before the (expensive) HR and SpO2 calculation
+    quality = signal_quality.assess(ir, red)
+    if QUALITY_GATE and not quality.ok:
+        oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok = -999, False, -999, False
+    else:
+        # Process the data to calculate HR and SpO2
+        with metrics.timer("hrcalc"):
+            oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok = hrcalc.get_engine(engine)(ir, red)
 
-    # Print calculated values for debugging purposes
-    print(f"SpO2: {oxygen_level}% (Valid: {oxygen_level_ok}), HR: {heart_rate} BPM (Valid: {heart_rate_ok})")
+    # Log calculated values for debugging purposes
+    _record_reading(oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok, quality)
 
+    if with_quality:
+        return oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok, quality.score
     return oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok
 
+def stream_pulse_oximeter_data(m, estimator=None, with_quality=False, burst=False):
+    """
+    Yields heart rate (HR) and SpO2 readings from a sliding window of sensor data.
+
+    Unlike `get_pulse_oximeter_data`, which waits for a new 100-sample buffer every 
+    time, this generator reads `estimator.report_every` samples at a time and reports 
+    over the last 100 samples, so a fresh reading arrives about once per second once 
+    the first window has filled.
+    Sensor errors are retried (see read_samples); the generator only ends with the 
+    device, e.g. at the end of a replayed recording.
+
+    Parameters:
+    m (max30102.MAX30102): An initialized instance of the MAX30102 pulse oximeter sensor.
+    estimator (hrcalc_stream.StreamingHrSpo2Estimator, optional): Estimator to feed. 
+        A new one reporting once per second, gated on the signal quality if 
+        QUALITY_GATE is set, is created if omitted.
+    with_quality (bool, optional): Append the signal quality score of the window.
+    burst (bool, optional): Drain the sensor FIFO with block reads (see read_samples).
+
+    Yields:
+    tuple: (oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok), in the same 
+    order as `get_pulse_oximeter_data`, followed by the quality score with WITH_QUALITY.
+    """
+    if estimator is None:
+        estimator = hrcalc_stream.StreamingHrSpo2Estimator(quality_gate=QUALITY_GATE)
+
+    while True:
+        try:
+            samples = read_samples(m, estimator.report_every, burst)
+        except EOFError:
+            logger.info("End of the PPG recording")
+            return
+        if samples is None:
+            # the samples around the error are lost: start a new window rather than 
+            # estimating across the gap
+            estimator.reset()
+            continue
+        red, ir = samples
+        with metrics.timer("hrcalc"):
+            readings = list(estimator.extend(red, ir))
+        # report_every samples per read: at most one reading, graded in last_quality
+        for oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok in readings:
+            quality = estimator.last_quality
+            _record_reading(oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok, quality)
+            if with_quality:
+                yield oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok, quality.score
+            else:
+                yield oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok
+
+def read_samples(m, amount, burst=False):
+    """
+    Reads AMOUNT red and IR samples, surviving transient sensor errors.
+
+    I2C errors (loose wire, bus contention) are logged, counted in sensor.errors and 
+    followed by a READ_ERROR_BACKOFF wait instead of being raised, so that a stream of 
+    readings does not end on the first one. Samples lost in the sensor FIFO during the 
+    read are logged.
+
+    Parameters:
+    m (max30102.MAX30102): An initialized instance of the MAX30102 pulse oximeter sensor.
+    amount (int): Number of samples to read.
+    burst (bool, optional): Drain the FIFO on every interrupt with one pointer read and 
+        a few block reads (max30102.MAX30102.read_fifo_burst) instead of three I2C 
+        transactions per sample. Ignored by an acquisition thread, which reads the way 
+        it was created with.
+
+    Returns:
+    tuple or None: (red, ir) lists, or None after a read error.
+    """
+    overflows = getattr(m, "overflow_count", 0)
+    try:
+        with metrics.timer("sensor.read"):
+            samples = m.read_sequential(amount, burst=burst)
+    except OSError as e:
+        metrics.counter("sensor.errors").inc()
+        logger.warning("Error reading the pulse oximeter: %s", e)
+        time.sleep(READ_ERROR_BACKOFF)
+        return None
+    lost = getattr(m, "overflow_count", 0) - overflows
+    if lost:
+        # also reported from the worker processes, whose metrics the monitor does not see
+        logger.warning("Sensor FIFO overflow, %d samples lost", lost)
+    return samples
+
+class VitalsReader:
+    """
+    Callable returning the next reading of a stream_pulse_oximeter_data generator, for 
+    the stages that poll the sensor.
+
+    The generator survives sensor errors but ends with the device (end of a replayed 
+    recording) or on an unexpected error. StopIteration must not reach the caller: it 
+    cannot cross an executor future and would otherwise turn into a failed read on 
+    every call. Once the stream has ended, the reader logs it once and returns None 
+    after waiting READ_ERROR_BACKOFF seconds, so pollers do not spin; the stale vitals 
+    alert of the monitor reports the missing readings.
+
+    Parameters:
+    stream (generator): Stream of readings, see stream_pulse_oximeter_data.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.ended = False
+
+    def __call__(self):
+        if not self.ended:
+            try:
+                return next(self.stream)
+            except StopIteration:
+                self.ended = True
+                metrics.counter("sensor.stream_ended").inc()
+                logger.error("The pulse oximeter stream has ended, no more vitals readings.")
+        time.sleep(READ_ERROR_BACKOFF)
+        return None
+
+def _record_reading(oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok, quality=None):
+    """
+    Logs a reading and counts it, and the invalid and rejected ones, in the metrics.
+    """
+    metrics.counter("vitals.readings").inc()
+    if not (oxygen_level_ok and heart_rate_ok):
+        metrics.counter("vitals.invalid").inc()
+    if quality is not None:
+        metrics.gauge("vitals.quality").set(quality.score)
+        if not quality.ok:
+            metrics.counter(f"vitals.rejected.{quality.reason}").inc()
+            logger.debug("Window rejected (%s, quality %.2f)", quality.reason, quality.score)
+    logger.debug("SpO2: %s%% (Valid: %s), HR: %s BPM (Valid: %s)", oxygen_level, oxygen_level_ok, heart_rate, heart_rate_ok)
+
 # ===========================
 # Testing (Commented Out)
 # ===========================
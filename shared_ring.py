@@ -0,0 +1,210 @@
+# ===========================
+# Shared Ring Buffer Module
+# ===========================
+"""
+Fixed-size ring buffer in multiprocessing.shared_memory, used to move frames, sample
+blocks and readings between processes without pickling.
+
+One process writes, any number of processes read. Every slot holds one item of a
+fixed shape and dtype plus its timestamp and sequence number. Writers mark a slot as
+busy while filling it and readers check the sequence number before and after copying
+an item out, so an item overwritten during the copy is detected and skipped (a
+seqlock) instead of being returned torn.
+
+The block also holds a heartbeat timestamp that the writer refreshes, so a
+supervisor can tell a hung writer from an idle one.
+
+Layout: [write count, heartbeat][slot sequence numbers][slot timestamps][slot data]
+"""
+
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# ===========================
+# Global Variables
+# ===========================
+ALIGN = 64  # bytes, alignment of every section
+POLL_MIN_DELAY = 0.001  # seconds between two checks of the write count
+POLL_MAX_DELAY = 0.02
+
+
+def _aligned(size):
+    return (size + ALIGN - 1) // ALIGN * ALIGN
+
+# ===========================
+# Shared Ring
+# ===========================
+class SharedRing:
+    """
+    Single-writer, multi-reader ring of SLOTS items of SHAPE and DTYPE.
+
+    Parameters:
+    name (str): Shared memory block name.
+    slots (int): Number of items kept.
+    shape (tuple): Shape of one item.
+    dtype: NumPy dtype of the items.
+    create (bool): Create the block (the owner) or attach to an existing one.
+    """
+
+    def __init__(self, name, slots, shape, dtype, create=False):
+        self.name = name
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = create
+
+        item_size = int(np.prod(self.shape)) * self.dtype.itemsize
+        header = _aligned(16)
+        seqs = _aligned(8 * slots)
+        stamps = _aligned(8 * slots)
+        size = header + seqs + stamps + item_size * slots
+
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            # processes started by the owner share its resource tracker, which only
+            # unlinks the block if the owner exits without doing it
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        buf = self.shm.buf
+        self._count = np.ndarray((1,), np.int64, buf, 0)
+        self._heartbeat = np.ndarray((1,), np.float64, buf, 8)
+        self._seqs = np.ndarray((slots,), np.int64, buf, header)
+        self._stamps = np.ndarray((slots,), np.float64, buf, header + seqs)
+        self._data = np.ndarray((slots,) + self.shape, self.dtype, buf, header + seqs + stamps)
+        if create:
+            self._count[0] = 0
+            self._heartbeat[0] = 0.0
+            self._seqs[:] = -1
+
+    def spec(self):
+        """
+        Arguments to attach to this ring from another process: SharedRing(*ring.spec()).
+        """
+        return self.name, self.slots, self.shape, self.dtype.str
+
+    # ---------------------------
+    # Writer
+    # ---------------------------
+    @property
+    def count(self):
+        """
+        Number of items written so far; the sequence number of the next item.
+        """
+        return int(self._count[0])
+
+    def write(self, item, timestamp=None):
+        """
+        Copies ITEM into the next slot.
+
+        Returns:
+        int: Sequence number of the item.
+        """
+        seq = self.count
+        index = seq % self.slots
+        self._seqs[index] = -1  # busy
+        self._data[index] = item
+        self._stamps[index] = time.time() if timestamp is None else timestamp
+        self._seqs[index] = seq
+        self._count[0] = seq + 1
+        return seq
+
+    def beat(self):
+        """
+        Refreshes the heartbeat.
+        """
+        self._heartbeat[0] = time.time()
+
+    @property
+    def heartbeat(self):
+        """
+        Time of the last beat() (0 if the writer never beat).
+        """
+        return float(self._heartbeat[0])
+
+    # ---------------------------
+    # Readers
+    # ---------------------------
+    def read(self, seq):
+        """
+        Copies out the item with sequence number SEQ.
+
+        Returns:
+        tuple: (timestamp, item), or None if the item was overwritten or not written yet.
+        """
+        index = seq % self.slots
+        if self._seqs[index] != seq:
+            return None
+        item = self._data[index].copy()
+        timestamp = float(self._stamps[index])
+        if self._seqs[index] != seq:
+            return None
+        return timestamp, item
+
+    def latest(self):
+        """
+        Returns:
+        tuple: (seq, timestamp, item) of the newest item, or None if the ring is empty.
+        """
+        while True:
+            seq = self.count - 1
+            if seq < 0:
+                return None
+            result = self.read(seq)
+            if result is not None:
+                return (seq,) + result
+
+    def read_since(self, after_seq):
+        """
+        Items with a sequence number above AFTER_SEQ that are still in the ring.
+
+        Returns:
+        tuple: (list of (seq, timestamp, item), number of items already overwritten)
+        """
+        end = self.count
+        start = max(after_seq + 1, end - self.slots)
+        lost = max(0, start - (after_seq + 1))
+        items = []
+        for seq in range(start, end):
+            result = self.read(seq)
+            if result is None:
+                lost += 1
+            else:
+                items.append((seq,) + result)
+        return items, lost
+
+    def wait(self, after_seq, timeout=None):
+        """
+        Waits until an item with a sequence number above AFTER_SEQ is written, polling
+        the write count with a bounded back-off.
+
+        Returns:
+        bool: False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = POLL_MIN_DELAY
+        while self.count <= after_seq + 1:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            time.sleep(delay if remaining is None else min(delay, remaining))
+            delay = min(delay * 2, POLL_MAX_DELAY)
+        return True
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+    def close(self):
+        """
+        Detaches from the block (and unlinks it if this process created it).
+        """
+        # the views must go before the buffer can be released
+        self._count = self._heartbeat = self._seqs = self._stamps = self._data = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,135 @@
+# ===========================
+# Signal Quality Module
+# ===========================
+"""
+Cheap quality check of a red/IR window before the HR/SpO2 peak search.
+
+Without a finger on the sensor, or while the baby moves, calc_hr_and_spo2 returns
+-999 or implausible values (HR 166, SpO2 23, ...) that used to raise alarms. assess()
+looks at a window in a few vectorized passes (tens of microseconds, against a
+millisecond or more for the peak search) and rejects it when:
+
+- the IR DC level is too low: no skin contact ("no_contact");
+- too many samples sit at the top of the ADC range ("clipped");
+- the perfusion index, pulsatile (AC) over DC amplitude of the IR signal in percent,
+  is outside the range of a pulse ("low_perfusion", "high_perfusion");
+- the motion-artifact score is high ("motion"): sudden jumps (largest sample-to-sample
+  step against the typical one) or a baseline shift larger than the pulse itself.
+
+Every window gets a score between 0 (unusable) and 1: 0 without contact, when clipped
+or with a perfusion index out of range, otherwise a perfusion factor (reaching 1 at
+GOOD_PERFUSION_INDEX) times one minus the motion score. Windows scoring below
+QUALITY_THRESHOLD are rejected as well, so a window is usable exactly when its score
+reaches the threshold.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+# ===========================
+# Global Variables
+# ===========================
+ADC_MAX = 0x3FFFF  # 18-bit samples
+CONTACT_DC = 50000  # IR counts below which there is no finger/skin on the sensor (LED at ~7 mA)
+CLIP_LEVEL = 0.98 * ADC_MAX  # samples above this are considered saturated
+MAX_CLIPPED_FRACTION = 0.02  # fraction of saturated samples tolerated per window
+MIN_PERFUSION_INDEX = 0.05  # %, below: no pulse in the signal
+MAX_PERFUSION_INDEX = 20.0  # %, above: not a pulse (movement, ambient light)
+GOOD_PERFUSION_INDEX = 0.5  # %, perfusion factor of the score reaches 1
+SPIKE_RATIO = 4.0  # largest step / median step at which the jump score starts to rise
+SPIKE_RANGE = 8.0  # ... and the additional ratio at which it reaches 1
+DRIFT_RANGE = 2.0  # baseline shift / pulse amplitude at which the drift score reaches 1
+QUALITY_THRESHOLD = 0.3  # windows scoring below are rejected
+
+SignalQuality = namedtuple(
+    "SignalQuality",
+    ["score", "ok", "reason", "dc", "perfusion_index", "clipped_fraction", "motion"],
+)
+REJECTED = SignalQuality(0.0, False, "empty", 0.0, 0.0, 0.0, 0.0)
+
+
+def _clamp(value):
+    return min(1.0, max(0.0, value))
+
+
+def _spread(x):
+    """
+    5th to 95th percentile range of X (np.partition: no full sort).
+    """
+    n = x.shape[0]
+    low, high = int(0.05 * (n - 1)), int(np.ceil(0.95 * (n - 1)))
+    part = np.partition(x, (low, high))
+    return float(part[high] - part[low])
+
+
+def motion_score(ir, ac=None):
+    """
+    Motion-artifact score of an IR window, between 0 (clean) and 1.
+
+    Parameters:
+    ir (np.ndarray): IR samples (float).
+    ac (float, optional): Pulsatile amplitude of the detrended window, if already known.
+
+    Returns:
+    float: The larger of the jump score and the baseline drift score.
+    """
+    n = ir.shape[0]
+    steps = np.abs(np.diff(ir))
+    middle = steps.shape[0] // 2
+    typical = float(np.partition(steps, middle)[middle]) + 1.0
+    jump = _clamp((float(steps.max()) / typical - SPIKE_RATIO) / SPIKE_RANGE)
+
+    # least-squares slope over the window: the baseline shift it spans
+    t = np.arange(n) - (n - 1) / 2.0
+    slope = float(np.dot(t, ir - ir.mean()) / np.dot(t, t))
+    if ac is None:
+        ac = _spread(ir - slope * t)
+    drift = _clamp(abs(slope) * (n - 1) / max(ac, 1.0) / DRIFT_RANGE)
+    return max(jump, drift)
+
+
+def assess(ir_data, red_data, threshold=QUALITY_THRESHOLD):
+    """
+    Grades a red/IR window.
+
+    Parameters:
+    ir_data (array-like): IR samples of the window.
+    red_data (array-like): Red samples of the window.
+    threshold (float): See QUALITY_THRESHOLD.
+
+    Returns:
+    SignalQuality: Score, whether the window is usable, the reason it is not (None if
+    it is) and the measurements behind the decision.
+    """
+    ir = np.asarray(ir_data, dtype=np.float64)
+    red = np.asarray(red_data, dtype=np.float64)
+    if ir.shape[0] < 3:
+        return REJECTED
+
+    dc = float(ir.mean())
+    clipped = float(np.count_nonzero((ir >= CLIP_LEVEL) | (red >= CLIP_LEVEL))) / ir.shape[0]
+    if dc < CONTACT_DC:
+        return SignalQuality(0.0, False, "no_contact", dc, 0.0, clipped, 0.0)
+    if clipped > MAX_CLIPPED_FRACTION:
+        return SignalQuality(0.0, False, "clipped", dc, 0.0, clipped, 0.0)
+
+    # pulsatile amplitude of the detrended window, robust to a single outlier
+    n = ir.shape[0]
+    t = np.arange(n) - (n - 1) / 2.0
+    slope = float(np.dot(t, ir - dc) / np.dot(t, t))
+    ac = _spread(ir - slope * t)
+    perfusion_index = 100.0 * ac / dc
+
+    motion = motion_score(ir, ac)
+    score = _clamp(perfusion_index / GOOD_PERFUSION_INDEX) * (1.0 - motion)
+
+    if perfusion_index < MIN_PERFUSION_INDEX:
+        score, reason = 0.0, "low_perfusion"
+    elif perfusion_index > MAX_PERFUSION_INDEX:
+        score, reason = 0.0, "high_perfusion"
+    elif score < threshold:
+        reason = "motion" if motion > 0.5 else "low_perfusion"
+    else:
+        reason = None
+    return SignalQuality(score, reason is None, reason, dc, perfusion_index, clipped, motion)
@@ -0,0 +1,129 @@
+# ===========================
+# Startup Timing Module
+# ===========================
+"""
+Timing of the startup steps of the monitoring system.
+
+Cold start on the Pi used to take several seconds: importing OpenCV, picamera2 and
+pygame, initializing the audio mixer, opening the camera and resetting the pulse
+oximeter all ran one after the other. main.py now imports the heavy modules only
+where they are used and runs the slow device initializations that do not depend on
+each other in background threads. StartupTimer records how long every step took,
+in the foreground or in the background, and reports it once the system runs:
+
+    Startup took 1.42 s: imports 0.21 s, sensor 0.06 s, camera 1.15 s (background),
+    audio 0.38 s (background)
+
+The durations are also published as startup.<step> gauges in the metrics registry.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Startup Timer
+# ===========================
+class BackgroundStep(threading.Thread):
+    """
+    Startup step running FUNCTION(*args) in a daemon thread (see StartupTimer.background).
+    """
+
+    def __init__(self, timer, name, function, args):
+        super().__init__(name=f"startup-{name}", daemon=True)
+        self.timer = timer
+        self.step = name
+        self.function = function
+        self.args = args
+        self.value = None
+        self.error = None
+
+    def run(self):
+        with self.timer.step(self.step, background=True):
+            try:
+                self.value = self.function(*self.args)
+            except BaseException as e:
+                self.error = e
+
+    def result(self, timeout=None):
+        """
+        Waits for the step and returns its result, re-raising its exception.
+        """
+        self.join(timeout)
+        if self.is_alive():
+            raise TimeoutError(f"Startup step {self.step!r} still running after {timeout} s")
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class StartupTimer:
+    """
+    Records the duration of the startup steps.
+
+    Parameters:
+    started (float, optional): time.monotonic() at which the startup began (default: now),
+        e.g. taken before the imports of the main module.
+    """
+
+    def __init__(self, started=None):
+        self.started = time.monotonic() if started is None else started
+        self.steps = []  # (name, seconds, background), in completion order
+        self._last_mark = self.started
+        self._lock = threading.Lock()
+
+    def _record(self, name, duration, background):
+        with self._lock:
+            self.steps.append((name, duration, background))
+        metrics.gauge(f"startup.{name}").set(duration)
+
+    def mark(self, name):
+        """
+        Records the time since the previous mark (or the start) as step NAME.
+        """
+        now = time.monotonic()
+        self._record(name, now - self._last_mark, False)
+        self._last_mark = now
+
+    @contextmanager
+    def step(self, name, background=False):
+        """
+        Times the enclosed block as step NAME.
+        """
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._record(name, time.monotonic() - started, background)
+            if not background:
+                self._last_mark = time.monotonic()
+
+    def background(self, name, function, *args):
+        """
+        Runs FUNCTION(*ARGS) in a background thread, timed as step NAME.
+
+        Returns:
+        BackgroundStep: Its result() waits for the step.
+        """
+        step = BackgroundStep(self, name, function, args)
+        step.start()
+        return step
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def report(self):
+        """
+        Logs the total startup time and the duration of every recorded step.
+        """
+        with self._lock:
+            steps = list(self.steps)
+        details = ", ".join(f"{name} {duration:.2f} s" + (" (background)" if background else "")
+                            for name, duration, background in steps)
+        logger.info("Startup took %.2f s: %s", self.elapsed(), details or "no steps recorded")
+        metrics.gauge("startup.total").set(self.elapsed())
@@ -0,0 +1,427 @@
+# ===========================
+# Live Status Server Module
+# ===========================
+"""
+Live view of the monitor for the parents, in any browser on the Pi.
+
+Until now the current state was only visible on stdout and in the CSV file. StatusServer
+serves, with the standard library only:
+
+- /          a small page showing the state, updated live;
+- /events    a server-sent events stream: a `state` event with the JSON of every fused
+             state (SpO2, heart rate, signal quality, face and motion flags, alarm status) and a
+             `snapshot` event whenever a new camera snapshot is available;
+- /state     the latest state as JSON;
+- /snapshot.jpg  the latest camera snapshot.
+
+Pushing is cheap for the pipeline, however many clients listen: publish() serializes the
+state once and only swaps it in and wakes the clients, and add_frame() only keeps a
+reference to the frame. Every client has its own handler thread that sends the latest
+state when it wakes up, so a slow client skips the states it had no time for instead of
+queueing them, and a client that stops reading for CLIENT_TIMEOUT seconds is dropped. No
+write to a client ever happens on a pipeline thread.
+
+Snapshots are taken at most every SNAPSHOT_INTERVAL seconds, and only while a client is
+connected: the server's snapshot thread downscales the latest frame to SNAPSHOT_WIDTH and
+encodes it to JPEG once, and every client fetches the same bytes.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+
+import metrics
+from pulse_oximeter_reader import SPO2_FIELD, HR_FIELD
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Global Variables
+# ===========================
+HOST = "127.0.0.1"  # only reachable from the Pi itself ("0.0.0.0" to serve the local network)
+PORT = 8766
+MAX_CLIENTS = 8  # simultaneous /events streams, further ones get 503
+CLIENT_TIMEOUT = 10.0  # seconds a client may block a write before it is dropped
+KEEPALIVE_INTERVAL = 15.0  # seconds between SSE comments sent when nothing changes
+SNAPSHOTS = True  # push camera snapshots to the clients
+SNAPSHOT_INTERVAL = 2.0  # seconds between two snapshots
+SNAPSHOT_WIDTH = 320  # pixels, width of the snapshots (the height follows the camera's aspect ratio)
+JPEG_QUALITY = 70  # 0 to 100
+
+# ===========================
+# State Serialization
+# ===========================
+def _number(value):
+    """
+    VALUE as a JSON number, or None if it is missing or invalid (-999 or NaN).
+    """
+    if value is None:
+        return None
+    value = float(value)
+    if value == -999 or not math.isfinite(value):
+        return None
+    return round(value, 2)
+
+
+def _flag(value):
+    return None if value is None else bool(value)
+
+
+def alarm_status(alarm_manager):
+    """
+    Active alert conditions of ALARM_MANAGER and whether it is sounding.
+    """
+    if alarm_manager is None:
+        return None
+    # copied at once: the manager thread changes the dict while we read it
+    active = list(alarm_manager.active.items())
+    return {
+        "sounding": alarm_manager.sounding_since is not None,
+        "level": alarm_manager.level,
+        "active": [{"key": key, "message": message, "since": first} for key, (first, _, message) in active],
+    }
+
+
+def state_payload(state, alarm_manager=None):
+    """
+    JSON-serializable dict of a fused pipeline state.
+
+    Parameters:
+    state (pipeline.FusedState): State to serialize.
+    alarm_manager (alarm.AlarmManager, optional): Alarm whose status is included.
+
+    Returns:
+    dict: timestamp, vitals (spo2 in %, hr in bpm), vision (None while there is no
+    reading) and alarm.
+    """
+    vitals = vision = None
+    if state.vitals is not None:
+        v = state.vitals
+        vitals = {
+            "spo2": _number(getattr(v, SPO2_FIELD)),
+            "spo2_ok": _flag(getattr(v, SPO2_FIELD + "_ok")),
+            "hr": _number(getattr(v, HR_FIELD)),
+            "hr_ok": _flag(getattr(v, HR_FIELD + "_ok")),
+            "quality": _number(v.quality),
+            "filtered_spo2": _number(getattr(v, "filtered_" + SPO2_FIELD)),
+            "filtered_hr": _number(getattr(v, "filtered_" + HR_FIELD)),
+            "age": _number(state.vitals_age),
+            "fresh": state.vitals_fresh,
+        }
+    if state.vision is not None:
+        vision = {
+            "face_detected": bool(state.vision.face_detected),
+            "motion_detected": _flag(state.vision.motion_detected),
+            "age": _number(state.vision_age),
+            "fresh": state.vision_fresh,
+        }
+    return {"timestamp": state.timestamp, "vitals": vitals, "vision": vision,
+            "alarm": alarm_status(alarm_manager)}
+
+# ===========================
+# Status Server
+# ===========================
+class StatusServer:
+    """
+    Pushes the latest fused state and camera snapshots to local browsers over HTTP.
+    Has the start()/stop() lifecycle of the pipeline services.
+
+    Parameters:
+    host (str): Interface to bind; the default only accepts local connections.
+    port (int): TCP port (0 picks a free one, see `address`).
+    alarm_manager (alarm.AlarmManager, optional): Alarm whose status is sent with every state.
+    snapshots (bool): Whether to serve camera snapshots.
+    snapshot_interval (float): Seconds between two snapshots.
+    snapshot_width (int): Width of the snapshots in pixels.
+    max_clients (int): Simultaneous event streams.
+    metrics_scope (str, optional): Scope of the server's gauges (see metrics.scoped).
+    """
+
+    def __init__(self, host=HOST, port=PORT, alarm_manager=None, snapshots=SNAPSHOTS,
+                 snapshot_interval=SNAPSHOT_INTERVAL, snapshot_width=SNAPSHOT_WIDTH, max_clients=MAX_CLIENTS,
+                 metrics_scope=None):
+        self.host = host
+        self.port = port
+        self.alarm_manager = alarm_manager
+        self.snapshots = snapshots
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_width = snapshot_width
+        self.max_clients = max_clients
+        self.clients = 0
+        self.state_seq = 0
+        self.state_json = b"null"
+        self.snapshot_seq = 0
+        self.snapshot_jpeg = None
+        self.snapshot_time = None
+        self._frame = None  # latest (image, timestamp) offered by the capture path
+        self._last_frame = None
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._server = None
+        self._thread = None
+        self._snapshot_thread = None
+        metrics.gauge(metrics.scoped("status.clients", metrics_scope), lambda: self.clients)
+
+    @property
+    def address(self):
+        return self._server.server_address if self._server else None
+
+    # --- producer side, called from the pipeline ---
+
+    def publish(self, state):
+        """
+        Makes STATE the latest state and wakes the clients. Never blocks on a client.
+
+        Parameters:
+        state (pipeline.FusedState): State to push.
+        """
+        data = json.dumps(state_payload(state, self.alarm_manager)).encode()
+        with self._cond:
+            self.state_json = data
+            self.state_seq += 1
+            self._cond.notify_all()
+        metrics.counter("status.published").inc()
+
+    def wants_frame(self, timestamp):
+        """
+        Whether a frame taken at TIMESTAMP would be used for a snapshot (to skip fetching
+        the others).
+        """
+        return (self.snapshots and self.clients > 0
+                and (self._last_frame is None or timestamp - self._last_frame >= self.snapshot_interval))
+
+    def add_frame(self, frame, timestamp=None):
+        """
+        Offers FRAME for the next snapshot. Only keeps a reference; the frame is encoded
+        in the snapshot thread.
+
+        Parameters:
+        frame (frame_producer.Frame or np.ndarray): RGB frame, not modified afterwards.
+        timestamp (float, optional): Capture time (default: the Frame's, or now).
+        """
+        image = getattr(frame, "image", frame)
+        if timestamp is None:
+            timestamp = getattr(frame, "timestamp", None) or time.time()
+        if not self.wants_frame(timestamp):
+            return
+        self._last_frame = timestamp
+        self._frame = (image, timestamp)
+
+    # --- snapshots ---
+
+    def _encode(self, image):
+        import cv2
+
+        height, width = image.shape[:2]
+        if width > self.snapshot_width:
+            size = (self.snapshot_width, max(1, round(height * self.snapshot_width / width)))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        return jpeg.tobytes() if ok else None
+
+    def _run_snapshots(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._stopped or self._frame is not None)
+                if self._stopped:
+                    return
+                frame, self._frame = self._frame, None
+            image, timestamp = frame
+            try:
+                with metrics.timer("status.encode"):
+                    jpeg = self._encode(image)
+            except Exception:
+                logger.exception("Snapshot encoding failed")
+                jpeg = None
+            if jpeg is not None:
+                with self._cond:
+                    self.snapshot_jpeg = jpeg
+                    self.snapshot_time = timestamp
+                    self.snapshot_seq += 1
+                    self._cond.notify_all()
+
+    # --- client side, called from the handler threads ---
+
+    def _connect(self):
+        with self._cond:
+            if self.clients >= self.max_clients:
+                return False
+            self.clients += 1
+        metrics.counter("status.connections").inc()
+        return True
+
+    def _disconnect(self):
+        with self._cond:
+            self.clients -= 1
+
+    def wait_update(self, state_seq, snapshot_seq, timeout):
+        """
+        Waits up to TIMEOUT seconds for a state or snapshot newer than the given sequence
+        numbers.
+
+        Returns:
+        tuple: (state_seq, state_json, snapshot_seq, snapshot_time) at wake-up.
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._stopped or self.state_seq != state_seq or self.snapshot_seq != snapshot_seq, timeout
+            )
+            return self.state_seq, self.state_json, self.snapshot_seq, self.snapshot_time
+
+    # --- lifecycle ---
+
+    def start(self):
+        """
+        Starts serving. If the port cannot be bound (e.g. it is in use), the error is
+        logged and the monitor runs without the status page.
+        """
+        from http.server import ThreadingHTTPServer
+
+        self._stopped = False
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), _handler_class())
+        except OSError as e:
+            logger.error("Live status unavailable on %s:%d: %s", self.host, self.port, e)
+            return
+        self._server.daemon_threads = True
+        self._server.status = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name="status-server", daemon=True)
+        self._thread.start()
+        if self.snapshots:
+            self._snapshot_thread = threading.Thread(target=self._run_snapshots, name="status-snapshots",
+                                                     daemon=True)
+            self._snapshot_thread.start()
+        logger.info("Live status available on http://%s:%d/", *self.address[:2])
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join(timeout)
+            self._server = None
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join(timeout)
+            self._snapshot_thread = None
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+# ===========================
+# HTTP Endpoint
+# ===========================
+PAGE = b"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><meta name="viewport" content="width=device-width">
+<title>Baby monitor</title>
+<style>body{font-family:sans-serif;margin:1em}td{padding:.2em 1em .2em 0}
+#alarm{font-weight:bold}.on{color:#c00}img{max-width:100%}</style></head>
+<body><h1>Baby monitor</h1>
+<p id="alarm">Connecting...</p>
+<table>
+<tr><td>Heart rate (bpm)</td><td id="hr">-</td></tr>
+<tr><td>Oxygen saturation (SpO2 %)</td><td id="spo2">-</td></tr>
+<tr><td>Signal quality</td><td id="quality">-</td></tr>
+<tr><td>Face detected</td><td id="face_detected">-</td></tr>
+<tr><td>Motion</td><td id="motion_detected">-</td></tr>
+<tr><td>Updated</td><td id="updated">-</td></tr>
+</table>
+<img id="snapshot" alt="">
+<script>
+function show(id, value) { document.getElementById(id).textContent = value === null || value === undefined ? "-" : value; }
+var events = new EventSource("events");
+events.addEventListener("state", function (e) {
+  var s = JSON.parse(e.data), v = s.vitals || {}, c = s.vision || {}, a = s.alarm;
+  show("hr", v.hr); show("spo2", v.spo2); show("quality", v.quality);
+  show("face_detected", c.fresh ? (c.face_detected ? "yes" : "no") : null);
+  show("motion_detected", c.fresh && c.motion_detected !== null ? (c.motion_detected ? "yes" : "no") : null);
+  show("updated", new Date(s.timestamp * 1000).toLocaleTimeString());
+  var alarm = document.getElementById("alarm");
+  var messages = a ? a.active.map(function (x) { return x.message; }) : [];
+  alarm.textContent = messages.length ? "ALARM: " + messages.join(", ") : "No alarm";
+  alarm.className = a && a.sounding ? "on" : "";
+});
+events.addEventListener("snapshot", function (e) {
+  document.getElementById("snapshot").src = "snapshot.jpg?seq=" + JSON.parse(e.data).seq;
+});
+events.onerror = function () { show("alarm", "Disconnected, retrying..."); };
+</script></body></html>
+"""
+
+
+def _handler_class():
+    """
+    Request handler of the server. http.server is only imported once a server starts,
+    so importing this module stays cheap.
+    """
+    from http.server import BaseHTTPRequestHandler
+
+    class StatusHandler(BaseHTTPRequestHandler):
+        timeout = CLIENT_TIMEOUT  # applies to every read and write on the client socket
+
+        def do_GET(self):
+            status = self.server.status
+            path = self.path.split("?")[0]
+            if path == "/":
+                self._send(PAGE, "text/html; charset=utf-8")
+            elif path == "/state":
+                self._send(status.state_json, "application/json")
+            elif path == "/snapshot.jpg":
+                jpeg = status.snapshot_jpeg
+                if jpeg is None:
+                    self.send_error(404, "No snapshot yet")
+                else:
+                    self._send(jpeg, "image/jpeg")
+            elif path == "/events":
+                self._stream(status)
+            else:
+                self.send_error(404)
+
+        def _send(self, body, content_type):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _stream(self, status):
+            if not status._connect():
+                self.send_error(503, "Too many clients")
+                return
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                state_seq = snapshot_seq = 0
+                while not status.stopped:
+                    seq, data, new_snapshot_seq, snapshot_time = status.wait_update(
+                        state_seq, snapshot_seq, KEEPALIVE_INTERVAL
+                    )
+                    chunks = []
+                    if seq != state_seq and seq > 0:
+                        chunks.append(b"event: state\ndata: " + data + b"\n\n")
+                    if new_snapshot_seq != snapshot_seq:
+                        snapshot = json.dumps({"seq": new_snapshot_seq, "timestamp": snapshot_time})
+                        chunks.append(b"event: snapshot\ndata: " + snapshot.encode() + b"\n\n")
+                    state_seq, snapshot_seq = seq, new_snapshot_seq
+                    # only the latest state is sent, whatever this client missed is skipped
+                    self.wfile.write(b"".join(chunks) or b": keepalive\n\n")
+                    metrics.counter("status.sent").inc()
+            except OSError:
+                # disconnected, or blocked a write for CLIENT_TIMEOUT seconds
+                metrics.counter("status.disconnects").inc()
+            finally:
+                status._disconnect()
+
+        def log_message(self, format, *args):
+            logger.debug("status endpoint: " + format, *args)
+
+    return StatusHandler
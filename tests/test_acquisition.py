@@ -0,0 +1,68 @@
+import pytest
+
+import fakes
+import max30102
+from acquisition import AcquisitionThread, Sample
+
+SAMPLES = [(1000 + k, 50000 + k) for k in range(300)]
+
+
+def make_sensor(samples=SAMPLES, sample_rate=None, edge_support=True):
+    bus = fakes.FakeSMBus(samples, sample_rate=sample_rate)
+    return max30102.MAX30102(bus=bus, gpio=fakes.FakeGPIO(bus, edge_support=edge_support))
+
+
+@pytest.mark.parametrize("burst", [False, True])
+@pytest.mark.parametrize("edge_support", [True, False])
+def test_every_sample_arrives_in_order(burst, edge_support):
+    sensor = make_sensor(sample_rate=250, edge_support=edge_support)
+    thread = AcquisitionThread(sensor, burst=burst)
+    thread.start()
+    try:
+        blocks = [thread.get_block(50, timeout=5) for _ in range(4)]
+    finally:
+        thread.stop(timeout=2)
+    red = sum((block[0] for block in blocks), [])
+    ir = sum((block[1] for block in blocks), [])
+    # the samples produced before the driver resets the FIFO during setup are lost
+    start = SAMPLES.index((red[0], ir[0]))
+    assert list(zip(red, ir)) == SAMPLES[start:start + 200]
+    assert thread.dropped == 0 and thread.overflows == 0
+
+
+def test_full_queue_keeps_the_newest_samples():
+    thread = AcquisitionThread(None, maxsize=4)
+    for k in range(6):
+        thread._put(Sample(k, k, k))
+    assert [s.red for s in thread.get_samples()] == [2, 3, 4, 5]
+    assert thread.dropped == 2
+
+
+def test_timed_out_block_keeps_its_samples():
+    thread = AcquisitionThread(None)
+    for k in range(3):
+        thread._put(Sample(k, k, 10 + k))
+    assert thread.get_block(5, timeout=0.05) is None
+    for k in range(3, 7):
+        thread._put(Sample(k, k, 10 + k))
+    assert thread.get_block(5, timeout=0.05) == ([0, 1, 2, 3, 4], [10, 11, 12, 13, 14])
+    assert [s.red for s in thread.get_samples()] == [5, 6]
+
+
+def test_thread_stands_in_for_the_device():
+    import ppg_recording
+    from pulse_oximeter_reader import initialize_pulse_oximeter, stream_pulse_oximeter_data
+
+    # shorter than the queue, so replaying as fast as possible loses nothing
+    samples = ppg_recording.synthetic_ppg(12)
+    direct = list(stream_pulse_oximeter_data(ppg_recording.ReplayMAX30102(samples, speed=None)))
+    device = initialize_pulse_oximeter(samples, speed=None, threaded=True)
+    try:
+        assert isinstance(device, AcquisitionThread)
+        threaded = list(stream_pulse_oximeter_data(device))
+    finally:
+        device.stop(timeout=2)
+    # the same readings, and the stream ends with the recording
+    assert threaded == direct
+    assert len(threaded) >= 3
+    assert device.ended
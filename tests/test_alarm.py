@@ -0,0 +1,85 @@
+import time
+
+import fakes
+from alarm import AlarmManager
+
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_manager(**kwargs):
+    clock = Clock()
+    backend = fakes.SilentAlarmBackend()
+    manager = AlarmManager(backend=backend, clear_after=15, min_sound_time=10,
+                           escalation=((0, 0.5), (30, 0.8), (60, 1.0)), clock=clock, **kwargs)
+    return manager, backend, clock
+
+
+def advance(manager, clock, until, key=None, every=1.0):
+    """
+    Runs the manager loop by hand until UNTIL, repeating alert KEY every EVERY seconds.
+    """
+    while clock.now < until:
+        clock.now += every
+        if key is not None:
+            manager.raise_alert(key, f"{key} alert")
+        while not manager.events.empty():
+            manager._handle(manager.events.get_nowait())
+        manager._update(clock.now)
+
+
+def test_repeats_are_deduplicated_and_the_volume_escalates():
+    manager, backend, clock = make_manager()
+    advance(manager, clock, 70, key="oxygen")
+    assert manager.raised == 1
+    assert manager.deduplicated == 69
+    assert backend.calls[0] == ("play",)
+    assert [volume for call, *volume in backend.calls if call == "volume"] == [[0.5], [0.8], [1.0]]
+    assert manager.escalations == 2
+
+
+def test_alarm_stops_once_the_condition_is_quiet():
+    manager, backend, clock = make_manager()
+    advance(manager, clock, 3, key="heart_rate")
+    assert backend.playing
+    advance(manager, clock, 3 + 15)
+    assert backend.playing and manager.active  # not quiet for clear_after yet
+    advance(manager, clock, 3 + 16)
+    assert not manager.active and not backend.playing
+    assert manager.sounding_since is None
+
+
+def test_alarm_sounds_for_min_sound_time():
+    manager, backend, clock = make_manager()
+    advance(manager, clock, 1, key="oxygen")
+    manager.clear("oxygen")
+    advance(manager, clock, 5)
+    assert backend.playing
+    advance(manager, clock, 11)
+    assert not backend.playing
+
+
+def test_raise_alert_never_blocks_when_the_queue_is_full():
+    manager, _, _ = make_manager()
+    started = time.monotonic()
+    for k in range(manager.events.maxsize * 3):
+        manager.raise_alert(f"key{k}", "message")
+    assert time.monotonic() - started < 1.0
+    assert manager.events.qsize() == manager.events.maxsize
+
+
+def test_thread_stop_silences_the_alarm():
+    manager, backend, _ = make_manager()
+    manager.start()
+    manager.raise_alert("oxygen", "Low Oxygen Level")
+    deadline = time.monotonic() + 2
+    while not backend.playing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert backend.playing
+    manager.stop(timeout=2)
+    assert not manager.is_alive() and not backend.playing
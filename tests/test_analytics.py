@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+import analytics
+
+LOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sleep_monitor_log.csv")
+
+
+def analyze(paths):
+    options = analytics.AnalysisOptions()
+    return analytics.summarize([analytics.analyze_input(str(path), options) for path in paths])
+
+
+@pytest.mark.parametrize("parts", [2, 3, 7])
+def test_night_split_over_files_equals_whole(tmp_path, parts):
+    with open(LOG) as f:
+        lines = f.readlines()
+    paths = []
+    for k in range(parts):
+        path = tmp_path / f"part{k}.csv"
+        path.write_text("".join(lines[k * len(lines) // parts:(k + 1) * len(lines) // parts]))
+        paths.append(path)
+    assert analyze(paths) == analyze([LOG])
+
+
+def test_chunked_reads_equal_whole(monkeypatch):
+    whole = analyze([LOG])
+    monkeypatch.setattr(analytics, "CHUNK_ROWS", 10)
+    monkeypatch.setattr(analytics.read_csv_chunks, "__defaults__", (10,))
+    assert analyze([LOG]) == whole
+
+
+def test_parts_far_apart_are_not_joined(tmp_path):
+    first = tmp_path / "a.csv"
+    second = tmp_path / "b.csv"
+    first.write_text("2024-12-04 22:00:00,97,120,True\n2024-12-04 22:00:05,97,120,True\n")
+    second.write_text("2024-12-04 23:00:00,97,140,True\n2024-12-04 23:00:05,97,140,True\n")
+    night, = analyze([first, second])
+    assert night["monitored_hours"] == round(10 / 3600, 2)
+    assert night["heart_rate"]["rmssd"] == 0.0
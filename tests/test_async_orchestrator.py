@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import fakes
+from async_orchestrator import Orchestrator, PeriodicTask
+
+FAST = {"vitals_interval": 0.05, "vision_interval": 0.05, "log_interval": 0.05}
+
+
+class EndingDevices:
+    """
+    Device layer whose vitals stream yields READINGS and then ends.
+    """
+
+    def __init__(self, readings):
+        self.readings = list(readings)
+
+    def read_vitals(self):
+        return self.readings.pop(0) if self.readings else None
+
+
+def test_vitals_task_survives_the_end_of_the_stream():
+    devices = EndingDevices([(97, True, 125, True, 0.9)])
+    orchestrator = Orchestrator(devices, decide=lambda state: [], log=lambda state: None,
+                                alert=lambda alert: None)
+
+    async def read_twice():
+        await orchestrator._read_vitals()
+        first = orchestrator.latest_vitals
+        await orchestrator._read_vitals()
+        return first
+
+    first = asyncio.run(read_twice())
+    assert first.oxygen_level == 97 and first.heart_rate == 125
+    # the ended stream keeps the last reading, which ages for the health check
+    assert orchestrator.latest_vitals is first
+
+
+def orchestrator_for(devices, scope, **options):
+    logged = []
+    orchestrator = Orchestrator(devices, decide=lambda state: [], log=logged.append, alert=lambda alert: None,
+                                metrics_scope=scope, **dict(FAST, **options))
+    return orchestrator, logged
+
+
+def test_a_hung_sensor_only_stalls_its_own_task():
+    devices = fakes.FakeMonitorDevices()
+    devices.hung.add("vitals")
+    orchestrator, logged = orchestrator_for(devices, "test-hung", timeouts={"vitals": 0.1})
+    try:
+        asyncio.run(orchestrator.run(duration=1.0))
+    finally:
+        devices.hung.clear()
+    stats = orchestrator.stats()
+    assert stats["vitals"]["timeouts"] >= 2  # the timed-out call, then "still running" on every tick
+    assert orchestrator.calls["vitals"].timeouts == 1
+    assert devices.calls["vitals"] == 1  # never called again while the first call hangs
+    assert stats["vision"]["count"] >= 5 and devices.calls["detection"] >= 5
+    assert len(logged) >= 5
+    assert orchestrator.latest_vitals is None and orchestrator.latest_vision is not None
+
+
+def test_a_slow_step_counts_deadline_misses():
+    async def slow_step():
+        await asyncio.sleep(0.12)
+
+    task = PeriodicTask("slow", 0.05, slow_step, metrics_scope="test-slow")
+
+    async def run_briefly():
+        running = asyncio.create_task(task.run())
+        await asyncio.sleep(0.5)
+        task.stop()
+        await running
+
+    asyncio.run(run_briefly())
+    assert task.stats.count >= 3
+    assert task.deadline_misses >= 2 * (task.stats.count - 1)  # every step overruns two deadlines
+
+
+def test_run_returns_and_closes_the_devices_while_a_call_hangs():
+    devices = fakes.FakeMonitorDevices()
+    devices.hung.add("capture")
+    orchestrator, _ = orchestrator_for(devices, "test-close")
+    started = time.monotonic()
+    try:
+        asyncio.run(asyncio.wait_for(orchestrator.run(duration=0.3), 5.0))
+    finally:
+        devices.hung.clear()
+    assert time.monotonic() - started < 2.0
+    assert devices.calls["close"] == 1 and not devices.opened
+    assert devices.calls["vitals"] >= 2
@@ -0,0 +1,82 @@
+import time
+
+import numpy as np
+import pytest
+
+import baseline
+from baseline import BaselineSketches, HistogramSketch, ThresholdTable
+
+DEFAULTS = {"oxygen_level": 30.0, "heart_rate": 50.0}
+
+
+def write_log(path, start_hour, rows, seed):
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        for k in range(rows):
+            second = start_hour * 3600 + k
+            stamp = f"2024-12-04 {second // 3600 % 24:02d}:{second // 60 % 60:02d}:{second % 60:02d}"
+            f.write(f"{stamp},{rng.normal(97, 1.5):.2f},{rng.normal(125, 10):.0f},True\n")
+
+
+def test_quantiles_match_numpy_up_to_the_bin_width():
+    values = np.random.default_rng(1).normal(120, 15, 20000)
+    sketch = HistogramSketch()
+    sketch.add(values)
+    percentiles = (1, 5, 25, 50, 75, 95, 99)
+    assert sketch.quantiles(percentiles) == pytest.approx(np.percentile(values, percentiles),
+                                                          abs=baseline.BIN_WIDTH)
+    assert HistogramSketch().quantiles(percentiles) is None
+
+
+def test_merged_sketches_equal_a_single_pass(tmp_path):
+    paths = [str(tmp_path / f"night{k}.csv") for k in range(3)]
+    for k, path in enumerate(paths):
+        write_log(path, 20 + k, 3000, seed=k)
+    single = baseline.sketch_logs(paths)
+    merged = BaselineSketches()
+    for path in paths:
+        merged.merge(baseline.sketch_logs([path]))
+    state = str(tmp_path / "sketches.npz")
+    merged.save(state)
+    for sketches in (merged, BaselineSketches.load(state)):
+        for name in baseline.VALUES:
+            for mine, theirs in zip(sketches.sketches[name], single.sketches[name]):
+                assert np.array_equal(mine.counts, theirs.counts)
+    with pytest.raises(ValueError):
+        HistogramSketch().merge(HistogramSketch(bin_width=1.0))
+
+
+def test_hours_with_few_samples_keep_the_defaults(tmp_path, monkeypatch):
+    monkeypatch.setattr(baseline, "MIN_SAMPLES", 1000)
+    path = str(tmp_path / "night.csv")
+    write_log(path, 21, 3600 + 500, seed=0)  # a full hour 21, then 500 rows of hour 22
+    entry = baseline.thresholds_from_sketches(baseline.sketch_logs([path]), DEFAULTS)
+    oxygen = entry["oxygen_level"]
+    assert oxygen["samples"][21] == 3600 and oxygen["samples"][22] == 500
+    assert oxygen["thresholds"][22] is None and oxygen["percentiles"][22] is None
+    assert [t is not None for t in oxygen["thresholds"]].count(True) == 1
+    # the third logged column (oxygen_level) is drawn from N(125, 10): 85% of its 5th percentile
+    assert oxygen["thresholds"][21] == pytest.approx(0.85 * (125 - 1.645 * 10), abs=1.5)
+
+    table_path = str(tmp_path / "thresholds.json")
+    baseline.write_table(table_path, "lucia", entry)
+    table = ThresholdTable.load(table_path, "lucia", DEFAULTS)
+    assert table.learned
+    day = time.mktime((2024, 12, 4, 0, 30, 0, 0, 0, -1))
+    assert table.lookup("oxygen_level", day + 21 * 3600) == oxygen["thresholds"][21]
+    assert table.lookup("oxygen_level", day + 22 * 3600) == DEFAULTS["oxygen_level"]
+    assert table.lookup("heart_rate", day + 3 * 3600) == DEFAULTS["heart_rate"]
+
+
+def test_missing_table_or_baby_gives_the_defaults(tmp_path, caplog):
+    table = ThresholdTable.load(str(tmp_path / "missing.json"), "lucia", DEFAULTS)
+    assert not table.learned
+    assert table.lookup("oxygen_level", time.time()) == DEFAULTS["oxygen_level"]
+
+    path = str(tmp_path / "thresholds.json")
+    baseline.write_table(path, "mateo", {name: {"thresholds": [60.0] * 24} for name in baseline.VALUES})
+    table = ThresholdTable.load(path, "lucia", DEFAULTS)
+    assert not table.learned
+    assert table.lookup("heart_rate", time.time()) == DEFAULTS["heart_rate"]
+    assert "No thresholds for 'lucia'" in caplog.text
+    assert ThresholdTable.load(path, "mateo", DEFAULTS).lookup("heart_rate", time.time()) == 60.0
@@ -0,0 +1,30 @@
+import numpy as np
+
+from binary_log import BinaryLogReader, BinaryLogWriter
+
+
+def test_records_round_trip(tmp_path):
+    writer = BinaryLogWriter(str(tmp_path), chunk_records=4)
+    for i in range(10):
+        writer.log(1_700_000_000 + i, 120 + i, 97, i % 2 == 0, motion_detected=i == 3)
+    writer.stop()
+
+    reader = BinaryLogReader(str(tmp_path))
+    assert len(reader.paths) == 3
+    columns = reader.columns(1_700_000_002, 1_700_000_008)
+    np.testing.assert_array_equal(columns["heart_rate"], np.arange(122, 128))
+    assert columns["face_detected"].tolist() == [True, False, True, False, True, False]
+    assert columns["motion_detected"].tolist() == [False, True, False, False, False, False]
+
+
+def test_records_reach_the_disk_within_the_flush_interval(tmp_path):
+    writer = BinaryLogWriter(str(tmp_path), flush_interval=3600)
+    writer.log(1_700_000_000, 120, 97, True)
+    writer.log(1_700_000_001, 121, 97, True)
+    # still in the file buffer: the reader sees no record yet
+    assert len(BinaryLogReader(str(tmp_path))) == 0
+
+    writer.flush_interval = 0.0
+    writer.log(1_700_000_002, 122, 97, True)
+    assert len(BinaryLogReader(str(tmp_path))) == 3
+    writer.stop()
@@ -0,0 +1,148 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+import clip_recorder
+from clip_recorder import ClipEvent, ClipRecorder
+
+
+def make_recorder(tmp_path, **kwargs):
+    options = dict(directory=str(tmp_path / "clips"), fps=5.0, width=32, pre_event=2.0, post_event=2.0,
+                   metrics_scope=f"test-{tmp_path.name}")
+    options.update(kwargs)
+    return ClipRecorder(**options)
+
+
+def frame(k):
+    return np.full((36, 64, 3), 4 * k, np.uint8)
+
+
+def read_clip(path):
+    capture = cv2.VideoCapture(path)
+    levels = []
+    while True:
+        ok, image = capture.read()
+        if not ok:
+            break
+        levels.append(float(image.mean()))
+    capture.release()
+    return levels
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_clip_spans_the_pre_and_post_event_window(tmp_path):
+    recorder = make_recorder(tmp_path)
+    t0 = time.time() - 20.0  # a past night: every frame of the clip is already in the ring
+    for k in range(46):  # 9 s at 5 fps, more than the ring holds
+        recorder.add_frame(frame(k), t0 + 0.2 * k)
+    assert recorder.ring.oldest_seq == 46 - recorder.capacity
+    recorder.start()
+    assert recorder.trigger("oxygen", "Low Oxygen Level", timestamp=t0 + 5.0)
+    wait_for(lambda: recorder.clips == 1)
+    recorder.stop(2.0)
+
+    path, = os.listdir(tmp_path / "clips")
+    assert path.startswith(clip_recorder.CLIP_PREFIX) and path.endswith("-oxygen" + clip_recorder.CLIP_SUFFIX)
+    levels = read_clip(str(tmp_path / "clips" / path))
+    # frames 15 to 35: from PRE_EVENT before the event to POST_EVENT after it
+    assert len(levels) == 21
+    assert abs(levels[0] - 4 * 15) < 3 and abs(levels[-1] - 4 * 35) < 3
+
+
+def test_alerts_during_a_clip_extend_it_up_to_the_longest_clip(tmp_path):
+    recorder = make_recorder(tmp_path, max_clip_seconds=5.0)
+    event = ClipEvent(100.0, "oxygen", "")
+    recorder._current = [98.0, 102.0, event]  # the encoder is writing the clip of EVENT
+    assert not recorder.trigger("heart_rate", timestamp=101.0)
+    assert recorder._current[1] == 103.0
+    assert not recorder.trigger("oxygen", timestamp=102.5)
+    assert recorder._current[1] == 98.0 + 5.0  # capped at max_clip_seconds
+    assert recorder.skipped_events == 2 and not recorder._events
+    assert recorder.trigger("face", timestamp=104.0)  # after the clip: a new one
+
+
+def test_same_alert_within_the_cooldown_starts_no_clip(tmp_path):
+    recorder = make_recorder(tmp_path, cooldown=300.0)
+    assert recorder.trigger("oxygen", timestamp=1000.0)
+    assert not recorder.trigger("oxygen", timestamp=1010.0)
+    assert recorder.trigger("heart_rate", timestamp=1010.0)
+    assert recorder.trigger("oxygen", timestamp=1301.0)
+    assert [e.key for e in recorder._events] == ["oxygen", "heart_rate", "oxygen"]
+
+
+def test_pending_events_are_bounded(tmp_path):
+    recorder = make_recorder(tmp_path)
+    keys = [f"alert{k}" for k in range(clip_recorder.MAX_PENDING + 2)]
+    started = [recorder.trigger(key, timestamp=1000.0) for key in keys]
+    assert started == [True] * clip_recorder.MAX_PENDING + [False, False]
+    assert len(recorder._events) == clip_recorder.MAX_PENDING
+    assert recorder.skipped_events == 2
+
+
+def test_oldest_clips_are_deleted_first(tmp_path):
+    recorder = make_recorder(tmp_path, max_disk_bytes=250)
+    directory = tmp_path / "clips"
+    directory.mkdir()
+    names = [f"{clip_recorder.CLIP_PREFIX}{k}{clip_recorder.CLIP_SUFFIX}" for k in "dcba"]
+    for age, name in enumerate(names):  # clip-d is the oldest, whatever the names sort as
+        path = directory / name
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (1000.0 + age, 1000.0 + age))
+    (directory / "notes.txt").write_bytes(b"x" * 1000)  # not a clip
+    recorder._enforce_budget()
+    assert sorted(os.listdir(directory)) == sorted(names[2:] + ["notes.txt"])
+    assert recorder.deleted_clips == 2
+
+    recorder.max_disk_bytes = 10
+    recorder._enforce_budget()
+    assert sorted(os.listdir(directory)) == [names[3], "notes.txt"]  # the newest is always kept
+
+
+class SlowWriter:
+    """
+    cv2.VideoWriter stand-in taking WRITE_TIME per frame, like an encoder on a busy CPU.
+    """
+
+    WRITE_TIME = 0.1
+    written = 0
+
+    def __init__(self, *args):
+        pass
+
+    def isOpened(self):
+        return True
+
+    def write(self, frame):
+        time.sleep(self.WRITE_TIME)
+        SlowWriter.written += 1
+
+    def release(self):
+        pass
+
+
+def test_add_frame_never_waits_for_the_encoder(tmp_path, monkeypatch):
+    monkeypatch.setattr(clip_recorder.cv2, "VideoWriter", SlowWriter)
+    recorder = make_recorder(tmp_path, fps=20.0, post_event=1.0)
+    recorder.start()
+    durations = []
+    start = time.time()
+    for k in range(30):
+        timestamp = start + 0.05 * k
+        if k == 5:
+            recorder.trigger("oxygen", timestamp=timestamp)
+        began = time.perf_counter()
+        recorder.add_frame(frame(k), timestamp)
+        durations.append(time.perf_counter() - began)
+        time.sleep(max(0.0, timestamp + 0.05 - time.time()))
+    assert 0 < SlowWriter.written < 30  # the encoder is still behind when the capture ends
+    recorder.stop(5.0)
+    assert max(durations) < 0.05
+    assert recorder.ring.next_seq == 30
@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+import data_logger
+from data_logger import BufferedCsvLogger
+
+
+@pytest.fixture(autouse=True)
+def fast_retry(monkeypatch):
+    monkeypatch.setattr(data_logger, "WRITE_RETRY_INTERVAL", 0.05)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_rows_are_written_in_batches(tmp_path):
+    path = tmp_path / "log.csv"
+    writer = BufferedCsvLogger(str(path), flush_rows=3, fsync="never")
+    writer.start()
+    for i in range(7):
+        writer.log(1_700_000_000 + i, 97, 120, True)
+    wait_for(lambda: writer.written == 6)
+    writer.stop()
+    assert writer.written == 7
+    assert len(path.read_text().splitlines()) == 7
+    assert not writer.is_alive()
+
+
+def test_writer_survives_write_errors(tmp_path, monkeypatch):
+    path = tmp_path / "log.csv"
+    writer = BufferedCsvLogger(str(path), flush_rows=1, fsync="never")
+    failures = [OSError(28, "No space left on device")] * 2
+    real_open = writer._open
+
+    def flaky_open():
+        if failures:
+            raise failures.pop()
+        real_open()
+
+    monkeypatch.setattr(writer, "_open", flaky_open)
+    writer.start()
+    writer.log(1_700_000_000, 97, 120, True)
+    wait_for(lambda: writer.errors >= 1)
+    assert writer.is_alive()
+    assert not writer.healthy
+    assert isinstance(writer.last_error, OSError)
+
+    # the rows are kept and written once the disk is back
+    writer.log(1_700_000_001, 98, 121, True)
+    wait_for(lambda: writer.written == 2)
+    assert writer.healthy
+    assert writer.errors == 2
+    writer.stop()
+    assert len(path.read_text().splitlines()) == 2
+
+
+def test_buffer_is_bounded_while_writes_fail(tmp_path, monkeypatch):
+    writer = BufferedCsvLogger(str(tmp_path / "log.csv"), flush_rows=1, queue_size=5)
+
+    def broken_open():
+        raise OSError(5, "Input/output error")
+
+    monkeypatch.setattr(writer, "_open", broken_open)
+    for i in range(12):
+        writer._add((1_700_000_000 + i, 97, 120, True))
+        writer._try_flush()
+    assert len(writer._buffer) <= 5
+    assert writer.dropped == 12 - len(writer._buffer)
@@ -0,0 +1,26 @@
+from bench_face_detection import SAMPLE_IMAGE, load_frame
+from face_detector import DETECTION_MIN_PIXELS, FaceDetector
+
+
+def test_default_scale_keeps_the_smallest_face_detectable():
+    assert FaceDetector().scale == 1.0
+    assert FaceDetector(min_size=(96, 96)).scale == DETECTION_MIN_PIXELS / 96
+
+
+def test_tracks_the_sample_face_in_frame_coordinates():
+    frame = load_frame(SAMPLE_IMAGE)
+    detector = FaceDetector(rescan_interval=5)
+    first = detector.detect(frame)
+    assert len(first) == 1
+    for _ in range(3):
+        faces = detector.detect(frame)
+        assert len(faces) == 1
+        assert all(abs(a - b) <= 4 for a, b in zip(faces[0], first[0]))
+    assert detector.full_scans == 1 and detector.roi_scans == 3
+
+
+def test_downscaled_detection_reports_full_resolution_boxes():
+    # the 1280x720 frame at 0.5x is the 640x360 frame: the box must come back doubled
+    face, = FaceDetector(scale=0.5, rescan_interval=0).detect(load_frame(SAMPLE_IMAGE, (1280, 720)))
+    reference, = FaceDetector(rescan_interval=0).detect(load_frame(SAMPLE_IMAGE))
+    assert all(abs(a - 2 * b) <= 8 for a, b in zip(face, reference))
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import fakes
+import frame_producer
+from frame_producer import FrameProducer
+
+
+def image(level):
+    return np.full((36, 64, 3), level, np.uint8)
+
+
+def producer(**kwargs):
+    return FrameProducer(camera=fakes.FakeCamera(frames=[image(0)]), **kwargs)
+
+
+def test_ring_drops_the_oldest_frames():
+    frames = producer(ring_size=3)
+    assert frames.latest() is None and frames.frames() == []
+    for k in range(5):
+        frames.publish(image(k), timestamp=100.0 + k)
+    assert [f.seq for f in frames.frames()] == [3, 4, 5]
+    assert [f.timestamp for f in frames.frames()] == [102.0, 103.0, 104.0]
+    assert frames.latest().seq == 5 and frames.latest().image[0, 0, 0] == 4
+
+
+def test_frames_are_read_only_views_with_cached_derived_images():
+    captured = image(7)
+    frame = producer().publish(captured)
+    assert np.shares_memory(frame.image, captured)  # no copy
+    with pytest.raises(ValueError):
+        frame.image[0, 0] = 0
+    gray = frame.gray
+    assert gray.shape == (36, 64) and frame.gray is gray
+    with pytest.raises(ValueError):
+        gray[0, 0] = 0
+    calls = []
+    assert frame.derived("half", lambda f: calls.append(1) or f.gray[::2]) is frame.derived("half", None)
+    assert calls == [1]
+
+
+def test_wait_for_frame():
+    frames = producer()
+    assert frames.wait_for_frame(timeout=0.05) is None
+    frames.publish(image(1))
+    assert frames.wait_for_frame(after_seq=0, timeout=0.05).seq == 1
+    assert frames.wait_for_frame(after_seq=1, timeout=0.05) is None
+
+
+class FlakyCamera(fakes.FakeCamera):
+    def capture_array(self):
+        if self.captured == 2:
+            self.captured += 1
+            raise RuntimeError("camera timeout")
+        return super().capture_array()
+
+
+def test_thread_publishes_frames_and_survives_capture_errors(monkeypatch):
+    monkeypatch.setattr(frame_producer, "CAPTURE_ERROR_BACKOFF", 0.01)
+    seen = []
+    frames = FrameProducer(camera=FlakyCamera(frames=[image(0), image(1)], fps=100), on_frame=seen.append)
+    frames.start()
+    frame = frames.wait_for_frame(after_seq=5, timeout=2.0)
+    frames.stop(1.0)
+    assert frame is not None and not frames.is_alive()
+    assert frames.errors == 1
+    assert [f.seq for f in seen[:6]] == [1, 2, 3, 4, 5, 6]
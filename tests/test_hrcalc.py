@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+import hrcalc
+from hrcalc_parity import check_parity, synthetic_windows
+
+WINDOWS = 400  # the CLI checks 5000 by default, this keeps the test under a few seconds
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_vectorized_engine_matches_legacy(seed):
+    checked, mismatches = check_parity(synthetic_windows(WINDOWS, seed))
+    assert checked == WINDOWS
+    assert mismatches == []
+
+
+def test_synthetic_windows_cover_valid_and_invalid_paths():
+    results = [hrcalc.calc_hr_and_spo2(ir, red) for ir, red in synthetic_windows(100, seed=0)]
+    hr_valid = [hr_ok for _, hr_ok, _, _ in results]
+    assert any(hr_valid) and not all(hr_valid)
+
+
+def test_engines_accept_numpy_arrays():
+    ir, red = next(synthetic_windows(2, seed=3))
+    expected = hrcalc.calc_hr_and_spo2(ir, red)
+    assert hrcalc.calc_hr_and_spo2_vectorized(np.array(ir), np.array(red)) == expected
+
+
+def test_get_engine():
+    assert hrcalc.get_engine() is hrcalc.ENGINES[hrcalc.DEFAULT_ENGINE]
+    assert hrcalc.get_engine("vectorized") is hrcalc.calc_hr_and_spo2_vectorized
+    with pytest.raises(ValueError):
+        hrcalc.get_engine("fortran")
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+import hrcalc
+from hrcalc_parity import synthetic_windows
+from hrcalc_stream import StreamingHrSpo2Estimator
+
+
+def stream(count, seed=0):
+    """
+    Concatenated synthetic windows as one (red, ir) sample stream.
+    """
+    red, ir = [], []
+    for window_ir, window_red in synthetic_windows(count, seed):
+        ir.extend(window_ir)
+        red.extend(window_red)
+    return red, ir
+
+
+@pytest.mark.parametrize("report_every", [1, 7, hrcalc.SAMPLE_FREQ])
+def test_estimates_match_hrcalc_on_the_same_window(report_every):
+    red, ir = stream(12)
+    estimator = StreamingHrSpo2Estimator(report_every=report_every)
+    reports = 0
+    for k, (r, i) in enumerate(zip(red, ir)):
+        estimate = estimator.push(r, i)
+        if estimate is None:
+            continue
+        reports += 1
+        start = k + 1 - hrcalc.BUFFER_SIZE
+        assert estimate == hrcalc.calc_hr_and_spo2(ir[start:k + 1], red[start:k + 1]), k
+    assert reports == (len(red) - hrcalc.BUFFER_SIZE) // report_every + 1
+
+
+def test_no_estimate_before_a_full_window():
+    red, ir = stream(1)
+    estimator = StreamingHrSpo2Estimator(report_every=1)
+    assert estimator.extend(red[:hrcalc.BUFFER_SIZE - 1], ir[:hrcalc.BUFFER_SIZE - 1]) == []
+    assert not estimator.ready
+    assert estimator.estimate() == (-999, False, -999, False)
+    assert len(estimator.extend(red[-1:], ir[-1:])) == 1
+
+
+def test_reset_drops_the_window():
+    red, ir = stream(2)
+    estimator = StreamingHrSpo2Estimator()
+    estimator.extend(red, ir)
+    estimator.reset()
+    assert not estimator.ready
+    assert estimator.extend(red[:hrcalc.BUFFER_SIZE], ir[:hrcalc.BUFFER_SIZE]) == [
+        hrcalc.calc_hr_and_spo2(ir[:hrcalc.BUFFER_SIZE], red[:hrcalc.BUFFER_SIZE])
+    ]
+
+
+def test_quality_gate_rejects_a_flat_signal():
+    flat = np.full(hrcalc.BUFFER_SIZE, 1000)
+    estimator = StreamingHrSpo2Estimator(quality_gate=True)
+    assert estimator.extend(flat, flat) == [(-999, False, -999, False)]
+    assert not estimator.last_quality.ok
+
+
+def test_report_every_must_be_positive():
+    with pytest.raises(ValueError):
+        StreamingHrSpo2Estimator(report_every=0)
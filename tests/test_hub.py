@@ -0,0 +1,129 @@
+import itertools
+import threading
+import time
+
+import fakes
+import hub
+import ppg_recording
+from hub import Crib, CribConfig, Hub, SensorScheduler
+
+SCOPES = itertools.count()
+
+
+class PolledCrib:
+    """
+    Stand-in for a Crib that records when its sensor is polled, and can fail.
+    """
+
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+        self.polled = []
+        self.sensor_errors = 0
+        self.camera = None
+
+    def poll_sensor(self):
+        self.polled.append(time.monotonic())
+        if self.fail:
+            raise OSError(121, "Remote I/O error")
+        return 0
+
+
+def run_scheduler(cribs, seconds, **kwargs):
+    scheduler = SensorScheduler(cribs, metrics_scope=f"test{next(SCOPES)}", **kwargs)
+    scheduler.start()
+    time.sleep(seconds)
+    scheduler.stop()
+    return scheduler
+
+
+def test_cribs_are_polled_in_turn_at_the_interval():
+    cribs = [PolledCrib(f"crib{k}") for k in range(3)]
+    scheduler = run_scheduler(cribs, 1.0, workers=1, interval=0.1)
+    for crib in cribs:
+        assert 8 <= len(crib.polled) <= 11
+        steps = sorted(b - a for a, b in zip(crib.polled, crib.polled[1:]))
+        assert abs(steps[len(steps) // 2] - 0.1) < 0.02  # a late poll is caught up by the next one
+    # staggered over the interval: one worker serves the cribs in turn
+    order = sorted((t, k) for k, crib in enumerate(cribs) for t in crib.polled)
+    assert [k for _, k in order[:6]] == [0, 1, 2, 0, 1, 2]
+    assert scheduler.polls == sum(len(crib.polled) for crib in cribs)
+
+
+def test_a_failing_sensor_backs_off_without_delaying_the_others(monkeypatch):
+    monkeypatch.setattr(hub, "ERROR_BACKOFF", 0.3)
+    healthy, failing = PolledCrib("healthy"), PolledCrib("failing", fail=True)
+    run_scheduler([healthy, failing], 1.0, workers=1, interval=0.1)
+    assert 2 <= len(failing.polled) <= 4
+    assert failing.sensor_errors == len(failing.polled)
+    assert min(b - a for a, b in zip(failing.polled, failing.polled[1:])) >= 0.29
+    assert len(healthy.polled) >= 8 and healthy.sensor_errors == 0
+
+
+def make_crib(tmp_path, name, seed):
+    config = CribConfig(name, ppg_source=ppg_recording.synthetic_ppg(60, seed=seed), ppg_speed=4.0,
+                        log_file=str(tmp_path / f"{name}.csv"))
+    crib = Crib(config, alarm_backend=fakes.SilentAlarmBackend(), metrics_scope=f"test{next(SCOPES)}")
+    crib.evaluator.thresholds_file = str(tmp_path / "thresholds.json")  # none: default thresholds
+    return crib
+
+
+def test_a_failing_crib_does_not_stop_the_others(tmp_path, caplog):
+    broken, working = make_crib(tmp_path, "broken", 0), make_crib(tmp_path, "working", 1)
+    monitor = Hub([broken, working], poll_interval=0.1, fusion_interval=0.2, metrics_scope=f"test{next(SCOPES)}")
+    monitor.start()
+
+    def unplugged():
+        raise OSError(121, "Remote I/O error")
+
+    broken.device.read_fifo_burst = unplugged
+    time.sleep(4.0)
+    stats = monitor.stats()
+    monitor.stop()
+
+    assert stats["broken"]["sensor_errors"] >= 2 and stats["broken"]["readings"] == 0
+    assert stats["working"]["sensor_errors"] == 0 and stats["working"]["readings"] >= 4
+    assert "[broken] Sensor read failed" in caplog.text
+    # every crib logs to its own file; the broken one has no vitals to log
+    rows = (tmp_path / "working.csv").read_text().splitlines()
+    assert len(rows) >= 5
+    assert not (tmp_path / "broken.csv").exists() or (tmp_path / "broken.csv").read_text() == ""
+
+
+class SlowVisionCrib:
+    """
+    Stand-in for a Crib whose frame analysis takes longer than the vision interval.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.camera = object()
+        self.vision_busy = False
+        self.analyses = 0
+        self.overlaps = 0
+        self._running = threading.Lock()
+
+    def analyze_frame(self):
+        if not self._running.acquire(blocking=False):
+            self.overlaps += 1
+            return
+        try:
+            time.sleep(0.25)
+            self.analyses += 1
+        finally:
+            self._running.release()
+            self.vision_busy = False
+
+
+def test_busy_cribs_skip_frames():
+    slow = SlowVisionCrib("slow")
+    monitor = Hub([slow], vision_workers=2, vision_interval=0.05, metrics_scope=f"test{next(SCOPES)}")
+    vision = threading.Thread(target=monitor._vision_loop, daemon=True)
+    vision.start()
+    time.sleep(1.0)
+    monitor.stop_event.set()
+    vision.join(1.0)
+    monitor.vision_pool.shutdown(wait=True)
+    assert slow.overlaps == 0  # never two frames of the same crib at once
+    assert 3 <= slow.analyses <= 5
+    assert monitor.skipped_frames >= monitor.batches - slow.analyses - 1 >= 10
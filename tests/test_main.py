@@ -0,0 +1,56 @@
+import main
+from pipeline import VitalsReading, fuse
+
+
+def evaluator():
+    return main.StateEvaluator(thresholds_file="/nonexistent.json")
+
+
+def reading(timestamp):
+    return VitalsReading(timestamp, 97.0, True, 120.0, True, 0.9)
+
+
+def alert_keys(alerts):
+    return [key for key, _ in alerts]
+
+
+def test_no_alert_while_vitals_are_fresh():
+    check = evaluator()
+    vitals = reading(1000.0)
+    assert check.evaluate(fuse(1000.5, vitals, None)) == []
+
+
+def test_stale_vitals_raise_an_alert():
+    check = evaluator()
+    vitals = reading(1000.0)
+    assert "vitals" not in alert_keys(check.evaluate(fuse(1000.0 + main.NO_VITALS_ALERT_AFTER - 1, vitals, None)))
+    alerts = check.evaluate(fuse(1000.0 + main.NO_VITALS_ALERT_AFTER + 1, vitals, None))
+    assert alert_keys(alerts) == ["vitals"]
+    assert "check the sensor" in alerts[0][1]
+
+
+def test_missing_vitals_raise_an_alert_from_the_first_state():
+    check = evaluator()
+    assert check.evaluate(fuse(2000.0, None, None)) == []
+    assert check.evaluate(fuse(2000.0 + main.NO_VITALS_ALERT_AFTER - 1, None, None)) == []
+    assert alert_keys(check.evaluate(fuse(2000.0 + main.NO_VITALS_ALERT_AFTER, None, None))) == ["vitals"]
+    # a fresh reading ends the condition
+    assert check.evaluate(fuse(2100.0, reading(2100.0), None)) == []
+
+
+def test_poor_signal_is_not_checked_and_raises_an_alert_after_a_while():
+    check = evaluator()
+    start = 3000.0
+    poor = main.QUALITY_THRESHOLD / 2
+    for k in range(int(main.POOR_SIGNAL_ALERT_AFTER)):
+        # implausible values of a poor window do not raise low vitals alerts
+        vitals = VitalsReading(start + k, -999, False, 23.0, True, poor)
+        assert check.evaluate(fuse(start + k, vitals, None)) == []
+    now = start + main.POOR_SIGNAL_ALERT_AFTER
+    alerts = check.evaluate(fuse(now, VitalsReading(now, -999, False, 23.0, True, poor), None))
+    assert alert_keys(alerts) == ["signal"]
+    assert "check the sensor" in alerts[0][1]
+    # a good window ends the condition and is checked again
+    now += 1
+    alerts = check.evaluate(fuse(now, VitalsReading(now, -999, False, 23.0, True, 0.9), None))
+    assert "signal" not in alert_keys(alerts) and "oxygen" in alert_keys(alerts)
@@ -0,0 +1,69 @@
+import fakes
+import max30102
+
+SAMPLES = [((7 * k) & 0x3FFFF, (0x3FFFF - 13 * k) & 0x3FFFF) for k in range(200)]
+
+
+def make_sensor(samples=SAMPLES, sample_rate=None):
+    bus = fakes.FakeSMBus(samples, sample_rate=sample_rate)
+    return bus, max30102.MAX30102(bus=bus, gpio=fakes.FakeGPIO(bus))
+
+
+def test_decode_samples_masks_to_18_bits():
+    data = [0xFF, 0x12, 0x34, 0x01, 0x00, 0x02]
+    assert max30102.decode_samples(data).tolist() == [[0x031234, 0x010002]]
+
+
+def test_burst_drains_the_fifo_in_block_reads():
+    bus, sensor = make_sensor()
+    bus.fifo.clear()
+    for red, ir in SAMPLES[:12]:
+        bus.fifo.append((red, ir))
+    bus.registers[max30102.REG_FIFO_WR_PTR] = 12
+    bus.registers[max30102.REG_FIFO_RD_PTR] = 0
+    bus.sample_rate = 0  # nothing new enters the FIFO during the read
+    reads = bus.reads
+    block = sensor.read_fifo_burst()
+    assert block.tolist() == [list(s) for s in SAMPLES[:12]]
+    # interrupt status + pointers + 12 samples in reads of at most 5
+    assert bus.reads - reads == 2 + 3
+    assert sensor.read_fifo_burst().shape == (0, 2)
+
+
+def test_burst_counts_overflows():
+    bus, sensor = make_sensor()
+    bus.fifo.clear()
+    bus.fifo.extend(SAMPLES[:max30102.FIFO_DEPTH])
+    bus.registers[max30102.REG_FIFO_WR_PTR] = bus.registers[max30102.REG_FIFO_RD_PTR] = 5
+    bus.registers[max30102.REG_OVF_COUNTER] = 3
+    bus.sample_rate = 0
+    assert sensor.read_fifo_burst().shape == (max30102.FIFO_DEPTH, 2)
+    assert sensor.last_overflow == 3 and sensor.overflow_count == 3
+
+
+def contiguous(red, ir):
+    """
+    Whether the samples read are an uninterrupted run of SAMPLES (the samples produced
+    before the driver resets the FIFO during setup are lost, as on the device).
+    """
+    start = SAMPLES.index((red[0], ir[0]))
+    return list(zip(red, ir)) == SAMPLES[start:start + len(red)]
+
+
+def test_single_reads_return_every_sample():
+    _, sensor = make_sensor()
+    assert contiguous(*sensor.read_sequential(150))
+
+
+def test_burst_reads_keep_the_extra_samples_for_the_next_call():
+    _, sensor = make_sensor(sample_rate=1000)
+    red, ir = sensor.read_sequential(100, burst=True)
+    more_red, more_ir = sensor.read_sequential(50, burst=True)
+    assert len(red) == 100 and len(more_red) == 50
+    assert contiguous(red + more_red, ir + more_ir)
+
+
+def test_reset_is_polled():
+    bus, _ = make_sensor()
+    # the fake clears the reset bit at once, so the driver never waits the full second
+    assert not bus.registers[max30102.REG_MODE_CONFIG] & max30102.MODE_RESET
@@ -0,0 +1,92 @@
+import json
+import socket
+import threading
+import urllib.request
+
+import metrics
+from metrics import MetricsRegistry, MetricsServer
+
+
+def test_counters_gauges_and_histograms():
+    registry = MetricsRegistry()
+    registry.counter("events").inc()
+    registry.counter("events").inc(2)
+    registry.gauge("depth", lambda: 7)
+    registry.gauge("level").set(3)
+    for value in (1, 2, 3, 400):
+        registry.histogram("latency").observe(value)
+
+    snapshot = registry.snapshot()
+    assert snapshot["counters"] == {"events": 3}
+    assert snapshot["gauges"] == {"depth": 7, "level": 3}
+    assert snapshot["histograms"]["latency"]["count"] == 4
+    assert snapshot["histograms"]["latency"]["max"] == 400
+
+
+def test_a_bound_gauge_is_not_rebound():
+    registry = MetricsRegistry()
+    registry.gauge("queue.log_rows", lambda: 1)
+    registry.gauge("queue.log_rows", lambda: 2)
+    assert registry.snapshot()["gauges"]["queue.log_rows"] == 1
+
+
+def test_scoped_gauges_are_separate():
+    registry = MetricsRegistry()
+    for crib, depth in (("crib1", 1), ("crib2", 2)):
+        registry.gauge(metrics.scoped("queue.log_rows", f"hub.{crib}"), lambda d=depth: d)
+    gauges = registry.snapshot()["gauges"]
+    assert gauges == {"hub.crib1.queue.log_rows": 1, "hub.crib2.queue.log_rows": 2}
+    assert metrics.scoped("queue.log_rows") == "queue.log_rows"
+
+
+def test_components_in_their_own_scopes_do_not_collide(monkeypatch, caplog):
+    from async_orchestrator import Orchestrator
+    from pipeline import Pipeline
+
+    monkeypatch.setattr(metrics, "registry", MetricsRegistry())
+    pipelines = [Pipeline(None, None, None, None, None, None, metrics_scope=scope) for scope in ("threads", "processes")]
+    pipelines[1].stages[0].stats.errors = 3
+    for scope in ("first", "second"):
+        Orchestrator(None, None, None, None, metrics_scope=scope)
+    gauges = metrics.snapshot()["gauges"]
+    assert gauges["threads.stage.vitals.errors"] == 0
+    assert gauges["processes.stage.vitals.errors"] == 3
+    assert "second.orchestrator.vitals.timeouts" in gauges
+    assert "already bound" not in caplog.text
+
+
+def test_snapshot_while_metrics_are_created():
+    registry = MetricsRegistry()
+
+    def create():
+        for i in range(5000):
+            registry.counter(f"c{i}").inc()
+
+    thread = threading.Thread(target=create)
+    thread.start()
+    while thread.is_alive():
+        registry.snapshot()
+    thread.join()
+    assert len(registry.snapshot()["counters"]) == 5000
+
+
+def test_server_serves_the_snapshot():
+    registry = MetricsRegistry()
+    registry.counter("events").inc()
+    server = MetricsServer(registry, port=0)
+    server.start()
+    try:
+        with urllib.request.urlopen("http://%s:%d/metrics" % server.address[:2], timeout=5) as response:
+            assert json.load(response)["counters"] == {"events": 1}
+    finally:
+        server.stop()
+
+
+def test_server_on_a_busy_port_does_not_abort():
+    with socket.socket() as busy:
+        busy.bind(("127.0.0.1", 0))
+        busy.listen()
+        server = MetricsServer(MetricsRegistry(), port=busy.getsockname()[1])
+        server.start()
+        assert server.address is None
+        server.stop()
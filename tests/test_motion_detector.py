@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from motion_detector import DILATE_KERNEL, FAST_SCALE, MODES, MotionDetector, synthetic_scene
+
+STILL = range(5, 30)  # after the background model settled, before the block moves
+MOVING = range(35, 60)  # the block moves 12 pixels per frame
+
+
+@pytest.fixture(scope="module")
+def results():
+    """
+    Results of both modes on the synthetic scene, with their contour passes after each frame.
+    """
+    detectors = {mode: MotionDetector(mode) for mode in MODES}
+    out = {mode: [] for mode in MODES}
+    for k, frame in enumerate(synthetic_scene(60)):
+        for mode, detector in detectors.items():
+            out[mode].append((detector.detect(frame, timestamp=float(k)), detector.contour_passes))
+    return out
+
+
+def test_modes_agree_on_clear_motion_and_stillness(results):
+    for mode in MODES:
+        assert not any(results[mode][k][0] for k in STILL)
+        assert all(results[mode][k][0] for k in MOVING)
+
+
+def test_fast_mode_skips_the_contours_without_foreground(results):
+    fast = [passes for _, passes in results["fast"]]
+    reference = [passes for _, passes in results["reference"]]
+    assert fast[STILL[-1]] == fast[STILL[0] - 1]  # countNonZero was enough on every still frame
+    assert reference[STILL[-1]] - reference[STILL[0] - 1] == len(STILL)
+    assert fast[MOVING[-1]] - fast[MOVING[0] - 1] == len(MOVING)
+    assert all(result.magnitude < 0.01 and result.bbox is None for result, _ in
+               (results["fast"][k] for k in STILL))
+
+
+def test_bbox_follows_the_moving_block(results):
+    # the dilation grows the mask by up to DILATE_KERNEL pixels, on a coarser grid in the fast mode
+    slack = DILATE_KERNEL + 1 / FAST_SCALE
+    for k in MOVING:
+        right = 50 + 12 * (k - 29) + 120  # leading edge of the block (see synthetic_scene)
+        for mode in MODES:
+            result = results[mode][k][0]
+            x, y, w, h = result.bbox
+            assert 0.0 < result.magnitude < 0.5
+            assert abs(y - 120) <= slack and abs(y + h - 240) <= slack
+            assert abs(x + w - right) <= slack and w >= 12
+
+
+def test_energy_ring_is_bounded():
+    detector = MotionDetector(energy_size=10)
+    for k, frame in enumerate(synthetic_scene(25, size=(160, 90))):
+        detector.detect(frame, timestamp=float(k))
+    timestamps, magnitudes = detector.energy()
+    assert timestamps.tolist() == [float(k) for k in range(15, 25)]
+    assert magnitudes.shape == (10,) and np.all((magnitudes >= 0) & (magnitudes <= 1))
+    assert detector.energy(since=21.0)[0].tolist() == [22.0, 23.0, 24.0]
+    assert detector.mean_energy(3.0) == pytest.approx(magnitudes[-3:].mean())
+    assert MotionDetector().mean_energy(10.0) == 0.0
+
+
+def test_unknown_mode_is_refused():
+    with pytest.raises(ValueError):
+        MotionDetector("slow")
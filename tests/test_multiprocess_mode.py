@@ -0,0 +1,91 @@
+import pytest
+
+import multiprocess_mode
+from multiprocess_mode import Supervisor, WorkerProcess
+
+
+class FakeProcess:
+    def __init__(self, context):
+        self.context = context
+        self.pid = 1000 + len(context.started)
+        self.exitcode = None
+        self.terminated = False
+
+    def start(self):
+        self.context.started.append(self)
+
+    def is_alive(self):
+        return self.exitcode is None
+
+    def terminate(self):
+        self.terminated = True
+        self.exitcode = -15
+
+    def kill(self):
+        self.exitcode = -9
+
+    def join(self, timeout=None):
+        pass
+
+
+class FakeContext:
+    def __init__(self):
+        self.started = []
+
+    def Process(self, target, args, name, daemon):
+        return FakeProcess(self)
+
+
+class FakeRing:
+    heartbeat = 0.0
+
+
+@pytest.fixture
+def supervisor(monkeypatch):
+    monkeypatch.setattr(multiprocess_mode, "RESTART_BACKOFF", 0.0)
+    context = FakeContext()
+    alerts = []
+    worker = WorkerProcess("vitals", None, (), FakeRing())
+    supervisor = Supervisor([worker], stop_event=None, context=context,
+                            alert=lambda key, message: alerts.append((key, message)))
+    supervisor._launch(worker)
+    return supervisor, worker, context, alerts
+
+
+def test_crashed_worker_is_restarted_with_backoff(supervisor, monkeypatch):
+    supervisor, worker, context, alerts = supervisor
+    monkeypatch.setattr(multiprocess_mode, "RESTART_BACKOFF", 1.0)
+    worker.process.exitcode = 1
+    supervisor.check(worker)
+    assert worker.process is None
+    assert worker.failures == 1
+    supervisor.check(worker)  # still within the back-off
+    assert len(context.started) == 1
+    worker.next_start = 0.0
+    supervisor.check(worker)
+    assert len(context.started) == 2
+    assert worker.restarts == 1
+    assert alerts == []
+
+
+def test_repeated_failures_raise_an_alert(supervisor):
+    supervisor, worker, context, alerts = supervisor
+    for _ in range(multiprocess_mode.RESTART_ALERT_AFTER):
+        worker.process.exitcode = 1
+        supervisor.check(worker)  # exited
+        supervisor.check(worker)  # restarted
+    assert worker.restarts == multiprocess_mode.RESTART_ALERT_AFTER
+    assert len(alerts) == 1
+    key, message = alerts[0]
+    assert key == "process-vitals"
+    assert "failed 3 times" in message
+
+
+def test_worker_that_ended_is_not_restarted(supervisor):
+    supervisor, worker, context, alerts = supervisor
+    worker.process.exitcode = 0
+    for _ in range(3):
+        supervisor.check(worker)
+    assert worker.ended
+    assert len(context.started) == 1
+    assert alerts == [("process-vitals", "The vitals process ended")]
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+import max30102
+import ppg_recording
+from ppg_recording import PpgRecorder, RecordingMAX30102, ReplayMAX30102
+
+
+class FakeTime:
+    """
+    Clock and sleep of a replay, advancing only when the replay sleeps.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_recorded_samples_replay_unchanged(tmp_path):
+    red, ir = ppg_recording.synthetic_ppg(10)
+    path = str(tmp_path / "night.ppg")
+    device = RecordingMAX30102(ReplayMAX30102((red, ir), speed=None), path)
+    read = [device.read_sequential(100), device.read_sequential(60)]
+    device.read_fifo()
+    device.shutdown()
+
+    rate, records = ppg_recording.load_recording(path)
+    assert rate == ppg_recording.SAMPLE_RATE and records.shape == (161,)
+    # each buffer is stamped backwards from its read, one sample period apart
+    assert np.allclose(np.diff(records["timestamp"][:100]), 1 / rate)
+    replay = ReplayMAX30102(path, speed=None)
+    assert replay.read_sequential(100) == read[0]
+    assert replay.read_sequential(60) == read[1]
+    assert replay.read_fifo() == (red[160], ir[160])
+    with pytest.raises(EOFError):
+        replay.read_sequential(1)
+    assert replay.exhausted and not replay.wait_for_interrupt(0.0)
+
+
+def test_appending_to_a_recording_keeps_one_header(tmp_path):
+    path = str(tmp_path / "night.ppg")
+    for start in (0.0, 10.0):
+        with PpgRecorder(path) as recorder:
+            recorder.write([1, 2], [3, 4], timestamps=[start, start + 0.04])
+    _, records = ppg_recording.load_recording(path)
+    assert records["red"].tolist() == [1, 2, 1, 2]
+    assert records["timestamp"].tolist() == [0.0, 0.04, 10.0, 10.04]
+    (tmp_path / "other.bin").write_bytes(b"not a recording")
+    with pytest.raises(ValueError):
+        ppg_recording.load_recording(str(tmp_path / "other.bin"))
+
+
+def test_loop_restarts_from_the_beginning():
+    red, ir = np.arange(10), np.arange(100, 110)
+    replay = ReplayMAX30102((red, ir), speed=None, loop=True)
+    got_red, got_ir = replay.read_sequential(25)
+    assert got_red == list(range(10)) * 2 + list(range(5))
+    assert got_ir[10] == 100 and not replay.exhausted
+
+
+def test_replay_follows_the_recorded_pace_at_its_speed():
+    fake = FakeTime()
+    red, ir = ppg_recording.synthetic_ppg(20)
+    replay = ReplayMAX30102((red, ir), speed=2.0, clock=fake.clock, sleep=fake.sleep)
+    replay.read_sequential(50)
+    # the 50th sample is recorded 49 sample periods in, replayed twice as fast
+    assert fake.now == pytest.approx(49 / ppg_recording.SAMPLE_RATE / 2.0)
+
+    fake.now += 0.5  # one second of recording becomes due
+    samples = replay.read_fifo_burst()
+    assert samples.shape == (ppg_recording.SAMPLE_RATE, 2)
+    assert samples[0].tolist() == [red[50], ir[50]]
+
+    fake.now += 10.0  # far more than the FIFO holds: the oldest samples are lost
+    samples = replay.read_fifo_burst()
+    assert samples.shape[0] == max30102.FIFO_DEPTH
+    assert samples[-1].tolist() == [red[-1], ir[-1]]
+    assert replay.last_overflow == replay.overflow_count == len(red) - 75 - max30102.FIFO_DEPTH
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+import ppg_recording
+import pulse_oximeter_reader
+from pulse_oximeter_reader import VitalsReader, stream_pulse_oximeter_data
+
+
+class FlakyDevice:
+    """
+    Replay device whose reads fail with an I2C error on the given call numbers.
+    """
+
+    def __init__(self, seconds, failing_calls=()):
+        self.device = ppg_recording.ReplayMAX30102(ppg_recording.synthetic_ppg(seconds), speed=None)
+        self.failing_calls = set(failing_calls)
+        self.calls = 0
+
+    def read_sequential(self, amount=100, burst=False):
+        self.calls += 1
+        if self.calls in self.failing_calls:
+            raise OSError(121, "Remote I/O error")
+        return self.device.read_sequential(amount, burst)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(pulse_oximeter_reader, "READ_ERROR_BACKOFF", 0.0)
+
+
+def test_stream_survives_read_errors():
+    device = FlakyDevice(30, failing_calls={6, 7})
+    readings = list(stream_pulse_oximeter_data(device))
+    # the window restarts after the errors, so the stream still yields readings after them
+    assert device.calls > 7
+    assert len(readings) >= 30 - 2 - 2 * 4
+    assert any(heart_rate_ok for _, _, _, heart_rate_ok in readings[-5:])
+
+
+def test_stream_ends_with_the_recording():
+    device = FlakyDevice(8)
+    assert len(list(stream_pulse_oximeter_data(device))) == 8 - 4 + 1
+
+
+def test_reader_returns_none_once_the_stream_ended():
+    read = VitalsReader(stream_pulse_oximeter_data(FlakyDevice(5)))
+    readings = [read() for _ in range(4)]
+    assert readings[0] is not None and readings[1] is not None
+    assert readings[2:] == [None, None]
+    assert read.ended
+
+
+def test_burst_reads_take_few_transactions():
+    import fakes
+    import max30102
+
+    samples = [(1000 + k, 50000 + k) for k in range(400)]
+    bus = fakes.FakeSMBus(samples, sample_rate=100)
+    sensor = max30102.MAX30102(bus=bus, gpio=fakes.FakeGPIO(bus))
+    while bus.pending() < 25:  # queued while the consumer was busy
+        time.sleep(0.01)
+    reads = bus.reads
+    red, ir = pulse_oximeter_reader.read_samples(sensor, 25, burst=True)
+    start = samples.index((red[0], ir[0]))
+    assert list(zip(red, ir)) == samples[start:start + 25]
+    # reading them one by one takes three transactions per sample
+    assert bus.reads - reads < 25
+
+
+def test_fifo_overflows_are_published():
+    import metrics
+
+    metrics.registry.reset()
+    device = pulse_oximeter_reader.initialize_pulse_oximeter(ppg_recording.synthetic_ppg(8), speed=None)
+    device.overflow_count = 5
+    assert metrics.snapshot()["gauges"]["sensor.fifo_overflows"] == 5
+    metrics.registry.reset()
+
+
+def test_fifo_overflows_are_logged(caplog):
+    class OverflowingDevice(FlakyDevice):
+        overflow_count = 0
+
+        def read_sequential(self, amount=100, burst=False):
+            self.overflow_count += 3
+            return super().read_sequential(amount, burst)
+
+    assert pulse_oximeter_reader.read_samples(OverflowingDevice(8), 25) is not None
+    assert "3 samples lost" in caplog.text
@@ -0,0 +1,73 @@
+import secrets
+
+import numpy as np
+import pytest
+
+from shared_ring import SharedRing
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRing(f"smtest{secrets.token_hex(4)}", 4, (3,), np.float64, create=True)
+    yield ring
+    ring.close()
+
+
+def test_items_are_read_back(ring):
+    assert ring.latest() is None
+    for seq in range(3):
+        assert ring.write([seq, seq + 1, seq + 2], timestamp=100.0 + seq) == seq
+    timestamp, item = ring.read(1)
+    assert timestamp == 101.0
+    np.testing.assert_array_equal(item, [1, 2, 3])
+    seq, timestamp, item = ring.latest()
+    assert (seq, timestamp) == (2, 102.0)
+    assert ring.read(3) is None  # not written yet
+
+
+def test_read_copies_the_item(ring):
+    ring.write([1, 2, 3])
+    _, item = ring.read(0)
+    ring.write([4, 5, 6])
+    ring.write([7, 8, 9])
+    ring.write([0, 0, 0])
+    ring.write([5, 5, 5])  # reuses the slot of item 0
+    np.testing.assert_array_equal(item, [1, 2, 3])
+
+
+def test_overwritten_items_are_detected(ring):
+    for seq in range(6):
+        ring.write([seq] * 3)
+    assert ring.read(1) is None  # slot reused by item 5
+    items, lost = ring.read_since(-1)
+    assert [seq for seq, _, _ in items] == [2, 3, 4, 5]
+    assert lost == 2
+    items, lost = ring.read_since(3)
+    assert [seq for seq, _, _ in items] == [4, 5]
+    assert lost == 0
+
+
+def test_slot_being_written_is_not_returned(ring):
+    for seq in range(3):
+        ring.write([seq] * 3)
+    # what a reader sees while the writer fills the slot of item 2
+    ring._seqs[2 % ring.slots] = -1
+    assert ring.read(2) is None
+    items, lost = ring.read_since(0)
+    assert [seq for seq, _, _ in items] == [1]
+    assert lost == 1
+
+
+def test_reader_attached_by_name(ring):
+    reader = SharedRing(*ring.spec())
+    try:
+        assert not reader.wait(-1, timeout=0.01)
+        ring.write([1, 2, 3], timestamp=5.0)
+        ring.beat()
+        assert reader.wait(-1, timeout=1.0)
+        seq, timestamp, item = reader.latest()
+        assert (seq, timestamp) == (0, 5.0)
+        np.testing.assert_array_equal(item, [1, 2, 3])
+        assert reader.heartbeat > 0
+    finally:
+        reader.close()
@@ -0,0 +1,51 @@
+import numpy as np
+
+import signal_quality
+from signal_quality import assess
+
+FS = 25  # samples per second of the estimator windows
+T = np.arange(100) / FS
+
+
+def window(dc=120000.0, ac=600.0, heart_rate=125.0):
+    ir = dc + ac * np.sin(2 * np.pi * heart_rate / 60.0 * T)
+    return ir, 0.8 * ir
+
+
+def test_clean_window_is_usable():
+    quality = assess(*window())
+    assert quality.ok and quality.reason is None
+    assert quality.score >= 0.9
+    assert 0.5 < quality.perfusion_index < 2.0 and quality.motion < 0.1
+
+
+def test_no_contact():
+    quality = assess(*window(dc=2000.0, ac=5.0))
+    assert (quality.ok, quality.reason, quality.score) == (False, "no_contact", 0.0)
+
+
+def test_clipped():
+    ir, red = window(dc=signal_quality.ADC_MAX * 0.97, ac=4000.0)
+    ir = np.minimum(ir, signal_quality.ADC_MAX)
+    quality = assess(ir, red)
+    assert quality.clipped_fraction > signal_quality.MAX_CLIPPED_FRACTION
+    assert (quality.ok, quality.reason, quality.score) == (False, "clipped", 0.0)
+
+
+def test_low_perfusion():
+    quality = assess(*window(ac=20.0))
+    assert quality.perfusion_index < signal_quality.MIN_PERFUSION_INDEX
+    assert (quality.ok, quality.reason, quality.score) == (False, "low_perfusion", 0.0)
+
+
+def test_motion_corrupted():
+    ir, red = window()
+    ir[60:] += 15000.0  # the baby moves: the baseline jumps
+    quality = assess(ir, red)
+    assert quality.motion > 0.5
+    assert (quality.ok, quality.reason) == (False, "motion")
+    assert quality.score < signal_quality.QUALITY_THRESHOLD
+
+
+def test_too_short_window():
+    assert assess([1, 2], [1, 2]) is signal_quality.REJECTED
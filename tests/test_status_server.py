@@ -0,0 +1,46 @@
+import json
+import socket
+import urllib.request
+
+from pipeline import VitalsReading, VisionReading, fuse
+from status_server import StatusServer, state_payload
+
+
+def test_vitals_are_labelled_by_what_they_measure():
+    # heart_rate holds the SpO2, oxygen_level the HR (see pulse_oximeter_reader.SPO2_FIELD)
+    vitals = VitalsReading(100.0, 125, True, 97, True, 0.8)
+    payload = state_payload(fuse(101.0, vitals, VisionReading(100.5, True, False, 1)))
+    assert payload["vitals"]["spo2"] == 97
+    assert payload["vitals"]["hr"] == 125
+    assert payload["vitals"]["spo2_ok"] and payload["vitals"]["hr_ok"]
+    assert payload["vitals"]["fresh"]
+    assert payload["vision"]["face_detected"]
+
+
+def test_invalid_values_are_null():
+    vitals = VitalsReading(100.0, -999, False, float("nan"), False)
+    payload = state_payload(fuse(100.0, vitals, None))
+    assert payload["vitals"]["hr"] is None
+    assert payload["vitals"]["spo2"] is None
+    assert payload["vision"] is None
+
+
+def test_state_is_served():
+    server = StatusServer(port=0, snapshots=False)
+    server.start()
+    try:
+        server.publish(fuse(100.0, VitalsReading(100.0, 125, True, 97, True), None))
+        with urllib.request.urlopen("http://%s:%d/state" % server.address[:2], timeout=5) as response:
+            assert json.load(response)["vitals"]["spo2"] == 97
+    finally:
+        server.stop()
+
+
+def test_busy_port_does_not_abort():
+    with socket.socket() as busy:
+        busy.bind(("127.0.0.1", 0))
+        busy.listen()
+        server = StatusServer(port=busy.getsockname()[1], snapshots=False)
+        server.start()
+        assert server.address is None
+        server.stop()
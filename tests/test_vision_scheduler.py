@@ -0,0 +1,137 @@
+import itertools
+
+import pytest
+
+import vision_scheduler
+from vision_scheduler import VisionScheduler
+
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Scene:
+    """
+    Scripted detectors: the face flag and whether the next frame shows motion.
+    """
+
+    def __init__(self):
+        self.face = True
+        self.motion = False
+        self.cascades = 0
+
+    def detect_face(self, frame):
+        self.cascades += 1
+        return self.face
+
+    def detect_motion(self, frame):
+        return self.motion
+
+
+SCOPES = itertools.count()
+
+
+def make_scheduler(load=0.0, **kwargs):
+    clock, scene, loads = Clock(), Scene(), [load]
+    scheduler = VisionScheduler(scene.detect_face, scene.detect_motion, load=lambda: loads[0], clock=clock,
+                                metrics_scope=f"test{next(SCOPES)}", **kwargs)
+    return scheduler, scene, clock, loads
+
+
+def frames(scheduler, clock, until, every=0.25):
+    """
+    Feeds a frame every EVERY seconds until UNTIL and returns the scene states.
+    """
+    states = []
+    while clock.now < until - 1e-9:
+        clock.now += every
+        states.append(scheduler.update(None, timestamp=clock.now))
+    return states
+
+
+def reasons(states):
+    return [s.reason for s in states if s.cascade_ran]
+
+
+def test_still_scene_only_runs_the_cascade_when_stale():
+    scheduler, scene, clock, _ = make_scheduler()
+    first = scheduler.update(None, timestamp=0.0)
+    assert first.cascade_ran and first.reason == "first" and first.face_detected
+    states = frames(scheduler, clock, 65.0)
+    assert reasons(states) == ["stale", "stale"]
+    assert scheduler.cascades == scene.cascades == 3
+    assert scheduler.frames == len(states) + 1
+
+
+def test_motion_runs_the_cascade_at_most_once_per_interval():
+    scheduler, scene, clock, _ = make_scheduler()
+    scheduler.update(None)
+    scene.motion = True
+    states = frames(scheduler, clock, 5.0)
+    assert reasons(states) == ["motion"] * 5  # every MIN_CASCADE_INTERVAL seconds, not every frame
+    assert all(s.motion_detected for s in states)
+
+
+def test_requested_check_runs_on_the_next_frame():
+    scheduler, scene, clock, _ = make_scheduler()
+    scheduler.update(None)
+    frames(scheduler, clock, 2.0)
+    scene.face = False
+    scheduler.request_check("vitals")
+    state, = frames(scheduler, clock, 2.25)
+    assert state.cascade_ran and state.reason == "vitals" and not state.face_detected
+    assert reasons(frames(scheduler, clock, 10.0)) == []  # the request is consumed
+
+
+def test_requested_check_respects_the_minimum_interval():
+    scheduler, scene, clock, _ = make_scheduler()
+    scheduler.update(None)
+    scheduler.request_check("vitals")
+    states = frames(scheduler, clock, 1.5)
+    ran = [s for s in states if s.cascade_ran]
+    assert len(ran) == 1 and ran[0].face_age == 0.0
+    assert ran[0].timestamp == pytest.approx(vision_scheduler.MIN_CASCADE_INTERVAL)
+
+
+def test_interval_adapts_to_the_load():
+    scheduler, scene, clock, loads = make_scheduler(load=1.0)
+    scene.motion = True
+    scheduler.update(None)
+    frames(scheduler, clock, 60.0)
+    assert scheduler.cascade_interval == vision_scheduler.MAX_CASCADE_INTERVAL
+    busy = scheduler.cascades
+    loads[0] = 0.0
+    frames(scheduler, clock, 120.0)
+    assert scheduler.cascade_interval == vision_scheduler.MIN_CASCADE_INTERVAL
+    assert scheduler.cascades - busy > 2 * busy  # far more cascades once the load is gone
+
+    loads[0] = 0.6  # between LOW_LOAD and HIGH_LOAD: unchanged
+    scheduler.cascade_interval = 2.0
+    frames(scheduler, clock, 130.0)
+    assert scheduler.cascade_interval == 2.0
+
+
+def test_confidence_decays_with_age_and_drops_after_motion():
+    scheduler, scene, clock, _ = make_scheduler()
+    scheduler.update(None)
+    state = frames(scheduler, clock, 15.0, every=15.0)[0]
+    assert not state.cascade_ran
+    assert state.face_age == 15.0
+    assert state.confidence == pytest.approx(1.0 - 15.0 / vision_scheduler.STALE_AFTER)
+
+    scheduler, scene, clock, _ = make_scheduler(min_interval=5.0)
+    scheduler.update(None)
+    scene.motion = True
+    moved = frames(scheduler, clock, 3.0, every=3.0)[0]  # too soon for another cascade
+    assert not moved.cascade_ran and moved.motion_detected
+    assert moved.confidence == pytest.approx((1.0 - 3.0 / vision_scheduler.STALE_AFTER)
+                                             * vision_scheduler.MOTION_CONFIDENCE)
+    scene.motion = False
+    still = frames(scheduler, clock, 4.0, every=1.0)[0]
+    assert still.confidence < 1.0 - 4.0 / vision_scheduler.STALE_AFTER  # moved since the last check
+    later = frames(scheduler, clock, 5.0, every=1.0)[0]
+    assert not later.cascade_ran  # no motion in this frame and not stale: no reason to run
@@ -0,0 +1,60 @@
+import numpy as np
+
+from pipeline import VitalsReading
+from vitals_filter import INVALID, HistoryRing, VitalsFilter
+
+
+def run(vitals_filter, spo2_values, start=1_700_000_000.0):
+    """
+    Feeds one reading per second (SpO2 in the heart_rate field, like the sensor, and a
+    steady value in the other) and returns the filtered SpO2 values.
+    """
+    out = []
+    for k, value in enumerate(spo2_values):
+        reading = VitalsReading(start + k, 125.0, True, value, value != INVALID)
+        out.append(vitals_filter(reading).filtered_heart_rate)
+    return out
+
+
+def test_a_single_spike_is_replaced():
+    vitals_filter = VitalsFilter(tau=0)  # no smoothing: the Hampel output itself
+    out = run(vitals_filter, [93, 94, 93, 92, 93, 23, 93])
+    assert out[5] == 93
+    assert out[:5] == [93, 94, 93, 92, 93] and out[6] == 93
+    assert vitals_filter.heart_rate.outliers == 1
+    assert vitals_filter.oxygen_level.outliers == 0
+
+
+def test_a_sustained_step_passes_through():
+    vitals_filter = VitalsFilter(tau=0)
+    out = run(vitals_filter, [125] * 7 + [150] * 8)
+    # replaced until the new level is the median of the window (4 of its 7 values)
+    assert out[7:] == [125] * 4 + [150] * 4
+
+
+def test_invalid_readings_do_not_poison_the_window():
+    vitals_filter = VitalsFilter(tau=0)
+    out = run(vitals_filter, [93, 94, 93, 92, INVALID, INVALID, INVALID, INVALID, 93, 23])
+    assert out[4:8] == [INVALID] * 4  # passed through unchanged
+    assert out[8] == 93 and out[9] == 93  # the spike is still recognized
+    window = vitals_filter.heart_rate.hampel.window
+    assert len(window) == 6 and INVALID not in window._sorted
+    # a -999 flagged ok is still invalid
+    reading = VitalsReading(1_700_000_100.0, 125.0, True, INVALID, True)
+    assert vitals_filter(reading).filtered_heart_rate == INVALID
+    assert len(window) == 6
+
+
+def test_history_is_bounded():
+    ring = HistoryRing(4, ("a", "b"))
+    for k in range(10):
+        ring.append((k, -k))
+    assert len(ring) == 4
+    assert ring.series()["a"].tolist() == [6, 7, 8, 9]
+
+    vitals_filter = VitalsFilter(history_size=5)
+    run(vitals_filter, [97] * 10 + [INVALID])
+    series = vitals_filter.series()
+    assert all(column.shape == (5,) for column in series.values())
+    assert np.diff(series["timestamp"]).tolist() == [1.0] * 4
+    assert np.isnan(series["heart_rate"][-1]) and np.isnan(series["filtered_heart_rate"][-1])
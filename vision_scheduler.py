@@ -0,0 +1,182 @@
+# ===========================
+# Vision Scheduler Module
+# ===========================
+"""
+Duty-cycled vision: cheap motion detection on every frame, the Haar cascade only when
+its answer may have changed.
+
+Background subtraction (monitor_motion) costs a few milliseconds per frame while the
+face cascade costs tens to hundreds. A sleeping baby who does not move does not change
+the answer of the cascade, so VisionScheduler runs it only when:
+
+- motion was seen in the frame,
+- the last face result is older than STALE_AFTER seconds,
+- a check was requested (request_check(), e.g. because the vitals look abnormal),
+- or the cascade has never run.
+
+Motion- and staleness-triggered runs are spaced by at least `cascade_interval` seconds,
+which adapts to the CPU headroom: it grows when the system load is high and shrinks
+back towards MIN_CASCADE_INTERVAL when it is low. Requested checks only respect
+MIN_CASCADE_INTERVAL.
+
+Every frame produces a SceneState: the last face result with its age and a confidence
+that decays with that age and drops when the scene has moved since the check.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Global Variables
+# ===========================
+MIN_CASCADE_INTERVAL = 1.0  # seconds, fastest cascade rate
+MAX_CASCADE_INTERVAL = 10.0  # seconds, slowest cascade rate under load
+STALE_AFTER = 30.0  # seconds after which a face result is re-checked even without motion
+HIGH_LOAD = 0.8  # load (fraction of the CPUs) above which the cascade slows down
+LOW_LOAD = 0.5  # load below which it speeds up again
+SLOW_DOWN = 1.5  # cascade interval factor under high load
+SPEED_UP = 0.8  # cascade interval factor under low load
+MOTION_CONFIDENCE = 0.5  # confidence factor once the scene moved after the last check
+
+SceneState = namedtuple(
+    "SceneState",
+    ["timestamp", "face_detected", "confidence", "face_age", "motion_detected", "cascade_ran", "reason",
+     "motion_magnitude"],
+    defaults=(None,),
+)
+
+
+def system_load():
+    """
+    One-minute load average as a fraction of the CPUs (0 where it is not available).
+    """
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return 0.0
+
+# ===========================
+# Vision Scheduler
+# ===========================
+class VisionScheduler:
+    """
+    Decides, frame by frame, whether the face cascade has to run.
+
+    Parameters:
+    detect_face (callable): frame -> bool, the expensive detector.
+    detect_motion (callable): frame -> bool (or a truthy motion_detector.MotionResult,
+        whose magnitude is passed on), run on every frame.
+    min_interval (float): See MIN_CASCADE_INTERVAL.
+    max_interval (float): See MAX_CASCADE_INTERVAL.
+    stale_after (float): See STALE_AFTER.
+    load (callable): Returns the current load as a fraction of the CPUs.
+    clock (callable): Monotonic time source.
+    metrics_scope (str, optional): Scope of the scheduler's gauges (see metrics.scoped).
+    """
+
+    def __init__(self, detect_face, detect_motion, min_interval=MIN_CASCADE_INTERVAL,
+                 max_interval=MAX_CASCADE_INTERVAL, stale_after=STALE_AFTER, load=system_load,
+                 clock=time.monotonic, metrics_scope=None):
+        self.detect_face = detect_face
+        self.detect_motion = detect_motion
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stale_after = stale_after
+        self.load = load
+        self.clock = clock
+
+        self.cascade_interval = min_interval
+        self.face_detected = False
+        self.last_cascade = None  # clock time of the last cascade run
+        self.moved_since_cascade = False
+        self.frames = 0
+        self.cascades = 0
+        self._requested = None
+        self._lock = threading.Lock()
+        metrics.gauge(metrics.scoped("vision.cascade_interval", metrics_scope), lambda: self.cascade_interval)
+
+    def request_check(self, reason="requested"):
+        """
+        Asks for a cascade run on the next frame (thread-safe, never blocks).
+        """
+        with self._lock:
+            self._requested = reason
+
+    def _reason(self, now, motion):
+        """
+        Why the cascade should run on this frame, or None.
+        """
+        if self.last_cascade is None:
+            return "first"
+        since = now - self.last_cascade
+        with self._lock:
+            requested = self._requested
+        if requested is not None and since >= self.min_interval:
+            return requested
+        if since < self.cascade_interval:
+            return None
+        if motion:
+            return "motion"
+        if since >= self.stale_after:
+            return "stale"
+        return None
+
+    def _adapt(self):
+        load = self.load()
+        if load > HIGH_LOAD:
+            interval = min(self.max_interval, self.cascade_interval * SLOW_DOWN)
+        elif load < LOW_LOAD:
+            interval = max(self.min_interval, self.cascade_interval * SPEED_UP)
+        else:
+            return
+        if interval != self.cascade_interval:
+            logger.debug("Cascade interval %.1f s -> %.1f s (load %.2f)", self.cascade_interval, interval, load)
+            self.cascade_interval = interval
+
+    def update(self, frame, timestamp=None):
+        """
+        Runs motion detection on FRAME, and the cascade if needed.
+
+        Parameters:
+        frame (frame_producer.Frame or np.ndarray): Frame to analyze.
+        timestamp (float, optional): Time of the frame, reported in the SceneState.
+
+        Returns:
+        SceneState: The scene after this frame.
+        """
+        now = self.clock()
+        self.frames += 1
+        result = self.detect_motion(frame)
+        motion = bool(result)
+        if motion:
+            self.moved_since_cascade = True
+
+        reason = self._reason(now, motion)
+        if reason is not None:
+            with self._lock:
+                self._requested = None
+            self.face_detected = bool(self.detect_face(frame))
+            self.last_cascade = now
+            self.moved_since_cascade = False
+            self.cascades += 1
+            metrics.counter(f"vision.cascade.{reason}").inc()
+            self._adapt()
+        else:
+            metrics.counter("vision.cascade.skipped").inc()
+
+        face_age = now - self.last_cascade
+        confidence = max(0.0, 1.0 - face_age / self.stale_after)
+        if self.moved_since_cascade:
+            confidence *= MOTION_CONFIDENCE
+        return SceneState(time.time() if timestamp is None else timestamp, self.face_detected, confidence,
+                          face_age, motion, reason is not None, reason, getattr(result, "magnitude", None))
+
+    def __call__(self, frame):
+        return self.update(frame)
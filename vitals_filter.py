@@ -0,0 +1,298 @@
+# ===========================
+# Vitals Filter Module
+# ===========================
+"""
+Online outlier filtering and smoothing of the HR/SpO2 readings.
+
+Consecutive readings of the pulse oximeter jump between implausible values (98.45 ->
+85.90, 93 -> 23 -> 166 within seconds in sleep_monitor_log.csv), and a single spike is
+enough to cross the alert thresholds. VitalsFilter sits between the reading and the
+alert logic and, for each of the two values of a reading:
+
+- runs a Hampel filter over the last HAMPEL_WINDOW valid values: a value further than
+  HAMPEL_SIGMAS robust standard deviations (1.4826 * MAD, at least MIN_SCALE) from the
+  window median is replaced by the median. The raw value still enters the window, so a
+  real change of level passes once it has lasted half the window;
+- smooths the result with an exponential moving average whose weight follows the time
+  between readings (time constant EWMA_TAU).
+
+Invalid values (-999 or flagged not ok) pass through unchanged and leave the state
+alone; after a gap of more than RESET_AFTER seconds the filter starts over. Each
+reading costs O(HAMPEL_WINDOW) with a small fixed window, and memory is bounded: the
+windows and the HISTORY_SIZE most recent raw and filtered readings live in fixed-size
+rings.
+
+apply() returns the reading with its filtered_oxygen_level and filtered_heart_rate
+set, so both series travel with it to the decision logic and the logger.
+"""
+
+import math
+import threading
+from bisect import bisect_left, insort
+
+import numpy as np
+
+import metrics
+
+# ===========================
+# Global Variables
+# ===========================
+HAMPEL_WINDOW = 7  # valid readings the median and MAD are taken over
+HAMPEL_SIGMAS = 3.0  # robust standard deviations beyond which a value is an outlier
+MIN_SCALE = 1.5  # floor of the robust standard deviation (bpm or %), for flat windows
+MIN_SAMPLES = 3  # values needed in the window before outliers are replaced
+EWMA_TAU = 3.0  # seconds, time constant of the smoothing
+RESET_AFTER = 30.0  # seconds without a valid value after which the filter starts over
+HISTORY_SIZE = 3600  # readings kept for series() (one hour at one reading per second)
+INVALID = -999
+MAD_SCALE = 1.4826  # MAD to standard deviation for normally distributed values
+HISTORY_COLUMNS = ("timestamp", "oxygen_level", "heart_rate", "filtered_oxygen_level", "filtered_heart_rate")
+
+
+def _sorted_median(values):
+    n = len(values)
+    middle = n // 2
+    return values[middle] if n % 2 else 0.5 * (values[middle - 1] + values[middle])
+
+# ===========================
+# Rings
+# ===========================
+class RingWindow:
+    """
+    The last SIZE values in insertion order, with a sorted copy for the median.
+
+    Parameters:
+    size (int): Number of values kept.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._values = [0.0] * size
+        self._sorted = []
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def push(self, value):
+        """
+        Adds VALUE, evicting the oldest value once the window is full.
+        """
+        if self._count == self.size:
+            del self._sorted[bisect_left(self._sorted, self._values[self._next])]
+        else:
+            self._count += 1
+        self._values[self._next] = value
+        insort(self._sorted, value)
+        self._next = (self._next + 1) % self.size
+
+    def median(self):
+        return _sorted_median(self._sorted)
+
+    def mad(self, median):
+        """
+        Median absolute deviation from MEDIAN.
+        """
+        return _sorted_median(sorted(abs(value - median) for value in self._sorted))
+
+    def clear(self):
+        self._sorted.clear()
+        self._next = 0
+        self._count = 0
+
+
+class HistoryRing:
+    """
+    Fixed-size table of the most recent rows of COLUMNS floats.
+
+    Parameters:
+    size (int): Number of rows kept.
+    columns (tuple): Column names.
+    """
+
+    def __init__(self, size, columns):
+        self.columns = columns
+        self._rows = np.full((size, len(columns)), np.nan)
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, row):
+        self._rows[self._next] = row
+        self._next = (self._next + 1) % self._rows.shape[0]
+        self._count = min(self._count + 1, self._rows.shape[0])
+
+    def series(self):
+        """
+        Returns:
+        dict: Column name -> np.ndarray of the kept rows, oldest first.
+        """
+        if self._count < self._rows.shape[0]:
+            rows = self._rows[:self._count]
+        else:
+            rows = np.roll(self._rows, -self._next, axis=0)
+        return {name: rows[:, i].copy() for i, name in enumerate(self.columns)}
+
+# ===========================
+# Filters
+# ===========================
+class HampelFilter:
+    """
+    Trailing-window Hampel filter: replaces outliers by the window median.
+
+    Parameters:
+    window (int): See HAMPEL_WINDOW.
+    n_sigmas (float): See HAMPEL_SIGMAS.
+    min_scale (float): See MIN_SCALE.
+    min_samples (int): See MIN_SAMPLES.
+    """
+
+    def __init__(self, window=HAMPEL_WINDOW, n_sigmas=HAMPEL_SIGMAS, min_scale=MIN_SCALE,
+                 min_samples=MIN_SAMPLES):
+        self.window = RingWindow(window)
+        self.n_sigmas = n_sigmas
+        self.min_scale = min_scale
+        self.min_samples = min_samples
+
+    def update(self, value):
+        """
+        Returns:
+        tuple: (filtered value, whether VALUE was an outlier)
+        """
+        outlier = False
+        filtered = value
+        if len(self.window) >= self.min_samples:
+            median = self.window.median()
+            scale = max(MAD_SCALE * self.window.mad(median), self.min_scale)
+            if abs(value - median) > self.n_sigmas * scale:
+                filtered, outlier = median, True
+        self.window.push(value)
+        return filtered, outlier
+
+    def reset(self):
+        self.window.clear()
+
+
+class Ewma:
+    """
+    Exponential moving average over irregularly spaced values.
+
+    Parameters:
+    tau (float): Time constant in seconds; each value weighs 1 - exp(-dt / tau).
+    """
+
+    def __init__(self, tau=EWMA_TAU):
+        self.tau = tau
+        self.value = None
+        self.last_timestamp = None
+
+    def update(self, value, timestamp):
+        if self.value is None or self.tau <= 0:
+            self.value = value
+        else:
+            dt = max(0.0, timestamp - self.last_timestamp)
+            alpha = 1.0 - math.exp(-dt / self.tau)
+            self.value += alpha * (value - self.value)
+        self.last_timestamp = timestamp
+        return self.value
+
+    def reset(self):
+        self.value = None
+        self.last_timestamp = None
+
+
+class SeriesFilter:
+    """
+    Hampel filter followed by an EWMA for one value of the readings.
+
+    Parameters:
+    name (str): Value name, used in the outlier counter.
+    window, n_sigmas, min_scale: See HampelFilter.
+    tau (float): See EWMA_TAU.
+    reset_after (float): See RESET_AFTER.
+    """
+
+    def __init__(self, name, window=HAMPEL_WINDOW, n_sigmas=HAMPEL_SIGMAS, min_scale=MIN_SCALE, tau=EWMA_TAU,
+                 reset_after=RESET_AFTER):
+        self.name = name
+        self.hampel = HampelFilter(window, n_sigmas, min_scale)
+        self.ewma = Ewma(tau)
+        self.reset_after = reset_after
+        self.outliers = 0
+        self._outlier_counter = metrics.counter(f"vitals.filter.outliers.{name}")
+
+    def update(self, value, ok, timestamp):
+        """
+        Returns:
+        float: The filtered value, or VALUE unchanged if it is invalid.
+        """
+        if value is None or value == INVALID or not ok:
+            return value
+        last = self.ewma.last_timestamp
+        if last is not None and timestamp - last > self.reset_after:
+            self.reset()
+        value, outlier = self.hampel.update(float(value))
+        if outlier:
+            self.outliers += 1
+            self._outlier_counter.inc()
+        return self.ewma.update(value, timestamp)
+
+    def reset(self):
+        self.hampel.reset()
+        self.ewma.reset()
+
+# ===========================
+# Vitals Filter
+# ===========================
+class VitalsFilter:
+    """
+    Filters both values of pipeline.VitalsReading items and keeps their recent history.
+
+    Parameters:
+    history_size (int): See HISTORY_SIZE.
+    **options: Passed on to both SeriesFilter (window, n_sigmas, min_scale, tau, reset_after).
+    """
+
+    def __init__(self, history_size=HISTORY_SIZE, **options):
+        self.oxygen_level = SeriesFilter("oxygen_level", **options)
+        self.heart_rate = SeriesFilter("heart_rate", **options)
+        self.history = HistoryRing(history_size, HISTORY_COLUMNS)
+        self._lock = threading.Lock()
+
+    def apply(self, reading):
+        """
+        Parameters:
+        reading (pipeline.VitalsReading): Raw reading.
+
+        Returns:
+        pipeline.VitalsReading: READING with filtered_oxygen_level and filtered_heart_rate set.
+        """
+        with self._lock:
+            oxygen_level = self.oxygen_level.update(reading.oxygen_level, reading.oxygen_level_ok, reading.timestamp)
+            heart_rate = self.heart_rate.update(reading.heart_rate, reading.heart_rate_ok, reading.timestamp)
+            self.history.append((reading.timestamp, _as_float(reading.oxygen_level), _as_float(reading.heart_rate),
+                                 _as_float(oxygen_level), _as_float(heart_rate)))
+        return reading._replace(filtered_oxygen_level=oxygen_level, filtered_heart_rate=heart_rate)
+
+    __call__ = apply
+
+    def series(self):
+        """
+        Returns:
+        dict: The raw and filtered series of the kept readings (HISTORY_COLUMNS ->
+        np.ndarray, oldest first, NaN for invalid values).
+        """
+        with self._lock:
+            return self.history.series()
+
+    def reset(self):
+        with self._lock:
+            self.oxygen_level.reset()
+            self.heart_rate.reset()
+
+
+def _as_float(value):
+    return np.nan if value is None or value == INVALID else float(value)